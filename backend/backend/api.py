@@ -44,8 +44,16 @@ def create_api(scope, lambda_fn, domain_name=None, certificate=None):
             api,
             stage="prod"
         )
+    # Photo URLs are negotiated from the Accept header, so it has to be part of
+    # the cache key, as does GET /dogs?snapshot=, a different response altogether
     api.root.add_proxy(
-        default_integration=apigateway.LambdaIntegration(lambda_fn),
+        default_integration=apigateway.LambdaIntegration(
+            lambda_fn,
+            cache_key_parameters=["method.request.header.Accept", "method.request.querystring.snapshot"]
+        ),
+        default_method_options=apigateway.MethodOptions(
+            request_parameters={"method.request.header.Accept": False, "method.request.querystring.snapshot": False}
+        ),
         any_method=True
     )
     return api
\ No newline at end of file
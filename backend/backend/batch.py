@@ -0,0 +1,68 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# BatchGetItem takes at most 100 keys per call. Larger reads are split into
+# chunks that run side by side on GET_POOL, each retrying its UnprocessedKeys
+# (returned when a partition is throttled or a response would pass 16 MB)
+# with full-jitter exponential backoff. Calls go through the low-level client,
+# which unlike the resource is safe to share between threads.
+BATCH_GET_LIMIT = 100
+GET_WORKERS = int(os.environ.get('BATCH_GET_WORKERS', 8))
+GET_POOL = ThreadPoolExecutor(max_workers=GET_WORKERS)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_CAP_SECONDS = 2.0
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def backoff(attempt):
+    # Full jitter: anywhere up to the capped exponential delay
+    time.sleep(random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+
+
+def get_chunk(client, table_name, request):
+    # Items for one chunk of at most BATCH_GET_LIMIT keys
+    items = []
+    request_items = {table_name: request}
+    for attempt in range(MAX_ATTEMPTS):
+        response = client.batch_get_item(RequestItems=request_items)
+        items.extend(response['Responses'].get(table_name, []))
+        request_items = response.get('UnprocessedKeys')
+        if not request_items:
+            return items
+        backoff(attempt)
+    raise RuntimeError(f"{len(request_items[table_name]['Keys'])} keys of {table_name} still unprocessed after {MAX_ATTEMPTS} attempts")
+
+
+def get_items(dynamodb, table_name, keys, attributes=None):
+    # Items for keys (plain dicts, as the resource API takes them), in no
+    # particular order; keys with no item are left out. attributes limits
+    # what is read back, and must include the key attributes.
+    keys = list({tuple(sorted(key.items())): key for key in keys}.values())
+    if not keys:
+        return []
+    client = dynamodb.meta.client
+    template = {}
+    if attributes:
+        template['ProjectionExpression'] = ', '.join(f"#a{i}" for i in range(len(attributes)))
+        template['ExpressionAttributeNames'] = {f"#a{i}": name for i, name in enumerate(attributes)}
+    chunks = [
+        dict(template, Keys=[{name: serializer.serialize(value) for name, value in key.items()} for key in keys[start:start + BATCH_GET_LIMIT]])
+        for start in range(0, len(keys), BATCH_GET_LIMIT)
+    ]
+    if len(chunks) == 1:
+        responses = [get_chunk(client, table_name, chunks[0])]
+    else:
+        responses = list(GET_POOL.map(lambda chunk: get_chunk(client, table_name, chunk), chunks))
+    return [{name: deserializer.deserialize(value) for name, value in item.items()} for items in responses for item in items]
+
+
+# Writes that go item by item (conditional puts, which BatchWriteItem cannot
+# make) run side by side on WRITE_POOL, through the client like reads.
+WRITE_POOL = ThreadPoolExecutor(max_workers=GET_WORKERS)
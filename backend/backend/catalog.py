@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+import images
+import views
+from export import plain
+
+logger = logging.getLogger()
+
+# GET /dogs?snapshot=redirect|inline serves every listed dog at once from a
+# snapshot in the photos bucket instead of querying the dogs table, so loading
+# the whole deck costs the same however many clients do it. The catalog
+# materializer (catalog_materializer.py) rewrites the snapshot from the dogs
+# table stream, and cdk-workshop/build_catalog.py builds it from scratch.
+#
+# A snapshot is immutable and named by its version, a hash of its contents:
+#   catalog/v/<version>/dogs.json.gz         the dogs as stored, for updates
+#   catalog/v/<version>/dogs.<format>.json.gz  per image format, photos negotiated
+# Each file is gzipped JSON, {"version", "generatedAt", "dogs": [...]}, newest
+# dog first. catalog/current.json names the current version; it is written
+# only once every file of the version is in place. Superseded versions are
+# deleted RETIRE_AFTER_SECONDS later, since clients (and the API Gateway
+# cache) may still be following a redirect to them.
+POINTER_KEY = 'catalog/current.json'
+VERSIONS_PREFIX = 'catalog/v/'
+# Summary fields, less the like count, which changes with every swipe and
+# would otherwise rewrite the snapshot just as often
+FIELDS = tuple(field for field in views.SUMMARY_FIELDS if field != 'likeCount') + ('createdAt',)
+ATTRIBUTES = views.attributes(FIELDS)
+FORMATS = tuple(images.FORMATS)
+RETIRE_AFTER_SECONDS = 3600
+
+# How long a warm container trusts its copy of the pointer
+REFRESH_SECONDS = int(os.environ.get('CATALOG_REFRESH_SECONDS', '10'))
+
+
+def entry(dog):
+    # What the snapshot holds for a dog: nothing unless it is listed
+    if not dog or dog.get('status', 'ACTIVE') != 'ACTIVE':
+        return None
+    return {name: plain(dog[name]) for name in ATTRIBUTES if dog.get(name) not in (None, '')}
+
+
+def file_key(version, image_format=None):
+    name = f"dogs.{image_format}.json.gz" if image_format else 'dogs.json.gz'
+    return f"{VERSIONS_PREFIX}{version}/{name}"
+
+
+def etag(pointer, image_format):
+    # Strong ETag of one representation of a version
+    return f'"{pointer["version"]}-{image_format}"'
+
+
+def version_of(entries):
+    canonical = json.dumps(entries, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return hashlib.sha256(canonical).hexdigest()[:20]
+
+
+def encode(document):
+    # mtime=0 keeps the bytes, like the version, a function of the contents
+    return gzip.compress(json.dumps(document, separators=(',', ':'), sort_keys=True).encode('utf-8'), mtime=0)
+
+
+def ordered(entries):
+    return sorted(entries, key=lambda dog: (dog.get('createdAt', ''), dog['id']), reverse=True)
+
+
+def apply(entries, upserts, deletes):
+    # The snapshot's dogs with dogs added, changed or removed
+    #   upserts: dog id -> entry; deletes: dog ids
+    dogs = {dog['id']: dog for dog in entries}
+    for dog_id in deletes:
+        dogs.pop(dog_id, None)
+    dogs.update(upserts)
+    return ordered(dogs.values())
+
+
+def documents(entries, version, generated_at):
+    # (image format or None, document) for every file of a version
+    yield None, {'version': version, 'generatedAt': generated_at, 'dogs': entries}
+    for image_format in FORMATS:
+        dogs = [views.shape(images.negotiate_photos(dict(dog), image_format), FIELDS) for dog in entries]
+        yield image_format, {'version': version, 'generatedAt': generated_at, 'format': image_format, 'dogs': dogs}
+
+
+def publish(s3, bucket, entries, previous=None, now=None):
+    # Writes entries as the current snapshot, unless they are what it already
+    # holds; returns the pointer
+    now = time.time() if now is None else now
+    version = version_of(entries)
+    if previous and previous['version'] == version:
+        return previous
+    generated_at = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    for image_format, document in documents(entries, version, generated_at):
+        s3.put_object(
+            Bucket=bucket, Key=file_key(version, image_format), Body=encode(document),
+            ContentType='application/json', ContentEncoding='gzip', CacheControl='public, max-age=31536000, immutable'
+        )
+
+    retired = list(previous.get('retired', [])) + [{'version': previous['version'], 'retiredAt': now}] if previous else []
+    expired = [old for old in retired if now - old['retiredAt'] >= RETIRE_AFTER_SECONDS]
+    pointer = {
+        'version': version, 'count': len(entries), 'generatedAt': generated_at,
+        'retired': [old for old in retired if old not in expired],
+    }
+    s3.put_object(Bucket=bucket, Key=POINTER_KEY, Body=json.dumps(pointer).encode('utf-8'), ContentType='application/json', CacheControl='no-cache')
+    for old in expired:
+        for image_format in (None,) + FORMATS:
+            s3.delete_object(Bucket=bucket, Key=file_key(old['version'], image_format))
+    return pointer
+
+
+def read_pointer(s3, bucket):
+    # The current pointer, or None if no snapshot was built yet
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=POINTER_KEY)['Body'].read())
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise
+        return None
+
+
+def read_entries(s3, bucket, pointer):
+    # The dogs of a version as stored
+    if not pointer:
+        return []
+    data = s3.get_object(Bucket=bucket, Key=file_key(pointer['version']))['Body'].read()
+    return json.loads(gzip.decompress(data))['dogs']
+
+
+# Warm containers keep the pointer, and the snapshot bodies they serve inline
+# or deal GET /feed from (feed.py)
+_loaded = {'pointer': None, 'etag': None, 'checked': 0.0, 'bodies': {}, 'dogs': {}}
+
+
+def current(s3, bucket, max_age=REFRESH_SECONDS):
+    # The current pointer, re-checked against S3 (with a conditional GET) once
+    # the copy is older than max_age seconds; None if there is no snapshot
+    now = time.monotonic()
+    if _loaded['checked'] and now - _loaded['checked'] < max_age:
+        return _loaded['pointer']
+    request = {'Bucket': bucket, 'Key': POINTER_KEY}
+    if _loaded['etag']:
+        request['IfNoneMatch'] = _loaded['etag']
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('304', 'NotModified'):
+            _loaded['checked'] = now
+            return _loaded['pointer']
+        if code not in ('NoSuchKey', '404'):
+            raise
+        logger.warning(f"No catalog snapshot at s3://{bucket}/{POINTER_KEY} yet")
+        _loaded.update(pointer=None, etag=None, checked=now)
+        return None
+    _loaded.update(pointer=json.loads(response['Body'].read()), etag=response['ETag'], checked=now)
+    return _loaded['pointer']
+
+
+def body(s3, bucket, pointer, image_format):
+    # The uncompressed JSON of a version for image_format
+    key = file_key(pointer['version'], image_format)
+    if key not in _loaded['bodies']:
+        data = gzip.decompress(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+        # Bodies of other versions are no longer served
+        prefix = f"{VERSIONS_PREFIX}{pointer['version']}/"
+        _loaded['bodies'] = {name: cached for name, cached in _loaded['bodies'].items() if name.startswith(prefix)}
+        _loaded['bodies'][key] = data
+    return _loaded['bodies'][key]
+
+
+def dogs(s3, bucket, pointer, image_format):
+    # The dogs of a version for image_format, parsed once per container
+    key = file_key(pointer['version'], image_format)
+    if key not in _loaded['dogs']:
+        parsed = json.loads(body(s3, bucket, pointer, image_format))['dogs']
+        prefix = f"{VERSIONS_PREFIX}{pointer['version']}/"
+        _loaded['dogs'] = {name: cached for name, cached in _loaded['dogs'].items() if name.startswith(prefix)}
+        _loaded['dogs'][key] = parsed
+    return _loaded['dogs'][key]
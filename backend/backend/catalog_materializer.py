@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+
+import catalog
+import ingest
+from streams import image, key
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def changes(records):
+    # (upserts, deletes) for a batch of pupper-dogs stream records, last write
+    # wins. Updates to attributes the snapshot doesn't hold (counts, most of
+    # them) are skipped.
+    upserts, deletes = {}, set()
+    for record in records:
+        dog_id = key(record, 'id')
+        new = catalog.entry(image(record, 'NewImage'))
+        if record['eventName'] == 'MODIFY' and new == catalog.entry(image(record, 'OldImage')):
+            continue
+        if new:
+            upserts[dog_id] = new
+            deletes.discard(dog_id)
+        else:
+            deletes.add(dog_id)
+            upserts.pop(dog_id, None)
+    return upserts, deletes
+
+
+def handler(event, context):
+    # pupper-dogs stream handler: publishes a new catalog snapshot for a batch
+    # of changes. Runs with a reserved concurrency of 1, so batches from
+    # different stream shards never overwrite each other's updates.
+    upserts, deletes = changes(event.get('Records', []))
+    if not upserts and not deletes:
+        return {'upserts': 0, 'deletes': 0}
+    s3 = ingest.s3_client()
+    bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+    previous = catalog.read_pointer(s3, bucket_name)
+    entries = catalog.apply(catalog.read_entries(s3, bucket_name, previous), upserts, deletes)
+    pointer = catalog.publish(s3, bucket_name, entries, previous)
+    logger.info(json.dumps({"event": "catalog_published", "version": pointer['version'], "dogs": pointer['count'], "upserts": len(upserts), "deletes": len(deletes)}))
+    return {'upserts': len(upserts), 'deletes': len(deletes)}
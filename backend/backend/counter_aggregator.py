@@ -0,0 +1,25 @@
+import json
+import logging
+
+import boto3
+
+import counters
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def handler(event, context):
+    # pupper-interactions stream handler: turns a batch of swipes into one
+    # counter increment per dog (see counters.py); counter_flusher.py copies
+    # the totals onto the dogs. Swipes that repeat an earlier one, and updates
+    # that only touch a like's dogSummary, change no count.
+    deltas = {dog_id: delta for dog_id, delta in counters.deltas(event.get('Records', [])).items() if delta['likes'] or delta['dislikes']}
+    if not deltas:
+        return {'dogs': 0}
+    client = boto3.resource('dynamodb').meta.client
+    list(counters.POOL.map(lambda dog_id: counters.apply(client, dog_id, deltas[dog_id]), deltas))
+    hot = sum(1 for delta in deltas.values() if delta['swipes'] >= counters.HOT_BATCH_SWIPES)
+    logger.info(json.dumps({"event": "dog_counters_updated", "records": len(event.get('Records', [])), "dogs": len(deltas), "hotDogs": hot}))
+    return {'dogs': len(deltas)}
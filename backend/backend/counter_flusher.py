@@ -0,0 +1,24 @@
+import json
+import logging
+
+import boto3
+
+import counters
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def handler(event, context):
+    # pupper-dog-counters stream handler: copies the totals of the dogs whose
+    # counters a batch changed onto those dogs (see counters.py). The event
+    # source waits up to a minute to fill a batch, so each dog is written at
+    # most about once a minute.
+    dog_ids = counters.changed(event.get('Records', []))
+    if not dog_ids:
+        return {'dogs': 0, 'written': 0}
+    client = boto3.resource('dynamodb').meta.client
+    written = sum(counters.POOL.map(lambda dog_id: counters.flush(client, dog_id), dog_ids))
+    logger.info(json.dumps({"event": "dog_counts_flushed", "records": len(event.get('Records', [])), "dogs": len(dog_ids), "written": written}))
+    return {'dogs': len(dog_ids), 'written': written}
@@ -0,0 +1,131 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+import dog_cache
+from streams import image, key
+
+# Per-dog like and dislike counts, kept from the pupper-interactions stream by
+# counter_aggregator.py. A batch of stream records becomes one increment per
+# dog, added to a counter item in pupper-dog-counters (dogId, shard). Most
+# dogs only ever use shard 0; a dog swiped HOT_BATCH_SWIPES times in one batch
+# spreads its increments over COUNTER_SHARDS items, so the aggregators running
+# side by side on different stream shards don't all write the same item.
+#
+# The summed shards are copied onto the dog as likeCount and dislikeCount,
+# which GET /dogs?order=popular sorts on (PopularityIndex, listing.py), by
+# counter_flusher.py from the counters table's stream. Its event source
+# gathers up to a minute of counter writes per batch, and a dog is only
+# written when its totals changed, so a dog swiped all day is written about
+# once a minute whatever the swipe rate. likeCount is projected into the
+# listing indexes, which hold slim summary entries (views.INDEXED_ATTRIBUTES),
+# so a flush rewrites those rather than whole dogs.
+#
+# Counting is at least once: a stream batch that is retried after some of its
+# dogs were written counts those dogs twice. cdk-workshop/backfill_dog_counters.py
+# recounts from the interactions table.
+COUNTERS_TABLE = 'pupper-dog-counters'
+COUNTER_SHARDS = 10
+HOT_BATCH_SWIPES = 25
+COUNTED = {'LIKE': 'likes', 'DISLIKE': 'dislikes'}
+# What a new dog starts with, so that it is in PopularityIndex from the start
+NEW_DOG_COUNTS = {'likeCount': 0, 'dislikeCount': 0}
+
+# Counters and dogs are written side by side through the low-level client,
+# which unlike the resource is safe to share between threads
+WORKERS = int(os.environ.get('COUNTER_WORKERS', 16))
+POOL = ThreadPoolExecutor(max_workers=WORKERS)
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def deltas(records):
+    # {dogId: {'likes': n, 'dislikes': n, 'swipes': n}} for a batch of
+    # pupper-interactions stream records. A swipe that replaces another moves
+    # a count from one to the other; one that repeats it changes nothing.
+    result = {}
+    for record in records:
+        dog_id = key(record, 'dogId')
+        delta = result.setdefault(dog_id, {'likes': 0, 'dislikes': 0, 'swipes': 0})
+        delta['swipes'] += 1
+        new, old = image(record, 'NewImage'), image(record, 'OldImage')
+        if old and old.get('interaction') in COUNTED:
+            delta[COUNTED[old['interaction']]] -= 1
+        if new and new.get('interaction') in COUNTED:
+            delta[COUNTED[new['interaction']]] += 1
+    return result
+
+
+def pick_shard(delta):
+    return random.randrange(COUNTER_SHARDS) if delta['swipes'] >= HOT_BATCH_SWIPES else 0
+
+
+def totals(client, dog_id):
+    # (likes, dislikes) summed over the dog's counter shards
+    likes = dislikes = 0
+    query = {
+        'TableName': COUNTERS_TABLE,
+        'KeyConditionExpression': 'dogId = :dog',
+        'ExpressionAttributeValues': {':dog': serializer.serialize(dog_id)},
+        'ConsistentRead': True,
+    }
+    while True:
+        response = client.query(**query)
+        for item in response['Items']:
+            likes += int(deserializer.deserialize(item.get('likes', {'N': '0'})))
+            dislikes += int(deserializer.deserialize(item.get('dislikes', {'N': '0'})))
+        if 'LastEvaluatedKey' not in response:
+            return likes, dislikes
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def apply(client, dog_id, delta):
+    # Adds a dog's increments to one of its counter shards
+    client.update_item(
+        TableName=COUNTERS_TABLE,
+        Key={'dogId': serializer.serialize(dog_id), 'shard': serializer.serialize(pick_shard(delta))},
+        UpdateExpression='ADD likes :likes, dislikes :dislikes',
+        ExpressionAttributeValues={':likes': serializer.serialize(delta['likes']), ':dislikes': serializer.serialize(delta['dislikes'])},
+    )
+
+
+def changed(records):
+    # The dogs whose counts a batch of pupper-dog-counters stream records
+    # changes. Increments that cancel out within the batch change nothing.
+    net = {}
+    for record in records:
+        new, old = image(record, 'NewImage') or {}, image(record, 'OldImage') or {}
+        change = net.setdefault(key(record, 'dogId'), [0, 0])
+        for n, name in enumerate(('likes', 'dislikes')):
+            change[n] += int(new.get(name, 0)) - int(old.get(name, 0))
+    return [dog_id for dog_id, change in net.items() if any(change)]
+
+
+def flush(client, dog_id):
+    # Copies the dog's totals onto it, unless it already has them. Returns
+    # whether the dog was written.
+    likes, dislikes = totals(client, dog_id)
+    try:
+        response = client.update_item(
+            TableName='pupper-dogs',
+            Key={'id': serializer.serialize(dog_id)},
+            UpdateExpression='SET likeCount = :likes, dislikeCount = :dislikes ADD recordVersion :one',
+            # Dogs that are gone stay gone. Flushes for a dog are never
+            # concurrent: its counter items share a partition key, and so a
+            # stream shard and a batch.
+            ConditionExpression='attribute_exists(id) AND NOT (likeCount = :likes AND dislikeCount = :dislikes)',
+            ExpressionAttributeValues={
+                ':likes': serializer.serialize(likes), ':dislikes': serializer.serialize(dislikes), ':one': serializer.serialize(1),
+            },
+            ReturnValues='UPDATED_NEW',
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    dog_cache.default_cache().invalidate(dog_id, int(deserializer.deserialize(response['Attributes']['recordVersion'])))
+    return True
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import images
+
+logger = logging.getLogger()
+
+# Every processed photo is recorded under the SHA-256 of its bytes. Its 64-bit
+# perceptual hash is split into PERCEPTUAL_BANDS bands, each indexed by its own
+# item, so copies that were re-encoded or resized (and differ in a few hash
+# bits) are found as well: two hashes within MAX_PERCEPTUAL_DISTANCE bits of
+# each other always share at least one band exactly. A duplicate upload reuses
+# the recorded classification and, for Labradors, the renditions already in S3.
+#   hashKey 'sha256#<hex>'          sha256 <hex>  -> the photo record
+#   hashKey 'phash<band>#<4 hex>'   sha256 <hex>  -> phash of that photo
+PHOTOS_TABLE = 'pupper-photo-hashes'
+PERCEPTUAL_BANDS = 4
+MAX_PERCEPTUAL_DISTANCE = PERCEPTUAL_BANDS - 1
+
+# Flat, low-detail images all hash to (nearly) the same bits, so perceptual
+# matches need at least this many bits set and this many clear
+MIN_PERCEPTUAL_BITS = 8
+
+METRICS_NAMESPACE = 'Pupper'
+
+
+def content_hash(image_data):
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def distinctive(phash):
+    bits = bin(int(phash, 16)).count('1')
+    return MIN_PERCEPTUAL_BITS <= bits <= 64 - MIN_PERCEPTUAL_BITS
+
+
+def distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def band_keys(phash):
+    width = len(phash) // PERCEPTUAL_BANDS
+    return [f"phash{i}#{phash[i * width:(i + 1) * width]}" for i in range(PERCEPTUAL_BANDS)]
+
+
+def find(table, sha256, phash):
+    # Returns (record, 'exact' | 'perceptual') or (None, None)
+    try:
+        record = table.get_item(Key={'hashKey': f"sha256#{sha256}", 'sha256': sha256}).get('Item')
+        if record:
+            return record, 'exact'
+        if not phash or not distinctive(phash):
+            return None, None
+        for band_key in band_keys(phash):
+            candidates = table.query(KeyConditionExpression=Key('hashKey').eq(band_key))['Items']
+            for candidate in sorted(candidates, key=lambda c: distance(c['phash'], phash)):
+                if distance(candidate['phash'], phash) > MAX_PERCEPTUAL_DISTANCE:
+                    break
+                key = {'hashKey': f"sha256#{candidate['sha256']}", 'sha256': candidate['sha256']}
+                record = table.get_item(Key=key).get('Item')
+                if record:
+                    return record, 'perceptual'
+    except ClientError as e:
+        # Dedup is an optimization; never fail an upload over it
+        logger.error(f"Photo hash lookup failed: {str(e)}")
+    return None, None
+
+
+def reusable_fields(record, s3, bucket_name):
+    # Image fields of a recorded Labrador, if they are current and still in S3
+    fields = record.get('imageFields')
+    if not fields or fields.get('renditionVersion', 0) < images.RENDITION_SPEC['version'] or 'placeholder' not in fields:
+        return None
+    original_key = fields['originalPhoto'].split('.amazonaws.com/', 1)[-1]
+    try:
+        s3.head_object(Bucket=bucket_name, Key=original_key)
+    except ClientError:
+        # The dog that owned them was deleted
+        return None
+    if 'cardPhotos' not in fields:
+        # Recorded before the listing indexes projected cardPhotos
+        base_url = fields['originalPhoto'].rsplit('/', 1)[0]
+        fields = dict(fields, cardPhotos=images.card_photos(fields['renditions'], fields['photoFormats'], base_url))
+    return fields
+
+
+def remember(table, sha256, phash, dog_id, is_labrador, detected_labels, fields=None):
+    record = {
+        'hashKey': f"sha256#{sha256}", 'sha256': sha256, 'dogId': dog_id, 'isLabrador': is_labrador,
+        'detectedLabels': detected_labels, 'createdAt': datetime.utcnow().isoformat(),
+    }
+    if fields:
+        record['imageFields'] = fields
+    try:
+        with table.batch_writer() as batch:
+            batch.put_item(Item=record)
+            if phash and distinctive(phash):
+                for band_key in band_keys(phash):
+                    batch.put_item(Item={'hashKey': band_key, 'sha256': sha256, 'phash': phash})
+    except ClientError as e:
+        logger.error(f"Could not record photo hash: {str(e)}")
+
+
+def emit_metric(match):
+    # CloudWatch embedded metric format: a JSON line on stdout becomes the
+    # Pupper/DedupHit metric, whose Average is the dedup hit rate
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [[]],
+                'Metrics': [{'Name': 'DedupHit', 'Unit': 'Count'}],
+            }],
+        },
+        'DedupHit': 1 if match else 0,
+        'dedupMatch': match or 'miss',
+    }))
@@ -0,0 +1,261 @@
+import copy
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from export import plain
+
+logger = logging.getLogger()
+
+# Dog items read by GET /dogs/{id}, GET /dogs/search and the GET /likes join
+# go through a read-through cache that lives as long as the Lambda container:
+# a size-bounded LRU of whole items, each kept for at most TTL_SECONDS. Items
+# are copied on the way out, since handlers negotiate photos and strip keys in
+# place.
+#
+# Every write to a dog adds 1 to its recordVersion (ingest.update_dog,
+# counters.apply; POST /dogs writes 1), and the writer passes the new version
+# to invalidate(). That drops older copies from this container's LRU and,
+# when DOG_CACHE_URL names an external tier, from the tier shared by every
+# container, which also remembers the version. Reads check the cached
+# versions against the tier's in one round trip, so no container serves a
+# dog older than the last write it was told about. Without an external tier,
+# other containers catch up within the TTL. Writes made outside the backend
+# (the cdk-workshop backfills) are also only seen once the TTL runs out.
+#
+#   DOG_CACHE_URL=redis://host:6379/0  Redis, or ElastiCache's Redis endpoint
+#   DOG_CACHE_URL=memory://            an in-process stand-in, for local runs
+VERSION_ATTRIBUTE = 'recordVersion'
+MAX_ENTRIES = int(os.environ.get('DOG_CACHE_SIZE', '2000'))
+TTL_SECONDS = float(os.environ.get('DOG_CACHE_TTL_SECONDS', '60'))
+# How long the external tier keeps items, and the versions it was told about
+EXTERNAL_TTL_SECONDS = int(os.environ.get('DOG_CACHE_EXTERNAL_TTL_SECONDS', '600'))
+STAMP_TTL_SECONDS = 86400
+
+
+def version_of(item):
+    return int(item.get(VERSION_ATTRIBUTE, 0))
+
+
+class LRUCache:
+    # key -> (version, item), least recently used first. Thread safe.
+    def __init__(self, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS, clock=time.monotonic):
+        self.max_entries, self.ttl, self.clock = max_entries, ttl_seconds, clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, version, item = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                self.counts['expirations'] += 1
+                return None
+            self.entries.move_to_end(key)
+            return version, item
+
+    def put(self, key, version, item):
+        with self.lock:
+            current = self.entries.get(key)
+            if current and current[1] > version:
+                # A slower read of an older version
+                return
+            self.entries[key] = (self.clock() + self.ttl, version, item)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts['evictions'] += 1
+
+    def invalidate(self, key, version=None):
+        # Drops key, or only a copy older than version
+        with self.lock:
+            current = self.entries.get(key)
+            if current and (version is None or current[1] < version):
+                del self.entries[key]
+                self.counts['invalidations'] += 1
+
+
+class MemoryTier:
+    # Stand-in for the external tier, shared by every cache in the process the
+    # way Redis is shared by every container
+    def __init__(self, ttl_seconds=EXTERNAL_TTL_SECONDS, clock=time.monotonic):
+        self.ttl, self.clock = ttl_seconds, clock
+        self.items, self.stamps = {}, {}
+        self.lock = threading.Lock()
+
+    def versions(self, keys):
+        with self.lock:
+            return {key: self.stamps[key] for key in keys if key in self.stamps}
+
+    def get_many(self, keys):
+        with self.lock:
+            now = self.clock()
+            return {key: (version, copy.deepcopy(item)) for key, (expires, version, item) in
+                    ((key, self.items[key]) for key in keys if key in self.items) if expires > now}
+
+    def put_many(self, entries):
+        # entries: key -> (version, item); older versions than known are ignored
+        with self.lock:
+            for key, (version, item) in entries.items():
+                if version >= self.stamps.get(key, 0):
+                    self.items[key] = (self.clock() + self.ttl, version, copy.deepcopy(item))
+                    self.stamps[key] = version
+
+    def invalidate(self, key, version):
+        with self.lock:
+            self.stamps[key] = max(version, self.stamps.get(key, 0))
+            if key in self.items and self.items[key][1] < version:
+                del self.items[key]
+
+
+class RedisTier:
+    # Items as JSON under dog:<id>, versions under dogv:<id>. The scripts
+    # compare versions in Redis, so racing writers can't go backwards.
+    PUT = """
+        if tonumber(ARGV[1]) >= tonumber(redis.call('GET', KEYS[2]) or '0') then
+            redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+            redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[4])
+        end
+    """
+    INVALIDATE = """
+        local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+        if tonumber(ARGV[1]) > current then
+            redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+            redis.call('DEL', KEYS[1])
+        end
+    """
+
+    def __init__(self, url, ttl_seconds=EXTERNAL_TTL_SECONDS):
+        # redis-py is only needed where DOG_CACHE_URL points at Redis
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("DOG_CACHE_URL names Redis, which needs the redis package in the deployment")
+        self.redis = redis.Redis.from_url(url, socket_timeout=0.05)
+        self.ttl = ttl_seconds
+        self.put_script = self.redis.register_script(self.PUT)
+        self.invalidate_script = self.redis.register_script(self.INVALIDATE)
+
+    def versions(self, keys):
+        values = self.redis.mget([f"dogv:{key}" for key in keys])
+        return {key: int(value) for key, value in zip(keys, values) if value is not None}
+
+    def get_many(self, keys):
+        found = {}
+        for key, value in zip(keys, self.redis.mget([f"dog:{key}" for key in keys])):
+            if value is not None:
+                # Numbers come back as Decimal, as DynamoDB returns them
+                entry = json.loads(value, parse_float=Decimal, parse_int=Decimal)
+                found[key] = (int(entry['version']), entry['item'])
+        return found
+
+    def put_many(self, entries):
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, (version, item) in entries.items():
+            data = json.dumps({'version': version, 'item': plain(item)}, separators=(',', ':'))
+            self.put_script(keys=[f"dog:{key}", f"dogv:{key}"], args=[version, data, self.ttl, STAMP_TTL_SECONDS], client=pipeline)
+        pipeline.execute()
+
+    def invalidate(self, key, version):
+        self.invalidate_script(keys=[f"dog:{key}", f"dogv:{key}"], args=[version, STAMP_TTL_SECONDS])
+
+
+_memory_tier = MemoryTier()
+
+
+def external_tier(url):
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return _memory_tier
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisTier(url)
+    raise ValueError(f"Unknown DOG_CACHE_URL scheme: {url}")
+
+
+class DogCache:
+    def __init__(self, local, external=None):
+        self.local, self.external = local, external
+        self.counts = {'hits': 0, 'externalHits': 0, 'misses': 0, 'stale': 0, 'tierErrors': 0}
+        self.lock = threading.Lock()
+
+    def count(self, name, amount):
+        with self.lock:
+            self.counts[name] += amount
+
+    def shared(self, method, *args, default=None):
+        # A call to the external tier. A tier that is down or slow makes the
+        # cache this container's LRU alone rather than failing the request.
+        if not self.external:
+            return default
+        try:
+            return getattr(self.external, method)(*args)
+        except Exception as e:
+            logger.warning(f"Dog cache tier {method} failed: {str(e)}")
+            self.count('tierErrors', 1)
+            return default
+
+    def get_many(self, keys, load):
+        # key -> item for keys, reading what isn't cached through
+        # load(missing keys) -> items; keys with no item are left out
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for key in keys:
+            entry = self.local.get(key)
+            if entry:
+                found[key] = entry
+        stamps = self.shared('versions', keys, default={}) if keys else {}
+        for key, (version, _) in list(found.items()):
+            if stamps.get(key, 0) > version:
+                del found[key]
+                self.local.invalidate(key, stamps[key])
+                self.count('stale', 1)
+        self.count('hits', len(found))
+
+        missing = [key for key in keys if key not in found]
+        if self.external and missing:
+            for key, (version, item) in self.shared('get_many', missing, default={}).items():
+                if version >= stamps.get(key, 0):
+                    found[key] = (version, item)
+                    self.local.put(key, version, item)
+                    self.count('externalHits', 1)
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            self.count('misses', len(missing))
+            loaded = {item['id']: (version_of(item), item) for item in load(missing) if item}
+            for key, (version, item) in loaded.items():
+                self.local.put(key, version, item)
+            if loaded:
+                self.shared('put_many', loaded)
+            found.update(loaded)
+        return {key: copy.deepcopy(found[key][1]) for key in keys if key in found}
+
+    def get(self, key, load):
+        # The item for key, or None; load(key) returns the item or None
+        return self.get_many([key], lambda missing: [load(missing[0])]).get(key)
+
+    def invalidate(self, key, version):
+        self.local.invalidate(key, version)
+        self.shared('invalidate', key, version)
+
+    def stats(self):
+        return dict(self.counts, **self.local.counts, entries=len(self.local))
+
+
+@functools.lru_cache(maxsize=None)
+def default_cache():
+    # One cache per container, so warm invocations share it
+    return DogCache(LRUCache(), external_tier(os.environ.get('DOG_CACHE_URL')))
@@ -4,6 +4,8 @@ from aws_cdk import (
     aws_applicationautoscaling as autoscaling,
 )
 
+from backend import views
+
 def create_tables(scope):
     # Dogs table
     dogs_table = dynamodb.Table(
@@ -17,8 +19,54 @@ def create_tables(scope):
         read_capacity=5,
         write_capacity=5,
         removal_policy=RemovalPolicy.DESTROY,
+        # Feeds the search indexer (backend/search_indexer.py)
+        stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
     )
 
+    # Listing indexes for GET /dogs (backend/listing.py): every listed dog by
+    # createdAt, plus sparse composite-key indexes for the filters. Existing
+    # stacks must add them one deployment at a time, since CloudFormation only
+    # creates one GSI per table update.
+    listing_indexes = [
+        ("StatusCreatedAtIndex", ("status", dynamodb.AttributeType.STRING), ("createdAt", dynamodb.AttributeType.STRING)),
+        ("StateIndex", ("statusState", dynamodb.AttributeType.STRING), ("createdAt", dynamodb.AttributeType.STRING)),
+        ("StateCityIndex", ("statusState", dynamodb.AttributeType.STRING), ("cityCreatedAt", dynamodb.AttributeType.STRING)),
+        ("ColorIndex", ("statusColor", dynamodb.AttributeType.STRING), ("createdAt", dynamodb.AttributeType.STRING)),
+        ("WeightIndex", ("status", dynamodb.AttributeType.STRING), ("weightInPounds", dynamodb.AttributeType.NUMBER)),
+        # Most liked first, for GET /dogs?order=popular (backend/counters.py)
+        ("PopularityIndex", ("status", dynamodb.AttributeType.STRING), ("likeCount", dynamodb.AttributeType.NUMBER)),
+        # Listed dogs by geohash cell, for GET /dogs?near= (backend/nearby.py)
+        ("GeoIndex", ("geoCell", dynamodb.AttributeType.STRING), ("geohash", dynamodb.AttributeType.STRING)),
+    ]
+    # GET /dogs?near= ranks every dog in its cells, so GeoIndex holds only the
+    # coordinates and the attributes its filters need, not whole dogs. The
+    # other indexes hold what a view=summary card is built from and what
+    # their filters read (backend/views.py), under 2 KB a dog; other fields
+    # are read from the dogs. That includes likeCount, which
+    # backend/counter_flusher.py copies onto a dog at most once a minute.
+    included_attributes = {
+        index_name: [name for name in views.INDEXED_ATTRIBUTES if name not in ("id", partition_name, sort_name)]
+        for index_name, (partition_name, _), (sort_name, _) in listing_indexes
+        if index_name != "GeoIndex"
+    }
+    included_attributes["GeoIndex"] = ["latitude", "longitude", "statusColor", "weightInPounds"]
+    for index_name, (partition_name, partition_type), (sort_name, sort_type) in listing_indexes:
+        dogs_table.add_global_secondary_index(
+            index_name=index_name,
+            partition_key=dynamodb.Attribute(
+                name=partition_name,
+                type=partition_type
+            ),
+            sort_key=dynamodb.Attribute(
+                name=sort_name,
+                type=sort_type
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=included_attributes[index_name],
+            read_capacity=5,
+            write_capacity=5,
+        )
+
     # Add auto-scaling to the dogs table
     read_scaling = dogs_table.auto_scale_read_capacity(
         min_capacity=5,
@@ -38,6 +86,27 @@ def create_tables(scope):
         target_utilization_percent=70
     )
 
+    for index_name, _, _ in listing_indexes:
+        index_read_scaling = dogs_table.auto_scale_global_secondary_index_read_capacity(
+            index_name,
+            min_capacity=5,
+            max_capacity=100
+        )
+
+        index_read_scaling.scale_on_utilization(
+            target_utilization_percent=70
+        )
+
+        index_write_scaling = dogs_table.auto_scale_global_secondary_index_write_capacity(
+            index_name,
+            min_capacity=5,
+            max_capacity=50
+        )
+
+        index_write_scaling.scale_on_utilization(
+            target_utilization_percent=70
+        )
+
     # User interactions table
     interactions_table = dynamodb.Table(
         scope, "UserInteractionsTable",
@@ -54,6 +123,46 @@ def create_tables(scope):
         read_capacity=5,
         write_capacity=5,
         removal_policy=RemovalPolicy.DESTROY,
+        # Feeds the like/dislike counters (backend/counter_aggregator.py) and
+        # the seen filters GET /feed deals past (backend/seen_recorder.py)
+        stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
+    )
+
+    # Sparse likes index for GET /likes (backend/likes.py): only LIKE items
+    # carry likedBy, so a user's dislikes are neither stored nor read here.
+    # Interaction items are tiny, so projecting everything costs nothing per
+    # read.
+    interactions_table.add_global_secondary_index(
+        index_name="LikesByTimeIndex",
+        partition_key=dynamodb.Attribute(
+            name="likedBy",
+            type=dynamodb.AttributeType.STRING
+        ),
+        sort_key=dynamodb.Attribute(
+            name="timestamp",
+            type=dynamodb.AttributeType.STRING
+        ),
+        projection_type=dynamodb.ProjectionType.ALL,
+        read_capacity=5,
+        write_capacity=5
+    )
+
+    # Who liked a dog, for refreshing the dog summaries copied onto its likes
+    # (backend/summary_refresher.py). Sparse the same way: dislikes have no
+    # likedBy.
+    interactions_table.add_global_secondary_index(
+        index_name="LikesByDogIndex",
+        partition_key=dynamodb.Attribute(
+            name="dogId",
+            type=dynamodb.AttributeType.STRING
+        ),
+        sort_key=dynamodb.Attribute(
+            name="likedBy",
+            type=dynamodb.AttributeType.STRING
+        ),
+        projection_type=dynamodb.ProjectionType.KEYS_ONLY,
+        read_capacity=5,
+        write_capacity=5
     )
 
     # Add auto-scaling to the interactions table
@@ -74,5 +183,67 @@ def create_tables(scope):
     write_scaling.scale_on_utilization(
         target_utilization_percent=70
     )
+
+    for index_name in ("LikesByTimeIndex", "LikesByDogIndex"):
+        likes_read_scaling = interactions_table.auto_scale_global_secondary_index_read_capacity(
+            index_name,
+            min_capacity=5,
+            max_capacity=100
+        )
+
+        likes_read_scaling.scale_on_utilization(
+            target_utilization_percent=70
+        )
+
+        likes_write_scaling = interactions_table.auto_scale_global_secondary_index_write_capacity(
+            index_name,
+            min_capacity=5,
+            max_capacity=50
+        )
+
+        likes_write_scaling.scale_on_utilization(
+            target_utilization_percent=70
+        )
+
+    # Like/dislike counters per dog (backend/counters.py): one item per
+    # counter shard, summed onto the dog by the flusher from this table's
+    # stream. On demand, since writes follow swipe bursts rather than a
+    # steady rate.
+    counters_table = dynamodb.Table(
+        scope, "DogCountersTable",
+        table_name="pupper-dog-counters",
+        partition_key=dynamodb.Attribute(
+            name="dogId",
+            type=dynamodb.AttributeType.STRING
+        ),
+        sort_key=dynamodb.Attribute(
+            name="shard",
+            type=dynamodb.AttributeType.NUMBER
+        ),
+        billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        removal_policy=RemovalPolicy.DESTROY,
+        # Feeds the counts copied onto dogs (backend/counter_flusher.py)
+        stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
+    )
+
+    # Photo hashes for upload deduplication (backend/dedup.py): one record per
+    # SHA-256 of the uploaded bytes, plus perceptual hash band entries that
+    # point back at it
+    photos_table = dynamodb.Table(
+        scope, "PhotoHashesTable",
+        table_name="pupper-photo-hashes",
+        partition_key=dynamodb.Attribute(
+            name="hashKey",
+            type=dynamodb.AttributeType.STRING
+        ),
+        sort_key=dynamodb.Attribute(
+            name="sha256",
+            type=dynamodb.AttributeType.STRING
+        ),
+        billing_mode=dynamodb.BillingMode.PROVISIONED,
+        read_capacity=5,
+        write_capacity=5,
+        removal_policy=RemovalPolicy.DESTROY,
+    )
     
-    return dogs_table, interactions_table
+    return dogs_table, interactions_table, photos_table, counters_table
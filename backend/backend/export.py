@@ -0,0 +1,241 @@
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary, TypeDeserializer
+from botocore.exceptions import ClientError
+
+# Bulk export of a DynamoDB table (cdk-workshop/export_tables.py). The table
+# is scanned as TotalSegments parallel segments, each on its own worker
+# through the low-level client, and every segment writes its items to part
+# files of newline-delimited JSON or Parquet, locally or under an S3 prefix:
+#   <table>/segment-0003-part-00012.ndjson
+# A part always ends on a scan page boundary, and once it is written the
+# segment's position (the page's LastEvaluatedKey) goes into
+# <table>/_checkpoint.json. A failed export run again with the same
+# destination carries on from there without writing any item twice.
+#
+# Reads are paced by an RcuBudget shared by all workers, using the capacity
+# each scan page reports, so an export can run next to live traffic.
+FORMATS = ('ndjson', 'parquet')
+ROWS_PER_FILE = 50000
+# Scan page size; smaller pages keep each read well inside a small budget
+PAGE_SIZE = 1000
+CHECKPOINT_NAME = '_checkpoint.json'
+
+deserializer = TypeDeserializer()
+
+
+class RcuBudget:
+    # Token bucket over read capacity units. A scan page may start once the
+    # bucket is not in debt, and what it consumed is taken out afterwards, so
+    # pages never wait on a guess of their own size. Holds at most a second's
+    # worth of units.
+    def __init__(self, units_per_second, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(units_per_second)
+        self.tokens = self.rate
+        self.clock, self.sleep = clock, sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self):
+        while True:
+            with self.lock:
+                self.refill()
+                # Not 0: a refill can leave a rounding error's worth of debt,
+                # too little for the sleep below to move the clock
+                if self.tokens >= -1e-9:
+                    return
+                delay = -self.tokens / self.rate
+            self.sleep(delay)
+
+    def spend(self, units):
+        with self.lock:
+            self.refill()
+            self.tokens -= units
+
+
+class LocalSink:
+    # Files under a local directory; each write lands whole or not at all
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3Sink:
+    def __init__(self, s3, bucket, prefix=''):
+        self.s3, self.bucket, self.prefix = s3, bucket, prefix.strip('/')
+
+    def key(self, name):
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def write(self, name, data):
+        self.s3.put_object(Bucket=self.bucket, Key=self.key(name), Body=data)
+
+    def read(self, name):
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=self.key(name))['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+
+
+def sink_for(output, s3=None):
+    # A sink for a local directory or an s3://bucket/prefix URL
+    if output.startswith('s3://'):
+        bucket, _, prefix = output[len('s3://'):].partition('/')
+        return S3Sink(s3, bucket, prefix)
+    return LocalSink(output)
+
+
+def plain(value):
+    # A deserialized DynamoDB value as plain JSON types
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(plain(item) for item in value)
+    if isinstance(value, Binary):
+        return base64.b64encode(value.value).decode('ascii')
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+
+def encode_ndjson(items):
+    return ''.join(json.dumps(plain(item), separators=(',', ':'), sort_keys=True) + '\n' for item in items).encode('utf-8')
+
+
+def encode_parquet(items):
+    # Top-level attributes become columns; maps, lists and sets are stored as
+    # JSON text, since items needn't agree on their shape. Needs pyarrow,
+    # which only the machine running the export has to install.
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    rows = []
+    for item in items:
+        row = {}
+        for name, value in plain(item).items():
+            row[name] = json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value
+        rows.append(row)
+    columns = sorted({name for row in rows for name in row})
+    table = pyarrow.Table.from_pydict({name: [row.get(name) for row in rows] for name in columns})
+    sink = pyarrow.BufferOutputStream()
+    pyarrow.parquet.write_table(table, sink, compression='zstd')
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {'ndjson': encode_ndjson, 'parquet': encode_parquet}
+
+
+class Checkpoint:
+    # Where every segment of an export has got to, saved after each part
+    def __init__(self, sink, table_name, total_segments, fmt):
+        self.sink, self.name = sink, f"{table_name}/{CHECKPOINT_NAME}"
+        self.lock = threading.Lock()
+        saved = sink.read(self.name)
+        if saved:
+            self.state = json.loads(saved)
+            if (self.state['totalSegments'], self.state['format']) != (total_segments, fmt):
+                raise ValueError(
+                    f"{table_name} has an unfinished export with {self.state['totalSegments']} {self.state['format']} segments; "
+                    "resume it with the same settings or export somewhere else"
+                )
+        else:
+            self.state = {
+                'table': table_name, 'totalSegments': total_segments, 'format': fmt,
+                'segments': [{'lastKey': None, 'done': False, 'parts': 0, 'items': 0} for _ in range(total_segments)],
+            }
+
+    def segment(self, segment):
+        return self.state['segments'][segment]
+
+    def advance(self, segment, last_key, items, wrote_part):
+        with self.lock:
+            state = self.state['segments'][segment]
+            state['lastKey'] = last_key
+            state['done'] = last_key is None
+            state['items'] += items
+            state['parts'] += wrote_part
+            self.sink.write(self.name, json.dumps(self.state, sort_keys=True).encode('utf-8'))
+
+
+def export_table(client, table_name, sink, total_segments=8, workers=8, fmt='ndjson', budget=None,
+                 rows_per_file=ROWS_PER_FILE, page_size=PAGE_SIZE, log=print):
+    # Exports table_name to sink, carrying on from its checkpoint if there is
+    # one; returns {'items', 'parts', 'consumedUnits', 'seconds'} for this run
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    encode = ENCODERS[fmt]
+    checkpoint = Checkpoint(sink, table_name, total_segments, fmt)
+    totals = {'items': 0, 'parts': 0, 'consumedUnits': 0.0}
+    totals_lock = threading.Lock()
+
+    def run_segment(segment):
+        state = checkpoint.segment(segment)
+        start_key, part = state['lastKey'], state['parts']
+        rows = []
+        while True:
+            if budget:
+                budget.wait()
+            params = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments,
+                      'ReturnConsumedCapacity': 'TOTAL', 'Limit': page_size}
+            if start_key:
+                params['ExclusiveStartKey'] = start_key
+            response = client.scan(**params)
+            units = response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            if budget:
+                budget.spend(units)
+            rows.extend({name: deserializer.deserialize(value) for name, value in item.items()} for item in response['Items'])
+            start_key = response.get('LastEvaluatedKey')
+            with totals_lock:
+                totals['consumedUnits'] += units
+            if len(rows) >= rows_per_file or not start_key:
+                if rows:
+                    sink.write(f"{table_name}/segment-{segment:04d}-part-{part:05d}.{fmt}", encode(rows))
+                    part += 1
+                checkpoint.advance(segment, start_key, len(rows), bool(rows))
+                with totals_lock:
+                    totals['items'] += len(rows)
+                    totals['parts'] += bool(rows)
+                rows = []
+            if not start_key:
+                return
+
+    pending = [segment for segment in range(total_segments) if not checkpoint.segment(segment)['done']]
+    if len(pending) < total_segments:
+        log(f"{table_name}: resuming, {total_segments - len(pending)} of {total_segments} segments already exported")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending) or 1))) as pool:
+        list(pool.map(run_segment, pending))
+    totals['seconds'] = time.monotonic() - started
+    return totals
@@ -0,0 +1,85 @@
+import itertools
+import json
+
+# GET /feed deals the next dogs a user hasn't swiped: the catalog snapshot
+# (catalog.py), less the dogs in the user's seen filter (seen.py). Dogs like
+# the ones the user recently liked come first (neighbors.py), then the rest,
+# newest first. Swipes reach the filter from the interactions stream a second or
+# so after they are recorded, so pages follow a cursor, nextToken, rather
+# than starting over and showing dogs swiped since the filter was read.
+#
+# Each page also names the photos of the page after it, so the client can
+# start loading them while the user swipes through this one.
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+# The two parts of the deck, as named in nextToken
+RANKED = 'ranked'
+NEWEST = 'newest'
+
+
+def plan(params):
+    # (limit, cursor) for GET /feed query parameters; raises ValueError
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    token = params.get('nextToken')
+    return limit, parse_token(token) if token else None
+
+
+def token(dog, scores):
+    # Where the page after dog starts: its place among the ranked dogs, or
+    # among the rest by age
+    if dog['id'] in scores:
+        return json.dumps([RANKED, scores[dog['id']], dog['id']])
+    return json.dumps([NEWEST, dog.get('createdAt', ''), dog['id']])
+
+
+def parse_token(token):
+    try:
+        phase, position, dog_id = json.loads(token)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid nextToken")
+    valid = isinstance(position, (int, float)) if phase == RANKED else isinstance(position, str)
+    if phase not in (RANKED, NEWEST) or not valid or not isinstance(dog_id, str):
+        raise ValueError("Invalid nextToken")
+    return phase, position, dog_id
+
+
+def deal(dogs, seen, limit, cursor=None, scores=None):
+    # (page, upcoming): the first limit dogs past cursor that seen doesn't
+    # hold, and the limit after them. Dogs with a score (dog id -> score,
+    # neighbors.py) come first, highest first, then the rest newest first.
+    # Scores move as the user likes dogs; a dog that gains one after the
+    # ranked dogs were dealt waits for the next pass, as do dogs that joined
+    # the catalog since the cursor was handed out.
+    scores = scores or {}
+    phase, position, cursor_id = cursor or (RANKED, None, None)
+    candidates = []
+    if phase == RANKED and scores:
+        after = (-position, cursor_id) if cursor else None
+        ranked = sorted((dog for dog in dogs if dog['id'] in scores), key=lambda dog: (-scores[dog['id']], dog['id']))
+        candidates.append(dog for dog in ranked if after is None or (-scores[dog['id']], dog['id']) > after)
+    before = (position, cursor_id) if phase == NEWEST else None
+    candidates.append(dog for dog in dogs if dog['id'] not in scores and (before is None or (dog.get('createdAt', ''), dog['id']) < before))
+
+    page, upcoming = [], []
+    for dog in itertools.chain(*candidates):
+        if dog['id'] in seen:
+            continue
+        if len(page) < limit:
+            page.append(dog)
+        else:
+            upcoming.append(dog)
+            if len(upcoming) == limit:
+                break
+    return page, upcoming
+
+
+def prefetch(dogs):
+    # Photo URLs for the client to load ahead of showing dogs
+    return [dog['photo'] for dog in dogs if dog.get('photo')]
+
+
+def link_header(urls):
+    return ', '.join(f"<{url}>; rel=prefetch; as=image" for url in urls)
@@ -0,0 +1,236 @@
+import csv
+import functools
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from decimal import Decimal
+
+# Where dogs are, for GET /dogs?near= (nearby.py). A dog's city and state are
+# resolved to coordinates from CITIES_FILE, a table of US cities bundled with
+# the code, so writes never wait on a geocoding service; dogs in cities it
+# doesn't list have no coordinates and aren't found by distance. The table is
+# every US place of 500 people or more in GeoNames (CC BY 4.0), about 21,000,
+# built by cdk-workshop/build_cities.py; reading it takes about 150 ms, once
+# per container. A dog whose city isn't in it counts towards the
+# Pupper/UnresolvedCity metric, and backfill_listing_keys.py reports them.
+#
+# Coordinates are indexed by geohash: latitude and longitude bits interleaved
+# and written in base 32, so a cell is a string prefix and its 32 children
+# extend it by one character. Precision 3 cells are about 156 x 156 km at the
+# equator, 5 about 4.9 x 4.9 km, 9 about 5 x 5 m.
+CITIES_FILE = os.path.join(os.path.dirname(__file__), 'cities.csv')
+METRICS_NAMESPACE = 'Pupper'
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = math.pi * EARTH_RADIUS_MILES / 180
+PUNCTUATION = re.compile(r"[.']")
+SEPARATORS = re.compile(r'[\s-]+')
+SAINT = re.compile(r'\bsaint\b')
+
+
+def place_key(city, state):
+    # Case, accents, punctuation and "Saint"/"St." spellings don't matter
+    name = (city or '').strip().lower()
+    if not name.isascii():
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    name = SAINT.sub('st', SEPARATORS.sub(' ', PUNCTUATION.sub('', name)))
+    return name, (state or '').strip().upper()
+
+
+@functools.lru_cache(maxsize=1)
+def cities():
+    with open(CITIES_FILE, newline='') as f:
+        return {place_key(row['city'], row['state']): (row['latitude'], row['longitude']) for row in csv.DictReader(f)}
+
+
+def coordinates(city, state):
+    # {'latitude', 'longitude'} as Decimals, for storing on a dog, or {} for a
+    # place the table doesn't know
+    found = cities().get(place_key(city, state))
+    if not found:
+        return {}
+    return {'latitude': Decimal(found[0]), 'longitude': Decimal(found[1])}
+
+
+def emit_unresolved(city, state):
+    # CloudWatch embedded metric format: a JSON line on stdout counts a dog
+    # towards Pupper/UnresolvedCity, and names the place for Logs Insights
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [[]],
+                'Metrics': [{'Name': 'UnresolvedCity', 'Unit': 'Count'}],
+            }],
+        },
+        'UnresolvedCity': 1,
+        'city': city,
+        'state': state,
+    }))
+
+
+def cell_size(precision):
+    # (degrees of latitude, degrees of longitude) a cell spans
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            middle = (west + east) / 2
+            value = value * 2 + (longitude >= middle)
+            west, east = (middle, east) if longitude >= middle else (west, middle)
+        else:
+            middle = (south + north) / 2
+            value = value * 2 + (latitude >= middle)
+            south, north = (middle, north) if latitude >= middle else (south, middle)
+        even, bits = not even, bits + 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value, bits = 0, 0
+    return ''.join(chars)
+
+
+def bounds(cell):
+    # (south, west, north, east) of a cell
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in cell:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                middle = (west + east) / 2
+                west, east = (middle, east) if bit else (west, middle)
+            else:
+                middle = (south + north) / 2
+                south, north = (middle, north) if bit else (south, middle)
+            even = not even
+    return south, west, north, east
+
+
+def distance_miles(latitude1, longitude1, latitude2, longitude2):
+    # Great-circle distance (haversine)
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    half_dphi, half_dlambda = (phi2 - phi1) / 2, math.radians(longitude2 - longitude1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def nearest_miles(box, latitude, longitude):
+    # Distance to the nearest point of box (south, west, north, east), from
+    # clamping the point into it. The nearest point on an edge along a
+    # meridian is a little poleward of that, so this can be up to about 1%
+    # long; callers allow for it.
+    south, west, north, east = box
+    nearest_longitude = longitude
+    if not west <= longitude <= east:
+        # The nearer edge, the short way round
+        nearest_longitude = min((west, east), key=lambda edge: abs((longitude - edge + 180) % 360 - 180))
+    return distance_miles(latitude, longitude, min(max(latitude, south), north), nearest_longitude)
+
+
+def farthest_miles(box, latitude, longitude):
+    # Distance to the farthest corner of box
+    south, west, north, east = box
+    return max(distance_miles(latitude, longitude, corner_latitude, corner_longitude)
+               for corner_latitude in (south, north) for corner_longitude in (west, east))
+
+
+def spans(latitude, radius_miles):
+    # (degrees of latitude, degrees of longitude) either side of a point that
+    # a box around the circle needs, measured at the circle's edge nearest
+    # the pole, where a degree of longitude is shortest
+    lat_span = radius_miles / MILES_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(latitude) + lat_span, 89.9)))
+    return lat_span, min(radius_miles / (MILES_PER_DEGREE * cos_lat), 180.0)
+
+
+def cells(latitude, longitude, radius_miles, precision):
+    # The cells of precision within radius_miles of the point (give or take
+    # 1%), from those overlapping the box around the circle, wrapping across
+    # the antimeridian
+    height, width = cell_size(precision)
+    lat_span, lon_span = spans(latitude, radius_miles)
+    rows = range(int((max(latitude - lat_span, -90) + 90) // height), int((min(latitude + lat_span, 89.999999) + 90) // height) + 1)
+    columns = range(int((longitude - lon_span + 180) // width), int((longitude + lon_span + 180) // width) + 1)
+    count = 360 / width
+    found = []
+    for row in rows:
+        south = -90 + row * height
+        for column in dict.fromkeys(int(column % count) for column in columns):
+            west = -180 + column * width
+            if nearest_miles((south, west, south + height, west + width), latitude, longitude) <= radius_miles * 1.01:
+                found.append(encode(south + height / 2, west + width / 2, precision))
+    return found
+
+
+def layout(longitude_first):
+    # (row, column) of each of a cell's 32 children within it: the five bits
+    # of a character alternate between longitude and latitude, starting with
+    # longitude when the parent has an even number of characters
+    places = []
+    for value in range(32):
+        first = (value >> 4 & 1) * 4 + (value >> 2 & 1) * 2 + (value & 1)
+        second = (value >> 3 & 1) * 2 + (value >> 1 & 1)
+        places.append((second, first) if longitude_first else (first, second))
+    return places
+
+
+CHILDREN = {True: (4, 8, layout(True)), False: (8, 4, layout(False))}
+
+
+def children(cell, box):
+    # (child, its box) for each of the cell's 32 children
+    south, west, north, east = box
+    rows, columns, places = CHILDREN[len(cell) % 2 == 0]
+    height, width = (north - south) / rows, (east - west) / columns
+    return [(cell + char, (south + row * height, west + column * width, south + (row + 1) * height, west + (column + 1) * width))
+            for char, (row, column) in zip(BASE32, places)]
+
+
+def runs(cells, min_precision):
+    # [first, last] of each run of same-size cells that follow each other in
+    # geohash order under one cell of min_precision: the key ranges to read
+    found = []
+    for cell in sorted(cells):
+        if found:
+            last = found[-1][1]
+            if (len(cell) == len(last) > min_precision and cell[:-1] == last[:-1]
+                    and BASE32.index(cell[-1]) == BASE32.index(last[-1]) + 1):
+                found[-1][1] = cell
+                continue
+        found.append([cell, cell])
+    return found
+
+
+def cover(latitude, longitude, radius_miles, min_precision, max_runs):
+    # The fewest cells, of precision min_precision or finer, that hold every
+    # point within radius_miles: those of the finest precision that come to
+    # at most max_runs key ranges (min_precision regardless), refined a
+    # precision at a time from the children of the cells before. A cell's
+    # children can't share a range with another cell's, so refining stops
+    # once there are more cells than max_runs. Finer cells read less beyond
+    # the circle's edge; any cell whose 32 children all touch the circle is
+    # read whole.
+    level = [(cell, bounds(cell)) for cell in cells(latitude, longitude, radius_miles, min_precision)]
+    for _ in range(min_precision, GEOHASH_PRECISION):
+        if len(level) > max_runs:
+            break
+        finer = []
+        for cell, box in level:
+            inside = [(child, child_box) for child, child_box in children(cell, box)
+                      if nearest_miles(child_box, latitude, longitude) <= radius_miles * 1.01]
+            finer.extend(inside if len(inside) < len(BASE32) else [(cell, box)])
+        if finer == level or len(runs([cell for cell, _ in finer], min_precision)) > max_runs:
+            break
+        level = finer
+    return sorted(cell for cell, _ in level)
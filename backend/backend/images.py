@@ -0,0 +1,425 @@
+import base64
+import io
+import resource
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from PIL import Image, ImageFilter, ImageOps, features
+
+# Rendition output formats in order of preference when negotiating with a client:
+# name -> (Pillow format, content type, save params)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'speed': 8}),
+    'webp': ('WEBP', 'image/webp', {'method': 4}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+
+# Renditions generated for every upload. Each width ladder is rendered largest
+# first so every size is cascaded from the previous one instead of the full frame.
+#   fit: 'contain' keeps the source aspect ratio, 'cover' centre-crops to 'aspect'
+#   default: width exposed as photo/thumbnailPhoto for clients without srcset
+#   eager: widths rendered at upload time; every other width in the ladder is
+#          allow-listed for GET /images/{dogId}/{variant} and generated on first use
+#   quality: per-format quality (PNG is lossless and ignores it)
+# A new on-demand width only needs a change here. Changing the eager set needs a
+# version bump and a run of cdk-workshop/backfill_renditions.py for existing dogs.
+RENDITION_SPEC = {
+    'version': 3,
+    'renditions': [
+        {
+            'name': 'standard', 'widths': [800, 400, 200], 'default': 400, 'eager': [400], 'fit': 'contain',
+            'formats': ['avif', 'webp', 'png'], 'quality': {'avif': 60, 'webp': 80},
+        },
+        {
+            'name': 'thumbnail', 'widths': [100, 50], 'default': 50, 'eager': [50], 'fit': 'cover', 'aspect': (1, 1),
+            'sharpen': True, 'formats': ['avif', 'webp', 'png'], 'quality': {'avif': 60, 'webp': 80},
+        },
+    ],
+}
+
+# Every client can display this one, so it is always produced and served by default
+FALLBACK_FORMAT = 'png'
+
+# Upload formats we are happy to serve exactly as uploaded: (extension, content type)
+SAFE_ORIGINAL_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+EXIF_ORIENTATION = 0x0112
+EXIF_GPS_INFO = 0x8825
+
+# Inline placeholder stored on every dog so clients can paint a blurred preview
+# before the first rendition arrives (a few hundred bytes as a data URI)
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 40
+
+# Sources above this are refused instead of decoded, to bound Lambda memory
+MAX_SOURCE_PIXELS = 40_000_000
+
+# reduce() is a cheap box filter, so only use it for the coarse steps and keep
+# at least this factor of headroom over the target for the final LANCZOS pass.
+REDUCING_GAP = 2
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class StageTimer:
+    # Stages may be timed from several threads at once, so totalMs (the sum of
+    # stages) can exceed wallMs when encodes run in parallel
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({
+                'stage': name,
+                'ms': round((time.perf_counter() - start) * 1000, 2),
+                'peakRssMb': round(peak_rss_mb(), 1),
+            })
+
+    def report(self):
+        return {
+            'totalMs': round(sum(stage['ms'] for stage in self.stages), 2),
+            'wallMs': round((time.perf_counter() - self.started) * 1000, 2),
+            'peakRssMb': round(peak_rss_mb(), 1),
+            'stages': self.stages,
+        }
+
+
+def decode(image_data, min_size=None, max_pixels=None):
+    img = Image.open(io.BytesIO(image_data))
+    if max_pixels is not None and img.width * img.height > max_pixels:
+        raise ValueError(f"Image is too large to process ({img.width}x{img.height})")
+    if min_size is not None:
+        # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale; draft() picks
+        # the smallest scale that still covers min_size and is a no-op otherwise.
+        # It sees the image as stored, so min_size is turned to match photos
+        # that exif_transpose() will stand up (orientations 5-8 swap the sides).
+        if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+            min_size = (min_size[1], min_size[0])
+        img.draft('RGB', min_size)
+    img.load()
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def perceptual_hash(image_data):
+    # 64-bit difference hash as 16 hex digits: each bit says whether a pixel of
+    # a 9x8 greyscale thumbnail is brighter than its right-hand neighbour. It
+    # survives re-encoding, resizing and metadata changes. draft() lets JPEGs
+    # decode at 1/8 scale, so this costs far less than a full decode.
+    img = Image.open(io.BytesIO(image_data))
+    img.draft('L', (64, 64))
+    img = ImageOps.exif_transpose(img).convert('L').resize((9, 8), Image.Resampling.BOX)
+    pixels = img.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def placeholder(img):
+    # Tiny WebP (JPEG without WebP support) of img as a data URI; the browser's
+    # upscaling of it is the blur
+    height = max(1, round(img.height * PLACEHOLDER_WIDTH / img.width))
+    small = img.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX, reducing_gap=REDUCING_GAP)
+    pil_format, content_type = ('WEBP', 'image/webp') if features.check('webp') else ('JPEG', 'image/jpeg')
+    data = encode(small, pil_format, quality=PLACEHOLDER_QUALITY)
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def downscale(img, size):
+    factor = min(img.width // (size[0] * REDUCING_GAP), img.height // (size[1] * REDUCING_GAP))
+    if factor > 1:
+        img = img.reduce(factor)
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+
+def fitted_size(size, rendition):
+    # Source area a rendition is cut from: the whole frame for 'contain', the
+    # largest centred box with the requested aspect ratio for 'cover'
+    width, height = size
+    if rendition['fit'] != 'cover':
+        return width, height
+    aspect_w, aspect_h = rendition['aspect']
+    return min(width, height * aspect_w // aspect_h), min(height, width * aspect_h // aspect_w)
+
+
+def crop_to_fit(img, rendition):
+    width, height = fitted_size(img.size, rendition)
+    if (width, height) == img.size:
+        return img
+    left = (img.width - width) // 2
+    top = (img.height - height) // 2
+    return img.crop((left, top, left + width, top + height))
+
+
+def variant_key(rendition, width, fmt):
+    return f"{rendition['name']}-{width}.{fmt}"
+
+
+def parse_variant(key, spec=RENDITION_SPEC):
+    # (rendition, width, format) for an allow-listed variant key, else None
+    stem, _, fmt = key.partition('.')
+    name, _, width = stem.rpartition('-')
+    for rendition in spec['renditions']:
+        if rendition['name'] == name and width.isdigit() and int(width) in rendition['widths'] and fmt in rendition['formats']:
+            return rendition, int(width), fmt
+    return None
+
+
+def single_variant_spec(rendition, width, fmt, spec=RENDITION_SPEC):
+    return {'version': spec['version'], 'renditions': [dict(rendition, widths=[width], eager=[width], formats=[fmt])]}
+
+
+def plan(size, spec=RENDITION_SPEC):
+    # Yields (rendition, width, height) for every size in the spec that does not
+    # upscale the source, largest first; the smallest width is always included
+    for rendition in spec['renditions']:
+        source_width, source_height = fitted_size(size, rendition)
+        widths = sorted(rendition['widths'], reverse=True)
+        widths = [width for width in widths if width <= source_width] or widths[-1:]
+        for width in widths:
+            yield rendition, width, max(1, round(width * source_height / source_width))
+
+
+def plan_outputs(size, spec=RENDITION_SPEC, formats=None):
+    # Same entries render() would return for a source of this size, without the data
+    formats = formats or available_formats()
+    return [
+        {
+            'name': rendition['name'], 'width': width, 'height': height, 'format': fmt,
+            'key': variant_key(rendition, width, fmt), 'contentType': FORMATS[fmt][1],
+        }
+        for rendition, width, height in plan(size, spec)
+        for fmt in rendition['formats'] if fmt in formats
+    ]
+
+
+def minimum_source_size(spec=RENDITION_SPEC):
+    # Smallest decode that can still produce the largest width of every rendition
+    min_width, min_height = 1, 1
+    for rendition in spec['renditions']:
+        width = max(rendition['widths'])
+        min_width = max(min_width, width)
+        if rendition['fit'] == 'cover':
+            aspect_w, aspect_h = rendition['aspect']
+            min_height = max(min_height, width * aspect_h // aspect_w)
+    return min_width, min_height
+
+
+def resize_all(img, spec=RENDITION_SPEC, timer=None, eager_only=False):
+    # Yields (rendition, width, image) for every planned size, each cascaded
+    # from the previous size of the same rendition
+    timer = timer or StageTimer()
+    current = source = None
+    for rendition, width, height in plan(img.size, spec):
+        if eager_only and width not in rendition.get('eager', rendition['widths']):
+            continue
+        if rendition is not current:
+            current, source = rendition, crop_to_fit(img, rendition)
+        with timer.stage(f"resize:{rendition['name']}-{width}"):
+            source = downscale(source, (width, height))
+        yield rendition, width, source.filter(ImageFilter.SHARPEN) if rendition.get('sharpen') else source
+
+
+def run_inline(fn, *args):
+    # Executor.submit stand-in that runs fn on the calling thread
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def timed_encode(timer, img, fmt, quality, stage):
+    with timer.stage(stage):
+        return encode_rendition(img, fmt, quality)
+
+
+def render(img, spec=RENDITION_SPEC, formats=None, timer=None, eager_only=False, executor=None):
+    # Returns one entry per (rendition, width, format) with the encoded bytes.
+    # Resizes cascade so they run in order; with an executor the encodes run on
+    # its threads (Pillow releases the GIL while encoding) as each size is ready.
+    timer = timer or StageTimer()
+    formats = formats or available_formats()
+    submit = executor.submit if executor else run_inline
+    pending = []
+    for rendition, width, resized in resize_all(img, spec, timer, eager_only):
+        for fmt in rendition['formats']:
+            if fmt not in formats:
+                continue
+            stage = f"encode:{rendition['name']}-{width}.{fmt}"
+            # save() keeps encoder state on the image, so parallel encodes each get a copy
+            source = resized.copy() if executor else resized
+            pending.append(({
+                'name': rendition['name'], 'width': resized.width, 'height': resized.height, 'format': fmt,
+                'key': variant_key(rendition, width, fmt), 'contentType': FORMATS[fmt][1],
+            }, submit(timed_encode, timer, source, fmt, rendition.get('quality', {}).get(fmt), stage)))
+    return [dict(output, data=future.result()) for output, future in pending]
+
+
+def record_fields(outputs, base_url, spec=RENDITION_SPEC):
+    # Dog item attributes describing the rendition set. Outputs carrying their own
+    # 'url' (on-demand variants) keep it, everything else lives under base_url:
+    #   renditions:     {name: [{width, height, formats: {fmt: url}}]}, largest first
+    #   photoFormats:   {name: {fmt: url}} at each rendition's default width
+    #   photo/thumbnailPhoto: fallback-format URLs at the default width
+    by_width = {}
+    for output in outputs:
+        size = by_width.setdefault((output['name'], output['width']), {'width': output['width'], 'height': output['height'], 'formats': {}})
+        size['formats'][output['format']] = output.get('url') or f"{base_url}/{output['key']}"
+    renditions = {}
+    for (name, _), size in sorted(by_width.items(), key=lambda entry: -entry[0][1]):
+        renditions.setdefault(name, []).append(size)
+
+    photo_formats = {}
+    for rendition in spec['renditions']:
+        sizes = renditions.get(rendition['name'], [])
+        if sizes:
+            # The default width, or the closest one produced when the source was too small
+            default = min(sizes, key=lambda size: abs(size['width'] - rendition['default']))
+            photo_formats[rendition['name']] = default['formats']
+
+    return {
+        'renditions': renditions,
+        'renditionVersion': spec['version'],
+        'photoFormats': photo_formats,
+        'photo': photo_formats['standard'][FALLBACK_FORMAT],
+        'thumbnailPhoto': photo_formats['thumbnail'][FALLBACK_FORMAT],
+        'cardPhotos': card_photos(renditions, photo_formats, base_url),
+    }
+
+
+def card_photos(renditions, photo_formats, base_url):
+    # What negotiate_photos() needs of renditions and photoFormats, a few
+    # hundred bytes instead of a few KB, for the listing indexes to project:
+    #   {base: base_url, formats: {fmt: {photo, thumbnailPhoto, photoSrcset: [[url, width]]}}}
+    # with URLs under base_url relative to it
+    def relative(url):
+        return url[len(base_url) + 1:] if url.startswith(base_url + '/') else url
+
+    formats = {}
+    for fmt in FORMATS:
+        photos = {}
+        if fmt in photo_formats.get('standard', {}):
+            photos['photo'] = relative(photo_formats['standard'][fmt])
+        if fmt in photo_formats.get('thumbnail', {}):
+            photos['thumbnailPhoto'] = relative(photo_formats['thumbnail'][fmt])
+        sizes = [[relative(size['formats'][fmt]), size['width']] for size in renditions.get('standard', []) if fmt in size['formats']]
+        if sizes:
+            photos['photoSrcset'] = sizes
+        if photos:
+            formats[fmt] = photos
+    return {'base': base_url, 'formats': formats}
+
+
+def srcset(sizes, fmt):
+    return ', '.join(f"{size['formats'][fmt]} {size['width']}w" for size in sizes if fmt in size['formats'])
+
+
+def negotiate_photos(item, image_format):
+    # Point photo/thumbnailPhoto (and the srcset) at the best format the client
+    # accepts, from cardPhotos where the item was read with it, as the listing
+    # indexes project it
+    card = item.pop('cardPhotos', None)
+    if card:
+        def absolute(url):
+            return url if '://' in url else f"{card['base']}/{url}"
+
+        photos = card['formats'].get(image_format, {})
+        for name in ('photo', 'thumbnailPhoto'):
+            if name in photos:
+                item[name] = absolute(photos[name])
+        if 'photoSrcset' in photos:
+            item['photoSrcset'] = ', '.join(f"{absolute(url)} {int(width)}w" for url, width in photos['photoSrcset'])
+    formats = item.get('photoFormats', {})
+    if image_format in formats.get('standard', {}):
+        item['photo'] = formats['standard'][image_format]
+    if image_format in formats.get('thumbnail', {}):
+        item['thumbnailPhoto'] = formats['thumbnail'][image_format]
+    if 'standard' in item.get('renditions', {}):
+        item['photoSrcset'] = srcset(item['renditions']['standard'], image_format)
+    return item
+
+
+def encode(img, format='PNG', **params):
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def available_formats():
+    # AVIF/WebP support depends on the codecs Pillow was built with
+    return [fmt for fmt in FORMATS if fmt == FALLBACK_FORMAT or features.check(fmt)]
+
+
+def encode_rendition(img, fmt, quality=None):
+    pil_format, _, params = FORMATS[fmt]
+    if quality is not None:
+        params = dict(params, quality=quality)
+    return encode(img, pil_format, **params)
+
+
+def negotiate_format(accept, available):
+    # Only image types the client names explicitly count; */* and image/* are
+    # sent by clients that cannot necessarily decode AVIF or WebP
+    weights = {}
+    for part in (accept or '').split(','):
+        media_type, _, params = part.partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[media_type.strip().lower()] = weight
+
+    best, best_weight = FALLBACK_FORMAT, 0.0
+    for fmt, (_, content_type, _) in FORMATS.items():
+        weight = weights.get(content_type, 0.0)
+        if fmt in available and weight > best_weight:
+            best, best_weight = fmt, weight
+    return best
+
+
+def needs_normalization(img):
+    # Rotated photos must be baked upright, and location data must not leak
+    exif = img.getexif()
+    return exif.get(EXIF_ORIENTATION, 1) != 1 or EXIF_GPS_INFO in exif
+
+
+def prepare_original(image_data):
+    # Returns (data, extension, content_type) for the stored original, keeping
+    # the uploaded bytes verbatim unless they are unsafe or need normalizing
+    img = Image.open(io.BytesIO(image_data))
+    if img.format in SAFE_ORIGINAL_FORMATS and not needs_normalization(img):
+        extension, content_type = SAFE_ORIGINAL_FORMATS[img.format]
+        return image_data, extension, content_type
+
+    source_format = img.format
+    icc_profile = img.info.get('icc_profile')
+    # Saving without exif= drops the remaining metadata along with the orientation
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P') or source_format == 'PNG':
+        # Keep transparency and lossless sources lossless
+        return encode(img, 'PNG', icc_profile=icc_profile), 'png', 'image/png'
+    if img.mode != 'RGB':
+        # The embedded profile describes the old colour space
+        img = img.convert('RGB')
+        icc_profile = None
+    return encode(img, 'JPEG', quality=92, icc_profile=icc_profile), 'jpg', 'image/jpeg'
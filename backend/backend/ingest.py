@@ -0,0 +1,215 @@
+import functools
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+
+import dedup
+import dog_cache
+import images
+
+logger = logging.getLogger()
+
+# Direct-to-S3 uploads (and images queued for async ingestion) land here first
+STAGING_PREFIX = 'staging/'
+STAGING_KEY = re.compile(r'^staging/[0-9a-f-]{36}$')
+
+# Rekognition reads images of up to 15 MB from S3, and up to 5 MB inline.
+# Staged uploads are classified from S3, so they can be no larger; bigger
+# inline images are sent as a downscaled JPEG.
+REKOGNITION_S3_OBJECT_BYTES = 15 * 1024 * 1024
+REKOGNITION_INLINE_BYTES = 5 * 1024 * 1024
+REKOGNITION_INLINE_SIDE = 1920
+MAX_UPLOAD_BYTES = min(int(os.environ.get('MAX_UPLOAD_BYTES', REKOGNITION_S3_OBJECT_BYTES)), REKOGNITION_S3_OBJECT_BYTES)
+READ_CHUNK_BYTES = 1024 * 1024
+
+# Rendition encodes and S3 uploads run on these pools, which live as long as the
+# container. Pillow releases the GIL while encoding and boto3 while waiting on
+# the network, so threads are enough. Lambda adds vCPUs with memory (one full
+# vCPU at 1769 MB), which is what ENCODE_WORKERS should follow.
+ENCODE_WORKERS = int(os.environ.get('ENCODE_WORKERS', max(2, os.cpu_count() or 1)))
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 8))
+ENCODE_POOL = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix='encode')
+UPLOAD_POOL = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+
+# Time kept back from the invocation deadline to save the record and respond
+DEADLINE_MARGIN_SECONDS = 2
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client():
+    # One client per container so warm invocations reuse its connections; the
+    # pool is sized for every upload thread to hold a connection at once
+    return boto3.client('s3', config=Config(max_pool_connections=UPLOAD_WORKERS))
+
+
+def read_upload(s3, bucket_name, key):
+    # The bytes of a staged upload, read a chunk at a time so that an object
+    # over MAX_UPLOAD_BYTES raises ValueError once it passes the limit rather
+    # than being read whole
+    body = s3.get_object(Bucket=bucket_name, Key=key)['Body']
+    data = bytearray()
+    while chunk := body.read(READ_CHUNK_BYTES):
+        data += chunk
+        if len(data) > MAX_UPLOAD_BYTES:
+            body.close()
+            raise ValueError("Image is too large")
+    return bytes(data)
+
+
+def invocation_deadline(context, default_seconds=20):
+    # time.monotonic() value by which work must finish to leave the margin
+    if context is None:
+        return time.monotonic() + default_seconds
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_MARGIN_SECONDS
+
+
+def process_image(image_data):
+    timer = images.StageTimer()
+    with timer.stage('original'):
+        original = images.prepare_original(image_data)
+
+    with timer.stage('decode'):
+        # Originals are no longer re-encoded, so decode straight at the rendition scale
+        img = images.decode(image_data, min_size=images.minimum_source_size(), max_pixels=images.MAX_SOURCE_PIXELS)
+
+    # Eager widths/formats in images.RENDITION_SPEC, cascaded largest to smallest;
+    # the rest of the ladder is generated on demand by GET /images
+    outputs = images.render(img, timer=timer, eager_only=True, executor=ENCODE_POOL)
+    planned = images.plan_outputs(img.size)
+
+    with timer.stage('placeholder'):
+        placeholder = images.placeholder(img)
+
+    logger.info(json.dumps({"event": "process_image", "sourceSize": list(img.size), **timer.report()}))
+    return original, outputs, planned, placeholder
+
+
+def rekognition_image(image_data, s3_object=None):
+    # The Image argument of detect_labels: staged uploads are read straight
+    # from S3, and inline images over its limit are downscaled
+    if s3_object:
+        return {'S3Object': s3_object}
+    if len(image_data) <= REKOGNITION_INLINE_BYTES:
+        return {'Bytes': image_data}
+    side = (REKOGNITION_INLINE_SIDE, REKOGNITION_INLINE_SIDE)
+    img = images.decode(image_data, min_size=side, max_pixels=images.MAX_SOURCE_PIXELS)
+    img.thumbnail(side)
+    return {'Bytes': images.encode(img, 'JPEG', quality=90)}
+
+
+def classify_dog_breed(image_data, s3_object=None, raise_errors=False):
+    rekognition = boto3.client('rekognition')
+    try:
+        response = rekognition.detect_labels(Image=rekognition_image(image_data, s3_object), MaxLabels=20, MinConfidence=60)
+        labels = [label['Name'].lower() for label in response['Labels']]
+        labrador_keywords = ['labrador', 'retriever', 'lab']
+        is_labrador = any(keyword in ' '.join(labels) for keyword in labrador_keywords)
+        return is_labrador, labels
+    except Exception as e:
+        logger.error(f"Rekognition error: {str(e)}")
+        if raise_errors:
+            raise
+        return False, []
+
+
+def store_images(s3, bucket_name, region, dog_id, image_data, api_url, upload_key=None, deadline=None):
+    # Uploads the original and the eager renditions, and returns the dog item
+    # attributes that describe them. Raises ValueError for unprocessable images
+    # and TimeoutError if the uploads are not done by deadline (time.monotonic()).
+    (original_data, original_extension, original_content_type), outputs, planned, placeholder = process_image(image_data)
+    base_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{dog_id}"
+
+    original_key = f"{dog_id}/original.{original_extension}"
+    if upload_key and original_data is image_data:
+        # Kept verbatim, so copy it server-side instead of uploading it again
+        uploads = [UPLOAD_POOL.submit(
+            s3.copy_object, Bucket=bucket_name, Key=original_key, CopySource={'Bucket': bucket_name, 'Key': upload_key},
+            ContentType=original_content_type, MetadataDirective='REPLACE'
+        )]
+    else:
+        uploads = [UPLOAD_POOL.submit(s3.put_object, Bucket=bucket_name, Key=original_key, Body=original_data, ContentType=original_content_type)]
+    for output in outputs:
+        uploads.append(UPLOAD_POOL.submit(
+            s3.put_object, Bucket=bucket_name, Key=f"{dog_id}/{output['key']}", Body=output['data'], ContentType=output['contentType']
+        ))
+
+    timeout = None if deadline is None else max(0, deadline - time.monotonic())
+    done, not_done = wait(uploads, timeout=timeout)
+    for upload in not_done:
+        upload.cancel()
+    if not_done:
+        raise TimeoutError(f"{len(not_done)} of {len(uploads)} uploads for dog {dog_id} missed the deadline")
+    for upload in done:
+        upload.result()
+
+    # Sizes that were not rendered now are served through GET /images on first use
+    eager_keys = {output['key'] for output in outputs}
+    on_demand = [dict(entry, url=f"{api_url}/images/{dog_id}/{entry['key']}") for entry in planned if entry['key'] not in eager_keys]
+
+    return {
+        'originalPhoto': f"{base_url}/original.{original_extension}",
+        'placeholder': placeholder,
+        **images.record_fields(outputs + on_demand, base_url),
+    }
+
+
+def ingest_photo(s3, bucket_name, region, dog_id, image_data, api_url, upload_key=None, deadline=None, raise_errors=False):
+    # Classifies and stores a dog photo, reusing the classification and the
+    # renditions of an earlier upload of the same photo when dedup finds one.
+    # Returns (is_labrador, detected_labels, fields); fields are the dog item's
+    # image attributes and are None when the photo is not a Labrador.
+    photos = boto3.resource('dynamodb').Table(dedup.PHOTOS_TABLE)
+    sha256 = dedup.content_hash(image_data)
+    try:
+        phash = images.perceptual_hash(image_data)
+    except Exception:
+        # Unreadable images are reported by store_images
+        phash = None
+    record, match = dedup.find(photos, sha256, phash)
+    dedup.emit_metric(match)
+
+    if record:
+        is_labrador, detected_labels = record['isLabrador'], record['detectedLabels']
+    else:
+        s3_object = {'Bucket': bucket_name, 'Name': upload_key} if upload_key else None
+        is_labrador, detected_labels = classify_dog_breed(image_data, s3_object, raise_errors=raise_errors)
+    if not is_labrador:
+        # An empty label list means Rekognition failed, which is not worth caching
+        if not record and detected_labels:
+            dedup.remember(photos, sha256, phash, dog_id, False, detected_labels)
+        return False, detected_labels, None
+
+    fields = dedup.reusable_fields(record, s3, bucket_name) if record else None
+    if fields is not None:
+        logger.info(json.dumps({"event": "dedup_reuse", "dogId": dog_id, "sourceDogId": record['dogId'], "match": match}))
+        if match == 'perceptual':
+            dedup.remember(photos, sha256, phash, record['dogId'], True, detected_labels, fields)
+    else:
+        fields = store_images(s3, bucket_name, region, dog_id, image_data, api_url, upload_key=upload_key, deadline=deadline)
+        dedup.remember(photos, sha256, phash, dog_id, True, detected_labels, fields)
+    return True, detected_labels, dict(fields, photoHash=sha256)
+
+
+def update_dog(table, dog_id, fields, **kwargs):
+    # SET every attribute in fields and bump the dog's version stamp, then
+    # drop older cached copies; extra kwargs (conditions) go to update_item
+    names = {f"#{name}": name for name in fields}
+    values = {f":{name}": value for name, value in fields.items()}
+    names.update(kwargs.pop('ExpressionAttributeNames', {}), **{'#recordVersion': dog_cache.VERSION_ATTRIBUTE})
+    values.update(kwargs.pop('ExpressionAttributeValues', {}), **{':one': 1})
+    response = table.update_item(
+        Key={'id': dog_id},
+        UpdateExpression='SET ' + ', '.join(f"#{name} = :{name}" for name in fields) + ' ADD #recordVersion :one',
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='UPDATED_NEW',
+        **kwargs
+    )
+    dog_cache.default_cache().invalidate(dog_id, int(response['Attributes'][dog_cache.VERSION_ATTRIBUTE]))
+    return response
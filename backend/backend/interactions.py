@@ -0,0 +1,110 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+import batch
+import likes
+import seen
+
+logger = logging.getLogger()
+
+# POST /interactions/batch takes the swipes a client has buffered, each with
+# the time it happened on the client. Only the latest swipe of each dog is
+# written (a user who likes then dislikes a dog in one buffer disliked it),
+# and every swipe gets a result so the client knows which to send again.
+#
+# Each swipe is a PutItem conditioned on the stored swipe of that dog being no
+# newer, so a batch that arrives late cannot undo a swipe recorded since by
+# POST /interactions or another batch. BatchWriteItem takes no conditions;
+# the puts run side by side on batch.WRITE_POOL instead, at the same write
+# units.
+MAX_BATCH_SIZE = 100
+# Client clocks are trusted for ordering likes, within limits: a swipe from
+# the future is dated now, and one from long ago no earlier than MAX_AGE.
+MAX_AGE = timedelta(days=1)
+
+RECORDED = 'recorded'
+SUPERSEDED = 'superseded'  # a later swipe of the same dog, in the batch or already stored, was kept instead
+INVALID = 'invalid'
+FAILED = 'failed'  # not written; safe to send again
+THROTTLED = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+def parse_timestamp(value, now):
+    # A client timestamp (ISO 8601, e.g. from Date.toISOString()) in the
+    # format the API writes (likes.format_timestamp); raises ValueError
+    if not isinstance(value, str):
+        raise ValueError(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return likes.format_timestamp(min(max(parsed, now - MAX_AGE), now))
+
+
+def plan(swipes, now):
+    # (latest, results): the swipe to write for each dog, as
+    # {dogId: (position, interaction, timestamp)}, and a result per swipe
+    # with the invalid ones already filled in
+    latest, results = {}, []
+    for position, swipe in enumerate(swipes):
+        dog_id = swipe.get('dogId') if isinstance(swipe, dict) else None
+        results.append({'dogId': dog_id})
+        # A seen key would overwrite a segment of the user's seen filter
+        if not isinstance(dog_id, str) or not dog_id or seen.is_seen_key(dog_id) or swipe.get('interaction') not in ('LIKE', 'DISLIKE'):
+            results[position]['status'] = INVALID
+            continue
+        try:
+            timestamp = parse_timestamp(swipe.get('timestamp', likes.format_timestamp(now)), now)
+        except ValueError:
+            results[position]['status'] = INVALID
+            continue
+        # Later swipes win; equal timestamps go to the one sent last
+        if dog_id not in latest or timestamp >= latest[dog_id][2]:
+            latest[dog_id] = (position, swipe['interaction'], timestamp)
+    return latest, results
+
+
+def put_if_newer(client, item):
+    # Writes one interaction item unless a newer swipe of the dog is stored;
+    # returns its status
+    request = {
+        'TableName': 'pupper-interactions',
+        'Item': {name: batch.serializer.serialize(value) for name, value in item.items()},
+        'ConditionExpression': 'attribute_not_exists(#timestamp) OR #timestamp <= :timestamp',
+        'ExpressionAttributeNames': {'#timestamp': 'timestamp'},
+        'ExpressionAttributeValues': {':timestamp': {'S': item['timestamp']}},
+    }
+    for attempt in range(batch.MAX_ATTEMPTS):
+        try:
+            client.put_item(**request)
+            return RECORDED
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'ConditionalCheckFailedException':
+                return SUPERSEDED
+            if code not in THROTTLED:
+                logger.error(f"PutItem of {item['dogId']} for {item['userId']} failed: {e}")
+                return FAILED
+        batch.backoff(attempt)
+    return FAILED
+
+
+def record(dynamodb, user_id, swipes, now=None):
+    # Writes a batch of swipes for user_id; returns a result per swipe
+    latest, results = plan(swipes, now or datetime.utcnow())
+    for position, result in enumerate(results):
+        if 'status' not in result:
+            result['status'] = RECORDED if latest[result['dogId']][0] == position else SUPERSEDED
+
+    # One BatchGetItem for the summaries copied onto likes (see likes.py)
+    liked = [dog_id for dog_id, (_, interaction, _) in latest.items() if interaction == 'LIKE']
+    dogs = {dog['id']: dog for dog in batch.get_items(dynamodb, 'pupper-dogs', [{'id': dog_id} for dog_id in liked], ('id',) + likes.SOURCE_ATTRIBUTES)}
+    items = [
+        likes.interaction_item(user_id, dog_id, interaction, timestamp, likes.dog_summary(dogs.get(dog_id)) if interaction == 'LIKE' else None)
+        for dog_id, (_, interaction, timestamp) in latest.items()
+    ]
+    client = dynamodb.meta.client
+    for item, status in zip(items, batch.WRITE_POOL.map(lambda item: put_if_newer(client, item), items)):
+        results[latest[item['dogId']][0]]['status'] = status
+    return results
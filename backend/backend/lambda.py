@@ -1,45 +1,72 @@
 # Fixed version of lambda.py with syntax error fixed and duplicate code removed
 import json
 import boto3
-from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+from botocore.exceptions import ClientError
 import base64
 import uuid
 from decimal import Decimal
 from datetime import datetime
-from PIL import Image
-import io
 import os
 import logging
+import time
+import batch
+import catalog
+import counters
+import dog_cache
+import feed
+import geo
+import images
+import ingest
+import interactions
+import likes
+import listing
+import nearby
+import neighbors
+import search
+import seen
+import variant_cache
+import views
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def process_image(image_data):
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    
-    original_buffer = io.BytesIO()
-    img.save(original_buffer, format='PNG')
-    original_data = original_buffer.getvalue()
-    
-    # 400x400 PNG with high quality
-    standard_img = img.resize((400, 400), Image.Resampling.LANCZOS)
-    standard_buffer = io.BytesIO()
-    standard_img.save(standard_buffer, format='PNG', optimize=True)
-    standard_data = standard_buffer.getvalue()
-    
-    # Better 50x50 thumbnail with sharpening
-    thumbnail_img = img.resize((50, 50), Image.Resampling.LANCZOS)
-    # Apply sharpening filter
-    from PIL import ImageFilter
-    thumbnail_img = thumbnail_img.filter(ImageFilter.SHARPEN)
-    thumbnail_buffer = io.BytesIO()
-    thumbnail_img.save(thumbnail_buffer, format='PNG', optimize=True)
-    thumbnail_data = thumbnail_buffer.getvalue()
-    
-    return original_data, standard_data, thumbnail_data
+MAX_UPLOAD_BYTES = ingest.MAX_UPLOAD_BYTES
+UPLOAD_URL_EXPIRY_SECONDS = 900
+
+class DecimalEncoder(json.JSONEncoder):
+    # DynamoDB returns every number (e.g. rendition dimensions) as Decimal
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return int(o) if o == o.to_integral_value() else float(o)
+        return super().default(o)
+
+def api_base_url(event):
+    # Public base URL of this API, used for links to on-demand image variants
+    if os.environ.get('API_URL'):
+        return os.environ['API_URL'].rstrip('/')
+    request_context = event.get('requestContext') or {}
+    domain_name = request_context.get('domainName', '')
+    if domain_name.endswith('.amazonaws.com'):
+        return f"https://{domain_name}/{request_context.get('stage', 'prod')}"
+    return f"https://{domain_name}"
+
+# What list views (/likes, /dogs/search) read of each dog
+SUMMARY_ATTRIBUTES = [
+    'id', 'name', 'species', 'shelter', 'city', 'state', 'description', 'birthday', 'weightInPounds', 'color',
+    'status', 'photo', 'thumbnailPhoto', 'photoFormats', 'renditions', 'placeholder',
+]
+
+def get_dogs(dynamodb, dog_ids, attributes=None):
+    # Dogs by id in the order given, skipping any that no longer exist. Whole
+    # items are read through the dog cache (dog_cache.py) and cut down here.
+    found = dog_cache.default_cache().get_many(
+        dog_ids, lambda missing: batch.get_items(dynamodb, 'pupper-dogs', [{'id': dog_id} for dog_id in missing])
+    )
+    if attributes:
+        found = {dog_id: {name: item[name] for name in attributes if name in item} for dog_id, item in found.items()}
+    return [found[dog_id] for dog_id in dog_ids if dog_id in found]
 
 def validate_dog_input(body):
     required_fields = ['name', 'species', 'shelter']
@@ -50,6 +77,20 @@ def validate_dog_input(body):
 
     return True, ""
 
+def dog_fields(body):
+    # Listing attributes taken from a POST /dogs body, with the coordinates of
+    # the city if the bundled table knows it (backend/geo.py)
+    location = geo.coordinates(body.get('city'), body.get('state'))
+    if not location and body.get('city'):
+        geo.emit_unresolved(body.get('city'), body.get('state'))
+    return {
+        'name': body.get('name', ''), 'species': body.get('species', ''), 'shelter': body.get('shelter', ''),
+        'city': body.get('city', ''), 'state': body.get('state', ''), 'description': body.get('description', ''),
+        'birthday': body.get('birthday', ''), 'weightInPounds': int(body.get('weightInPounds', 0)) if body.get('weightInPounds') else 0,
+        'color': body.get('color', ''), 'shelterEntryDate': body.get('shelterEntryDate', ''),
+        **location,
+    }
+
 def generate_image_with_nova(description):
     bedrock = boto3.client('bedrock-runtime')
     body = {
@@ -60,18 +101,6 @@ def generate_image_with_nova(description):
     response = bedrock.invoke_model(modelId='amazon.nova-canvas-v1:0', body=json.dumps(body))
     return json.loads(response['body'].read())['images'][0]
 
-def classify_dog_breed(image_data):
-    rekognition = boto3.client('rekognition')
-    try:
-        response = rekognition.detect_labels(Image={'Bytes': image_data}, MaxLabels=20, MinConfidence=60)
-        labels = [label['Name'].lower() for label in response['Labels']]
-        labrador_keywords = ['labrador', 'retriever', 'lab']
-        is_labrador = any(keyword in ' '.join(labels) for keyword in labrador_keywords)
-        return is_labrador, labels
-    except Exception as e:
-        logger.error(f"Rekognition error: {str(e)}")
-        return False, []
-
 def get_user_id_from_token(event):
     try:
         auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization')
@@ -94,7 +123,8 @@ def handler(event, context):
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token",
-        "Access-Control-Allow-Methods": "OPTIONS,GET,POST,DELETE"
+        "Access-Control-Allow-Methods": "OPTIONS,GET,POST,DELETE",
+        "Vary": "Accept"
     }
     
     try:
@@ -105,34 +135,76 @@ def handler(event, context):
             return {"statusCode": 200, "headers": headers, "body": ""}
         
         dynamodb = boto3.resource('dynamodb')
+        request_headers = event.get('headers') or {}
+        image_format = images.negotiate_format(request_headers.get('Accept') or request_headers.get('accept'), images.available_formats())
         
         if method == 'GET' and path == '/dogs':
             table = dynamodb.Table('pupper-dogs')
 
-            # Get pagination parameters
             query_params = event.get('queryStringParameters', {}) or {}
-            limit = int(query_params.get('limit', 20))
-            start_key = query_params.get('nextToken')
+            snapshot = query_params.get('snapshot')
+            if snapshot:
+                # Every listed dog from the catalog snapshot in S3 (backend/catalog.py)
+                if snapshot not in ('redirect', 'inline'):
+                    return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "snapshot must be redirect or inline"})}
+                s3 = ingest.s3_client()
+                bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+                region = os.environ.get('REGION', 'us-east-1')
+                pointer = catalog.current(s3, bucket_name)
+                if not pointer:
+                    return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "No catalog snapshot yet"})}
+                etag = catalog.etag(pointer, image_format)
+                snapshot_headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+                if_none_match = request_headers.get('If-None-Match') or request_headers.get('if-none-match') or ''
+                if etag in [tag.strip() for tag in if_none_match.split(',')]:
+                    return {"statusCode": 304, "headers": snapshot_headers, "body": ""}
+                if snapshot == 'redirect':
+                    location = f"https://{bucket_name}.s3.{region}.amazonaws.com/{catalog.file_key(pointer['version'], image_format)}"
+                    return {"statusCode": 302, "headers": {**snapshot_headers, "Location": location}, "body": ""}
+                return {"statusCode": 200, "headers": snapshot_headers, "body": catalog.body(s3, bucket_name, pointer, image_format).decode('utf-8')}
 
-            # Prepare scan parameters
-            scan_params = {
-                'Limit': limit
-            }
-            
-            if start_key:
+            if query_params.get('near'):
+                # Dogs within radiusMiles of a point, nearest first (backend/nearby.py)
                 try:
-                    scan_params['ExclusiveStartKey'] = json.loads(start_key)
-                except:
-                    return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "Invalid pagination token"})}
+                    plan = nearby.plan(query_params)
+                    fields = views.requested_fields(query_params)
+                except ValueError as e:
+                    return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": str(e)})}
+                page, cursor = nearby.find(dynamodb.meta.client, plan)
+                distances = {dog_id: distance for distance, dog_id in page}
+                items = get_dogs(dynamodb, [dog_id for _, dog_id in page], views.attributes(fields) if fields else None)
+                items = [views.shape(images.negotiate_photos(listing.strip_keys(item), image_format), fields) for item in items]
+                for item in items:
+                    item['distanceMiles'] = round(distances[item['id']], 1)
+                result = {"dogs": items}
+                if cursor:
+                    result['nextToken'] = nearby.token(cursor)
+                return {"statusCode": 200, "headers": headers, "body": json.dumps(result, cls=DecimalEncoder)}
 
-            # Execute scan
-            response = table.scan(**scan_params)
+            # Filters and pagination become a query on one of the listing GSIs
+            try:
+                listing_params = listing.plan_query(query_params)
+                fields = views.requested_fields(query_params)
+            except ValueError as e:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": str(e)})}
+            # The indexes hold the summary fields; pages asking for anything
+            # else read the dogs, through the dog cache
+            indexed = fields is not None and all(name in views.SUMMARY_FIELDS for name in fields)
+            listing_params.update(views.projection(fields if indexed else ['id']))
+
+            # Execute query
+            response = table.query(**listing_params)
 
             # Process items
             items = response.get('Items', [])
+            if items and not indexed:
+                items = get_dogs(dynamodb, [item['id'] for item in items], views.attributes(fields) if fields else None)
             for item in items:
                 if 'weightInPounds' in item and isinstance(item['weightInPounds'], Decimal):
                     item['weightInPounds'] = float(item['weightInPounds'])
+                listing.strip_keys(item)
+                images.negotiate_photos(item, image_format)
+            items = [views.shape(item, fields) for item in items]
 
             # Prepare response
             result = {
@@ -141,20 +213,56 @@ def handler(event, context):
 
             # Add pagination token if more results exist
             if 'LastEvaluatedKey' in response:
-                result['nextToken'] = json.dumps(response['LastEvaluatedKey'])
+                result['nextToken'] = json.dumps(response['LastEvaluatedKey'], cls=DecimalEncoder)
             
-            return {"statusCode": 200, "headers": headers, "body": json.dumps(result)}
+            return {"statusCode": 200, "headers": headers, "body": json.dumps(result, cls=DecimalEncoder)}
+        
+        elif method == 'GET' and path == '/dogs/search':
+            # Full-text search over name, description and city (backend/search.py)
+            query_params = event.get('queryStringParameters', {}) or {}
+            query = (query_params.get('q') or '').strip()
+            if not query:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "q is required"})}
+            try:
+                limit = min(max(int(query_params.get('limit', 20)), 1), search.MAX_RESULTS)
+            except ValueError:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "limit must be a number"})}
+            try:
+                fields = views.requested_fields(query_params)
+            except ValueError as e:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": str(e)})}
+
+            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+            index = search.load(ingest.s3_client(), bucket_name)
+            dog_ids, total = index.search(query, limit)
+            items = get_dogs(dynamodb, dog_ids, views.attributes(fields) if fields else SUMMARY_ATTRIBUTES)
+            items = [views.shape(images.negotiate_photos(item, image_format), fields) for item in items]
+            return {"statusCode": 200, "headers": headers, "body": json.dumps({"dogs": items, "total": total}, cls=DecimalEncoder)}
+
+        elif method == 'GET' and path.startswith('/dogs/') and path.endswith('/status'):
+            dog_id = path.split('/')[2]
+            response = dynamodb.Table('pupper-dogs').get_item(
+                Key={'id': dog_id},
+                ProjectionExpression='id, #status, detectedLabels, #error',
+                ExpressionAttributeNames={'#status': 'status', '#error': 'error'}
+            )
+            if 'Item' not in response:
+                return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "Dog not found"})}
+            # Dogs created before async ingestion have no status and are live
+            item = {'status': 'ACTIVE', **response['Item']}
+            return {"statusCode": 200, "headers": headers, "body": json.dumps(item)}
         
         elif method == 'GET' and path.startswith('/dogs/'):
             dog_id = path.split('/')[-1]
             table = dynamodb.Table('pupper-dogs')
-            response = table.get_item(Key={'id': dog_id})
-            if 'Item' not in response:
+            item = dog_cache.default_cache().get(dog_id, lambda key: table.get_item(Key={'id': key}).get('Item'))
+            if not item:
                 return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "Dog not found"})}
-            item = response['Item']
+            item = listing.strip_keys(item)
             if 'weightInPounds' in item and isinstance(item['weightInPounds'], Decimal):
                 item['weightInPounds'] = float(item['weightInPounds'])
-            return {"statusCode": 200, "headers": headers, "body": json.dumps(item)}
+            images.negotiate_photos(item, image_format)
+            return {"statusCode": 200, "headers": headers, "body": json.dumps(item, cls=DecimalEncoder)}
         
         elif method == 'POST' and path == '/interactions':
             user_id = get_user_id_from_token(event)
@@ -163,31 +271,139 @@ def handler(event, context):
             body = json.loads(event.get('body', '{}'))
             dog_id = body.get('dogId')
             interaction = body.get('interaction')
-            if not dog_id or interaction not in ['LIKE', 'DISLIKE']:
+            # A seen key would overwrite a segment of the user's seen filter
+            if not dog_id or not isinstance(dog_id, str) or seen.is_seen_key(dog_id) or interaction not in ['LIKE', 'DISLIKE']:
                 return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "Invalid request"})}
+            summary = None
+            if interaction == 'LIKE':
+                # Copied onto the like so GET /likes needs no second read
+                dog = dynamodb.Table('pupper-dogs').get_item(Key={'id': dog_id}, **likes.source_projection()).get('Item')
+                summary = likes.dog_summary(dog)
             interactions_table = dynamodb.Table('pupper-interactions')
-            interactions_table.put_item(Item={'userId': user_id, 'dogId': dog_id, 'interaction': interaction, 'timestamp': datetime.utcnow().isoformat()})
+            interactions_table.put_item(Item=likes.interaction_item(user_id, dog_id, interaction, likes.format_timestamp(datetime.utcnow()), summary))
             return {"statusCode": 200, "headers": headers, "body": json.dumps({"message": "Interaction recorded"})}
         
+        elif method == 'POST' and path == '/interactions/batch':
+            user_id = get_user_id_from_token(event)
+            if not user_id:
+                return {"statusCode": 401, "headers": headers, "body": json.dumps({"message": "Unauthorized"})}
+            # Swipes buffered by the client, written together; see interactions.py
+            swipes = json.loads(event.get('body') or '{}').get('interactions')
+            if not isinstance(swipes, list) or not swipes or len(swipes) > interactions.MAX_BATCH_SIZE:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": f"interactions must be a list of 1-{interactions.MAX_BATCH_SIZE} swipes"})}
+            results = interactions.record(dynamodb, user_id, swipes)
+            return {"statusCode": 200, "headers": headers, "body": json.dumps({"results": results})}
+        
         elif method == 'GET' and path == '/likes':
             user_id = get_user_id_from_token(event)
             if not user_id:
                 return {"statusCode": 401, "headers": headers, "body": json.dumps({"message": "Unauthorized"})}
-            interactions_table = dynamodb.Table('pupper-interactions')
-            response = interactions_table.query(KeyConditionExpression=Key('userId').eq(user_id), FilterExpression='interaction = :like', ExpressionAttributeValues={':like': 'LIKE'})
-            dog_ids = [item['dogId'] for item in response['Items']]
-            if not dog_ids:
-                return {"statusCode": 200, "headers": headers, "body": json.dumps([])}
-            dogs_table = dynamodb.Table('pupper-dogs')
+            # One page of the user's likes, newest first, from the sparse likes index
+            try:
+                likes_params = likes.plan_query(user_id, event.get('queryStringParameters') or {})
+            except ValueError as e:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": str(e)})}
+            response = dynamodb.Table('pupper-interactions').query(**likes_params)
+            # Likes recorded before summaries existed are joined with the dogs table
+            joined = {}
+            missing = [item['dogId'] for item in response['Items'] if 'dogSummary' not in item]
+            for item in get_dogs(dynamodb, missing, SUMMARY_ATTRIBUTES):
+                if 'weightInPounds' in item and isinstance(item['weightInPounds'], Decimal):
+                    item['weightInPounds'] = float(item['weightInPounds'])
+                joined[item['id']] = images.negotiate_photos(item, image_format)
             liked_dogs = []
-            for dog_id in dog_ids:
-                dog_response = dogs_table.get_item(Key={'id': dog_id})
-                if 'Item' in dog_response:
-                    item = dog_response['Item']
-                    if 'weightInPounds' in item and isinstance(item['weightInPounds'], Decimal):
-                        item['weightInPounds'] = float(item['weightInPounds'])
-                    liked_dogs.append(item)
-            return {"statusCode": 200, "headers": headers, "body": json.dumps(liked_dogs)}
+            for item in response['Items']:
+                if 'dogSummary' in item:
+                    if not item['dogSummary'].get('unavailable'):
+                        liked_dogs.append(likes.summary_dog(item, image_format))
+                elif item['dogId'] in joined:
+                    liked_dogs.append(joined[item['dogId']])
+            result = {"dogs": liked_dogs}
+            if 'LastEvaluatedKey' in response:
+                result['nextToken'] = json.dumps(response['LastEvaluatedKey'])
+            return {"statusCode": 200, "headers": headers, "body": json.dumps(result, cls=DecimalEncoder)}
+        
+        elif method == 'GET' and path == '/feed':
+            user_id = get_user_id_from_token(event)
+            if not user_id:
+                return {"statusCode": 401, "headers": headers, "body": json.dumps({"message": "Unauthorized"})}
+            # The next dogs the user hasn't swiped, dealt from the catalog
+            # snapshot past the user's seen filter (backend/feed.py)
+            try:
+                limit, cursor = feed.plan(event.get('queryStringParameters') or {})
+            except ValueError as e:
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": str(e)})}
+            s3 = ingest.s3_client()
+            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+            pointer = catalog.current(s3, bucket_name)
+            if not pointer:
+                return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "No catalog snapshot yet"})}
+            interactions_table = dynamodb.Table('pupper-interactions')
+            seen_dogs = seen.load(interactions_table, user_id)
+            # Dogs like the user's latest likes first, once the neighbors job has run
+            similar = neighbors.load(s3, bucket_name)
+            scores = similar.rank(likes.recent(interactions_table, user_id, neighbors.RECENT_LIKES)) if similar else {}
+            page, upcoming = feed.deal(catalog.dogs(s3, bucket_name, pointer, image_format), seen_dogs, limit, cursor, scores)
+            result = {"dogs": page, "prefetch": feed.prefetch(upcoming)}
+            feed_headers = {**headers, "Cache-Control": "private, no-store"}
+            if upcoming:
+                result['nextToken'] = feed.token(page[-1], scores)
+                feed_headers['Link'] = feed.link_header(result['prefetch'])
+            return {"statusCode": 200, "headers": feed_headers, "body": json.dumps(result)}
+
+        elif method == 'GET' and path.startswith('/images/'):
+            parts = path.split('/')
+            if len(parts) != 4 or not images.parse_variant(parts[3]):
+                return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "Unknown image variant"})}
+            dog_id, variant = parts[2], parts[3]
+            s3 = ingest.s3_client()
+            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+            region = os.environ.get('REGION', 'us-east-1')
+
+            def load_original():
+                dog = dynamodb.Table('pupper-dogs').get_item(Key={'id': dog_id}, ProjectionExpression='originalPhoto').get('Item')
+                if not dog or not dog.get('originalPhoto'):
+                    raise KeyError(dog_id)
+                original_key = f"{dog_id}/{dog['originalPhoto'].rsplit('/', 1)[-1]}"
+                return s3.get_object(Bucket=bucket_name, Key=original_key)['Body'].read()
+
+            # Leave a little time to answer when coalescing behind another generator
+            deadline = ingest.invocation_deadline(context)
+            try:
+                result = variant_cache.get_or_create(s3, bucket_name, dog_id, variant, load_original, deadline)
+            except KeyError:
+                return {"statusCode": 404, "headers": headers, "body": json.dumps({"message": "Dog not found"})}
+            except ValueError as e:
+                return {"statusCode": 422, "headers": headers, "body": json.dumps({"message": str(e)})}
+            except TimeoutError:
+                return {"statusCode": 503, "headers": {**headers, "Retry-After": "1"}, "body": json.dumps({"message": "Image is being generated"})}
+            logger.info(json.dumps({"event": "image_variant", "variant": variant, "result": result}))
+            return {
+                "statusCode": 302,
+                "headers": {**headers, "Location": f"https://{bucket_name}.s3.{region}.amazonaws.com/{dog_id}/{variant}", "Cache-Control": "public, max-age=86400"},
+                "body": ""
+            }
+        
+        elif method == 'POST' and path == '/uploads':
+            body = json.loads(event.get('body') or '{}')
+            content_type = body.get('contentType', '')
+            if not content_type.startswith('image/'):
+                return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "contentType must be an image type"})}
+            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+            region = os.environ.get('REGION', 'us-east-1')
+            # Presigned POSTs need SigV4 and the regional endpoint
+            s3 = boto3.client('s3', region_name=region, config=Config(signature_version='s3v4'))
+            upload_key = f"{ingest.STAGING_PREFIX}{uuid.uuid4()}"
+            upload = s3.generate_presigned_post(
+                Bucket=bucket_name, Key=upload_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, MAX_UPLOAD_BYTES]],
+                ExpiresIn=UPLOAD_URL_EXPIRY_SECONDS
+            )
+            return {"statusCode": 200, "headers": headers, "body": json.dumps({
+                "uploadKey": upload_key, "url": upload['url'], "fields": upload['fields'],
+                "maxBytes": MAX_UPLOAD_BYTES, "expiresIn": UPLOAD_URL_EXPIRY_SECONDS
+            })}
         
         elif method == 'POST' and path == '/generate-preview':
             body = json.loads(event.get('body', '{}'))
@@ -208,7 +424,21 @@ def handler(event, context):
             if not is_valid:
                 return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": error_message})}
             
-            if body.get('image'):
+            s3 = ingest.s3_client()
+            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+            region = os.environ.get('REGION', 'us-east-1')
+            upload_key = body.get('uploadKey')
+
+            if upload_key:
+                if not ingest.STAGING_KEY.match(upload_key):
+                    return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "Invalid uploadKey"})}
+                try:
+                    staged_size = s3.head_object(Bucket=bucket_name, Key=upload_key)['ContentLength']
+                except ClientError:
+                    return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "Upload not found"})}
+                if staged_size > MAX_UPLOAD_BYTES:
+                    return {"statusCode": 413, "headers": headers, "body": json.dumps({"message": "Image is too large"})}
+            elif body.get('image'):
                 image_data = base64.b64decode(body['image'])
             elif body.get('generateImageDescription'):
                 generated_image = generate_image_with_nova(body['generateImageDescription'])
@@ -216,34 +446,48 @@ def handler(event, context):
             else:
                 return {"statusCode": 400, "headers": headers, "body": json.dumps({"message": "No image provided"})}
             
-            is_labrador, detected_labels = classify_dog_breed(image_data)
-            if not is_labrador:
-                return {"statusCode": 422, "headers": headers, "body": json.dumps({"message": "Only Labrador retrievers are accepted for adoption listings.", "detectedLabels": detected_labels})}
-            
-            original_data, standard_data, thumbnail_data = process_image(image_data)
-            s3 = boto3.client('s3')
-            bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
-            region = os.environ.get('REGION', 'us-east-1')
             dog_id = str(uuid.uuid4())
-            
+
+            if body.get('async') and os.environ.get('INGEST_QUEUE_URL'):
+                # Classification and renditions run in the ingestion worker; the
+                # client polls GET /dogs/{id}/status until the dog is ACTIVE
+                staging_key = upload_key
+                if not staging_key:
+                    staging_key = f"{ingest.STAGING_PREFIX}{uuid.uuid4()}"
+                    s3.put_object(Bucket=bucket_name, Key=staging_key, Body=image_data)
+                dog_data = {'id': dog_id, **dog_fields(body), 'status': 'PENDING', 'createdAt': datetime.utcnow().isoformat(), **counters.NEW_DOG_COUNTS, dog_cache.VERSION_ATTRIBUTE: 1}
+                dynamodb.Table('pupper-dogs').put_item(Item=dog_data)
+                boto3.client('sqs').send_message(
+                    QueueUrl=os.environ['INGEST_QUEUE_URL'],
+                    MessageBody=json.dumps({"dogId": dog_id, "stagingKey": staging_key, "apiUrl": api_base_url(event)})
+                )
+                return {"statusCode": 202, "headers": headers, "body": json.dumps({"message": "Dog accepted for processing", "id": dog_id, "status": "PENDING"})}
+
             try:
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/original.png", Body=original_data, ContentType='image/png')
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/standard.png", Body=standard_data, ContentType='image/png')
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/thumbnail.png", Body=thumbnail_data, ContentType='image/png')
+                if upload_key:
+                    image_data = ingest.read_upload(s3, bucket_name, upload_key)
+                # Classification and renditions are reused when this photo was uploaded before
+                is_labrador, detected_labels, image_fields = ingest.ingest_photo(
+                    s3, bucket_name, region, dog_id, image_data, api_base_url(event),
+                    upload_key=upload_key, deadline=ingest.invocation_deadline(context)
+                )
+            except ValueError as e:
+                return {"statusCode": 413, "headers": headers, "body": json.dumps({"message": str(e)})}
+            except TimeoutError as e:
+                logger.error(f"Timed out storing images: {str(e)}")
+                return {"statusCode": 504, "headers": headers, "body": json.dumps({"message": "Timed out processing the image"})}
             except Exception as e:
                 logger.error(f"Error uploading to S3: {str(e)}")
                 return {"statusCode": 500, "headers": headers, "body": json.dumps({"message": "Error uploading to S3"})}
+            if not is_labrador:
+                return {"statusCode": 422, "headers": headers, "body": json.dumps({"message": "Only Labrador retrievers are accepted for adoption listings.", "detectedLabels": detected_labels})}
 
-            photo_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{dog_id}/standard.png"
-            dog_data = {
-                'id': dog_id, 'name': body.get('name', ''), 'species': body.get('species', ''), 'shelter': body.get('shelter', ''),
-                'city': body.get('city', ''), 'state': body.get('state', ''), 'description': body.get('description', ''),
-                'birthday': body.get('birthday', ''), 'weightInPounds': int(body.get('weightInPounds', 0)) if body.get('weightInPounds') else 0,
-                'color': body.get('color', ''), 'photo': photo_url,
-                'originalPhoto': f"https://{bucket_name}.s3.{region}.amazonaws.com/{dog_id}/original.png",
-                'thumbnailPhoto': f"https://{bucket_name}.s3.{region}.amazonaws.com/{dog_id}/thumbnail.png",
-                'shelterEntryDate': body.get('shelterEntryDate', '')
-            }
+            if upload_key:
+                # The bucket lifecycle rule expires anything left behind in staging/
+                s3.delete_object(Bucket=bucket_name, Key=upload_key)
+
+            dog_data = {'id': dog_id, **dog_fields(body), 'status': 'ACTIVE', 'createdAt': datetime.utcnow().isoformat(), **image_fields, **counters.NEW_DOG_COUNTS, dog_cache.VERSION_ATTRIBUTE: 1}
+            dog_data.update(listing.listing_keys(dog_data))
             try:
                 table = dynamodb.Table('pupper-dogs')
                 table.put_item(Item=dog_data)
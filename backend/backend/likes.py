@@ -0,0 +1,108 @@
+import json
+
+from boto3.dynamodb.conditions import Key
+
+# GET /likes reads LikesByTimeIndex on pupper-interactions (backend/dynamodb.py),
+# which only holds LIKEs: likedBy (the user id) is written on LIKE items and
+# removed when a dog is disliked, so a user's dislikes are never read. Likes
+# come back most recent first.
+LIKES_INDEX = 'LikesByTimeIndex'
+INDEX_KEYS = ('likedBy', 'timestamp')
+TABLE_KEYS = ('userId', 'dogId')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Each LIKE item also carries dogSummary, a copy of what the favorites list
+# shows of the dog, so a page of likes is one query with no read of the dogs
+# table. summary_refresher.py rewrites the copies from the dogs table stream
+# when a dog changes, finding them through LikesByDogIndex (dogId, likedBy),
+# which is sparse on likes too. The summary stays well under 1 KB, so it adds
+# no write units to a like and no read units to a page.
+LIKES_BY_DOG_INDEX = 'LikesByDogIndex'
+SUMMARY_FIELDS = ('name', 'species', 'city', 'state', 'color', 'weightInPounds', 'birthday', 'thumbnailPhoto')
+SOURCE_ATTRIBUTES = SUMMARY_FIELDS + ('status', 'photoFormats')
+# Written over the summary of a dog that was deleted or unlisted
+UNAVAILABLE = {'unavailable': True}
+
+
+def source_projection():
+    # get_item kwargs reading just what dog_summary() needs
+    return {
+        'ProjectionExpression': ', '.join(f"#{name}" for name in SOURCE_ATTRIBUTES),
+        'ExpressionAttributeNames': {f"#{name}": name for name in SOURCE_ATTRIBUTES},
+    }
+
+
+def dog_summary(dog):
+    if not dog or dog.get('status', 'ACTIVE') != 'ACTIVE':
+        return UNAVAILABLE
+    summary = {field: dog[field] for field in SUMMARY_FIELDS if dog.get(field) not in (None, '')}
+    thumbnails = dog.get('photoFormats', {}).get('thumbnail')
+    if thumbnails:
+        summary['thumbnailFormats'] = thumbnails
+    return summary
+
+
+def format_timestamp(moment):
+    # The timestamp written on interaction items: naive UTC, always with
+    # microseconds, so that timestamps sort as strings in time order
+    return moment.isoformat(timespec='microseconds')
+
+
+def interaction_item(user_id, dog_id, interaction, timestamp, summary=None):
+    item = {'userId': user_id, 'dogId': dog_id, 'interaction': interaction, 'timestamp': timestamp}
+    if interaction == 'LIKE':
+        item['likedBy'] = user_id
+        if summary:
+            item['dogSummary'] = summary
+    return item
+
+
+def summary_dog(item, image_format):
+    # A GET /likes entry from the summary on a LIKE item
+    summary = dict(item['dogSummary'])
+    formats = summary.pop('thumbnailFormats', {})
+    if image_format in formats:
+        summary['thumbnailPhoto'] = formats[image_format]
+    return dict(summary, id=item['dogId'], likedAt=item['timestamp'])
+
+
+def plan_query(user_id, params):
+    # Query kwargs for GET /likes query parameters; raises ValueError for bad ones
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    query = {
+        'IndexName': LIKES_INDEX,
+        'KeyConditionExpression': Key('likedBy').eq(user_id),
+        'ScanIndexForward': False,
+        'Limit': limit,
+    }
+    start_key = params.get('nextToken')
+    if start_key:
+        query['ExclusiveStartKey'] = parse_token(start_key, user_id)
+    return query
+
+
+def parse_token(token, user_id):
+    try:
+        start_key = json.loads(token)
+    except ValueError:
+        start_key = None
+    if not isinstance(start_key, dict) or set(start_key) != {*INDEX_KEYS, *TABLE_KEYS} or start_key['likedBy'] != user_id or start_key['userId'] != user_id:
+        raise ValueError("Invalid pagination token")
+    return start_key
+
+
+def recent(table, user_id, limit):
+    # Ids of the user's latest liked dogs, latest first, from one page of the
+    # likes index
+    response = table.query(
+        IndexName=LIKES_INDEX,
+        KeyConditionExpression=Key('likedBy').eq(user_id),
+        ScanIndexForward=False,
+        Limit=limit,
+        ProjectionExpression='dogId',
+    )
+    return [item['dogId'] for item in response['Items']]
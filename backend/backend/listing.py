@@ -0,0 +1,151 @@
+import json
+
+from boto3.dynamodb.conditions import Attr, Key
+
+import geo
+
+# GET /dogs reads from one of these GSIs on pupper-dogs (backend/dynamodb.py),
+# picking the most selective one for the filters given, so a page costs what it
+# returns rather than what the table holds. Filters not covered by the chosen
+# index's keys are applied to that index's results, which can shorten a page.
+# Results follow the index's sort key: listing date, except weight-only
+# queries, which come back by weight. A state alone reads StateIndex, keyed on
+# listing date; a state and city read StateCityIndex, whose sort key puts the
+# city first so the city is a key prefix. order=popular reads PopularityIndex, most
+# liked first (likeCount, kept by counters.py), with every filter applied to
+# its results. GET /dogs?near= reads GeoIndex instead (nearby.py).
+#
+# The indexes project what a view=summary card is built from, like count
+# included (views.INDEXED_ATTRIBUTES), so summary pages are served from the
+# index; other fields are read from the dogs, through the dog cache.
+#   name -> (partition key, sort key)
+INDEXES = {
+    'StatusCreatedAtIndex': ('status', 'createdAt'),
+    'StateIndex': ('statusState', 'createdAt'),
+    'StateCityIndex': ('statusState', 'cityCreatedAt'),
+    'ColorIndex': ('statusColor', 'createdAt'),
+    'WeightIndex': ('status', 'weightInPounds'),
+    'PopularityIndex': ('status', 'likeCount'),
+    'GeoIndex': ('geoCell', 'geohash'),
+}
+
+LISTED_STATUS = 'ACTIVE'
+MAX_PAGE_SIZE = 100
+# GeoIndex partitions on a dog's precision 3 geohash cell (geo.py) and sorts
+# on its full geohash, so finer cells are key prefixes within a partition
+GEO_PARTITION_PRECISION = 3
+
+
+def listing_keys(dog):
+    # Composite key attributes for the filter indexes. Only listed dogs get
+    # them, so those indexes stay sparse.
+    if dog.get('status') != LISTED_STATUS:
+        return {}
+    keys = {}
+    if dog.get('state'):
+        keys['statusState'] = f"{LISTED_STATUS}#{dog['state'].strip().upper()}"
+        keys['cityCreatedAt'] = f"{dog.get('city', '').strip().lower()}#{dog['createdAt']}"
+    if dog.get('color'):
+        keys['statusColor'] = f"{LISTED_STATUS}#{dog['color'].strip().lower()}"
+    if dog.get('latitude') is not None and dog.get('longitude') is not None:
+        geohash = geo.encode(float(dog['latitude']), float(dog['longitude']))
+        keys['geoCell'] = f"{LISTED_STATUS}#{geohash[:GEO_PARTITION_PRECISION]}"
+        keys['geohash'] = geohash
+    return keys
+
+
+def strip_keys(item):
+    # The composite key attributes are an implementation detail of the
+    # indexes, as are when the counts were last copied onto the dog and the
+    # version stamp the dog cache goes by
+    for name in ('statusState', 'cityCreatedAt', 'statusColor', 'geoCell', 'geohash', 'countedAt', 'recordVersion'):
+        item.pop(name, None)
+    return item
+
+
+def weight_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number of pounds")
+
+
+def plan_query(params):
+    # Query kwargs for GET /dogs query parameters; raises ValueError for bad ones
+    try:
+        limit = min(max(int(params.get('limit', 20)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    order = params.get('order', 'newest')
+    if order not in ('newest', 'oldest', 'popular'):
+        raise ValueError("order must be newest, oldest or popular")
+    state = (params.get('state') or '').strip().upper()
+    city = (params.get('city') or '').strip().lower()
+    color = (params.get('color') or '').strip().lower()
+    min_weight, max_weight = weight_param(params, 'minWeight'), weight_param(params, 'maxWeight')
+    if city and not state:
+        raise ValueError("city requires state")
+
+    weight = None
+    if min_weight is not None or max_weight is not None:
+        weight = (0 if min_weight is None else min_weight, 10000 if max_weight is None else max_weight)
+
+    residual = []
+    if order == 'popular':
+        index = 'PopularityIndex'
+        key = Key('status').eq(LISTED_STATUS)
+        if state:
+            residual.append(Attr('statusState').eq(f"{LISTED_STATUS}#{state}"))
+        if city:
+            residual.append(Attr('cityCreatedAt').begins_with(f"{city}#"))
+        if color:
+            residual.append(Attr('statusColor').eq(f"{LISTED_STATUS}#{color}"))
+    elif state:
+        index = 'StateCityIndex' if city else 'StateIndex'
+        key = Key('statusState').eq(f"{LISTED_STATUS}#{state}")
+        if city:
+            key = key & Key('cityCreatedAt').begins_with(f"{city}#")
+        if color:
+            residual.append(Attr('statusColor').eq(f"{LISTED_STATUS}#{color}"))
+    elif color:
+        index = 'ColorIndex'
+        key = Key('statusColor').eq(f"{LISTED_STATUS}#{color}")
+    elif weight:
+        index = 'WeightIndex'
+        key = Key('status').eq(LISTED_STATUS) & Key('weightInPounds').between(*weight)
+        weight = None
+    else:
+        index = 'StatusCreatedAtIndex'
+        key = Key('status').eq(LISTED_STATUS)
+    if weight:
+        residual.append(Attr('weightInPounds').between(*weight))
+
+    query = {
+        'IndexName': index,
+        'KeyConditionExpression': key,
+        'ScanIndexForward': order == 'oldest',
+        'Limit': limit,
+    }
+    if residual:
+        condition = residual[0]
+        for extra in residual[1:]:
+            condition = condition & extra
+        query['FilterExpression'] = condition
+
+    start_key = params.get('nextToken')
+    if start_key:
+        query['ExclusiveStartKey'] = parse_token(start_key, index)
+    return query
+
+
+def parse_token(token, index):
+    try:
+        start_key = json.loads(token)
+    except ValueError:
+        start_key = None
+    if not isinstance(start_key, dict) or set(start_key) != {'id', *INDEXES[index]}:
+        raise ValueError("Invalid pagination token")
+    return start_key
@@ -0,0 +1,188 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import geo
+import listing
+
+# GET /dogs?near=latitude,longitude&radiusMiles= lists the listed dogs within
+# radiusMiles of a point, nearest first. A circle is covered with the fewest
+# geohash cells (geo.cover) that come to at most MAX_QUERIES key ranges of
+# GeoIndex (listing.py), each one Query. The index holds only the coordinates
+# and what the color and weight filters need, so reading a cell costs about
+# 100 bytes a dog, not the whole item. Exact distances then drop the cells'
+# corners outside the circle and order the rest; only the page's dogs are
+# read in full, through the dog cache.
+#
+# Where dogs are dense, a 25 mile circle holds tens of thousands of them for
+# a page of 20, so the search reads rings: the circle of FIRST_RING_MILES
+# first, then RING_GROWTH times wider, until one holds more than a page or
+# the radius is reached. A wider ring's cover skips cells already read. A
+# later page picks up after nextToken, the distance and id of the last dog
+# returned, from the first ring reaching past it, and skips ranges that lie
+# wholly nearer than that. A ring's queries run side by side on POOL,
+# through the low-level client, which unlike the resource is safe to share
+# between threads.
+DEFAULT_RADIUS_MILES = 25
+MAX_RADIUS_MILES = 100
+MAX_QUERIES = 16
+FIRST_RING_MILES = 1
+RING_GROWTH = 4
+DEFAULT_PAGE_SIZE = 20
+# Parameters of GET /dogs that don't go with near
+EXCLUSIVE = ('state', 'city', 'order')
+WORKERS = int(os.environ.get('NEARBY_WORKERS', 8))
+POOL = ThreadPoolExecutor(max_workers=WORKERS)
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def number_param(params, name, default):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def plan(params):
+    # What to read for GET /dogs?near= query parameters; raises ValueError
+    # for bad ones
+    try:
+        latitude, longitude = (float(part) for part in params['near'].split(','))
+    except ValueError:
+        raise ValueError("near must be latitude,longitude")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("near must be latitude,longitude")
+    radius = number_param(params, 'radiusMiles', DEFAULT_RADIUS_MILES)
+    if not 0 < radius <= MAX_RADIUS_MILES:
+        raise ValueError(f"radiusMiles must be more than 0 and at most {MAX_RADIUS_MILES}")
+    for name in EXCLUSIVE:
+        if params.get(name):
+            raise ValueError(f"near can't be combined with {name}")
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), listing.MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be a number")
+
+    conditions, values = [], {}
+    color = (params.get('color') or '').strip().lower()
+    if color:
+        conditions.append('statusColor = :color')
+        values[':color'] = f"{listing.LISTED_STATUS}#{color}"
+    min_weight, max_weight = listing.weight_param(params, 'minWeight'), listing.weight_param(params, 'maxWeight')
+    if min_weight is not None or max_weight is not None:
+        conditions.append('weightInPounds BETWEEN :minWeight AND :maxWeight')
+        values.update({':minWeight': 0 if min_weight is None else min_weight, ':maxWeight': 10000 if max_weight is None else max_weight})
+
+    return {
+        'latitude': latitude, 'longitude': longitude, 'radius': radius, 'limit': limit,
+        'filter': (' AND '.join(conditions), values) if conditions else None,
+        'cursor': parse_token(params['nextToken']) if params.get('nextToken') else None,
+    }
+
+
+def rings(plan):
+    # The radii to search out to, from the first reaching past the cursor
+    radius = FIRST_RING_MILES
+    while radius < plan['radius']:
+        if not plan['cursor'] or radius > plan['cursor'][0]:
+            yield radius
+        radius *= RING_GROWTH
+    yield plan['radius']
+
+
+def queries(plan, radius):
+    # (nearest, farthest, cells, Query kwargs) for each key range covering
+    # the circle of radius, nearest first: how far the range's cells are from
+    # the point at their nearest and farthest
+    found = []
+    for first, last in geo.runs(geo.cover(plan['latitude'], plan['longitude'], radius, listing.GEO_PARTITION_PRECISION, MAX_QUERIES),
+                                listing.GEO_PARTITION_PRECISION):
+        partition = f"{listing.LISTED_STATUS}#{first[:listing.GEO_PARTITION_PRECISION]}"
+        values = {':cell': partition}
+        key = 'geoCell = :cell'
+        if first != last:
+            # Every geohash under first to last: none goes past last + '~'
+            key += ' AND geohash BETWEEN :first AND :last'
+            values.update({':first': first, ':last': last + '~'})
+        elif len(first) > listing.GEO_PARTITION_PRECISION:
+            key += ' AND begins_with(geohash, :first)'
+            values[':first'] = first
+        query = {
+            'TableName': 'pupper-dogs',
+            'IndexName': 'GeoIndex',
+            'KeyConditionExpression': key,
+            'ProjectionExpression': '#id, #latitude, #longitude',
+            'ExpressionAttributeNames': {'#id': 'id', '#latitude': 'latitude', '#longitude': 'longitude'},
+        }
+        if plan['filter']:
+            query['FilterExpression'], filter_values = plan['filter']
+            values.update(filter_values)
+        query['ExpressionAttributeValues'] = {name: serializer.serialize(value) for name, value in values.items()}
+        cells = [first[:-1] + char for char in geo.BASE32[geo.BASE32.index(first[-1]):geo.BASE32.index(last[-1]) + 1]]
+        boxes = [geo.bounds(cell) for cell in cells]
+        # Both allowing for nearest_miles running up to 1% long
+        nearest = min(geo.nearest_miles(box, plan['latitude'], plan['longitude']) for box in boxes) / 1.01
+        farthest = max(geo.farthest_miles(box, plan['latitude'], plan['longitude']) for box in boxes) * 1.01
+        found.append((nearest, farthest, cells, query))
+    return sorted(found, key=lambda entry: entry[0])
+
+
+def read(client, query):
+    # Every item a query matches, across its pages
+    query, items = dict(query), []
+    while True:
+        response = client.query(**query)
+        items.extend({name: deserializer.deserialize(value) for name, value in item.items()} for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def find(client, plan):
+    # (page, cursor): [(distance in miles, dog id)] nearest first for the
+    # page, and the last of them if there are more
+    cursor, limit = plan['cursor'], plan['limit']
+    read_cells, found = set(), {}
+    for radius in rings(plan):
+        # Ranges wholly nearer than the cursor only hold dogs already
+        # returned, and ranges under cells read for a smaller ring hold
+        # nothing new
+        pending = [
+            (cells, query) for nearest, farthest, cells, query in queries(plan, radius)
+            if (not cursor or farthest >= cursor[0]) and not all(
+                any(cell[:end] in read_cells for end in range(listing.GEO_PARTITION_PRECISION, len(cell) + 1)) for cell in cells)
+        ]
+        results = POOL.map(lambda entry: read(client, entry[1]), pending) if len(pending) > 1 else [read(client, query) for _, query in pending]
+        for items in results:
+            for item in items:
+                entry = (geo.distance_miles(plan['latitude'], plan['longitude'], float(item['latitude']), float(item['longitude'])), item['id'])
+                if entry[0] <= plan['radius'] and (not cursor or entry > cursor):
+                    found[entry[1]] = entry[0]
+        read_cells.update(cell for cells, _ in pending for cell in cells)
+        # Every dog within the ring has been read
+        ranked = sorted((distance, dog_id) for dog_id, distance in found.items() if distance <= radius)
+        if len(ranked) > limit:
+            break
+    page = ranked[:limit]
+    return page, page[-1] if len(ranked) > len(page) else None
+
+
+def token(cursor):
+    return json.dumps(list(cursor))
+
+
+def parse_token(token):
+    try:
+        distance, dog_id = json.loads(token)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination token")
+    if not isinstance(distance, (int, float)) or isinstance(distance, bool) or not isinstance(dog_id, str):
+        raise ValueError("Invalid pagination token")
+    return distance, dog_id
@@ -0,0 +1,143 @@
+import logging
+import os
+import struct
+import time
+from array import array
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# GET /feed deals the dogs most like the ones a user recently liked first.
+# Every dog's K nearest neighbors by co-likes (similarity.py) are computed
+# offline by cdk-workshop/build_neighbors.py and kept in S3 as one binary
+# file, which warm containers download and read in place. Ranking is a merge
+# of precomputed lists: each of the user's RECENT_LIKES latest likes adds its
+# neighbors' similarities, weighted by DECAY per like further back.
+#
+# Layout (little-endian, every section 4-byte aligned):
+#   magic 'PUPNBRS1'
+#   header   dog count, K, then the offset of each section below
+#   docs     dog count x DOC_ID_WIDTH bytes of dog id, space padded
+#   indices  dog count x K uint32 dog numbers, most similar first, padded with EMPTY
+#   scores   dog count x K float32 similarities
+NEIGHBORS_KEY = 'recommendations/neighbors.bin'
+MAGIC = b'PUPNBRS1'
+HEADER = struct.Struct('<5I')
+DOC_ID_WIDTH = 36
+EMPTY = 0xFFFFFFFF
+RECENT_LIKES = 20
+DECAY = 0.9
+
+# How long a warm container trusts its copy; the file changes once per run of
+# the job, so there is no hurry
+REFRESH_SECONDS = int(os.environ.get('NEIGHBORS_REFRESH_SECONDS', '300'))
+
+
+def aligned(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def packed(values, typecode):
+    # NumPy arrays are converted in one go, anything else through array()
+    if hasattr(values, 'astype'):
+        return values.astype({'I': '<u4', 'f': '<f4'}[typecode]).tobytes()
+    return array(typecode, values).tobytes()
+
+
+def encode(dog_ids, k, indices, scores):
+    # dog_ids: dog id of each number; indices and scores: dog count x k
+    # uint32 and float32 values, flat or as NumPy arrays (similarity.top_neighbors)
+    docs = bytearray()
+    for dog_id in dog_ids:
+        encoded = dog_id.encode('ascii')
+        if len(encoded) > DOC_ID_WIDTH:
+            raise ValueError(f"dog id {dog_id} is longer than {DOC_ID_WIDTH} characters")
+        docs += encoded.ljust(DOC_ID_WIDTH)
+    sections = [bytes(docs), packed(indices, 'I'), packed(scores, 'f')]
+    if len(sections[1]) != 4 * k * len(dog_ids) or len(sections[2]) != len(sections[1]):
+        raise ValueError("indices and scores need k values for every dog")
+    offsets, position = [], len(MAGIC) + HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(aligned(section))
+    return MAGIC + HEADER.pack(len(dog_ids), k, *offsets) + b''.join(aligned(section) for section in sections)
+
+
+class Neighbors:
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a neighbors file")
+        self.count, self.k, docs, indices, scores = HEADER.unpack_from(view, len(MAGIC))
+        self.docs = view[docs:docs + self.count * DOC_ID_WIDTH]
+        self.indices = view[indices:indices + 4 * self.count * self.k].cast('I')
+        self.scores = view[scores:scores + 4 * self.count * self.k].cast('f')
+        self.numbers = None
+
+    def doc_id(self, number):
+        start = number * DOC_ID_WIDTH
+        return bytes(self.docs[start:start + DOC_ID_WIDTH]).decode('ascii').rstrip()
+
+    def number(self, dog_id):
+        # Built on first use, once per file
+        if self.numbers is None:
+            self.numbers = {self.doc_id(number): number for number in range(self.count)}
+        return self.numbers.get(dog_id)
+
+    def of(self, dog_id):
+        # [(neighbor id, similarity)], most similar first
+        number = self.number(dog_id)
+        if number is None:
+            return []
+        start = number * self.k
+        return [(self.doc_id(self.indices[slot]), self.scores[slot]) for slot in range(start, start + self.k) if self.indices[slot] != EMPTY]
+
+    def rank(self, liked):
+        # dog id -> score for the neighbors of liked (dog ids, latest first),
+        # leaving out the liked dogs themselves
+        totals = {}
+        weight = 1.0
+        for dog_id in liked:
+            number = self.number(dog_id)
+            if number is not None:
+                start = number * self.k
+                for slot in range(start, start + self.k):
+                    neighbor = self.indices[slot]
+                    if neighbor == EMPTY:
+                        break
+                    totals[neighbor] = totals.get(neighbor, 0.0) + weight * self.scores[slot]
+            weight *= DECAY
+        ranked = {self.doc_id(number): round(score, 6) for number, score in totals.items()}
+        for dog_id in liked:
+            ranked.pop(dog_id, None)
+        return ranked
+
+
+# Warm containers keep the file between invocations
+_loaded = {'neighbors': None, 'etag': None, 'checked': 0.0}
+
+
+def load(s3, bucket, max_age=REFRESH_SECONDS):
+    # The current neighbors, re-checked against S3 (with a conditional GET)
+    # once the copy is older than max_age seconds; None if the job hasn't run
+    now = time.monotonic()
+    if _loaded['checked'] and now - _loaded['checked'] < max_age:
+        return _loaded['neighbors']
+    request = {'Bucket': bucket, 'Key': NEIGHBORS_KEY}
+    if _loaded['etag']:
+        request['IfNoneMatch'] = _loaded['etag']
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('304', 'NotModified'):
+            _loaded['checked'] = now
+            return _loaded['neighbors']
+        if code not in ('NoSuchKey', '404'):
+            raise
+        logger.warning(f"No neighbors at s3://{bucket}/{NEIGHBORS_KEY} yet")
+        _loaded.update(neighbors=None, etag=None, checked=now)
+        return None
+    _loaded.update(neighbors=Neighbors(response['Body'].read()), etag=response['ETag'], checked=now)
+    return _loaded['neighbors']
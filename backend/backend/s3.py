@@ -1,6 +1,7 @@
 from aws_cdk import (
     aws_s3 as s3,
     aws_iam as iam,
+    Duration,
     RemovalPolicy,
 )
 
@@ -10,11 +11,17 @@ def create_bucket(scope):
         scope, "DogPhotosBucket",
         removal_policy=RemovalPolicy.RETAIN,
         cors=[s3.CorsRule(
-            allowed_methods=[s3.HttpMethods.GET],
+            allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.POST, s3.HttpMethods.PUT],
             allowed_origins=["*"],
             allowed_headers=["*"],
             max_age=3000
         )],
+        # Direct uploads that never turned into a dog are cleaned up after a day
+        lifecycle_rules=[s3.LifecycleRule(
+            id="ExpireStagedUploads",
+            prefix="staging/",
+            expiration=Duration.days(1)
+        )],
         block_public_access=s3.BlockPublicAccess.BLOCK_ALL
     )
     
@@ -0,0 +1,399 @@
+import bisect
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# GET /dogs/search reads an inverted index of the listed dogs' name,
+# description and city, kept in S3 as one compact binary file. Warm Lambda
+# containers download it once to /tmp and memory-map it; a lookup binary
+# searches the sorted term table in place, so nothing is parsed up front. The
+# search indexer (search_indexer.py) keeps the file current from the dogs
+# table stream, and cdk-workshop/build_search_index.py rebuilds it from
+# scratch.
+#
+# Documents are numbered in listing order (oldest first), so the highest
+# numbers are the newest dogs. Each term's postings are stored either as a
+# sorted uint32 array of document numbers or, when that would be larger, as a
+# bitmap with one bit per document.
+#
+# Layout (little-endian uint32s, every section 4-byte aligned):
+#   magic 'PUPSRCH1'
+#   header   doc count, term count, then the offset of each section below
+#   docs     doc count x DOC_ID_WIDTH bytes of dog id, space padded
+#   term offsets     term count + 1 offsets into the term text
+#   term text        sorted UTF-8 terms, back to back
+#   posting offsets  term count + 1 offsets into the postings
+#   posting kinds    one byte per term: POSTINGS_ARRAY or POSTINGS_BITMAP
+#   postings
+INDEX_KEY = 'search/dogs.idx'
+SEARCH_FIELDS = ('name', 'description', 'city')
+MAGIC = b'PUPSRCH1'
+HEADER = struct.Struct('<8I')
+DOC_ID_WIDTH = 36
+POSTINGS_ARRAY = 0
+POSTINGS_BITMAP = 1
+
+MAX_RESULTS = 100
+# A short prefix like 'b' would otherwise expand to thousands of terms
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_TERMS = 64
+
+# How long a warm container trusts its copy before asking S3 for a newer one
+REFRESH_SECONDS = int(os.environ.get('SEARCH_REFRESH_SECONDS', '60'))
+CACHE_DIR = '/tmp'
+
+if sys.byteorder != 'little':
+    raise ImportError("search index files are read in place and assume a little-endian host")
+
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has he her his in is it its of on or she so that the their they '
+    'this to was who will with'.split()
+)
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def stem(word):
+    # Light suffix stripping, enough to match plurals and the common verb
+    # forms in shelter descriptions (loves/loved/loving -> lov, kids -> kid).
+    # Queries go through the same function, so the stems only need to agree
+    # with each other, not be real words.
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('sses'):
+        return word[:-2]
+    for suffix in ('ing', 'ed', 'ly', 'es', 'e', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not (suffix == 's' and word[-2] in 'su'):
+            word = word[:-len(suffix)]
+            if suffix in ('ing', 'ed') and len(word) > 3 and word[-1] == word[-2] and word[-1] not in 'lsz':
+                # running -> run, but not smell -> smel
+                word = word[:-1]
+            return word
+    return word
+
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def document_terms(dog):
+    terms = set()
+    for field in SEARCH_FIELDS:
+        value = dog.get(field)
+        if isinstance(value, str):
+            terms.update(tokenize(value))
+    return terms
+
+
+def aligned(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def encode(doc_ids, postings):
+    # doc_ids: list of dog ids in document number order
+    # postings: term -> set of document numbers, or a bytearray bitmap
+    doc_count = len(doc_ids)
+    bitmap_size = (doc_count + 7) // 8
+    docs = bytearray()
+    for dog_id in doc_ids:
+        encoded = dog_id.encode('ascii')
+        if len(encoded) > DOC_ID_WIDTH:
+            raise ValueError(f"dog id {dog_id} is longer than {DOC_ID_WIDTH} characters")
+        docs += encoded.ljust(DOC_ID_WIDTH)
+
+    term_offsets, term_text = array('I', [0]), bytearray()
+    posting_offsets, kinds, blob = array('I', [0]), bytearray(), bytearray()
+    for term in sorted(postings):
+        numbers = postings[term]
+        if isinstance(numbers, (bytes, bytearray)):
+            count = bin(int.from_bytes(numbers, 'little')).count('1')
+            bitmap = bytes(numbers[:bitmap_size]).ljust(bitmap_size, b'\0')
+            numbers = None if 4 * count > bitmap_size else bitmap_numbers(bitmap)
+        else:
+            count = len(numbers)
+            bitmap = None if 4 * count <= bitmap_size else to_bitmap(numbers, bitmap_size)
+        if not count:
+            continue
+        term_text += term.encode('utf-8')
+        term_offsets.append(len(term_text))
+        if 4 * count > bitmap_size:
+            kinds.append(POSTINGS_BITMAP)
+            blob += aligned(bitmap)
+        else:
+            kinds.append(POSTINGS_ARRAY)
+            blob += array('I', sorted(numbers)).tobytes()
+        posting_offsets.append(len(blob))
+
+    sections = [bytes(docs), term_offsets.tobytes(), bytes(term_text), posting_offsets.tobytes(), bytes(kinds), bytes(blob)]
+    offsets, position = [], len(MAGIC) + HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(aligned(section))
+    header = HEADER.pack(doc_count, len(kinds), *offsets)
+    return MAGIC + header + b''.join(aligned(section) for section in sections)
+
+
+def to_bitmap(numbers, size):
+    bitmap = bytearray(size)
+    for number in numbers:
+        bitmap[number >> 3] |= 1 << (number & 7)
+    return bytes(bitmap)
+
+
+def bitmap_numbers(bitmap):
+    # Set bit positions of a bitmap, in order
+    numbers = []
+    for position, byte in enumerate(bitmap):
+        if byte:
+            numbers.extend((position << 3) + bit for bit in range(8) if byte >> bit & 1)
+    return numbers
+
+
+def build(dogs):
+    # Index file for an iterable of dog items; only listed dogs are searchable
+    listed = sorted((dog for dog in dogs if dog.get('status', 'ACTIVE') == 'ACTIVE'), key=lambda dog: (dog.get('createdAt', ''), dog['id']))
+    postings = {}
+    for number, dog in enumerate(listed):
+        for term in document_terms(dog):
+            postings.setdefault(term, set()).add(number)
+    return encode([dog['id'] for dog in listed], postings)
+
+
+class Terms:
+    # The sorted term table as a sequence, for bisect
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.term_count
+
+    def __getitem__(self, position):
+        return self.index.term(position)
+
+
+class SearchIndex:
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a search index file")
+        (self.doc_count, self.term_count, docs, term_offsets, term_text,
+         posting_offsets, kinds, postings) = HEADER.unpack_from(view, len(MAGIC))
+        self.buffer = buffer
+        self.bitmap_size = (self.doc_count + 7) // 8
+        self.docs = view[docs:docs + self.doc_count * DOC_ID_WIDTH]
+        self.term_offsets = view[term_offsets:term_offsets + 4 * (self.term_count + 1)].cast('I')
+        self.term_text = view[term_text:]
+        self.posting_offsets = view[posting_offsets:posting_offsets + 4 * (self.term_count + 1)].cast('I')
+        self.kinds = view[kinds:kinds + self.term_count]
+        self.postings = view[postings:]
+        self.terms = Terms(self)
+
+    def term(self, position):
+        return bytes(self.term_text[self.term_offsets[position]:self.term_offsets[position + 1]])
+
+    def doc_id(self, number):
+        start = number * DOC_ID_WIDTH
+        return bytes(self.docs[start:start + DOC_ID_WIDTH]).decode('ascii').rstrip()
+
+    def doc_ids(self):
+        return [self.doc_id(number) for number in range(self.doc_count)]
+
+    def matches(self, term, prefix=False):
+        # Term positions matching term exactly, or all terms starting with it
+        encoded = term.encode('utf-8')
+        first = bisect.bisect_left(self.terms, encoded)
+        if not prefix:
+            return [first] if first < self.term_count and self.term(first) == encoded else []
+        last = bisect.bisect_left(self.terms, encoded + b'\xff', first)
+        return list(range(first, min(last, first + MAX_PREFIX_TERMS)))
+
+    def posting(self, position):
+        # Document numbers of one term: an array('I')-like view, or a bitmap
+        start, end = self.posting_offsets[position], self.posting_offsets[position + 1]
+        if self.kinds[position] == POSTINGS_BITMAP:
+            return DocSet(bitmap=self.postings[start:start + self.bitmap_size])
+        return DocSet(numbers=self.postings[start:end].cast('I'))
+
+    def lookup(self, term, prefix=False):
+        sets = [self.posting(position) for position in self.matches(term, prefix)]
+        return DocSet.union(sets, self.bitmap_size)
+
+    def search(self, query, limit=20):
+        # (dog ids newest first, total matches) for dogs matching every query
+        # term; the last term also matches as a prefix, for search-as-you-type
+        tokens = [token for token in TOKEN.findall((query or '').lower()) if token not in STOPWORDS]
+        if not tokens:
+            return [], 0
+        sets = [self.lookup(stem(token)) for token in tokens[:-1]]
+        last = tokens[-1]
+        if len(last) >= MIN_PREFIX_LENGTH:
+            sets.append(DocSet.union([self.lookup(stem(last)), self.lookup(last, prefix=True)], self.bitmap_size))
+        elif not sets:
+            sets.append(self.lookup(last))
+        # else a single character still being typed after other terms; ignore it
+        result = DocSet.intersection(sets, self.bitmap_size)
+        numbers, total = result.newest(limit)
+        return [self.doc_id(number) for number in numbers], total
+
+    def decode(self):
+        # (doc ids, postings) in the form encode() takes, for applying updates
+        postings = {}
+        for position in range(self.term_count):
+            term = self.term(position).decode('utf-8')
+            docs = self.posting(position)
+            postings[term] = bytearray(docs.bitmap) if docs.bitmap is not None else set(docs.numbers)
+        return self.doc_ids(), postings
+
+
+class DocSet:
+    # A set of document numbers, held as a sorted sequence while it is small
+    # and as a bitmap (bytes-like, bit n = document n) once it is not
+    def __init__(self, numbers=None, bitmap=None):
+        self.numbers = numbers
+        self.bitmap = bitmap
+
+    def __len__(self):
+        if self.numbers is not None:
+            return len(self.numbers)
+        return 8 * len(self.bitmap)
+
+    def __contains__(self, number):
+        if self.bitmap is not None:
+            return bool(self.bitmap[number >> 3] >> (number & 7) & 1)
+        position = bisect.bisect_left(self.numbers, number)
+        return position < len(self.numbers) and self.numbers[position] == number
+
+    def as_int(self, bitmap_size):
+        if self.bitmap is not None:
+            return int.from_bytes(self.bitmap, 'little')
+        return int.from_bytes(to_bitmap(self.numbers, bitmap_size), 'little')
+
+    @classmethod
+    def union(cls, sets, bitmap_size):
+        sets = [docs for docs in sets if len(docs)]
+        if len(sets) == 1:
+            return sets[0]
+        if all(docs.bitmap is None for docs in sets) and 4 * sum(len(docs) for docs in sets) <= bitmap_size:
+            return cls(numbers=sorted(set().union(*(docs.numbers for docs in sets))))
+        value = 0
+        for docs in sets:
+            value |= docs.as_int(bitmap_size)
+        return cls(bitmap=value.to_bytes(bitmap_size, 'little'))
+
+    @classmethod
+    def intersection(cls, sets, bitmap_size):
+        if not sets or not all(len(docs) for docs in sets):
+            return cls(numbers=[])
+        sets = sorted(sets, key=len)
+        smallest, others = sets[0], sets[1:]
+        if smallest.numbers is not None:
+            # Probe the others for each member of the smallest set
+            return cls(numbers=[number for number in smallest.numbers if all(number in docs for docs in others)])
+        value = smallest.as_int(bitmap_size)
+        for docs in others:
+            value &= docs.as_int(bitmap_size)
+        return cls(bitmap=value.to_bytes(bitmap_size, 'little'))
+
+    def newest(self, limit):
+        # (up to limit highest document numbers, highest first; total count)
+        if self.numbers is not None:
+            return list(reversed(self.numbers[-limit:])) if limit else [], len(self.numbers)
+        value = int.from_bytes(self.bitmap, 'little')
+        total = bin(value).count('1')
+        numbers = []
+        while value and len(numbers) < limit:
+            top = value.bit_length() - 1
+            numbers.append(top)
+            value ^= 1 << top
+        return numbers, total
+
+
+def apply(index, upserts, deletes):
+    # New index file bytes with dogs added, changed or removed. Changed dogs
+    # keep their document number; new ones are appended, so they rank newest.
+    #   upserts: dog id -> dog item; deletes: dog ids
+    doc_ids, postings = index.decode() if index else ([], {})
+    numbers = {dog_id: number for number, dog_id in enumerate(doc_ids)}
+    removed = {numbers[dog_id] for dog_id in set(deletes) | set(upserts) if dog_id in numbers}
+    for docs in postings.values():
+        for number in removed:
+            if isinstance(docs, bytearray):
+                docs[number >> 3] &= ~(1 << (number & 7)) & 0xFF
+            else:
+                docs.discard(number)
+
+    for dog_id in sorted(upserts, key=lambda dog_id: (upserts[dog_id].get('createdAt', ''), dog_id)):
+        number = numbers.get(dog_id)
+        if number is None:
+            number = numbers[dog_id] = len(doc_ids)
+            doc_ids.append(dog_id)
+        removed.discard(number)
+        for term in document_terms(upserts[dog_id]):
+            docs = postings.setdefault(term, set())
+            if isinstance(docs, bytearray):
+                if len(docs) <= number >> 3:
+                    docs.extend(bytes((number >> 3) + 1 - len(docs)))
+                docs[number >> 3] |= 1 << (number & 7)
+            else:
+                docs.add(number)
+
+    # Drop deleted documents and renumber the rest
+    if removed:
+        kept = [number for number in range(len(doc_ids)) if number not in removed]
+        renumber = {old: new for new, old in enumerate(kept)}
+        doc_ids = [doc_ids[old] for old in kept]
+        postings = {
+            term: {renumber[number] for number in (bitmap_numbers(docs) if isinstance(docs, bytearray) else docs) if number in renumber}
+            for term, docs in postings.items()
+        }
+    return encode(doc_ids, postings)
+
+
+# Warm containers keep the mapped file between invocations
+_loaded = {'index': None, 'etag': None, 'checked': 0.0}
+
+
+def load(s3, bucket, max_age=REFRESH_SECONDS):
+    # The current index, downloaded and mapped on first use and re-checked
+    # against S3 once the copy is older than max_age seconds (a conditional
+    # GET, so an unchanged index is not downloaded again). An empty index if
+    # none was built yet.
+    now = time.monotonic()
+    if _loaded['index'] is not None and now - _loaded['checked'] < max_age:
+        return _loaded['index']
+    request = {'Bucket': bucket, 'Key': INDEX_KEY}
+    if _loaded['etag']:
+        request['IfNoneMatch'] = _loaded['etag']
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('304', 'NotModified'):
+            _loaded['checked'] = now
+            return _loaded['index']
+        if code not in ('NoSuchKey', '404'):
+            raise
+        logger.warning(f"No search index at s3://{bucket}/{INDEX_KEY} yet")
+        _loaded.update(index=SearchIndex(build([])), etag=None, checked=now)
+        return _loaded['index']
+
+    etag = response['ETag'].strip('"')
+    path = os.path.join(CACHE_DIR, f"search-{etag}.idx")
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: response['Body'].read(1024 * 1024), b''):
+            f.write(chunk)
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    os.remove(path)
+    _loaded.update(index=SearchIndex(mapped), etag=response['ETag'], checked=now)
+    return _loaded['index']
@@ -0,0 +1,61 @@
+import functools
+import json
+import logging
+import os
+
+import boto3
+
+import search
+from streams import image, key
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client():
+    # Not ingest.s3_client(): ingest needs Pillow, which this function is
+    # deployed without
+    return boto3.client('s3')
+
+
+def searchable(dog):
+    # What the index holds for a dog: nothing unless it is listed
+    if not dog or dog.get('status', 'ACTIVE') != 'ACTIVE':
+        return None
+    return {field: dog.get(field) for field in search.SEARCH_FIELDS + ('status',)}
+
+
+def changes(records):
+    # (upserts, deletes) for a batch of pupper-dogs stream records, last write
+    # wins. Updates that touch nothing searchable (most of them) are skipped.
+    upserts, deletes = {}, set()
+    for record in records:
+        dog_id = key(record, 'id')
+        new, old = image(record, 'NewImage'), image(record, 'OldImage')
+        if record['eventName'] == 'MODIFY' and searchable(new) == searchable(old):
+            continue
+        if searchable(new):
+            upserts[dog_id] = new
+            deletes.discard(dog_id)
+        else:
+            deletes.add(dog_id)
+            upserts.pop(dog_id, None)
+    return upserts, deletes
+
+
+def handler(event, context):
+    # pupper-dogs stream handler: applies a batch of changes to the search
+    # index in S3. Runs with a reserved concurrency of 1, so batches from
+    # different stream shards never overwrite each other's updates.
+    upserts, deletes = changes(event.get('Records', []))
+    if not upserts and not deletes:
+        return {'upserts': 0, 'deletes': 0}
+    s3 = s3_client()
+    bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+    index = search.load(s3, bucket_name, max_age=0)
+    data = search.apply(index, upserts, deletes)
+    s3.put_object(Bucket=bucket_name, Key=search.INDEX_KEY, Body=data, ContentType='application/octet-stream')
+    logger.info(json.dumps({"event": "search_index_updated", "upserts": len(upserts), "deletes": len(deletes), "bytes": len(data)}))
+    return {'upserts': len(upserts), 'deletes': len(deletes)}
@@ -0,0 +1,192 @@
+import functools
+import hashlib
+import math
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+# GET /feed (feed.py) skips the dogs a user has already swiped by checking
+# them against a Bloom filter of the user's swiped dog ids. The filter is kept
+# next to the swipes, in the user's partition of pupper-interactions, by
+# seen_recorder.py from the table stream; cdk-workshop/build_seen_filters.py
+# builds it from the swipes recorded before.
+#
+# A Bloom filter never forgets a dog it was given, but may claim one it wasn't
+# given: about ERROR_RATE of unseen dogs are left out of the feed. The filter
+# is scalable (Almeida et al., 2007): once a layer holds its capacity, a new
+# one with twice the capacity and half the error rate is added. The first
+# layer gets half of ERROR_RATE, so the overall rate stays near ERROR_RATE
+# however many dogs a user swipes, and a user with a handful of swipes has a
+# filter of a few hundred bytes; 5,000 swipes take about 15 KB.
+#
+# Each layer is split into segments of at most SEGMENT_BYTES, one item each
+# (dogId '#seen#<layer>#<segment>', which the API rejects as a dog id), and all of a
+# dog's bits fall in one segment of the layer (a blocked Bloom filter, Putze
+# et al., 2007). Adding a swipe rewrites that one item, under 1 KB, rather
+# than the whole filter; segments nothing was added to yet aren't stored. A
+# page of the feed reads every segment with one query.
+SEEN_KEY = '#seen'
+SEGMENT_PREFIX = SEEN_KEY + '#'
+INITIAL_CAPACITY = 256
+ERROR_RATE = 0.01
+# Keeps a segment item, keys and all, within 1 KB: one write unit
+SEGMENT_BYTES = 900
+# Past this size new swipes go into the last layer, whose error rate then
+# grows, rather than the filter growing without end
+MAX_BYTES = 300_000
+SAVE_ATTEMPTS = 5
+
+
+def is_seen_key(dog_id):
+    # True for the dogId of a filter segment, or of the single filter item
+    # earlier versions kept
+    return dog_id.startswith(SEEN_KEY)
+
+
+class Layer:
+    # One layer of the filter, sized for INITIAL_CAPACITY * 2 ** number ids,
+    # as segments of bits held by segment number
+    def __init__(self, number):
+        self.number = number
+        self.capacity = INITIAL_CAPACITY * 2 ** number
+        error_rate = ERROR_RATE / 2 ** (number + 1)
+        # The optimal size and number of hashes for capacity items
+        size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(size / self.capacity * math.log(2)))
+        self.segments = math.ceil((size + 7) // 8 / SEGMENT_BYTES)
+        self.segment_bytes = math.ceil((size + 7) // 8 / self.segments)
+        self.segment_size = self.segment_bytes * 8
+        self.bits, self.counts, self.versions = {}, {}, {}
+        self.changed = set()
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def nbytes(self):
+        return self.segments * self.segment_bytes
+
+    def __contains__(self, digest):
+        # Double hashing (Kirsch and Mitzenmacher) within the dog's segment,
+        # written out: this runs for every dog a feed walks past
+        first, second, third = digest
+        bits = self.bits.get(third % self.segments)
+        if bits is None:
+            return False
+        size = self.segment_size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            if not bits[position >> 3] >> (position & 7) & 1:
+                return False
+        return True
+
+    def add(self, digest):
+        first, second, third = digest
+        segment = third % self.segments
+        bits = self.bits.setdefault(segment, bytearray(self.segment_bytes))
+        for i in range(self.hashes):
+            position = (first + i * second) % self.segment_size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.counts[segment] = self.counts.get(segment, 0) + 1
+        self.changed.add(segment)
+
+
+@functools.lru_cache(maxsize=100_000)
+def digest(dog_id):
+    # The two 64-bit hashes every layer derives its positions from, and a
+    # third that picks the segment. Warm containers keep them for the dogs of
+    # the catalog they deal from.
+    value = hashlib.blake2b(dog_id.encode('utf-8'), digest_size=24).digest()
+    return int.from_bytes(value[:8], 'little'), int.from_bytes(value[8:16], 'little') | 1, int.from_bytes(value[16:], 'little')
+
+
+def segment_key(layer, segment):
+    return f'{SEGMENT_PREFIX}{layer:02d}#{segment:04d}'
+
+
+class SeenFilter:
+    def __init__(self, layers=None):
+        self.layers = layers or []
+
+    def __len__(self):
+        return sum(layer.count for layer in self.layers)
+
+    def __contains__(self, dog_id):
+        # Newest layer first: each holds as many ids as all the ones before it
+        hashed = digest(dog_id)
+        return any(hashed in layer for layer in reversed(self.layers))
+
+    def nbytes(self):
+        return sum(layer.nbytes() for layer in self.layers)
+
+    def add(self, dog_id):
+        # True if dog_id was new to the filter, which a false positive is not
+        if dog_id in self:
+            return False
+        if not self.layers or self.layers[-1].count >= self.layers[-1].capacity:
+            layer = Layer(len(self.layers))
+            if not self.layers or self.nbytes() + layer.nbytes() <= MAX_BYTES:
+                self.layers.append(layer)
+        self.layers[-1].add(digest(dog_id))
+        return True
+
+    @classmethod
+    def from_items(cls, items):
+        # From the user's segment items, in any order
+        layers = []
+        for item in items:
+            number, segment = (int(part) for part in item['dogId'][len(SEGMENT_PREFIX):].split('#'))
+            while len(layers) <= number:
+                layers.append(Layer(len(layers)))
+            layer = layers[number]
+            layer.bits[segment] = bytearray(getattr(item['bits'], 'value', item['bits']))
+            layer.counts[segment], layer.versions[segment] = int(item['count']), int(item['version'])
+        return cls(layers)
+
+    def changed_items(self, user_id):
+        # (item, version it replaces) of every segment added to since loading;
+        # version 0 for a segment not stored yet
+        for layer in self.layers:
+            for segment in sorted(layer.changed):
+                version = layer.versions.get(segment, 0)
+                yield {
+                    'userId': user_id, 'dogId': segment_key(layer.number, segment), 'version': version + 1,
+                    'count': layer.counts[segment], 'bits': bytes(layer.bits[segment]),
+                }, version
+
+
+def load(table, user_id, consistent=False):
+    # The filter of the user's swiped dogs, empty if there is none
+    query = {
+        'KeyConditionExpression': Key('userId').eq(user_id) & Key('dogId').begins_with(SEGMENT_PREFIX),
+        'ConsistentRead': consistent,
+    }
+    items = []
+    while True:
+        response = table.query(**query)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return SeenFilter.from_items(items)
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def record(table, user_id, dog_ids):
+    # Adds dog_ids to the user's filter; returns how many were new. Writes
+    # only the segments that changed, each conditional on the version read.
+    # Writers racing on the same user (a retried stream batch, a backfill)
+    # re-read and try again; bits already written stay set, so nothing is
+    # lost.
+    for _ in range(SAVE_ATTEMPTS):
+        seen = load(table, user_id, consistent=True)
+        added = sum(seen.add(dog_id) for dog_id in dog_ids)
+        if not added:
+            return 0
+        try:
+            for item, version in seen.changed_items(user_id):
+                condition = Attr('version').eq(version) if version else Attr('userId').not_exists()
+                table.put_item(Item=item, ConditionExpression=condition)
+            return added
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    raise RuntimeError(f"Seen filter of {user_id} kept changing under us")
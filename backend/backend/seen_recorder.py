@@ -0,0 +1,36 @@
+import json
+import logging
+
+import boto3
+
+import seen
+from streams import key
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def swiped(records):
+    # {userId: [dogId, ...]} swiped in a batch of pupper-interactions stream
+    # records. The filters' own writes come through the stream too.
+    users = {}
+    for record in records:
+        dog_id = key(record, 'dogId')
+        if record['eventName'] == 'REMOVE' or seen.is_seen_key(dog_id):
+            continue
+        users.setdefault(key(record, 'userId'), []).append(dog_id)
+    return users
+
+
+def handler(event, context):
+    # pupper-interactions stream handler: adds swiped dogs to each user's seen
+    # filter (see seen.py): one query per user in the batch, and one write per
+    # filter segment a swipe landed in.
+    # Records of a user share a stream shard, so they arrive in order.
+    users = swiped(event.get('Records', []))
+    table = boto3.resource('dynamodb').Table('pupper-interactions')
+    added = sum(seen.record(table, user_id, dog_ids) for user_id, dog_ids in users.items())
+    if users:
+        logger.info(json.dumps({"event": "seen_filters_updated", "records": len(event.get('Records', [])), "users": len(users), "added": added}))
+    return {'users': len(users), 'added': added}
@@ -0,0 +1,81 @@
+import heapq
+from array import array
+
+from neighbors import EMPTY
+
+# Item-item similarity of dogs from co-likes, for ranking GET /feed
+# (neighbors.py). Computed offline by cdk-workshop/build_neighbors.py from the
+# LIKEs in pupper-interactions; NumPy and SciPy are only needed there, never
+# in the API.
+#
+# Likes form a sparse users x dogs matrix X of ones. X^T X counts, for every
+# pair of dogs, the users who liked both, and the similarity is the cosine
+#   co-likes(a, b) / sqrt(likes(a) * likes(b))
+# so a dog everybody likes is not everybody's neighbor. Pairs with fewer than
+# MIN_CO_LIKES users in common are noise and dropped. X^T X is computed
+# BLOCK_ROWS dogs at a time and cut down to each dog's top K neighbors before
+# the next block, so memory stays bounded by a block, not by the dog count
+# squared. Each user counts with at most MAX_LIKES_PER_USER of their latest
+# likes: a user's likes add a number of pairs quadratic in their count, and
+# someone who likes everything says little about any pair.
+K = 50
+MIN_CO_LIKES = 2
+MAX_LIKES_PER_USER = 500
+BLOCK_ROWS = 512
+
+
+def _modules():
+    try:
+        import numpy
+        import scipy.sparse
+    except ImportError:
+        raise RuntimeError("Computing neighbors needs NumPy and SciPy: uv sync --extra neighbors in backend/")
+    return numpy, scipy.sparse
+
+
+def like_matrix(likes, max_likes_per_user=MAX_LIKES_PER_USER):
+    # (users x dogs CSR matrix of ones, dog id of each column) for an iterable
+    # of (user id, dog id, timestamp) LIKEs
+    np, sparse = _modules()
+    per_user = {}
+    for user_id, dog_id, timestamp in likes:
+        per_user.setdefault(user_id, []).append((timestamp, dog_id))
+    columns, rows, cols = {}, array('i'), array('i')
+    for row, liked in enumerate(per_user.values()):
+        if len(liked) > max_likes_per_user:
+            liked = heapq.nlargest(max_likes_per_user, liked)
+        for _, dog_id in liked:
+            rows.append(row)
+            cols.append(columns.setdefault(dog_id, len(columns)))
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32))), shape=(len(per_user), len(columns)))
+    # A like recorded twice is still one like
+    matrix.data[:] = 1
+    return matrix, list(columns)
+
+
+def top_neighbors(matrix, k=K, min_co_likes=MIN_CO_LIKES, block_rows=BLOCK_ROWS):
+    # (indices, scores): for each dog (column of matrix), the columns of its
+    # k most similar dogs, most similar first and padded with EMPTY, as a
+    # dogs x k uint32 array, and their similarities as float32
+    np, _ = _modules()
+    by_dog = matrix.T.tocsr()
+    likers = np.asarray(by_dog.sum(axis=1)).ravel()
+    norms = (1 / np.sqrt(np.maximum(likers, 1))).astype(np.float32)
+    count = by_dog.shape[0]
+    indices = np.full((count, k), EMPTY, dtype=np.uint32)
+    scores = np.zeros((count, k), dtype=np.float32)
+    for start in range(0, count, block_rows):
+        co_likes = (by_dog[start:start + block_rows] @ matrix).tocoo()
+        rows, cols, shared = co_likes.row, co_likes.col, co_likes.data
+        keep = (rows + start != cols) & (shared >= min_co_likes)
+        rows, cols = rows[keep], cols[keep]
+        similarity = shared[keep] * norms[rows + start] * norms[cols]
+        # Each row's pairs together, most similar first (ties by column)
+        order = np.lexsort((cols, -similarity, rows))
+        rows, cols, similarity = rows[order], cols[order], similarity[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = rank < k
+        indices[rows[top] + start, rank[top]] = cols[top]
+        scores[rows[top] + start, rank[top]] = similarity[top]
+    return indices, scores
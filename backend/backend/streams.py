@@ -0,0 +1,15 @@
+from boto3.dynamodb.types import TypeDeserializer
+
+# Helpers for DynamoDB stream records, as Lambda receives them
+
+deserializer = TypeDeserializer()
+
+
+def image(record, name):
+    # The record's 'NewImage' or 'OldImage' as a plain item, or None
+    raw = record['dynamodb'].get(name)
+    return {key: deserializer.deserialize(value) for key, value in raw.items()} if raw else None
+
+
+def key(record, name):
+    return deserializer.deserialize(record['dynamodb']['Keys'][name])
@@ -0,0 +1,62 @@
+import json
+import logging
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import likes
+from streams import image, key
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def refresh_summaries(interactions_table, dog_id, summary):
+    # Rewrites dogSummary on every LIKE of the dog; returns how many
+    updated = 0
+    query = {
+        'IndexName': likes.LIKES_BY_DOG_INDEX,
+        'KeyConditionExpression': Key('dogId').eq(dog_id),
+    }
+    while True:
+        response = interactions_table.query(**query)
+        for item in response['Items']:
+            try:
+                interactions_table.update_item(
+                    Key={'userId': item['userId'], 'dogId': dog_id},
+                    UpdateExpression='SET dogSummary = :summary',
+                    # Leave it alone if the user has disliked the dog since
+                    ConditionExpression='attribute_exists(likedBy)',
+                    ExpressionAttributeValues={':summary': summary}
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            return updated
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def handler(event, context):
+    # pupper-dogs stream handler: keeps the dog summaries on LIKE items in
+    # step with the dogs. Most dog updates change nothing a summary holds and
+    # cost nothing here.
+    interactions_table = boto3.resource('dynamodb').Table('pupper-interactions')
+    summaries = {}
+    for record in event.get('Records', []):
+        new, old = image(record, 'NewImage'), image(record, 'OldImage')
+        summary = likes.dog_summary(new)
+        if record['eventName'] == 'INSERT' or summary == likes.dog_summary(old):
+            # Nobody can have liked a dog before it existed
+            continue
+        summaries[key(record, 'id')] = summary
+
+    updated = 0
+    for dog_id, summary in summaries.items():
+        updated += refresh_summaries(interactions_table, dog_id, summary)
+    if summaries:
+        logger.info(json.dumps({"event": "like_summaries_refreshed", "dogs": len(summaries), "likes": updated}))
+    return {'dogs': len(summaries), 'likes': updated}
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timezone
+
+import botocore
+from botocore.exceptions import ClientError
+
+import images
+
+# On-demand variants are generated from the stored original on first request
+# and cached in S3 under the same {dogId}/{variant} key as the eager renditions.
+
+# Concurrent misses for one variant are coalesced through a lock object created
+# with If-None-Match; the holder generates, everyone else waits for the result.
+LOCK_PREFIX = '.locks'
+LOCK_TTL_SECONDS = 30
+WAIT_INTERVAL_SECONDS = 0.25
+# If-None-Match on PutObject needs botocore 1.35.9 or later, which
+# pyproject.toml pins; the SDK bundled with a Lambda runtime can be older (see
+# API.md). Without it misses are not coalesced: each one generates the
+# variant and the last write wins, which costs transforms but serves the same
+# bytes.
+CONDITIONAL_WRITES = tuple(int(part) for part in botocore.__version__.split('.')[:3]) >= (1, 35, 9)
+
+
+def variant_exists(s3, bucket_name, key):
+    try:
+        s3.head_object(Bucket=bucket_name, Key=key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def acquire_lock(s3, bucket_name, lock_key):
+    try:
+        s3.put_object(Bucket=bucket_name, Key=lock_key, Body=b'', IfNoneMatch='*')
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            raise
+
+    # Someone holds it; take it over only if they died without releasing it
+    try:
+        lock = s3.head_object(Bucket=bucket_name, Key=lock_key)
+    except ClientError:
+        return False
+    age = (datetime.now(timezone.utc) - lock['LastModified']).total_seconds()
+    if age > LOCK_TTL_SECONDS:
+        s3.delete_object(Bucket=bucket_name, Key=lock_key)
+        return acquire_lock(s3, bucket_name, lock_key)
+    return False
+
+
+def render_variant(image_data, rendition, width, fmt):
+    spec = images.single_variant_spec(rendition, width, fmt)
+    img = images.decode(image_data, min_size=images.minimum_source_size(spec), max_pixels=images.MAX_SOURCE_PIXELS)
+    return images.render(img, spec=spec, formats=[fmt])[0]
+
+
+def generate(s3, bucket_name, key, rendition, width, fmt, load_original):
+    output = render_variant(load_original(), rendition, width, fmt)
+    s3.put_object(
+        Bucket=bucket_name, Key=key, Body=output['data'], ContentType=output['contentType'],
+        CacheControl='public, max-age=31536000, immutable'
+    )
+    return 'generated'
+
+
+def get_or_create(s3, bucket_name, dog_id, variant, load_original, deadline):
+    # Makes sure {dog_id}/{variant} exists and returns 'hit', 'generated' or
+    # 'coalesced'. load_original() returns the original's bytes; deadline is a
+    # time.monotonic() value after which we stop waiting on another generator.
+    rendition, width, fmt = images.parse_variant(variant)
+    key = f"{dog_id}/{variant}"
+    if variant_exists(s3, bucket_name, key):
+        return 'hit'
+    if not CONDITIONAL_WRITES:
+        return generate(s3, bucket_name, key, rendition, width, fmt, load_original)
+
+    lock_key = f"{dog_id}/{LOCK_PREFIX}/{variant}"
+    while not acquire_lock(s3, bucket_name, lock_key):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for {key}")
+        time.sleep(WAIT_INTERVAL_SECONDS)
+        if variant_exists(s3, bucket_name, key):
+            return 'coalesced'
+
+    try:
+        # The previous holder may have finished between our check and the lock
+        if variant_exists(s3, bucket_name, key):
+            return 'coalesced'
+        return generate(s3, bucket_name, key, rendition, width, fmt, load_original)
+    finally:
+        s3.delete_object(Bucket=bucket_name, Key=lock_key)
@@ -0,0 +1,75 @@
+# GET /dogs and GET /dogs/search return every attribute of a dog by default
+# (view=detail). view=summary returns what the swipe card and the browse grid
+# show, and fields=a,b,c exactly the fields named (plus id). Only what those
+# fields are built from is read, through a ProjectionExpression, and the
+# inputs the response doesn't ask for (photoFormats, renditions) are dropped
+# once the photos are negotiated.
+#
+# A projection makes the items DynamoDB sends back and the response smaller,
+# but not the read: Query and GetItem consume capacity for the whole item.
+# The listing indexes hold only what a summary is built from, though
+# (INDEXED_ATTRIBUTES), so a view=summary page of GET /dogs reads items a
+# third the size of the dogs. See backend/benchmarks/bench_views.py.
+VIEWS = ('summary', 'detail')
+SUMMARY_FIELDS = (
+    'id', 'name', 'species', 'city', 'state', 'birthday', 'weightInPounds', 'color', 'description',
+    'photo', 'photoSrcset', 'thumbnailPhoto', 'placeholder', 'likeCount',
+)
+FIELDS = SUMMARY_FIELDS + (
+    'shelter', 'shelterEntryDate', 'status', 'createdAt', 'originalPhoto', 'photoFormats', 'renditions',
+    'renditionVersion', 'dislikeCount', 'latitude', 'longitude',
+)
+# Response fields that images.negotiate_photos() derives from other attributes:
+# cardPhotos, the compact copy of what they need of photoFormats and renditions
+SOURCES = {
+    'photo': ('photo', 'cardPhotos'),
+    'thumbnailPhoto': ('thumbnailPhoto', 'cardPhotos'),
+    'photoSrcset': ('cardPhotos',),
+}
+
+
+def requested_fields(params):
+    # The fields to return for GET query parameters, or None for all of them;
+    # raises ValueError for bad ones
+    fields = params.get('fields')
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return tuple(dict.fromkeys(['id'] + names))
+    view = params.get('view', 'detail')
+    if view not in VIEWS:
+        raise ValueError("view must be summary or detail")
+    return SUMMARY_FIELDS if view == 'summary' else None
+
+
+def attributes(fields):
+    # The item attributes to read for fields
+    names = []
+    for field in fields:
+        names.extend(SOURCES.get(field, (field,)))
+    return list(dict.fromkeys(name for name in names if name != 'photoSrcset'))
+
+
+# What the listing indexes but GeoIndex project (backend/dynamodb.py): what
+# the summary fields are built from, and the attributes filters are applied
+# to. Other fields are read from the dogs.
+INDEXED_ATTRIBUTES = tuple(attributes(SUMMARY_FIELDS)) + ('statusState', 'cityCreatedAt', 'statusColor')
+
+
+def projection(fields):
+    # Query/get_item kwargs reading only what fields need. The placeholders
+    # can't clash with the #n0... ones boto3 makes for condition objects.
+    names = attributes(fields)
+    return {
+        'ProjectionExpression': ', '.join(f"#p{i}" for i in range(len(names))),
+        'ExpressionAttributeNames': {f"#p{i}": name for i, name in enumerate(names)},
+    }
+
+
+def shape(item, fields):
+    # item cut down to fields, after images.negotiate_photos()
+    if fields is None:
+        return item
+    return {name: item[name] for name in fields if name in item}
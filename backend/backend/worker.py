@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+
+import boto3
+
+import ingest
+import listing
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Matches the queue's redrive policy: on the last attempt the dog is marked
+# FAILED before the message moves to the dead-letter queue
+MAX_RECEIVE_COUNT = int(os.environ.get('MAX_RECEIVE_COUNT', 3))
+
+
+def ingest_dog(message, deadline=None):
+    # Classifies and renders a PENDING dog queued by POST /dogs, then flips it
+    # to ACTIVE (or REJECTED). Raises on anything worth retrying.
+    dog_id = message['dogId']
+    staging_key = message['stagingKey']
+    s3 = ingest.s3_client()
+    table = boto3.resource('dynamodb').Table('pupper-dogs')
+    bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+    region = os.environ.get('REGION', 'us-east-1')
+
+    dog = table.get_item(Key={'id': dog_id}).get('Item')
+    if not dog or dog.get('status') != 'PENDING':
+        # Deleted, or a redelivered message for a dog we already finished
+        logger.info(json.dumps({"event": "ingest_skipped", "dogId": dog_id}))
+        return
+
+    try:
+        image_data = ingest.read_upload(s3, bucket_name, staging_key)
+        is_labrador, detected_labels, fields = ingest.ingest_photo(
+            s3, bucket_name, region, dog_id, image_data, message['apiUrl'],
+            upload_key=staging_key, deadline=deadline, raise_errors=True
+        )
+    except ValueError as e:
+        # Retrying will not make an oversized or broken image any better
+        ingest.update_dog(table, dog_id, {'status': 'FAILED', 'error': str(e)})
+        s3.delete_object(Bucket=bucket_name, Key=staging_key)
+        return
+    if not is_labrador:
+        ingest.update_dog(table, dog_id, {'status': 'REJECTED', 'detectedLabels': detected_labels})
+        s3.delete_object(Bucket=bucket_name, Key=staging_key)
+        return
+
+    fields = dict(fields, status='ACTIVE')
+    fields.update(listing.listing_keys(dict(dog, **fields)))
+    ingest.update_dog(
+        table, dog_id, fields,
+        ConditionExpression='#status = :pending',
+        ExpressionAttributeValues={':pending': 'PENDING'}
+    )
+    s3.delete_object(Bucket=bucket_name, Key=staging_key)
+
+
+def handler(event, context):
+    # SQS batch handler; failed messages are reported individually so the rest
+    # of the batch is not redelivered
+    failures = []
+    deadline = ingest.invocation_deadline(context, default_seconds=60)
+    for record in event.get('Records', []):
+        message = json.loads(record['body'])
+        try:
+            ingest_dog(message, deadline)
+        except Exception as e:
+            logger.error(f"Ingestion error for dog {message.get('dogId')}: {str(e)}")
+            if int(record.get('attributes', {}).get('ApproximateReceiveCount', 1)) >= MAX_RECEIVE_COUNT:
+                try:
+                    table = boto3.resource('dynamodb').Table('pupper-dogs')
+                    ingest.update_dog(table, message['dogId'], {'status': 'FAILED', 'error': str(e)})
+                except Exception as update_error:
+                    logger.error(f"Could not mark dog {message.get('dogId')} as failed: {str(update_error)}")
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# What it costs to hand the whole deck to many clients at once: every client
+# paging through GET /dogs (100 dogs a page, one Lambda invocation and one
+# index query each) against GET /dogs?snapshot=redirect, one invocation that
+# answers from the container's copy of the catalog pointer and sends the
+# client to the gzipped snapshot in S3.
+#
+#   python benchmarks/bench_catalog.py [--dogs 500 5000] [--clients 100 1000 10000]
+#
+# Dogs are the realistic record from bench_like_summaries.py with varied names
+# and descriptions. Lambda times are measured in process: for a live page,
+# boto3's deserialization of the typed items, photo negotiation, shaping and
+# json.dumps; for the snapshot, the handler's work with the pointer cached.
+# RCUs are what the index queries are charged (4 KB per half unit, eventually
+# consistent), and "sent" what the API, or S3, returns to the clients. The
+# snapshot's own cost is one rebuild per batch of dog changes, shown last.
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import catalog
+import images
+import views
+from bench_like_summaries import item_size, read_units, sample_dog
+
+PAGE_SIZE = 100
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def catalog_of(count):
+    dogs = []
+    for n in range(count):
+        dog = sample_dog()
+        dog.update({'id': f"{dog['id'][:-6]}{n:06d}", 'name': f"Dog {n}", 'description': dog['description'] * (1 + n % 3),
+                    'createdAt': f"2024-{1 + n % 12:02d}-{1 + n % 28:02d}T{n % 24:02d}:00:00.{n:06d}", 'likeCount': n % 40})
+        dogs.append(dog)
+    return dogs
+
+
+def live_page(typed_items):
+    # The GET /dogs?view=summary work on one page, as the query returns it
+    items = [{name: deserializer.deserialize(value) for name, value in item.items()} for item in typed_items]
+    for item in items:
+        images.negotiate_photos(item, 'webp')
+    return json.dumps({'dogs': [views.shape(item, views.SUMMARY_FIELDS) for item in items]}, default=float)
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dogs', type=int, nargs='+', default=[500, 5000])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'dogs':>6} {'clients':>8}  {'path':9} {'invocations':>12} {'RCUs':>10} {'Lambda s':>9} {'sent MB':>9}")
+    for count in args.dogs:
+        dogs = catalog_of(count)
+        pages = [dogs[start:start + PAGE_SIZE] for start in range(0, count, PAGE_SIZE)]
+        # The query reads whole items, whatever the summary projection
+        page_units = sum(read_units(sum(item_size(dog) for dog in page)) for page in pages)
+        typed = [[{name: serializer.serialize(value) for name, value in views.shape(dog, views.attributes(views.SUMMARY_FIELDS)).items()} for dog in page] for page in pages]
+        live_ms, live_bytes = 0.0, 0
+        for page in typed:
+            body, ms = timed(lambda: live_page(copy.deepcopy(page)), args.repeat)
+            live_ms += ms
+            live_bytes += len(body)
+
+        entries = catalog.ordered(catalog.entry(dog) for dog in dogs)
+        version = catalog.version_of(entries)
+        files, build_ms = timed(lambda: [catalog.encode(document) for _, document in catalog.documents(entries, version, '2025-01-01T00:00:00')], max(1, args.repeat // 5))
+        snapshot_bytes = len(files[1 + catalog.FORMATS.index('webp')])
+        pointer = {'version': version}
+        _, redirect_ms = timed(lambda: (catalog.etag(pointer, 'webp'), catalog.file_key(version, 'webp')), 1000)
+
+        for clients in args.clients:
+            print(f"{count:>6} {clients:>8}  {'live':9} {clients * len(pages):>12} {clients * page_units:>10.0f} "
+                  f"{clients * live_ms / 1000:>9.2f} {clients * live_bytes / 1e6:>9.1f}")
+            print(f"{count:>6} {clients:>8}  {'snapshot':9} {clients:>12} {0:>10} "
+                  f"{clients * redirect_ms / 1000:>9.4f} {clients * snapshot_bytes / 1e6:>9.1f}")
+        print(f"{count:>6} {'':>8}  rebuild: {len(files)} files, {sum(map(len, files)) / 1e3:.0f} KB gzipped, {build_ms:.0f} ms per batch of changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Can the like/dislike counters keep up with 1000 swipes a second, and what do
+# they write? Swipes (Zipf-distributed over dogs, so a few are very popular)
+# are cut into stream batches the way the event source mapping delivers them,
+# and each batch runs through counters.deltas() and counters.apply() on the
+# same thread pool the Lambda uses. A lane keeps up when it handles a batch in
+# less time than the batch took to arrive. The counter writes are then
+# flushed onto the dogs once per --flush-window, as counter_flusher.py does
+# from the counters table's stream.
+#
+#   python benchmarks/bench_counters.py [--rate 1000] [--seconds 60] [--dogs 5000]
+#       [--window 1.0] [--lanes 4] [--flush-window 60] [--rtt-ms 5]
+#
+# DynamoDB is an in-process stand-in answering each call after --rtt-ms. It
+# also reports the most writes any single item took in a second: a partition
+# serves at most 1000 writes a second, and well under that for one item in
+# practice. Write units count each dog write with its entry in the five
+# listing indexes, which hold likeCount in slim summary entries, against
+# copying counts every batch into five indexes holding whole dogs.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import counters
+import likes
+import listing
+
+serializer = TypeSerializer()
+LISTING_INDEXES = len(listing.INDEXES) - 1
+# Write units of a dog (bench_like_summaries.sample_dog(), 5.2 KB), of its
+# slim entry in a listing index (1.9 KB), and of a whole-dog entry, as the
+# indexes held before
+DOG_WRITE_UNITS = 6
+INDEX_ENTRY_WRITE_UNITS = 2
+WHOLE_DOG_ENTRY_WRITE_UNITS = 6
+
+
+class StandInDynamoDB:
+    # The low-level calls counters.apply() and counters.flush() make, answered
+    # from memory after a simulated round trip. Counter writes are kept as
+    # stream records for the flusher. Counts writes per item.
+    def __init__(self, rtt_ms, dogs):
+        self.rtt = rtt_ms / 1000
+        self.shards = {}
+        self.dogs = {f"dog-{dog}": (0, 0) for dog in range(dogs)}
+        self.stream = []
+        self.writes = Counter()
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(client=self)
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        values = {name: counters.deserializer.deserialize(value) for name, value in ExpressionAttributeValues.items()}
+        with self.lock:
+            self.calls += 1
+            if TableName == counters.COUNTERS_TABLE:
+                key = (Key['dogId']['S'], int(Key['shard']['N']))
+                old = dict(self.shards.get(key, {'likes': 0, 'dislikes': 0}))
+                shard = self.shards[key] = {'likes': old['likes'] + values[':likes'], 'dislikes': old['dislikes'] + values[':dislikes']}
+                self.stream.append({'dynamodb': {
+                    'Keys': {'dogId': Key['dogId'], 'shard': Key['shard']},
+                    'NewImage': {name: serializer.serialize(value) for name, value in shard.items()},
+                    'OldImage': {name: serializer.serialize(value) for name, value in old.items()},
+                }})
+            else:
+                key = Key['id']['S']
+                if self.dogs.get(key) == (values[':likes'], values[':dislikes']):
+                    time.sleep(self.rtt)
+                    raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+                self.dogs[key] = (values[':likes'], values[':dislikes'])
+            self.writes[(TableName, key)] += 1
+        time.sleep(self.rtt)
+        return {'Attributes': {'recordVersion': {'N': '1'}}}
+
+    def query(self, TableName, ExpressionAttributeValues, **kwargs):
+        dog_id = ExpressionAttributeValues[':dog']['S']
+        with self.lock:
+            self.calls += 1
+            items = [{'likes': serializer.serialize(shard['likes']), 'dislikes': serializer.serialize(shard['dislikes'])}
+                     for (shard_dog, _), shard in self.shards.items() if shard_dog == dog_id]
+        time.sleep(self.rtt)
+        return {'Items': items}
+
+    def drain_stream(self):
+        with self.lock:
+            records, self.stream = self.stream, []
+        return records
+
+
+def swipe_records(rng, rate, seconds, dogs):
+    # Stream records for rate * seconds swipes; each user swipes a dog once
+    weights = [1 / (rank + 1) for rank in range(dogs)]
+    dog_ids = rng.choices(range(dogs), weights=weights, k=rate * seconds)
+    records = []
+    for n, dog in enumerate(dog_ids):
+        item = likes.interaction_item(f"user-{n}", f"dog-{dog}", 'LIKE' if rng.random() < 0.4 else 'DISLIKE', '2025-01-01T00:00:00')
+        records.append({
+            'eventName': 'INSERT',
+            'dynamodb': {'Keys': {'userId': serializer.serialize(item['userId']), 'dogId': serializer.serialize(item['dogId'])},
+                         'NewImage': {name: serializer.serialize(value) for name, value in item.items()}},
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=int, default=1000, help='swipes per second')
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--dogs', type=int, default=5000)
+    parser.add_argument('--window', type=float, default=1.0, help='seconds of swipes per stream batch and lane')
+    parser.add_argument('--lanes', type=int, default=4, help='batches processed side by side (stream shards x parallelization factor)')
+    parser.add_argument('--flush-window', type=float, default=60.0, help='seconds of counter writes per flush')
+    parser.add_argument('--rtt-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    records = swipe_records(rng, args.rate, args.seconds, args.dogs)
+    # Records are spread over lanes by key, as stream shards and the
+    # parallelization factor do; each lane gets a batch per window
+    per_batch = int(args.rate * args.window / args.lanes)
+    lanes = [[record for record in records if hash(record['dynamodb']['Keys']['userId']['S']) % args.lanes == lane] for lane in range(args.lanes)]
+    # (second the batch is complete, batch), in that order
+    batches = sorted((((start // per_batch + 1) * args.window, lane[start:start + per_batch])
+                      for lane in lanes for start in range(0, len(lane), per_batch)), key=lambda batch: batch[0])
+
+    dynamodb = StandInDynamoDB(args.rtt_ms, args.dogs)
+    client = dynamodb.meta.client
+    durations, flushes = [], []
+    flushed_until = 0
+    started = time.perf_counter()
+
+    def flush():
+        flush_started = time.perf_counter()
+        dog_ids = counters.changed(dynamodb.drain_stream())
+        written = sum(counters.POOL.map(lambda dog_id: counters.flush(client, dog_id), dog_ids))
+        flushes.append((time.perf_counter() - flush_started, len(dog_ids), written))
+
+    for arrived, records_batch in batches:
+        while arrived > flushed_until + args.flush_window:
+            flush()
+            flushed_until += args.flush_window
+        batch_started = time.perf_counter()
+        deltas = {dog_id: delta for dog_id, delta in counters.deltas(records_batch).items() if delta['likes'] or delta['dislikes']}
+        list(counters.POOL.map(lambda dog_id: counters.apply(client, dog_id, deltas[dog_id]), deltas))
+        durations.append(time.perf_counter() - batch_started)
+    flush()
+    elapsed = time.perf_counter() - started
+
+    durations.sort()
+    hot_dog = Counter(record['dynamodb']['Keys']['dogId']['S'] for record in records).most_common(1)[0]
+    shard_writes = max(count for (table, _), count in dynamodb.writes.items() if table == counters.COUNTERS_TABLE)
+    counter_writes = sum(count for (table, _), count in dynamodb.writes.items() if table == counters.COUNTERS_TABLE)
+    dog_writes = [count for (table, _), count in dynamodb.writes.items() if table == 'pupper-dogs']
+    seconds = max(args.seconds, args.flush_window)
+    print(f"{len(records)} swipes at {args.rate}/s over {args.dogs} dogs; {len(batches)} batches of ~{per_batch} "
+          f"({args.lanes} lanes x {args.window}s), {len(flushes)} flushes; DynamoDB {args.rtt_ms} ms per call, {counters.WORKERS} threads")
+    print(f"batch time: median {durations[len(durations) // 2] * 1000:.0f} ms, max {durations[-1] * 1000:.0f} ms "
+          f"(budget {args.window * 1000:.0f} ms per lane) -> {'keeps up' if durations[-1] < args.window else 'FALLS BEHIND'}")
+    print(f"flush time: max {max(duration for duration, _, _ in flushes):.1f} s for up to {max(dogs for _, dogs, _ in flushes)} dogs "
+          f"(budget {args.flush_window:.0f} s)")
+    print(f"whole run processed in {elapsed:.1f} s on one lane at a time; {dynamodb.calls} DynamoDB calls, "
+          f"{dynamodb.calls / len(records):.2f} per swipe")
+    units = sum(dog_writes) * (DOG_WRITE_UNITS + LISTING_INDEXES * INDEX_ENTRY_WRITE_UNITS)
+    print(f"dog writes: {sum(dog_writes)} ({sum(dog_writes) / len(records):.3f} per swipe), {units} WCUs with their index entries; "
+          f"copied every batch into whole-dog indexes, it would be {counter_writes} dog writes and "
+          f"{counter_writes * (DOG_WRITE_UNITS + LISTING_INDEXES * WHOLE_DOG_ENTRY_WRITE_UNITS)} WCUs")
+    print(f"most swiped dog: {hot_dog[1]} swipes = {hot_dog[1] / args.seconds:.0f} writes/s to its item if counted per swipe")
+    print(f"busiest item here: {shard_writes / args.seconds:.1f} writes/s to a counter shard, "
+          f"{max(dog_writes) / seconds * 60:.1f} writes/min to a dog")
+    assert sum(like + dislike for like, dislike in dynamodb.dogs.values()) == len(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# GET /dogs/{id} reads under skewed traffic, with and without the dog cache
+# (backend/dog_cache.py): a few popular dogs get most of the views, as they do
+# once a dog is shared. Dog ids are drawn from a Zipf distribution (--skew)
+# over --dogs dogs and replayed against the in-process DynamoDB stand-in from
+# bench_likes.py, which answers after a simulated round trip.
+#
+#   python benchmarks/bench_dog_cache.py [--dogs 5000] [--requests 20000] [--containers 1 4 16]
+#
+# Requests are spread round robin over --containers warm Lambda containers,
+# each with its own LRU. "shared" adds the memory:// tier standing in for
+# Redis, with --tier-ms per round trip; "writes" updates --write-rate of the
+# requests' dogs first, as the counter aggregator does.
+import argparse
+import random
+import statistics
+import sys
+import os
+import time
+
+from boto3.dynamodb.types import TypeDeserializer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import dog_cache
+from bench_likes import StandInDynamoDB, synthetic_dog
+
+deserializer = TypeDeserializer()
+
+
+class SlowTier(dog_cache.MemoryTier):
+    # The memory tier after a simulated round trip to Redis
+    def __init__(self, tier_ms):
+        super().__init__()
+        self.rtt = tier_ms / 1000
+
+    def versions(self, keys):
+        time.sleep(self.rtt)
+        return super().versions(keys)
+
+    def get_many(self, keys):
+        time.sleep(self.rtt)
+        return super().get_many(keys)
+
+    def put_many(self, entries):
+        time.sleep(self.rtt)
+        super().put_many(entries)
+
+    def invalidate(self, key, version):
+        time.sleep(self.rtt)
+        super().invalidate(key, version)
+
+
+def zipf_ids(ids, count, skew, rng):
+    weights = [1 / (rank + 1) ** skew for rank in range(len(ids))]
+    return rng.choices(ids, weights=weights, k=count)
+
+
+def replay(client, requests, caches, writes=0.0, seed=1):
+    # Per-request latency in ms; caches is None for reads straight from the table
+    rng = random.Random(seed)
+    latencies = []
+    for n, dog_id in enumerate(requests):
+        if caches and writes and rng.random() < writes:
+            item = client.items[dog_id]
+            version = int(item.get('recordVersion', {'N': '0'})['N']) + 1
+            item['recordVersion'] = {'N': str(version)}
+            caches[n % len(caches)].invalidate(dog_id, version)
+        load = lambda key: {name: deserializer.deserialize(value) for name, value in client.get_item(TableName='pupper-dogs', Key={'id': {'S': key}}).get('Item', {}).items()} or None
+        started = time.perf_counter()
+        if caches:
+            caches[n % len(caches)].get(dog_id, load)
+        else:
+            load(dog_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dogs', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--containers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--cache-size', type=int, default=dog_cache.MAX_ENTRIES)
+    parser.add_argument('--rtt-ms', type=float, default=4.0)
+    parser.add_argument('--tier-ms', type=float, default=0.5)
+    parser.add_argument('--write-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    dogs = [dict(synthetic_dog(rng), recordVersion=1) for _ in range(args.dogs)]
+    requests = zipf_ids([dog['id'] for dog in dogs], args.requests, args.skew, rng)
+
+    print(f"{'containers':>10}  {'setup':9} {'hit rate':>9} {'table reads':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for containers in args.containers:
+        runs = [('none', None, 0.0), ('local', False, 0.0), ('shared', True, 0.0), ('writes', True, args.write_rate)]
+        for name, shared, writes in runs:
+            client = StandInDynamoDB(dogs, args.rtt_ms, 0.0)
+            caches = None
+            if shared is not None:
+                tier = SlowTier(args.tier_ms) if shared else None
+                caches = [dog_cache.DogCache(dog_cache.LRUCache(max_entries=args.cache_size), tier) for _ in range(containers)]
+            latencies = replay(client, requests, caches, writes)
+            hit_rate = 1 - client.calls / len(requests)
+            print(f"{containers:>10}  {name:9} {hit_rate:>8.1%} {client.calls:>12} "
+                  f"{statistics.median(latencies):>8.2f} {percentile(latencies, 0.99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# What a page of GET /feed costs for users with 10 to 5000 swipes, against
+# the two ways of leaving swiped dogs out without a seen filter: the client
+# downloading the whole catalog and its own swipes, or the API querying the
+# user's swipes out of pupper-interactions on every page.
+#
+#   python benchmarks/bench_feed.py [--dogs 10000] [--swipes 10 100 1000 5000] [--limit 10]
+#
+# Users swipe newest first, as the deck is dealt, so a fresh session walks
+# past every dog they swiped before it finds an unseen one: the worst case for
+# the feed's filter checks. Times are in process: reading the filter from its
+# segment items and dealing a page from the catalog the container has parsed.
+# RCUs are eventually consistent reads (4 KB per half unit) of the filter's
+# segments, or of the interaction items (about 100 bytes each, dogSummary
+# aside) for the query. WCUs are what recording one more swipe writes: the
+# segment it lands in, against the whole filter as the single item it used to
+# be (1 KB per unit).
+import argparse
+import json
+import math
+import statistics
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import catalog
+import feed
+import seen
+from bench_catalog import catalog_of
+
+INTERACTION_BYTES = 100
+# Keys, version and count of a stored segment
+SEGMENT_OVERHEAD_BYTES = 70
+
+
+def read_units(size):
+    return math.ceil(size / 4096) / 2
+
+
+def write_units(size):
+    return math.ceil(size / 1024)
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dogs', type=int, default=10000)
+    parser.add_argument('--swipes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--limit', type=int, default=feed.DEFAULT_PAGE_SIZE)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    entries = catalog.ordered(catalog.entry(dog) for dog in catalog_of(args.dogs))
+    _, document = list(catalog.documents(entries, catalog.version_of(entries), '2025-01-01T00:00:00'))[1]
+    dogs = document['dogs']
+    catalog_bytes = len(catalog.encode(document))
+    print(f"catalog: {len(dogs)} dogs, {catalog_bytes / 1e3:.0f} KB gzipped for the client to download")
+
+    print(f"{'swipes':>7} {'filter KB':>10} {'segments':>9} {'feed RCUs':>10} {'query RCUs':>11} {'swipe WCUs':>11} "
+          f"{'1 item WCUs':>12} {'feed p50 ms':>12} {'feed p99 ms':>12} {'page KB':>8}")
+    for count in args.swipes:
+        filter = seen.SeenFilter()
+        for dog in dogs[:count]:
+            filter.add(dog['id'])
+        items = [item for item, _ in filter.changed_items('user-1')]
+        stored = sum(len(item['bits']) + SEGMENT_OVERHEAD_BYTES for item in items)
+
+        def page():
+            loaded = seen.SeenFilter.from_items(items)
+            return feed.deal(dogs, loaded, args.limit)
+
+        (dealt, upcoming), p50, p99 = timed(page, args.repeat)
+        body = {'dogs': dealt, 'prefetch': feed.prefetch(upcoming), 'nextToken': feed.token(dealt[-1], {}) if dealt else None}
+        page_bytes = len(json.dumps(body))
+        largest = max(len(item['bits']) for item in items) + SEGMENT_OVERHEAD_BYTES
+        print(f"{count:>7} {filter.nbytes() / 1e3:>10.1f} {len(items):>9} {read_units(stored):>10.1f} "
+              f"{read_units(count * INTERACTION_BYTES):>11.1f} {write_units(largest):>11} {write_units(filter.nbytes() + 200):>12} "
+              f"{p50:>12.2f} {p99:>12.2f} {page_bytes / 1e3:>8.1f}")
+
+if __name__ == "__main__":
+    main()
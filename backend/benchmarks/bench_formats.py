@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Byte size and encode time of every rendition across output formats and
+# quality levels, over a directory of real uploads.
+#
+#   python benchmarks/bench_formats.py path/to/corpus [--repeat 3]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import images
+
+# (format, save params) combinations to compare; the first per format matches
+# what images.RENDITION_SPEC ships with today
+CANDIDATES = [
+    ('png', {'optimize': True}),
+    ('png', {}),
+    ('webp', {'quality': 80, 'method': 4}),
+    ('webp', {'quality': 70, 'method': 4}),
+    ('webp', {'quality': 90, 'method': 4}),
+    ('webp', {'quality': 80, 'method': 6}),
+    ('avif', {'quality': 60, 'speed': 8}),
+    ('avif', {'quality': 50, 'speed': 8}),
+    ('avif', {'quality': 70, 'speed': 8}),
+    ('avif', {'quality': 60, 'speed': 6}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
+    )
+    available = images.available_formats()
+
+    # rendition -> candidate index -> [total bytes, total best ms]
+    totals = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            image_data = f.read()
+        img = images.decode(image_data, min_size=images.minimum_source_size())
+        for rendition_spec, width, rendition in images.resize_all(img):
+            name = f"{rendition_spec['name']}-{width}"
+            for i, (fmt, params) in enumerate(CANDIDATES):
+                if fmt not in available:
+                    continue
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    data = images.encode(rendition, images.FORMATS[fmt][0], **params)
+                    timings.append((time.perf_counter() - start) * 1000)
+                entry = totals.setdefault(name, {}).setdefault(i, [0, 0.0])
+                entry[0] += len(data)
+                entry[1] += min(timings)
+
+    print(f"{len(paths)} images, totals per rendition")
+    for name, results in totals.items():
+        baseline = results[0][0]
+        print(f"\n{name}")
+        print(f"{'format':6} {'params':28} {'bytes':>10} {'vs png':>8} {'encode':>10}")
+        for i, (size, ms) in results.items():
+            fmt, params = CANDIDATES[i]
+            label = ', '.join(f"{key}={value}" for key, value in params.items())
+            print(f"{fmt:6} {label:28} {size:>10} {size / baseline:>7.0%} {ms:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
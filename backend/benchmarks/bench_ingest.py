@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Wall-clock time of ingest.store_images (decode, eager renditions, uploads)
+# with sequential versus pooled encodes and uploads, at several Lambda memory
+# sizes.
+#
+#   python benchmarks/bench_ingest.py path/to/corpus [--memory 512 1024 1769 3008] [--s3-latency-ms 40]
+#
+# Lambda allocates CPU in proportion to memory (one full vCPU at 1769 MB, up
+# to six at 10240 MB). Each memory size runs in its own interpreter pinned to
+# that many cores with sched_setaffinity. Fractions of a vCPU cannot be pinned,
+# so sizes below 1769 MB run on one whole core and flatter both modes equally.
+# S3 is simulated by a client that sleeps --s3-latency-ms per request; pass
+# --bucket to upload to a real bucket instead.
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+MODES = ['sequential', 'parallel']
+LAMBDA_MB_PER_VCPU = 1769
+LAMBDA_MAX_VCPUS = 6
+
+
+class SlowS3:
+    # Stands in for the S3 client with a fixed round trip per request
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def request(self, **kwargs):
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        return {}
+
+    put_object = copy_object = request
+
+
+def vcpus_for(memory_mb):
+    return min(LAMBDA_MAX_VCPUS, os.cpu_count() or 1, max(1, math.floor(memory_mb / LAMBDA_MB_PER_VCPU)))
+
+
+def run_mode(mode, paths, repeat, latency_ms, bucket):
+    from concurrent.futures import ThreadPoolExecutor
+    import ingest
+    if mode == 'sequential':
+        # One encode and one upload at a time, as before the pools
+        ingest.ENCODE_POOL = None
+        ingest.UPLOAD_POOL = ThreadPoolExecutor(max_workers=1)
+    s3 = ingest.s3_client() if bucket else SlowS3(latency_ms)
+    prefix = f"bench-{uuid.uuid4()}"
+
+    results = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            image_data = f.read()
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            ingest.store_images(s3, bucket or 'bench', 'us-east-1', f"{prefix}/{i}", image_data, 'https://api.example')
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append({'file': os.path.basename(path), 'bestMs': round(min(timings), 2)})
+    return {'mode': mode, 'files': results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--memory', type=int, nargs='+', default=[512, 1024, 1769, 3008])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--s3-latency-ms', type=float, default=40)
+    parser.add_argument('--bucket', help='upload to this bucket instead of simulating S3 (objects are left under bench-*/)')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
+    )
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, paths, args.repeat, args.s3_latency_ms, args.bucket)))
+        return
+
+    print(f"{'memory':>8} {'vCPUs':>6} " + ' '.join(f"{mode:>12}" for mode in MODES) + f" {'speedup':>8}")
+    for memory_mb in args.memory:
+        vcpus = vcpus_for(memory_mb)
+        cores = sorted(os.sched_getaffinity(0))[:vcpus]
+        totals = {}
+        for mode in MODES:
+            command = [sys.executable, __file__, args.corpus, '--repeat', str(args.repeat), '--s3-latency-ms', str(args.s3_latency_ms), '--mode', mode]
+            if args.bucket:
+                command += ['--bucket', args.bucket]
+            # The encode pool is sized from ENCODE_WORKERS when ingest is imported
+            env = dict(os.environ, ENCODE_WORKERS=str(max(2, vcpus)))
+            output = subprocess.check_output(command, env=env, preexec_fn=lambda: os.sched_setaffinity(0, cores))
+            totals[mode] = sum(f['bestMs'] for f in json.loads(output)['files'])
+        row = ' '.join(f"{totals[mode]:>10.1f}ms" for mode in MODES)
+        print(f"{memory_mb:>6}MB {vcpus:>6} {row} {totals['sequential'] / totals['parallel']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
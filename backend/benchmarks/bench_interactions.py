@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Cost of recording a burst of swipes: one POST /interactions per swipe (a
+# get_item of the dog for each like, then a put_item) against the client
+# buffering them and flushing through POST /interactions/batch (one
+# BatchGetItem for the likes' summaries, then a conditional put_item per
+# swipe, side by side).
+#
+#   python benchmarks/bench_interactions.py [--swipes 60] [--flush-every 20]
+#       [--like-ratio 0.3] [--rtt-ms 5] [--invoke-ms 25]
+#
+# DynamoDB is an in-process stand-in that answers each call after --rtt-ms
+# plus --item-ms per item; --invoke-ms is what each API request adds on top
+# (API Gateway, authorizer, Lambda invoke) and is not simulated, only added.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeSerializer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import interactions
+import likes
+
+serializer = TypeSerializer()
+
+
+class StandInDynamoDB:
+    # The low-level calls both paths make, answered from memory after a
+    # simulated network round trip. Thread safe, like the real client.
+    def __init__(self, dogs, rtt_ms, item_ms):
+        self.dogs = {dog['id']: {name: serializer.serialize(value) for name, value in dog.items()} for dog in dogs}
+        self.written = {}
+        self.rtt, self.per_item = rtt_ms / 1000, item_ms / 1000
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(client=self)
+
+    def wait(self, count):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.rtt + self.per_item * count)
+
+    def get_item(self, TableName, Key, **kwargs):
+        item = self.dogs.get(Key['id']['S'])
+        self.wait(1)
+        return {'Item': item} if item else {}
+
+    def put_item(self, TableName, Item, **kwargs):
+        self.written[(Item['userId']['S'], Item['dogId']['S'])] = Item
+        self.wait(1)
+        return {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        (name, request), = RequestItems.items()
+        found = [self.dogs[key['id']['S']] for key in request['Keys'] if key['id']['S'] in self.dogs]
+        self.wait(len(found))
+        return {'Responses': {name: found}, 'UnprocessedKeys': {}}
+
+
+def one_by_one(dynamodb, user_id, swipes):
+    # What POST /interactions does for each swipe; returns the requests made
+    client = dynamodb.meta.client
+    for swipe in swipes:
+        summary = None
+        if swipe['interaction'] == 'LIKE':
+            dog = client.get_item(TableName='pupper-dogs', Key={'id': {'S': swipe['dogId']}}).get('Item')
+            summary = likes.dog_summary(dog and {name: interactions.batch.deserializer.deserialize(value) for name, value in dog.items()})
+        item = likes.interaction_item(user_id, swipe['dogId'], swipe['interaction'], likes.format_timestamp(datetime.utcnow()), summary)
+        client.put_item(TableName='pupper-interactions', Item={name: serializer.serialize(value) for name, value in item.items()})
+    return len(swipes)
+
+
+def buffered(dynamodb, user_id, swipes, flush_every):
+    requests = 0
+    for start in range(0, len(swipes), flush_every):
+        results = interactions.record(dynamodb, user_id, swipes[start:start + flush_every])
+        assert all(result['status'] == interactions.RECORDED for result in results)
+        requests += 1
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--swipes', type=int, default=60, help='swipes in the burst (about a minute of a heavy user)')
+    parser.add_argument('--flush-every', type=int, default=20, help='swipes per batch request')
+    parser.add_argument('--like-ratio', type=float, default=0.3)
+    parser.add_argument('--rtt-ms', type=float, default=5.0, help='stand-in round trip per DynamoDB call')
+    parser.add_argument('--item-ms', type=float, default=0.05, help='stand-in cost per item read or written')
+    parser.add_argument('--invoke-ms', type=float, default=25.0, help='API Gateway + Lambda overhead per request')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    dogs = [{'id': f"dog-{i}", 'name': f"Dog {i}", 'species': 'Labrador Retriever', 'city': 'Seattle', 'state': 'WA', 'status': 'ACTIVE'} for i in range(args.swipes)]
+    now = datetime.utcnow().isoformat()
+    swipes = [{'dogId': dog['id'], 'interaction': 'LIKE' if rng.random() < args.like_ratio else 'DISLIKE', 'timestamp': now} for dog in dogs]
+    print(f"{args.swipes} swipes, {sum(s['interaction'] == 'LIKE' for s in swipes)} likes; DynamoDB {args.rtt_ms} ms per call, "
+          f"{args.invoke_ms} ms per API request")
+    print(f"{'path':32} {'requests':>8} {'DynamoDB calls':>15} {'DynamoDB ms':>12} {'ms per swipe':>13}")
+    for name, run in (('POST /interactions per swipe', lambda db: one_by_one(db, 'user-1', swipes)),
+                      (f"batch of {args.flush_every}", lambda db: buffered(db, 'user-1', swipes, args.flush_every))):
+        dynamodb = StandInDynamoDB(dogs, args.rtt_ms, args.item_ms)
+        started = time.perf_counter()
+        requests = run(dynamodb)
+        elapsed = (time.perf_counter() - started) * 1000
+        assert len(dynamodb.written) == args.swipes
+        per_swipe = (elapsed + requests * args.invoke_ms) / args.swipes
+        print(f"{name:32} {requests:>8} {dynamodb.calls:>15} {elapsed:>12.1f} {per_swipe:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Capacity cost of the dog summaries copied onto LIKE items: what a GET /likes
+# page saves by not joining with the dogs table, against what likes and dog
+# updates pay to keep the copies.
+#
+#   python benchmarks/bench_like_summaries.py [--page-size 50] [--likes-per-dog 20]
+#       [--page-views 200000] [--likes 50000] [--summary-updates 500]
+#
+# Item sizes follow DynamoDB's rules (attribute name + value bytes) for a
+# realistic dog record, interaction and summary. Reads are eventually
+# consistent: half a unit per 4 KB, and every item fetched by BatchGetItem is
+# rounded up to 4 KB on its own, however little of it is projected. Writes are
+# a unit per 1 KB, once for the table and once for each index the item is in.
+import argparse
+import math
+import os
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import likes
+
+
+def value_size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return 1 + math.ceil(len(str(value).lstrip('-').replace('.', '')) / 2)
+    if isinstance(value, dict):
+        return 3 + sum(len(key) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, list):
+        return 3 + sum(1 + value_size(item) for item in value)
+    raise TypeError(type(value))
+
+
+def item_size(item):
+    return sum(len(name) + value_size(value) for name, value in item.items())
+
+
+def sample_dog():
+    dog_id = '5f0c6f1e-6f5e-4a8e-9a53-2b1b8f0a9c11'
+    base_url = f"https://pupper-photos-957798448417.s3.us-east-1.amazonaws.com/{dog_id}"
+    widths = {'standard': [1600, 1200, 800, 400], 'thumbnail': [100, 50]}
+    return {
+        'id': dog_id, 'name': 'Max', 'species': 'Labrador Retriever', 'shelter': 'Golden Paws Rescue',
+        'city': 'Seattle', 'state': 'WA', 'birthday': '2021-03-15', 'weightInPounds': 70, 'color': 'Yellow',
+        'description': 'Friendly yellow lab who loves fetch and swimming. Great with kids and other dogs, '
+                       'house trained and knows sit, stay and come.',
+        'shelterEntryDate': '2024-12-01', 'status': 'ACTIVE', 'createdAt': '2024-12-01T10:00:00.000000',
+        'photo': f"{base_url}/standard-400.png", 'thumbnailPhoto': f"{base_url}/thumbnail-50.png",
+        'originalPhoto': f"{base_url}/original.jpg", 'photoHash': 'a' * 64, 'renditionVersion': 3,
+        'placeholder': 'data:image/webp;base64,' + 'A' * 400,
+        'photoFormats': {name: {fmt: f"{base_url}/{name}-{ladder[-1]}.{fmt}" for fmt in ('avif', 'webp', 'png')} for name, ladder in widths.items()},
+        'renditions': {name: [{'width': w, 'height': w * 3 // 4, 'formats': {fmt: f"{base_url}/{name}-{w}.{fmt}" for fmt in ('avif', 'webp', 'png')}} for w in ladder] for name, ladder in widths.items()},
+        'statusState': 'ACTIVE#WA', 'cityCreatedAt': 'seattle#2024-12-01T10:00:00.000000', 'statusColor': 'ACTIVE#yellow',
+    }
+
+
+def read_units(size):
+    return math.ceil(size / 4096) / 2
+
+
+def write_units(size):
+    return math.ceil(size / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--likes-per-dog', type=int, default=20, help='average likes a dog has when it is edited')
+    parser.add_argument('--page-views', type=int, default=200000, help='GET /likes pages per day')
+    parser.add_argument('--likes', type=int, default=50000, help='likes recorded per day')
+    parser.add_argument('--summary-updates', type=int, default=500, help='dog edits per day that change a summary')
+    args = parser.parse_args()
+
+    dog = sample_dog()
+    summary = likes.dog_summary(dog)
+    plain = likes.interaction_item('us-east-1:0d7c9a6e-1f1b-4b3e-8f6a-5a2d9c1e7b44', dog['id'], 'LIKE', '2025-01-01T12:00:00.000000')
+    with_summary = likes.interaction_item(plain['userId'], dog['id'], 'LIKE', plain['timestamp'], summary)
+    print(f"dog item {item_size(dog)} B, like without summary {item_size(plain)} B, with summary {item_size(with_summary)} B")
+
+    n = args.page_size
+    join_page = read_units(n * item_size(plain)) + n * read_units(item_size(dog))
+    summary_page = read_units(n * item_size(with_summary))
+    # table + LikesByTimeIndex before; LikesByDogIndex (keys only) added, plus
+    # reading the dog to copy from
+    like_before = 2 * write_units(item_size(plain))
+    like_after_w = 2 * write_units(item_size(with_summary)) + 1
+    like_after_r = read_units(item_size(dog))
+    # Rewriting a summary writes the table and LikesByTimeIndex (ALL); the
+    # keys-only index is untouched. The dog's likes are found with one query.
+    refresh_w = args.likes_per_dog * 2 * write_units(item_size(with_summary))
+    refresh_r = read_units(args.likes_per_dog * 100)
+
+    print(f"\nper operation                        {'RCU':>8} {'WCU':>8}")
+    print(f"GET /likes page of {n}, joined          {join_page:>8.1f} {0:>8}")
+    print(f"GET /likes page of {n}, from summaries  {summary_page:>8.1f} {0:>8}")
+    print(f"like, before                         {0:>8.1f} {like_before:>8}")
+    print(f"like, with summary                   {like_after_r:>8.1f} {like_after_w:>8}")
+    print(f"dog edit, {args.likes_per_dog} likes refreshed          {refresh_r:>8.1f} {refresh_w:>8}")
+
+    saved = args.page_views * (join_page - summary_page)
+    extra_reads = args.likes * like_after_r + args.summary_updates * refresh_r
+    extra_writes = args.likes * (like_after_w - like_before) + args.summary_updates * refresh_w
+    print(f"\nper day: {args.page_views} pages, {args.likes} likes, {args.summary_updates} summary-changing dog edits")
+    print(f"  reads saved {saved:,.0f} RCU, reads added {extra_reads:,.0f} RCU, writes added {extra_writes:,.0f} WCU")
+    # On-demand prices (us-east-1): a write unit costs 5x a read unit
+    print(f"  net, in read-unit terms (1 WCU = 5 RCU): {saved - extra_reads - 5 * extra_writes:,.0f} RCU saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Latency of the GET /likes join (liked dog ids -> dog items) for users with
+# 10, 100 and 1000 likes: one get_item per dog as before, BatchGetItem chunks
+# one after another, and chunks in parallel as backend/batch.py issues them.
+#
+#   python benchmarks/bench_likes.py [--likes 10 100 1000] [--endpoint-url http://localhost:8000]
+#
+# With --endpoint-url the dogs are seeded into a scratch table in DynamoDB
+# Local (pupper-bench-likes, deleted afterwards unless --keep is given).
+# Without it, an in-process stand-in answers every call after a simulated
+# round trip (--rtt-ms, plus --item-ms per item returned): DynamoDB Local has
+# no network between it and the caller, which flatters the get_item loop.
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import batch
+
+TABLE_NAME = 'pupper-bench-likes'
+serializer = TypeSerializer()
+
+
+class StandInDynamoDB:
+    # Low-level client calls used by the join, answered from memory after a
+    # simulated network round trip. Thread safe, like the real client.
+    def __init__(self, items, rtt_ms, item_ms):
+        self.items = {item['id']: {name: serializer.serialize(value) for name, value in item.items()} for item in items}
+        self.rtt, self.per_item = rtt_ms / 1000, item_ms / 1000
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(client=self)
+
+    def wait(self, count):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.rtt + self.per_item * count)
+
+    def get_item(self, TableName, Key, **kwargs):
+        item = self.items.get(Key['id']['S'])
+        self.wait(1)
+        return {'Item': item} if item else {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        (name, request), = RequestItems.items()
+        found = [self.items[key['id']['S']] for key in request['Keys'] if key['id']['S'] in self.items]
+        self.wait(len(found))
+        return {'Responses': {name: found}, 'UnprocessedKeys': {}}
+
+
+def synthetic_dog(rng):
+    dog_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    base_url = f"https://pupper-photos.s3.us-east-1.amazonaws.com/{dog_id}"
+    return {
+        'id': dog_id, 'name': f"Dog {rng.randrange(100000)}", 'species': 'Labrador Retriever',
+        'shelter': f"Shelter {rng.randrange(200)}", 'city': 'Seattle', 'state': 'WA', 'color': 'Yellow',
+        'weightInPounds': rng.randrange(40, 100), 'description': 'Friendly lab who loves fetch and swimming. ' * 4,
+        'status': 'ACTIVE', 'photo': f"{base_url}/standard-400.png", 'thumbnailPhoto': f"{base_url}/thumbnail-50.png",
+        'originalPhoto': f"{base_url}/original.jpg",
+        'photoFormats': {name: {fmt: f"{base_url}/{name}-{width}.{fmt}" for fmt in ('avif', 'webp', 'png')} for name, width in (('standard', 400), ('thumbnail', 50))},
+    }
+
+
+def serial_join(dynamodb, dog_ids):
+    # The old GET /likes loop
+    client = dynamodb.meta.client
+    return [client.get_item(TableName=TABLE_NAME, Key={'id': {'S': dog_id}}).get('Item') for dog_id in dog_ids]
+
+
+def sequential_batches(dynamodb, dog_ids):
+    client = dynamodb.meta.client
+    items = []
+    for start in range(0, len(dog_ids), batch.BATCH_GET_LIMIT):
+        chunk = {'Keys': [{'id': {'S': dog_id}} for dog_id in dog_ids[start:start + batch.BATCH_GET_LIMIT]]}
+        items += batch.get_chunk(client, TABLE_NAME, chunk)
+    return [{name: batch.deserializer.deserialize(value) for name, value in item.items()} for item in items]
+
+
+def parallel_batches(dynamodb, dog_ids):
+    return batch.get_items(dynamodb, TABLE_NAME, [{'id': dog_id} for dog_id in dog_ids])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--likes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rtt-ms', type=float, default=5.0, help='stand-in round trip per call')
+    parser.add_argument('--item-ms', type=float, default=0.02, help='stand-in cost per item returned')
+    parser.add_argument('--endpoint-url')
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    dogs = [synthetic_dog(rng) for _ in range(max(args.likes))]
+    if args.endpoint_url:
+        dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+        if TABLE_NAME not in [table.name for table in dynamodb.tables.all()]:
+            table = dynamodb.create_table(
+                TableName=TABLE_NAME, BillingMode='PAY_PER_REQUEST',
+                AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}],
+                KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            )
+            table.wait_until_exists()
+            with table.batch_writer() as writer:
+                for dog in dogs:
+                    writer.put_item(Item=dog)
+        print(f"DynamoDB at {args.endpoint_url}, {batch.GET_WORKERS} parallel chunks")
+    else:
+        dynamodb = StandInDynamoDB(dogs, args.rtt_ms, args.item_ms)
+        print(f"Stand-in DynamoDB: {args.rtt_ms} ms per call + {args.item_ms} ms per item, {batch.GET_WORKERS} parallel chunks")
+
+    joins = {'get_item per dog': serial_join, 'BatchGetItem, sequential': sequential_batches, 'BatchGetItem, parallel': parallel_batches}
+    print(f"{'likes':>6}  {'join':28} {'median ms':>10} {'max ms':>8}")
+    try:
+        for likes in args.likes:
+            dog_ids = [dog['id'] for dog in dogs[:likes]]
+            for name, join in joins.items():
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    found = join(dynamodb, dog_ids)
+                    samples.append((time.perf_counter() - started) * 1000)
+                assert len([item for item in found if item]) == likes
+                print(f"{likes:>6}  {name:28} {statistics.median(samples):>10.1f} {max(samples):>8.1f}")
+    finally:
+        if args.endpoint_url and not args.keep:
+            dynamodb.Table(TABLE_NAME).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# Consumed read capacity of GET /dogs access patterns at several catalog
+# sizes, against a scratch copy of the pupper-dogs table filled with
+# synthetic dogs.
+#
+#   python benchmarks/bench_listing_capacity.py [--sizes 10000 100000] [--endpoint-url http://localhost:8000]
+#
+# Point --endpoint-url at DynamoDB Local to avoid paying for the seeding
+# writes. Each size gets its own on-demand table (pupper-bench-<size>), which
+# is deleted afterwards unless --keep is given. The report ends with the write
+# cost of a new dog, which every extra index adds to.
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import listing
+import views
+
+STATUS_WEIGHTS = [('ACTIVE', 90), ('PENDING', 5), ('REJECTED', 5)]
+COLORS = ['Yellow', 'Black', 'Chocolate']
+STATES = ['WA', 'OR', 'CA', 'CO', 'TX', 'AZ', 'NY', 'FL']
+GEO_ATTRIBUTES = ['latitude', 'longitude', 'statusColor', 'weightInPounds']
+
+
+def create_table(dynamodb, name):
+    # Same keys and listing indexes as backend/dynamodb.py, billed on demand
+    attributes = {'id': 'S'}
+    indexes = []
+    for index_name, (partition_key, sort_key) in listing.INDEXES.items():
+        attributes[partition_key] = 'S'
+        attributes[sort_key] = 'N' if sort_key in ('weightInPounds', 'likeCount') else 'S'
+        included = GEO_ATTRIBUTES if index_name == 'GeoIndex' else [
+            name for name in views.INDEXED_ATTRIBUTES if name not in ('id', partition_key, sort_key)
+        ]
+        indexes.append({
+            'IndexName': index_name,
+            'KeySchema': [{'AttributeName': partition_key, 'KeyType': 'HASH'}, {'AttributeName': sort_key, 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': included},
+        })
+    table = dynamodb.create_table(
+        TableName=name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[{'AttributeName': attribute, 'AttributeType': kind} for attribute, kind in attributes.items()],
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        GlobalSecondaryIndexes=indexes,
+    )
+    table.wait_until_exists()
+    return table
+
+
+def synthetic_dog(rng, created_at):
+    # Roughly the size of a real record (~1.5 KB) including rendition URLs
+    dog_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    base_url = f"https://pupper-photos.s3.us-east-1.amazonaws.com/{dog_id}"
+    dog = {
+        'id': dog_id,
+        'name': f"Dog {rng.randrange(100000)}",
+        'species': 'Labrador Retriever',
+        'shelter': f"Shelter {rng.randrange(200)}",
+        'city': f"City {rng.randrange(500)}",
+        'state': rng.choice(STATES),
+        'color': rng.choice(COLORS),
+        'weightInPounds': rng.randrange(40, 100),
+        'description': 'Friendly lab who loves fetch and swimming. ' * 4,
+        'status': rng.choices([s for s, _ in STATUS_WEIGHTS], [w for _, w in STATUS_WEIGHTS])[0],
+        'createdAt': created_at.isoformat(),
+        'photo': f"{base_url}/standard-400.png",
+        'thumbnailPhoto': f"{base_url}/thumbnail-50.png",
+        'originalPhoto': f"{base_url}/original.jpg",
+        'photoFormats': {name: {fmt: f"{base_url}/{name}-{width}.{fmt}" for fmt in ('avif', 'webp', 'png')} for name, width in (('standard', 400), ('thumbnail', 50))},
+    }
+    dog.update(listing.listing_keys(dog))
+    return dog
+
+
+def seed(table, size, seed_value=7):
+    rng = random.Random(seed_value)
+    start = datetime(2023, 1, 1)
+    with table.batch_writer() as batch:
+        for i in range(size):
+            batch.put_item(Item=synthetic_dog(rng, start + timedelta(minutes=i)))
+
+
+def pages(read, page_size, count):
+    # Reads up to count pages through read(**params); returns (items, RCUs)
+    params = {'Limit': page_size, 'ReturnConsumedCapacity': 'TOTAL'}
+    items, units = 0, 0.0
+    for _ in range(count):
+        response = read(**params)
+        items += len(response['Items'])
+        units += response['ConsumedCapacity']['CapacityUnits']
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items, units
+
+
+def access_patterns(table, page_size, page_count):
+    # name -> callable returning (items returned, RCUs consumed). Each filter is
+    # read the way GET /dogs reads it (listing.plan_query) and the way a scan
+    # with a FilterExpression would, which pays for every dog in the table.
+    active = Attr('status').eq('ACTIVE')
+    filters = {
+        'all': ({}, active),
+        'state=WA': ({'state': 'WA'}, active & Attr('state').eq('WA')),
+        'state=WA&city=City 7': ({'state': 'WA', 'city': 'City 7'}, active & Attr('state').eq('WA') & Attr('city').eq('City 7')),
+        'color=black': ({'color': 'black'}, active & Attr('color').eq('Black')),
+        'weight 60-65': ({'minWeight': '60', 'maxWeight': '65'}, active & Attr('weightInPounds').between(60, 65)),
+        'state=WA&color=black': ({'state': 'WA', 'color': 'black'}, active & Attr('state').eq('WA') & Attr('color').eq('Black')),
+    }
+    patterns = {}
+    for name, (params, scan_filter) in filters.items():
+        query = listing.plan_query(dict(params, limit=str(page_size)))
+        del query['Limit']
+        patterns[f"{name}: {query['IndexName']}"] = lambda query=query: pages(lambda **p: table.query(**query, **p), page_size, page_count)
+        # What GET /dogs did before the indexes: arbitrary order, and pages come
+        # back short (or empty) once the filter drops non-matching dogs
+        patterns[f"{name}: scan"] = lambda scan_filter=scan_filter: pages(lambda **p: table.scan(FilterExpression=scan_filter, **p), page_size, page_count)
+    # The only way to get newest-first out of a scan is to read everything
+    patterns['all, sorted: full scan'] = lambda: pages(lambda **p: table.scan(FilterExpression=active, **p), 1000, sys.maxsize)
+    return patterns
+
+
+def write_cost(dog):
+    # WCUs to create one dog: the table write plus one per index holding it
+    item_kb = math.ceil(len(json.dumps(dog, default=str)) / 1024)
+    indexes = sum(1 for partition_key, sort_key in listing.INDEXES.values() if partition_key in dog and sort_key in dog)
+    return item_kb * (1 + indexes), indexes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=5, help='pages read per access pattern')
+    parser.add_argument('--endpoint-url')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch tables for another run')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+    print(f"{'dogs':>8}  {'access pattern':48} {'items':>8} {'RCUs':>10} {'RCU/item':>9}")
+    for size in args.sizes:
+        name = f"pupper-bench-{size}"
+        existing = [table.name for table in dynamodb.tables.all()]
+        table = dynamodb.Table(name) if name in existing else create_table(dynamodb, name)
+        if name not in existing:
+            seed(table, size)
+        try:
+            for pattern, run in access_patterns(table, args.page_size, args.pages).items():
+                items, units = run()
+                print(f"{size:>8}  {pattern:48} {items:>8} {units:>10.1f} {units / max(items, 1):>9.3f}")
+        finally:
+            if not args.keep:
+                table.delete()
+
+    dog = dict(synthetic_dog(random.Random(7), datetime(2023, 1, 1)), status='ACTIVE')
+    units, indexes = write_cost(dict(dog, **listing.listing_keys(dog)))
+    print(f"Creating a listed dog writes to the table and {indexes} indexes: ~{units} WCUs")
+
+
+if __name__ == "__main__":
+    main()
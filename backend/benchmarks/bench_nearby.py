@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# What GET /dogs?near= reads for a dense region (downtown Los Angeles, with a
+# large share of the dogs) and a sparse one (Billings, MT) at several radii,
+# against an in-memory copy of GeoIndex holding synthetic dogs.
+#
+#   python benchmarks/bench_nearby.py [--dogs 200000] [--radii 1 5 25 100] [--repeat 20]
+#
+# Dogs sit around the cities of backend/cities.csv, a third of them around
+# Los Angeles, plus a tenth scattered over the lower 48. nearby.find() runs
+# as it does in the API, against a client whose Query reads a key range of a
+# sorted list as DynamoDB reads a GeoIndex partition, so the times cover
+# planning, reading, the exact distances and the sort in process, but not
+# network round trips (one per query, WORKERS side by side). RCUs are
+# eventually consistent reads of the projected items, INDEX_ITEM_BYTES each,
+# in pages of up to 1 MB. Each radius reports the first page and the page
+# after it.
+#
+# For comparison: a fixed grid of precision 5 cells (about 3 miles square)
+# read whole, a query per run of cells, and reading every listed dog of the
+# state from StateIndex, whole items of DOG_ITEM_BYTES, the way a client
+# without near has to.
+import argparse
+import bisect
+import math
+import random
+import statistics
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import geo
+import listing
+import nearby
+
+INDEX_ITEM_BYTES = 110
+DOG_ITEM_BYTES = 1500
+PAGE_BYTES = 1024 * 1024
+REGIONS = {'dense': ('Los Angeles', 'CA'), 'sparse': ('Billings', 'MT')}
+LOWER_48 = (25.0, 49.0, -124.5, -67.0)
+
+
+def synthetic_dogs(count, seed=11):
+    # (geohash, id, latitude, longitude, state) of each dog
+    rng = random.Random(seed)
+    places = [(key, float(latitude), float(longitude)) for key, (latitude, longitude) in geo.cities().items()]
+    los_angeles = next(place for place in places if place[0] == geo.place_key('Los Angeles', 'CA'))
+    dogs = []
+    for n in range(count):
+        draw = rng.random()
+        if draw < 0.1:
+            latitude, longitude, state = rng.uniform(*LOWER_48[:2]), rng.uniform(*LOWER_48[2:]), None
+        else:
+            (_, state), latitude, longitude = los_angeles if draw < 0.43 else rng.choice(places)
+            spread = 20 if draw < 0.43 else 8
+            latitude += rng.gauss(0, spread / 69)
+            longitude += rng.gauss(0, spread / (69 * math.cos(math.radians(latitude))))
+        dogs.append((geo.encode(latitude, longitude), f'dog-{n:07d}', latitude, longitude, state))
+    return dogs
+
+
+def build_index(dogs):
+    # GeoIndex partition -> geohashes and dogs, in sort key order
+    partitions = {}
+    for dog in sorted(dogs):
+        geohashes, entries = partitions.setdefault(f"{listing.LISTED_STATUS}#{dog[0][:listing.GEO_PARTITION_PRECISION]}", ([], []))
+        geohashes.append(dog[0])
+        entries.append(dog)
+    return partitions
+
+
+def read_units(items, item_bytes):
+    # Eventually consistent reads of items, a page at a time
+    size = items * item_bytes
+    pages = max(1, math.ceil(size / PAGE_BYTES))
+    return sum(math.ceil(min(PAGE_BYTES, size - page * PAGE_BYTES) / 4096) / 2 for page in range(pages)) or 0.5
+
+
+class GeoIndex:
+    # The Query calls nearby.py makes, answered from partitions, counting
+    # queries, items and RCUs
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.queries, self.items, self.units = 0, 0, 0.0
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, **kwargs):
+        values = {name: nearby.deserializer.deserialize(value) for name, value in ExpressionAttributeValues.items()}
+        geohashes, entries = self.partitions.get(values[':cell'], ([], []))
+        low, high = 0, len(geohashes)
+        if 'BETWEEN' in KeyConditionExpression:
+            low, high = bisect.bisect_left(geohashes, values[':first']), bisect.bisect_right(geohashes, values[':last'])
+        elif ':first' in values:
+            low, high = bisect.bisect_left(geohashes, values[':first']), bisect.bisect_right(geohashes, values[':first'] + '~')
+        with self.lock:
+            self.queries += 1
+            self.items += high - low
+            self.units += read_units(high - low, INDEX_ITEM_BYTES)
+        return {'Items': [{'id': {'S': dog_id}, 'latitude': {'N': repr(latitude)}, 'longitude': {'N': repr(longitude)}}
+                          for _, dog_id, latitude, longitude, _ in entries[low:high]]}
+
+
+def grid_cost(partitions, latitude, longitude, radius, precision=5):
+    # (queries, RCUs) of reading a fixed grid of cells over the circle
+    ranges = geo.runs(geo.cells(latitude, longitude, radius, precision), listing.GEO_PARTITION_PRECISION)
+    units = 0.0
+    for first, last in ranges:
+        geohashes, _ = partitions.get(f"{listing.LISTED_STATUS}#{first[:listing.GEO_PARTITION_PRECISION]}", ([], []))
+        units += read_units(bisect.bisect_right(geohashes, last + '~') - bisect.bisect_left(geohashes, first), INDEX_ITEM_BYTES)
+    return len(ranges), units
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dogs', type=int, default=200000)
+    parser.add_argument('--radii', type=float, nargs='+', default=[1, 5, 25, 100])
+    parser.add_argument('--limit', type=int, default=nearby.DEFAULT_PAGE_SIZE)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    dogs = synthetic_dogs(args.dogs)
+    partitions = build_index(dogs)
+    by_state = {}
+    for dog in dogs:
+        by_state[dog[4]] = by_state.get(dog[4], 0) + 1
+    print(f"{len(dogs)} dogs in {len(partitions)} GeoIndex partitions, "
+          f"largest {max(len(geohashes) for geohashes, _ in partitions.values())}")
+
+    index = GeoIndex(partitions)
+    print(f"{'region':>7} {'miles':>6} {'found':>7} {'queries':>8} {'read':>7} {'RCUs':>7} {'p50 ms':>7} {'p99 ms':>7}"
+          f" {'next q':>7} {'next RCUs':>10} {'grid q':>7} {'grid RCUs':>10} {'state RCUs':>11}")
+    for region, (city, state) in REGIONS.items():
+        place = geo.coordinates(city, state)
+        latitude, longitude = float(place['latitude']), float(place['longitude'])
+        for radius in args.radii:
+            params = {'near': f'{latitude},{longitude}', 'radiusMiles': str(radius), 'limit': str(args.limit)}
+            found = len(nearby.find(index, dict(nearby.plan(params), limit=len(dogs)))[0])
+
+            def first_page():
+                index.reset()
+                return nearby.find(index, nearby.plan(params))
+
+            (_, cursor), p50, p99 = timed(first_page, args.repeat)
+            queries, items, units = index.queries, index.items, index.units
+            index.reset()
+            if cursor:
+                nearby.find(index, nearby.plan(dict(params, nextToken=nearby.token(cursor))))
+            grid_queries, grid_units = grid_cost(partitions, latitude, longitude, radius)
+            state_units = read_units(by_state.get(state, 0), DOG_ITEM_BYTES)
+            print(f"{region:>7} {radius:>6g} {found:>7} {queries:>8} {items:>7} {units:>7.1f} {p50:>7.2f} {p99:>7.2f}"
+                  f" {index.queries:>7} {index.units:>10.1f} {grid_queries:>7} {grid_units:>10.1f} {state_units:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
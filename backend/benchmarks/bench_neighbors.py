@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# What the neighbors job (cdk-workshop/build_neighbors.py) costs on millions
+# of likes, and what ranking a GET /feed page with its file costs per request.
+#
+#   python benchmarks/bench_neighbors.py [--users 200000] [--dogs 20000] [--likes 5000000] [--k 50]
+#
+# Likes are synthetic: dogs fall into breeds-like groups of --group-size, and
+# each user likes mostly within a couple of groups, with dog popularity
+# skewed (Zipf) inside them, so the neighbors found are the user's groups.
+# The job runs in process from the in-memory likes: reading them out of the
+# table or an export is not timed. Memory is the process peak (ru_maxrss),
+# and how far the job raised it.
+# Request time is loading the file into Neighbors once per container, then
+# ranking a user's RECENT_LIKES latest likes and dealing a page with the
+# scores from the parsed catalog, as GET /feed does.
+import argparse
+import itertools
+import random
+import resource
+import statistics
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import feed
+import neighbors
+import seen
+import similarity
+
+
+def synthetic_likes(users, dogs, count, group_size, seed=7):
+    rng = random.Random(seed)
+    groups = max(dogs // group_size, 1)
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(group_size)))
+    per_user = count // users
+    for user in range(users):
+        favourites = [rng.randrange(groups) for _ in range(2)]
+        for n in range(per_user):
+            group = rng.choice(favourites) if rng.random() < 0.8 else rng.randrange(groups)
+            dog = group * group_size + rng.choices(range(group_size), cum_weights=cumulative)[0]
+            yield f'user-{user}', f'dog-{dog % dogs:06d}', f'2024-{n:08d}'
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--dogs', type=int, default=20000)
+    parser.add_argument('--likes', type=int, default=5000000)
+    parser.add_argument('--group-size', type=int, default=100)
+    parser.add_argument('--k', type=int, default=similarity.K)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    likes = list(synthetic_likes(args.users, args.dogs, args.likes, args.group_size))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    started = time.monotonic()
+    matrix, dog_ids = similarity.like_matrix(likes)
+    built = time.monotonic()
+    indices, scores = similarity.top_neighbors(matrix, k=args.k)
+    computed = time.monotonic()
+    data = neighbors.encode(dog_ids, args.k, indices, scores)
+    encoded = time.monotonic()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"job: {matrix.nnz} likes by {matrix.shape[0]} users of {len(dog_ids)} dogs")
+    print(f"  matrix {built - started:.1f} s, neighbors {computed - built:.1f} s, encode {encoded - computed:.1f} s; "
+          f"peak memory {peak:.0f} MB ({peak - baseline:.0f} MB over the likes in memory); file {len(data) / 1e6:.1f} MB")
+
+    # Neighbors in the same group as the dog, of those it has
+    groups = [int(dog_id[4:]) // args.group_size for dog_id in dog_ids]
+    found = indices[indices != neighbors.EMPTY]
+    owners = (indices != neighbors.EMPTY).nonzero()[0]
+    same = sum(groups[owner] == groups[other] for owner, other in zip(owners[:200000], found[:200000]))
+    print(f"  {len(found) / len(dog_ids):.1f} neighbors per dog, {same / min(len(found), 200000):.0%} in the dog's group")
+
+    def load():
+        loaded = neighbors.Neighbors(data)
+        loaded.number(dog_ids[0])
+        return loaded
+
+    similar, load_ms, _ = timed(load, 1)
+    print(f"request: load and index {len(dog_ids)} ids {load_ms:.1f} ms, once per container and file")
+
+    by_user = {}
+    for user_id, dog_id, timestamp in likes:
+        by_user.setdefault(user_id, []).append((timestamp, dog_id))
+    users = list(by_user)[:args.repeat]
+    recent = [[dog_id for _, dog_id in sorted(by_user[user_id], reverse=True)[:neighbors.RECENT_LIKES]] for user_id in users]
+    dogs = [{'id': dog_id, 'createdAt': f'2024-{len(dog_ids) - n:08d}'} for n, dog_id in enumerate(sorted(dog_ids, reverse=True))]
+    empty = seen.SeenFilter()
+    position = iter(range(10 ** 9))
+
+    def page():
+        liked = recent[next(position) % len(recent)]
+        ranked = similar.rank(liked)
+        return ranked, feed.deal(dogs, empty, feed.DEFAULT_PAGE_SIZE, None, ranked)
+
+    (ranked, _), p50, p99 = timed(page, args.repeat)
+    rank_only = timed(lambda: similar.rank(recent[0]), args.repeat)
+    print(f"  rank {neighbors.RECENT_LIKES} likes: p50 {rank_only[1]:.2f} ms, p99 {rank_only[2]:.2f} ms, "
+          f"~{len(ranked)} scored dogs")
+    print(f"  rank + deal a page of {len(dogs)} dogs: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
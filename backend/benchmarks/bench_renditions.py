@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Compare the legacy process_image resize path with the cascaded rendition
+# pipeline over a directory of real uploads.
+#
+#   python benchmarks/bench_renditions.py path/to/corpus [--repeat 3]
+#
+# Every mode runs in its own interpreter so that peak RSS is not polluted by
+# the previous mode.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+MODES = ['legacy', 'pipeline', 'pipeline-draft']
+
+
+def legacy(image_data):
+    import io
+    from PIL import Image, ImageFilter
+    img = Image.open(io.BytesIO(image_data))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    standard = img.resize((400, 400), Image.Resampling.LANCZOS)
+    thumbnail = img.resize((50, 50), Image.Resampling.LANCZOS).filter(ImageFilter.SHARPEN)
+    return standard, thumbnail
+
+
+def pipeline(image_data, draft):
+    import images
+    min_size = images.minimum_source_size() if draft else None
+    img = images.decode(image_data, min_size=min_size)
+    return list(images.resize_all(img))
+
+
+def run_mode(mode, paths, repeat):
+    import images
+    results = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            image_data = f.read()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if mode == 'legacy':
+                legacy(image_data)
+            else:
+                pipeline(image_data, draft=(mode == 'pipeline-draft'))
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append({'file': os.path.basename(path), 'bestMs': round(min(timings), 2)})
+    return {'mode': mode, 'peakRssMb': round(images.peak_rss_mb(), 1), 'files': results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
+    )
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, paths, args.repeat)))
+        return
+
+    reports = {}
+    for mode in MODES:
+        output = subprocess.check_output([sys.executable, __file__, args.corpus, '--repeat', str(args.repeat), '--mode', mode])
+        reports[mode] = json.loads(output)
+
+    print(f"{'file':40} " + ' '.join(f"{mode:>16}" for mode in MODES))
+    for i, path in enumerate(paths):
+        row = ' '.join(f"{reports[mode]['files'][i]['bestMs']:>14.1f}ms" for mode in MODES)
+        print(f"{os.path.basename(path)[:40]:40} {row}")
+    totals = ' '.join(f"{sum(f['bestMs'] for f in reports[mode]['files']):>14.1f}ms" for mode in MODES)
+    print(f"{'total':40} {totals}")
+    peaks = ' '.join(f"{reports[mode]['peakRssMb']:>14.1f}MB" for mode in MODES)
+    print(f"{'peak RSS':40} {peaks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# GET /dogs/search lookup latency against a search index of synthetic dogs,
+# read the way a warm Lambda reads it: from a memory-mapped file.
+#
+#   python benchmarks/bench_search.py [--dogs 100000] [--repeat 200]
+#
+# Also reports the index size, the time to build it from scratch and to apply
+# a batch of stream updates, and the cold load time (open + mmap + header).
+import argparse
+import mmap
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import search
+
+NAMES = ['Max', 'Bella', 'Charlie', 'Luna', 'Rocky', 'Daisy', 'Cooper', 'Sadie', 'Bear', 'Molly', 'Tucker', 'Bailey',
+         'Duke', 'Maggie', 'Buddy', 'Lucy', 'Jack', 'Sophie', 'Murphy', 'Rosie', 'Zeus', 'Penny', 'Ollie', 'Ruby']
+CITIES = ['Seattle', 'Portland', 'Denver', 'Austin', 'Phoenix', 'San Diego', 'Boise', 'Spokane', 'Tacoma', 'Eugene',
+          'Salem', 'Tucson', 'Dallas', 'Houston', 'Reno', 'Fresno', 'Bend', 'Olympia', 'Boulder', 'El Paso']
+ADJECTIVES = ['friendly', 'sweet', 'energetic', 'gentle', 'playful', 'calm', 'loyal', 'shy', 'goofy', 'smart',
+              'strong', 'senior', 'young', 'happy', 'curious', 'cuddly', 'quiet', 'active', 'patient', 'silly']
+PHRASES = ['loves fetch', 'loves swimming', 'great with kids', 'good with cats', 'house trained', 'knows sit and stay',
+           'enjoys long walks', 'needs a fenced yard', 'likes car rides', 'plays well with other dogs',
+           'perfect family companion', 'loves outdoor adventures', 'crate trained', 'walks nicely on a leash',
+           'still learning manners', 'adores belly rubs', 'retrieves anything', 'would love a running partner']
+COLORS = ['yellow', 'black', 'chocolate']
+
+QUERIES = ['max', 'yellow', 'swimming', 'kids cats', 'friendly yellow lab', 'seattle', 'sea', 'lo', 'play',
+           'gentle senior black', 'loves fetch portland', 'nonexistentword', 'b']
+
+
+def synthetic_dog(rng, created_at):
+    # A few thousand distinct names keep the term table realistic
+    description = f"{rng.choice(ADJECTIVES).capitalize()} {rng.choice(COLORS)} lab who {rng.choice(PHRASES)}. " \
+                  f"{rng.choice(ADJECTIVES).capitalize()} and {rng.choice(PHRASES)}, {rng.choice(PHRASES)}."
+    return {
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'name': f"{rng.choice(NAMES)}{rng.randrange(200) if rng.random() < 0.5 else ''}",
+        'city': rng.choice(CITIES),
+        'description': description,
+        'status': 'ACTIVE',
+        'createdAt': created_at.isoformat(),
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dogs', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200, help='lookups timed per query')
+    parser.add_argument('--updates', type=int, default=100, help='dogs in the stream update batch')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    start = datetime(2023, 1, 1)
+    dogs = [synthetic_dog(rng, start + timedelta(minutes=i)) for i in range(args.dogs)]
+
+    started = time.perf_counter()
+    data = search.build(dogs)
+    build_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dogs.idx')
+        with open(path, 'wb') as f:
+            f.write(data)
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index = search.SearchIndex(mapped)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        print(f"{args.dogs} dogs: {index.term_count} terms, index {len(data) / 1024 / 1024:.2f} MiB "
+              f"({len(data) / args.dogs:.0f} B/dog), built in {build_seconds:.1f}s, mapped in {load_ms:.2f} ms")
+        print(f"{'query':24} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        worst = 0.0
+        for query in QUERIES:
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                _, total = index.search(query, limit=20)
+                samples.append((time.perf_counter() - started) * 1000)
+            worst = max(worst, percentile(samples, 0.99))
+            print(f"{query:24} {total:>8} {statistics.median(samples):>8.3f} {percentile(samples, 0.99):>8.3f} {max(samples):>8.3f}")
+        print(f"Worst p99: {worst:.2f} ms")
+
+        upserts = {dog['id']: dog for dog in (synthetic_dog(rng, start + timedelta(minutes=args.dogs)) for _ in range(args.updates))}
+        started = time.perf_counter()
+        search.apply(index, upserts, [])
+        print(f"Applying {args.updates} new dogs: {time.perf_counter() - started:.2f}s")
+        started = time.perf_counter()
+        search.apply(index, {}, [dogs[0]['id']])
+        print(f"Removing 1 dog (renumbers): {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# What view=summary and fields= save on a GET /dogs page against view=detail:
+# bytes DynamoDB sends back, read capacity, Lambda time to deserialize and
+# serialize the page, and response size.
+#
+# Read capacity: a page is a query on a listing index, charged for the index
+# entries it reads, which hold what a summary is built from
+# (views.INDEXED_ATTRIBUTES). Shapes the entries can't answer read the dogs
+# too, through the dog cache: the dogs column is a cold container's
+# BatchGetItem, charged per whole item; a warm one reads nothing. "whole
+# dogs" is what every shape cost when the indexes held whole dogs.
+#
+#   python benchmarks/bench_views.py [--page-size 20 100] [--repeat 200]
+#
+# Items are the realistic dog record from bench_like_summaries.py with varied
+# names and descriptions. Times cover what the Lambda does per page: boto3's
+# deserialization of the typed items, photo negotiation, shaping, json.dumps.
+import argparse
+import copy
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+import images
+import listing
+import views
+from bench_like_summaries import item_size, sample_dog
+
+lam = importlib.import_module('lambda')
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def page_of(page_size):
+    dogs = []
+    for n in range(page_size):
+        dog = sample_dog()
+        dog.update({'id': f"{dog['id'][:-4]}{n:04d}", 'name': f"Dog {n}", 'description': dog['description'] * (1 + n % 3),
+                    'likeCount': n * 7, 'dislikeCount': n})
+        dog['cardPhotos'] = images.card_photos(dog['renditions'], dog['photoFormats'], dog['originalPhoto'].rsplit('/', 1)[0])
+        dogs.append(dog)
+    return dogs
+
+
+def index_entry(dog):
+    # The dog as StatusCreatedAtIndex holds it
+    return {name: dog[name] for name in views.INDEXED_ATTRIBUTES + listing.INDEXES['StatusCreatedAtIndex'] if name in dog}
+
+
+def query_units(size):
+    # A Query is charged on the summed size of the entries it reads, whatever
+    # the projection: 4 KB per half unit, eventually consistent
+    return -(-size // 4096) / 2
+
+
+def project(dog, fields):
+    return dog if fields is None else {name: dog[name] for name in views.attributes(fields) if name in dog}
+
+
+def serve(typed_items, fields):
+    # The GET /dogs work on one page of typed items, as the query returns them
+    items = [{name: deserializer.deserialize(value) for name, value in item.items()} for item in typed_items]
+    for item in items:
+        images.negotiate_photos(item, 'webp')
+    return json.dumps({'dogs': [views.shape(item, fields) for item in items]}, cls=lam.DecimalEncoder)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--page-size', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    shapes = {'view=detail': None, 'view=summary': views.SUMMARY_FIELDS, 'fields=name,photo,city,state': ('id', 'name', 'photo', 'city', 'state')}
+    print(f"{'page':>5}  {'shape':30} {'index B':>8} {'RCU':>6} {'dogs RCU':>9} {'whole dogs':>11} {'returned B':>11} {'response B':>11} {'Lambda ms':>10}")
+    for page_size in args.page_size:
+        dogs = page_of(page_size)
+        stored = sum(item_size(dog) for dog in dogs)
+        indexed = sum(item_size(index_entry(dog)) for dog in dogs)
+        for name, fields in shapes.items():
+            from_index = fields is not None and all(field in views.SUMMARY_FIELDS for field in fields)
+            # BatchGetItem rounds each item up to 4 KB
+            dogs_rcu = 0 if from_index else sum(-(-item_size(dog) // 4096) / 2 for dog in dogs)
+            projected = [project(dog, fields) for dog in dogs]
+            typed = [{key: serializer.serialize(value) for key, value in dog.items()} for dog in projected]
+            samples = []
+            for _ in range(args.repeat):
+                batch = copy.deepcopy(typed)
+                started = time.perf_counter()
+                body = serve(batch, fields)
+                samples.append((time.perf_counter() - started) * 1000)
+            returned = sum(item_size(dog) for dog in projected)
+            print(f"{page_size:>5}  {name:30} {indexed:>8} {query_units(indexed):>6.1f} {dogs_rcu:>9.1f} {query_units(stored):>11.1f} "
+                  f"{returned:>11} {len(body):>11} {statistics.median(samples):>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+import copy
+import hashlib
+import io
+import json
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+import views
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class FakeS3:
+    # In-memory stand-in for the handful of S3 client calls the Lambda makes
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body=b'', IfNoneMatch=None, **kwargs):
+        with self.lock:
+            self.calls.append(('put_object', Key))
+            if IfNoneMatch == '*' and (Bucket, Key) in self.objects:
+                raise client_error('PreconditionFailed', 'PutObject')
+            data = Body.read() if hasattr(Body, 'read') else Body
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+            self.objects[(Bucket, Key)] = {'Body': data, 'ETag': etag, 'LastModified': datetime.now(timezone.utc), **kwargs}
+        return {'ETag': etag}
+
+    def head_object(self, Bucket, Key):
+        with self.lock:
+            self.calls.append(('head_object', Key))
+            if (Bucket, Key) not in self.objects:
+                raise client_error('404', 'HeadObject')
+            obj = self.objects[(Bucket, Key)]
+            return {'ContentLength': len(obj['Body']), 'LastModified': obj['LastModified']}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        with self.lock:
+            self.calls.append(('get_object', Key))
+            if (Bucket, Key) not in self.objects:
+                raise client_error('NoSuchKey', 'GetObject')
+            obj = self.objects[(Bucket, Key)]
+            if IfNoneMatch and IfNoneMatch == obj.get('ETag'):
+                raise client_error('304', 'GetObject')
+            return {'Body': io.BytesIO(obj['Body']), 'ContentLength': len(obj['Body']), 'ETag': obj.get('ETag', '""')}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        with self.lock:
+            self.calls.append(('copy_object', Key))
+            source = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+            self.objects[(Bucket, Key)] = dict(source, LastModified=datetime.now(timezone.utc))
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        with self.lock:
+            self.calls.append(('delete_object', Key))
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+
+
+class Expression:
+    # Recursive-descent evaluator for the DynamoDB expression subset the Lambda
+    # uses: comparisons, BETWEEN, IN, AND/OR/NOT, parentheses, attribute_exists,
+    # attribute_not_exists, begins_with and contains
+    TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),]|[#:]?[A-Za-z0-9_.]+)')
+
+    def __init__(self, text, names=None, values=None):
+        self.tokens = self.TOKEN.findall(text)
+        self.names = names or {}
+        self.values = values or {}
+
+    def evaluate(self, item):
+        self.item, self.pos = item, 0
+        result = self.disjunction()
+        assert self.pos == len(self.tokens), self.tokens[self.pos:]
+        return result
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.tokens[self.pos]
+        assert expected is None or token.upper() == expected, (token, expected)
+        self.pos += 1
+        return token
+
+    def disjunction(self):
+        result = self.conjunction()
+        while (self.peek() or '').upper() == 'OR':
+            self.take()
+            result = self.conjunction() or result
+        return result
+
+    def conjunction(self):
+        result = self.negation()
+        while (self.peek() or '').upper() == 'AND':
+            self.take()
+            result = self.negation() and result
+        return result
+
+    def negation(self):
+        if (self.peek() or '').upper() == 'NOT':
+            self.take()
+            return not self.negation()
+        return self.comparison()
+
+    def comparison(self):
+        if self.peek() == '(':
+            self.take()
+            result = self.disjunction()
+            self.take(')')
+            return result
+        if self.tokens[self.pos + 1:self.pos + 2] == ['(']:
+            return self.function()
+        left = self.operand()
+        op = self.take().upper()
+        if op == 'BETWEEN':
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return left is not None and low <= left <= high
+        if op == 'IN':
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return left in options
+        right = self.operand()
+        if left is None or right is None:
+            return op == '<>' and left != right
+        return {'=': left == right, '<>': left != right, '<': left < right, '>': left > right, '<=': left <= right, '>=': left >= right}[op]
+
+    def function(self):
+        name = self.take()
+        self.take('(')
+        path = self.take()
+        args = []
+        while self.peek() == ',':
+            self.take()
+            args.append(self.operand())
+        self.take(')')
+        value = self.resolve(path)
+        if name == 'attribute_exists':
+            return value is not None
+        if name == 'attribute_not_exists':
+            return value is None
+        if name == 'begins_with':
+            return isinstance(value, str) and value.startswith(args[0])
+        if name == 'contains':
+            return value is not None and args[0] in value
+        raise NotImplementedError(name)
+
+    def operand(self):
+        token = self.take()
+        if token.startswith(':'):
+            return self.values[token]
+        return self.resolve(token)
+
+    def resolve(self, path):
+        value = self.item
+        for part in path.split('.'):
+            part = self.names.get(part, part)
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+def to_dynamo(value):
+    # DynamoDB hands every number back as a Decimal, and boto3 refuses floats
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    if isinstance(value, set):
+        return {to_dynamo(v) for v in value}
+    return value
+
+
+def condition_text(condition, names, values, is_key_condition=False):
+    # Accepts both expression strings and boto3.dynamodb.conditions objects
+    if condition is None or isinstance(condition, str):
+        return condition
+    built = ConditionExpressionBuilder().build_expression(condition, is_key_condition=is_key_condition)
+    names.update(built.attribute_name_placeholders)
+    values.update(built.attribute_value_placeholders)
+    return built.condition_expression
+
+
+class FakeTable:
+    # In-memory stand-in for a boto3 DynamoDB Table resource. Every call is
+    # counted in self.calls and read_units approximates consumed RCUs. Indexes
+    # named in projections hold only their keys and those attributes, as an
+    # INCLUDE projection does. With streamed set, writes are kept as stream
+    # records in self.stream.
+    def __init__(self, name, key_schema, indexes=None, projections=None, streamed=False):
+        self.name = name
+        self.key_schema = key_schema
+        self.indexes = indexes or {}
+        self.projections = projections or {}
+        self.items = {}
+        self.calls = []
+        self.streamed = streamed
+        self.stream = []
+        self.read_units = 0.0
+        self.lock = threading.Lock()
+
+    def key_of(self, item, schema=None):
+        return tuple(item[name] for name in (schema or self.key_schema))
+
+    def indexed(self, item, index_name):
+        # What index_name holds of item
+        if index_name not in self.projections:
+            return item
+        names = set(self.key_schema) | set(self.indexes[index_name]) | set(self.projections[index_name])
+        return {name: value for name, value in item.items() if name in names}
+
+    def record(self, old, new):
+        if self.streamed and (old or new):
+            self.stream.append(stream_record('MODIFY' if old and new else 'INSERT' if new else 'REMOVE',
+                                             new=copy.deepcopy(new), old=copy.deepcopy(old), keys=self.key_schema))
+
+    def drain_stream(self):
+        with self.lock:
+            records, self.stream = self.stream, []
+        return records
+
+    @staticmethod
+    def item_units(item):
+        return max(1, len(json.dumps(item, default=str)) / 4096.0)
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        with self.lock:
+            self.calls.append('put_item')
+            names, values = dict(ExpressionAttributeNames or {}), dict(ExpressionAttributeValues or {})
+            expression = condition_text(ConditionExpression, names, values)
+            existing = self.items.get(self.key_of(Item), {})
+            if expression and not Expression(expression, names, values).evaluate(existing):
+                raise client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[self.key_of(Item)] = to_dynamo(copy.deepcopy(Item))
+            self.record(existing, self.items[self.key_of(Item)])
+        return {}
+
+    @contextmanager
+    def batch_writer(self, overwrite_by_pkeys=None):
+        yield self
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        with self.lock:
+            self.calls.append('get_item')
+            item = self.items.get(self.key_of(Key))
+            if item is None:
+                return {}
+            self.read_units += self.item_units(item) / 2
+            return {'Item': self.project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def delete_item(self, Key, **kwargs):
+        with self.lock:
+            self.calls.append('delete_item')
+            self.record(self.items.pop(self.key_of(Key), None), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues=None, **kwargs):
+        with self.lock:
+            self.calls.append('update_item')
+            names, values = dict(ExpressionAttributeNames or {}), to_dynamo(dict(ExpressionAttributeValues or {}))
+            expression = condition_text(ConditionExpression, names, values)
+            existing = self.items.get(self.key_of(Key))
+            if expression and not Expression(expression, names, values).evaluate(existing or {}):
+                raise client_error('ConditionalCheckFailedException', 'UpdateItem')
+            item = copy.deepcopy(existing) if existing else to_dynamo(dict(Key))
+            for action, clauses in re.findall(r'(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s|$)', UpdateExpression):
+                for clause in re.split(r',\s*(?![^()]*\))', clauses):
+                    clause = clause.strip()
+                    if action == 'SET':
+                        path, value = [part.strip() for part in clause.split('=', 1)]
+                        item[names.get(path, path)] = self.set_value(value, item, names, values)
+                    elif action == 'ADD':
+                        path, value = clause.split()
+                        attribute = names.get(path, path)
+                        item[attribute] = item.get(attribute, 0) + values[value]
+                    else:
+                        item.pop(names.get(clause, clause), None)
+            self.items[self.key_of(Key)] = item
+            self.record(existing, item)
+            return {'Attributes': copy.deepcopy(item)} if ReturnValues else {}
+
+    @staticmethod
+    def set_value(value, item, names, values):
+        # value, if_not_exists(path, value) or path + value
+        match = re.match(r'if_not_exists\((\S+?),\s*(\S+?)\)$', value)
+        if match:
+            attribute = names.get(match.group(1), match.group(1))
+            return item[attribute] if attribute in item else values[match.group(2)]
+        if '+' in value or ' - ' in value:
+            op = '+' if '+' in value else '-'
+            left, right = [part.strip() for part in value.split(op)]
+            left = values[left] if left.startswith(':') else item.get(names.get(left, left), 0)
+            right = values[right] if right.startswith(':') else item.get(names.get(right, right), 0)
+            return left + right if op == '+' else left - right
+        return copy.deepcopy(values[value])
+
+    @staticmethod
+    def project(item, projection, names):
+        if not projection:
+            return item
+        names = names or {}
+        attributes = [names.get(part.strip(), part.strip()) for part in projection.split(',')]
+        return {name: item[name] for name in attributes if name in item}
+
+    def page(self, candidates, schema, Limit=None, ExclusiveStartKey=None, FilterExpression=None, ProjectionExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None, Select=None, **kwargs):
+        names, values = dict(ExpressionAttributeNames or {}), dict(ExpressionAttributeValues or {})
+        expression = condition_text(FilterExpression, names, values)
+        if ExclusiveStartKey is not None:
+            start = self.key_of(ExclusiveStartKey, schema)
+            keys = [self.key_of(item, schema) for item in candidates]
+            candidates = candidates[keys.index(start) + 1:] if start in keys else []
+        evaluated = candidates[:Limit] if Limit else candidates
+        units = sum(self.item_units(item) for item in evaluated) / 2
+        self.read_units += units
+        matched = [item for item in evaluated if not expression or Expression(expression, names, values).evaluate(item)]
+        response = {
+            'Items': [self.project(copy.deepcopy(item), ProjectionExpression, names) for item in matched],
+            'Count': len(matched), 'ScannedCount': len(evaluated),
+            'ConsumedCapacity': {'TableName': self.name, 'CapacityUnits': units},
+        }
+        if Select == 'COUNT':
+            del response['Items']
+        if Limit and len(candidates) > Limit:
+            response['LastEvaluatedKey'] = {name: evaluated[-1][name] for name in dict.fromkeys(list(schema) + list(self.key_schema))}
+        return response
+
+    def scan(self, Segment=None, TotalSegments=None, IndexName=None, **kwargs):
+        with self.lock:
+            self.calls.append('scan')
+            schema = self.indexes[IndexName] if IndexName else self.key_schema
+            candidates = [self.indexed(item, IndexName) for item in self.items.values() if all(name in item for name in schema)]
+            if TotalSegments:
+                candidates = [item for item in candidates if hash(self.key_of(item)) % TotalSegments == Segment]
+            return self.page(candidates, schema, **kwargs)
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        with self.lock:
+            self.calls.append('query')
+            schema = self.indexes[IndexName] if IndexName else self.key_schema
+            names, values = dict(ExpressionAttributeNames or {}), dict(ExpressionAttributeValues or {})
+            expression = Expression(condition_text(KeyConditionExpression, names, values, is_key_condition=True), names, values)
+            candidates = [self.indexed(item, IndexName) for item in self.items.values() if all(name in item for name in schema) and expression.evaluate(item)]
+            candidates.sort(key=lambda item: tuple(item[name] for name in schema[1:]) + self.key_of(item), reverse=not ScanIndexForward)
+            return self.page(candidates, schema, ExpressionAttributeNames=names, ExpressionAttributeValues=values, **kwargs)
+
+
+class FakeDynamoDB:
+    # Stand-in for boto3.resource('dynamodb') holding the app's tables
+    def __init__(self):
+        self.tables = {
+            'pupper-dogs': FakeTable('pupper-dogs', ['id'], {
+                'StatusCreatedAtIndex': ['status', 'createdAt'],
+                'StateIndex': ['statusState', 'createdAt'],
+                'StateCityIndex': ['statusState', 'cityCreatedAt'],
+                'ColorIndex': ['statusColor', 'createdAt'],
+                'WeightIndex': ['status', 'weightInPounds'],
+                'PopularityIndex': ['status', 'likeCount'],
+                'GeoIndex': ['geoCell', 'geohash'],
+            }, projections={
+                'StatusCreatedAtIndex': views.INDEXED_ATTRIBUTES,
+                'StateIndex': views.INDEXED_ATTRIBUTES,
+                'StateCityIndex': views.INDEXED_ATTRIBUTES,
+                'ColorIndex': views.INDEXED_ATTRIBUTES,
+                'WeightIndex': views.INDEXED_ATTRIBUTES,
+                'PopularityIndex': views.INDEXED_ATTRIBUTES,
+                'GeoIndex': ['latitude', 'longitude', 'statusColor', 'weightInPounds'],
+            }),
+            'pupper-interactions': FakeTable('pupper-interactions', ['userId', 'dogId'], {
+                'LikesByTimeIndex': ['likedBy', 'timestamp'],
+                'LikesByDogIndex': ['dogId', 'likedBy'],
+            }),
+            'pupper-photo-hashes': FakeTable('pupper-photo-hashes', ['hashKey', 'sha256']),
+            'pupper-dog-counters': FakeTable('pupper-dog-counters', ['dogId', 'shard'], streamed=True),
+        }
+        self.meta = SimpleNamespace(client=FakeDynamoDBClient(self))
+
+    def Table(self, name):
+        return self.tables[name]
+
+
+class FakeDynamoDBClient:
+    # The low-level client behind FakeDynamoDB.meta.client, which takes and
+    # returns typed attribute values. Set unprocessed_rounds to have that many
+    # calls process only half their keys, or throttle a put, as a throttled
+    # table would.
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self.unprocessed_rounds = 0
+        self.lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise client_error('ValidationException', 'BatchGetItem')
+        with self.lock:
+            throttled = self.unprocessed_rounds > 0
+            self.unprocessed_rounds -= throttled
+        responses, unprocessed = {}, {}
+        for name, request in RequestItems.items():
+            table = self.dynamodb.tables[name]
+            keys = [{attribute: deserializer.deserialize(value) for attribute, value in key.items()} for key in request['Keys']]
+            if len({table.key_of(key) for key in keys}) < len(keys):
+                raise client_error('ValidationException', 'BatchGetItem')
+            if throttled:
+                keys, rest = keys[:len(keys) // 2], request['Keys'][len(keys) // 2:]
+                unprocessed[name] = dict(request, Keys=rest)
+            with table.lock:
+                table.calls.append('batch_get_item')
+                items = [table.items[table.key_of(key)] for key in keys if table.key_of(key) in table.items]
+                table.read_units += sum(table.item_units(item) for item in items) / 2
+                items = [table.project(copy.deepcopy(item), request.get('ProjectionExpression'), request.get('ExpressionAttributeNames')) for item in items]
+            responses[name] = [{attribute: serializer.serialize(value) for attribute, value in item.items()} for item in items]
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def put_item(self, TableName, Item, ExpressionAttributeValues=None, **kwargs):
+        with self.lock:
+            throttled = self.unprocessed_rounds > 0
+            self.unprocessed_rounds -= throttled
+        if throttled:
+            raise client_error('ProvisionedThroughputExceededException', 'PutItem')
+        values = {name: deserializer.deserialize(value) for name, value in (ExpressionAttributeValues or {}).items()}
+        item = {name: deserializer.deserialize(value) for name, value in Item.items()}
+        return self.dynamodb.tables[TableName].put_item(Item=item, ExpressionAttributeValues=values, **kwargs)
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues=None, ReturnValues=None, **kwargs):
+        table = self.dynamodb.tables[TableName]
+        values = {name: deserializer.deserialize(value) for name, value in (ExpressionAttributeValues or {}).items()}
+        response = table.update_item(Key={name: deserializer.deserialize(value) for name, value in Key.items()}, ExpressionAttributeValues=values, ReturnValues=ReturnValues, **kwargs)
+        if 'Attributes' in response:
+            response['Attributes'] = {name: serializer.serialize(value) for name, value in response['Attributes'].items()}
+        return response
+
+    def scan(self, TableName, ExclusiveStartKey=None, ReturnConsumedCapacity=None, **kwargs):
+        table = self.dynamodb.tables[TableName]
+        if ExclusiveStartKey:
+            kwargs['ExclusiveStartKey'] = {name: deserializer.deserialize(value) for name, value in ExclusiveStartKey.items()}
+        response = table.scan(**kwargs)
+        response['Items'] = [{name: serializer.serialize(value) for name, value in item.items()} for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = {name: serializer.serialize(value) for name, value in response['LastEvaluatedKey'].items()}
+        return response
+
+    def query(self, TableName, ExpressionAttributeValues=None, ExclusiveStartKey=None, **kwargs):
+        table = self.dynamodb.tables[TableName]
+        values = {name: deserializer.deserialize(value) for name, value in (ExpressionAttributeValues or {}).items()}
+        if ExclusiveStartKey:
+            kwargs['ExclusiveStartKey'] = {name: deserializer.deserialize(value) for name, value in ExclusiveStartKey.items()}
+        response = table.query(ExpressionAttributeValues=values, **kwargs)
+        response['Items'] = [{name: serializer.serialize(value) for name, value in item.items()} for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = {name: serializer.serialize(value) for name, value in response['LastEvaluatedKey'].items()}
+        return response
+
+
+class FakeSQS:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.messages.append({'QueueUrl': QueueUrl, 'Body': MessageBody})
+        return {'MessageId': str(uuid.uuid4())}
+
+    def drain(self, receive_count=1):
+        # Pops every queued message as an SQS Lambda event
+        records = [
+            {'messageId': str(uuid.uuid4()), 'body': message['Body'], 'attributes': {'ApproximateReceiveCount': str(receive_count)}}
+            for message in self.messages
+        ]
+        self.messages = []
+        return {'Records': records}
+
+
+def stream_record(event_name, new=None, old=None, keys=('id',)):
+    # A DynamoDB stream record for a change to an item, by default a pupper-dogs one
+    item = new or old
+    record = {'eventName': event_name, 'dynamodb': {'Keys': {name: serializer.serialize(item[name]) for name in keys}}}
+    for name, item in (('NewImage', new), ('OldImage', old)):
+        if item:
+            record['dynamodb'][name] = {key: serializer.serialize(value) for key, value in item.items()}
+    return record
+
+
+class FakeRekognition:
+    def __init__(self, labels=('Dog', 'Labrador Retriever')):
+        self.labels = list(labels)
+        self.calls = []
+
+    def detect_labels(self, Image, **kwargs):
+        self.calls.append(Image)
+        return {'Labels': [{'Name': name, 'Confidence': 99.0} for name in self.labels]}
+
+
+class FakeAWS:
+    # Routes boto3.client()/boto3.resource() to the fakes above:
+    #   aws = FakeAWS(); aws.install(monkeypatch)
+    def __init__(self):
+        self.s3 = FakeS3()
+        self.dynamodb = FakeDynamoDB()
+        self.sqs = FakeSQS()
+        self.rekognition = FakeRekognition()
+
+    def client(self, service, *args, **kwargs):
+        return getattr(self, service)
+
+    def resource(self, service, *args, **kwargs):
+        return getattr(self, service)
+
+    def install(self, monkeypatch):
+        import boto3
+        monkeypatch.setattr(boto3, 'client', self.client)
+        monkeypatch.setattr(boto3, 'resource', self.resource)
+        # Fresh tables mean a cold container: nothing cached from another test
+        import dog_cache
+        dog_cache.default_cache.cache_clear()
@@ -0,0 +1,120 @@
+import gzip
+import importlib
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import catalog
+import catalog_materializer
+import images
+import ingest
+from decimal import Decimal
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+BUCKET = 'pupper-photos-957798448417'
+
+def dog(dog_id, created_at, **fields):
+    base_url = f"https://{BUCKET}.s3.us-east-1.amazonaws.com/{dog_id}"
+    photo_formats = {'standard': {'png': f"{base_url}/standard-400.png", 'webp': f"{base_url}/standard-400.webp"}}
+    return {
+        'id': dog_id, 'name': dog_id.title(), 'city': 'Seattle', 'state': 'WA', 'status': 'ACTIVE', 'createdAt': created_at,
+        'weightInPounds': Decimal(70), 'shelter': 'Golden Paws', 'likeCount': Decimal(3),
+        'photo': f"{base_url}/standard-400.png", 'thumbnailPhoto': f"{base_url}/thumbnail-50.png",
+        'photoFormats': photo_formats, 'cardPhotos': images.card_photos({}, photo_formats, base_url),
+        **fields,
+    }
+
+DOGS = [dog('max', '2024-01-01'), dog('bella', '2024-01-02'), dog('luna', '2024-01-03'), dog('rocky', '2024-01-04', status='PENDING')]
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    ingest.s3_client.cache_clear()
+    monkeypatch.setattr(catalog, '_loaded', {'pointer': None, 'etag': None, 'checked': 0.0, 'bodies': {}, 'dogs': {}})
+    yield aws
+    ingest.s3_client.cache_clear()
+
+def published(aws, dogs=DOGS, now=None):
+    entries = catalog.ordered(entry for entry in map(catalog.entry, dogs) if entry)
+    return catalog.publish(aws.s3, BUCKET, entries, catalog.read_pointer(aws.s3, BUCKET), now=now)
+
+def snapshot_file(aws, version, image_format=None):
+    return json.loads(gzip.decompress(aws.s3.objects[(BUCKET, catalog.file_key(version, image_format))]['Body']))
+
+def get_dogs(params, **request_headers):
+    return lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': params, 'headers': request_headers}, None)
+
+def test_snapshot_holds_listed_dogs_newest_first(aws):
+    pointer = published(aws)
+    assert pointer['count'] == 3
+    dogs = snapshot_file(aws, pointer['version'], 'webp')['dogs']
+    assert [dog['id'] for dog in dogs] == ['luna', 'bella', 'max']
+    # Summary fields with photos negotiated, no shelter and no counts
+    assert dogs[0]['photo'].endswith('standard-400.webp') and dogs[0]['weightInPounds'] == 70
+    assert 'shelter' not in dogs[0] and 'likeCount' not in dogs[0] and 'photoFormats' not in dogs[0]
+    assert snapshot_file(aws, pointer['version'], 'png')['dogs'][0]['photo'].endswith('standard-400.png')
+    assert aws.s3.objects[(BUCKET, catalog.file_key(pointer['version'], 'webp'))]['ContentEncoding'] == 'gzip'
+
+def test_same_contents_same_version(aws):
+    pointer = published(aws)
+    writes = len(aws.s3.calls)
+    # Count changes don't make a new snapshot
+    assert published(aws, [dict(item, likeCount=Decimal(9)) for item in DOGS]) == pointer
+    assert len(aws.s3.calls) == writes + 1
+    assert published(aws, DOGS[1:])['version'] != pointer['version']
+
+def test_superseded_versions_are_deleted_later(aws):
+    first = published(aws, now=1000)
+    second = published(aws, DOGS[1:], now=1000 + 60)
+    assert (BUCKET, catalog.file_key(first['version'], 'webp')) in aws.s3.objects
+    assert second['retired'] == [{'version': first['version'], 'retiredAt': 1060}]
+    published(aws, DOGS[2:], now=1060 + catalog.RETIRE_AFTER_SECONDS)
+    assert (BUCKET, catalog.file_key(first['version'], 'webp')) not in aws.s3.objects
+    assert (BUCKET, catalog.file_key(second['version'], 'webp')) in aws.s3.objects
+
+def test_materializer_applies_stream_changes(aws):
+    published(aws)
+    rocky, luna = dict(DOGS[3], status='ACTIVE'), DOGS[2]
+    event = {'Records': [
+        # Rocky is listed, Luna is renamed, Max is deleted
+        stream_record('MODIFY', new=rocky, old=DOGS[3]),
+        stream_record('MODIFY', new=dict(luna, name='Lulu'), old=luna),
+        stream_record('REMOVE', old=DOGS[0]),
+        # Count changes leave the snapshot alone
+        stream_record('MODIFY', new=dict(DOGS[1], likeCount=Decimal(4)), old=DOGS[1]),
+    ]}
+    assert catalog_materializer.handler(event, None) == {'upserts': 2, 'deletes': 1}
+    pointer = catalog.read_pointer(aws.s3, BUCKET)
+    dogs = snapshot_file(aws, pointer['version'], 'avif')['dogs']
+    assert [(dog['id'], dog['name']) for dog in dogs] == [('rocky', 'Rocky'), ('luna', 'Lulu'), ('bella', 'Bella')]
+    assert catalog_materializer.handler({'Records': event['Records'][3:]}, None) == {'upserts': 0, 'deletes': 0}
+
+def test_get_dogs_redirects_to_snapshot(aws):
+    assert get_dogs({'snapshot': 'redirect'})['statusCode'] == 404
+    catalog._loaded['checked'] = 0.0
+    pointer = published(aws)
+    response = get_dogs({'snapshot': 'redirect'}, Accept='application/json, image/webp')
+    assert response['statusCode'] == 302
+    assert response['headers']['Location'].endswith(catalog.file_key(pointer['version'], 'webp'))
+    assert response['headers']['ETag'] == f'"{pointer["version"]}-webp"'
+    # Served from the container's copy of the pointer, with no table read
+    assert aws.dynamodb.Table('pupper-dogs').calls == []
+    response = get_dogs({'snapshot': 'redirect'}, **{'Accept': 'image/webp', 'If-None-Match': response['headers']['ETag']})
+    assert response['statusCode'] == 304
+    assert get_dogs({'snapshot': 'yes'})['statusCode'] == 400
+
+def test_get_dogs_serves_snapshot_inline(aws):
+    pointer = published(aws)
+    response = get_dogs({'snapshot': 'inline'})
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['version'] == pointer['version'] and body['format'] == 'png'
+    assert [dog['id'] for dog in body['dogs']] == ['luna', 'bella', 'max']
+    # A new version is picked up once the container's copy is stale
+    published(aws, DOGS[1:])
+    catalog._loaded['checked'] = 0.0
+    assert [dog['id'] for dog in json.loads(get_dogs({'snapshot': 'inline'})['body'])['dogs']] == ['luna', 'bella']
@@ -0,0 +1,135 @@
+import importlib
+import json
+import random
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import counter_aggregator
+import counter_flusher
+import counters
+import likes
+import listing
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    for i in range(20):
+        dog = {'id': f'dog-{i:02d}', 'name': f'Dog {i}', 'status': 'ACTIVE', 'createdAt': f'2024-01-{i + 1:02d}T00:00:00',
+               'state': 'WA' if i % 2 else 'OR', 'city': 'Seattle' if i % 2 else 'Portland', 'color': 'Yellow', **counters.NEW_DOG_COUNTS}
+        dogs.put_item(Item=dict(dog, **listing.listing_keys(dog)))
+    return aws
+
+def swipe(user_id, dog_id, interaction, previous=None):
+    # The stream record of a user swiping a dog, replacing any earlier swipe
+    new = likes.interaction_item(user_id, dog_id, interaction, '2024-06-01T00:00:00')
+    old = previous and likes.interaction_item(user_id, dog_id, previous, '2024-05-01T00:00:00')
+    return stream_record('MODIFY' if old else 'INSERT', new=new, old=old, keys=('userId', 'dogId'))
+
+def flush(aws):
+    # What the counter flusher does with the counter writes so far
+    return counter_flusher.handler({'Records': aws.dynamodb.Table('pupper-dog-counters').drain_stream()}, None)
+
+def counts(aws, dog_id):
+    dog = aws.dynamodb.Table('pupper-dogs').items[(dog_id,)]
+    return dog['likeCount'], dog['dislikeCount']
+
+def test_swipes_become_one_increment_per_dog():
+    records = [
+        swipe('user-1', 'dog-01', 'LIKE'),
+        swipe('user-2', 'dog-01', 'LIKE'),
+        swipe('user-3', 'dog-01', 'DISLIKE'),
+        swipe('user-1', 'dog-02', 'DISLIKE', previous='LIKE'),
+        swipe('user-2', 'dog-02', 'LIKE', previous='LIKE'),
+        stream_record('REMOVE', old=likes.interaction_item('user-4', 'dog-03', 'LIKE', '2024-01-01T00:00:00'), keys=('userId', 'dogId')),
+    ]
+    assert counters.deltas(records) == {
+        'dog-01': {'likes': 2, 'dislikes': 1, 'swipes': 3},
+        'dog-02': {'likes': -1, 'dislikes': 1, 'swipes': 2},
+        'dog-03': {'likes': -1, 'dislikes': 0, 'swipes': 1},
+    }
+
+def test_counts_are_kept_on_the_dogs(aws):
+    counter_aggregator.handler({'Records': [swipe(f'user-{i}', 'dog-01', 'LIKE') for i in range(3)] + [swipe('user-9', 'dog-02', 'DISLIKE')]}, None)
+    counter_aggregator.handler({'Records': [swipe('user-0', 'dog-01', 'DISLIKE', previous='LIKE'), swipe('user-1', 'dog-01', 'LIKE', previous='LIKE')]}, None)
+    # The dogs are only written when the counters are flushed, once for both
+    # batches
+    assert counts(aws, 'dog-01') == (0, 0)
+    assert flush(aws) == {'dogs': 2, 'written': 2}
+    assert counts(aws, 'dog-01') == (2, 1)
+    assert counts(aws, 'dog-02') == (0, 1)
+    assert counts(aws, 'dog-03') == (0, 0)
+    # A batch that changes no count writes nothing
+    aws.dynamodb.Table('pupper-dog-counters').calls = []
+    assert counter_aggregator.handler({'Records': [swipe('user-1', 'dog-01', 'LIKE', previous='LIKE')]}, None) == {'dogs': 0}
+    assert aws.dynamodb.Table('pupper-dog-counters').calls == []
+    dog = json.loads(lam.handler({'httpMethod': 'GET', 'path': '/dogs/dog-01'}, None)['body'])
+    assert dog['likeCount'] == 2 and 'recordVersion' not in dog
+
+def test_dogs_are_only_written_when_their_counts_change(aws):
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    # A like taken back before the flush changes nothing
+    counter_aggregator.handler({'Records': [swipe('user-1', 'dog-01', 'LIKE')]}, None)
+    unliked = stream_record('REMOVE', old=likes.interaction_item('user-1', 'dog-01', 'LIKE', '2024-06-01T00:00:00'), keys=('userId', 'dogId'))
+    counter_aggregator.handler({'Records': [unliked, swipe('user-2', 'dog-02', 'LIKE')]}, None)
+    dogs.calls = []
+    assert flush(aws) == {'dogs': 1, 'written': 1}
+    assert dogs.calls == ['update_item'] and counts(aws, 'dog-02') == (1, 0)
+    # Counts the dog already has, say from a retried batch, aren't written
+    # again
+    before = dict(dogs.items[('dog-02',)])
+    assert counters.flush(aws.dynamodb.meta.client, 'dog-02') is False
+    assert dogs.items[('dog-02',)] == before
+    # Nor are dogs that are gone
+    counter_aggregator.handler({'Records': [swipe('user-3', 'dog-gone', 'LIKE')]}, None)
+    assert flush(aws) == {'dogs': 1, 'written': 0}
+    assert ('dog-gone',) not in dogs.items
+
+def test_hot_dogs_spread_over_counter_shards(aws):
+    random.seed(3)
+    for batch in range(5):
+        counter_aggregator.handler({'Records': [swipe(f'user-{batch}-{i}', 'dog-05', 'LIKE') for i in range(counters.HOT_BATCH_SWIPES)]}, None)
+    counter_aggregator.handler({'Records': [swipe('user-x', 'dog-06', 'LIKE')]}, None)
+    flush(aws)
+    shards = aws.dynamodb.Table('pupper-dog-counters').items
+    assert len([key for key in shards if key[0] == 'dog-05']) > 1
+    assert [key for key in shards if key[0] == 'dog-06'] == [('dog-06', 0)]
+    assert counts(aws, 'dog-05') == (5 * counters.HOT_BATCH_SWIPES, 0)
+
+def test_a_second_of_swipes_is_one_write_per_dog(aws):
+    # 1000 swipes, most of them on a few popular dogs
+    rng = random.Random(1)
+    records = [swipe(f'user-{i}', f'dog-{min(int(rng.expovariate(0.4)), 19):02d}', rng.choice(['LIKE', 'LIKE', 'DISLIKE'])) for i in range(1000)]
+    result = counter_aggregator.handler({'Records': records}, None)
+    dogs_swiped = len({json.dumps(record['dynamodb']['Keys']['dogId']) for record in records})
+    assert result == {'dogs': dogs_swiped}
+    counter_table = aws.dynamodb.Table('pupper-dog-counters')
+    assert counter_table.calls.count('update_item') == dogs_swiped
+    # Nothing else is written until the flush, which writes each dog once
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    assert 'update_item' not in dogs.calls
+    flush(aws)
+    assert dogs.calls.count('update_item') == dogs_swiped
+    assert sum(sum(counts(aws, f'dog-{i:02d}')) for i in range(20)) == 1000
+
+def test_dogs_list_most_liked_first(aws):
+    likes_per_dog = {3: 5, 8: 9, 11: 2, 14: 7}
+    counter_aggregator.handler({'Records': [swipe(f'user-{n}', f'dog-{i:02d}', 'LIKE') for i, count in likes_per_dog.items() for n in range(count)]}, None)
+    flush(aws)
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': {'order': 'popular', 'limit': '3'}}, None)
+    body = json.loads(response['body'])
+    assert [dog['id'] for dog in body['dogs']] == ['dog-08', 'dog-14', 'dog-03']
+    assert [dog['likeCount'] for dog in body['dogs']] == [9, 7, 5]
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': {'order': 'popular', 'limit': '3', 'nextToken': body['nextToken']}}, None)
+    assert json.loads(response['body'])['dogs'][0]['id'] == 'dog-11'
+    # Filters apply to the popularity order
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': {'order': 'popular', 'state': 'wa', 'city': 'Seattle'}}, None)
+    filtered = json.loads(response['body'])['dogs']
+    assert [dog['id'] for dog in filtered[:2]] == ['dog-03', 'dog-11']
+    assert len(filtered) == 10 and all(dog['state'] == 'WA' for dog in filtered)
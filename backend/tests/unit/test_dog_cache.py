@@ -0,0 +1,119 @@
+import importlib
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import counter_aggregator
+import counter_flusher
+import counters
+import dog_cache
+import ingest
+import likes
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def loader(items):
+    # load() over a dict of items, remembering which keys it was asked for
+    def load(keys):
+        load.calls.append(list(keys))
+        return [items[key] for key in keys if key in items]
+    load.calls = []
+    return load
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    for i in range(3):
+        dogs.put_item(Item={'id': f'dog-{i}', 'name': f'Dog {i}', 'status': 'ACTIVE', 'recordVersion': 1, **counters.NEW_DOG_COUNTS})
+    dogs.calls = []
+    return aws
+
+def get_dog(dog_id):
+    response = lam.handler({'httpMethod': 'GET', 'path': f'/dogs/{dog_id}', 'headers': {}}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def test_lru_evicts_least_recently_used_and_expires():
+    clock = Clock()
+    cache = dog_cache.LRUCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put('a', 1, {'id': 'a'})
+    cache.put('b', 1, {'id': 'b'})
+    cache.get('a')
+    cache.put('c', 1, {'id': 'c'})
+    assert cache.get('b') is None and cache.get('a') == (1, {'id': 'a'})
+    clock.now = 10
+    assert cache.get('a') is None
+    assert cache.counts == {'evictions': 1, 'expirations': 1, 'invalidations': 0}
+
+def test_older_versions_never_replace_newer():
+    cache = dog_cache.LRUCache()
+    cache.put('a', 2, {'id': 'a', 'name': 'new'})
+    cache.put('a', 1, {'id': 'a', 'name': 'old'})
+    cache.invalidate('a', 2)
+    assert cache.get('a') == (2, {'id': 'a', 'name': 'new'})
+    cache.invalidate('a', 3)
+    assert cache.get('a') is None
+
+def test_reads_through_and_hands_out_copies():
+    load = loader({'a': {'id': 'a', 'recordVersion': 1}, 'b': {'id': 'b', 'recordVersion': 1}})
+    cache = dog_cache.DogCache(dog_cache.LRUCache())
+    assert cache.get_many(['a', 'gone', 'a'], load) == {'a': {'id': 'a', 'recordVersion': 1}}
+    cache.get_many(['a', 'b'], load)['a']['name'] = 'changed'
+    assert cache.get('a', lambda key: None) == {'id': 'a', 'recordVersion': 1}
+    assert load.calls == [['a', 'gone'], ['b']]
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 3
+
+def test_containers_sharing_a_tier_see_each_others_writes():
+    items = {'a': {'id': 'a', 'name': 'Rex', 'recordVersion': 1}}
+    tier = dog_cache.MemoryTier()
+    first, second = dog_cache.DogCache(dog_cache.LRUCache(), tier), dog_cache.DogCache(dog_cache.LRUCache(), tier)
+    load = loader(items)
+    first.get('a', lambda key: load([key])[0])
+    # The second container is filled from the tier rather than the table
+    assert second.get('a', lambda key: load([key])[0])['name'] == 'Rex'
+    assert load.calls == [['a']] and second.stats()['externalHits'] == 1
+    # A write seen by the first container makes the second's copy stale
+    items['a'] = {'id': 'a', 'name': 'Max', 'recordVersion': 2}
+    first.invalidate('a', 2)
+    assert second.get('a', lambda key: load([key])[0])['name'] == 'Max'
+    assert second.stats()['stale'] == 1
+
+def test_a_failing_tier_leaves_the_local_cache():
+    class DownTier:
+        def __getattr__(self, name):
+            raise ConnectionError('tier down')
+    cache = dog_cache.DogCache(dog_cache.LRUCache(), DownTier())
+    load = loader({'a': {'id': 'a'}})
+    assert cache.get('a', lambda key: load([key])[0]) == {'id': 'a'}
+    assert cache.get('a', lambda key: load([key])[0]) == {'id': 'a'}
+    cache.invalidate('a', 1)
+    assert load.calls == [['a']] and cache.stats()['tierErrors'] == 5
+
+def test_get_dog_is_served_from_the_cache(aws):
+    assert get_dog('dog-1') == get_dog('dog-1')
+    status, body = get_dog('dog-1')
+    assert status == 200 and 'recordVersion' not in body
+    assert aws.dynamodb.Table('pupper-dogs').calls == ['get_item']
+    assert get_dog('dog-9')[0] == 404
+
+def test_writes_to_a_dog_invalidate_it(aws):
+    get_dog('dog-1')
+    ingest.update_dog(aws.dynamodb.Table('pupper-dogs'), 'dog-1', {'name': 'Renamed'})
+    assert get_dog('dog-1')[1]['name'] == 'Renamed'
+    assert aws.dynamodb.Table('pupper-dogs').items[('dog-1',)]['recordVersion'] == 2
+    swipe = likes.interaction_item('user-1', 'dog-1', 'LIKE', '2024-06-01T00:00:00')
+    counter_aggregator.handler({'Records': [stream_record('INSERT', new=swipe, keys=('userId', 'dogId'))]}, None)
+    counter_flusher.handler({'Records': aws.dynamodb.Table('pupper-dog-counters').drain_stream()}, None)
+    assert get_dog('dog-1')[1]['likeCount'] == 1
+    assert dog_cache.default_cache().stats()['invalidations'] == 2
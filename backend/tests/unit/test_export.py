@@ -0,0 +1,106 @@
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import export
+from decimal import Decimal
+from fakes import FakeAWS
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    for i in range(60):
+        dogs.put_item(Item={'id': f'dog-{i:02d}', 'name': f'Dog {i}', 'weightInPounds': Decimal(40 + i),
+                            'photoFormats': {'webp', 'jpeg'}, 'renditions': {'400': {'jpeg': f'dog-{i:02d}/400.jpg'}}})
+    return aws
+
+def exported(sink, table_name='pupper-dogs'):
+    # Every item in the table's NDJSON part files
+    directory = os.path.join(sink.root, table_name)
+    return [json.loads(line) for name in sorted(os.listdir(directory)) if name.endswith('.ndjson')
+            for line in open(os.path.join(directory, name))]
+
+class FailingSink(export.LocalSink):
+    # Fails the nth part file written, as a crash or a network error would
+    def __init__(self, root, fail_at):
+        super().__init__(root)
+        self.parts, self.fail_at = 0, fail_at
+
+    def write(self, name, data):
+        if not name.endswith(export.CHECKPOINT_NAME):
+            self.parts += 1
+            if self.parts == self.fail_at:
+                raise IOError('connection reset')
+        super().write(name, data)
+
+def test_segments_export_every_item_once(aws, tmp_path):
+    sink = export.LocalSink(str(tmp_path))
+    totals = export.export_table(aws.dynamodb.meta.client, 'pupper-dogs', sink, total_segments=4, workers=4, page_size=5, rows_per_file=10)
+    items = exported(sink)
+    assert sorted(item['id'] for item in items) == [f'dog-{i:02d}' for i in range(60)]
+    assert totals['items'] == 60 and totals['parts'] == len(os.listdir(tmp_path / 'pupper-dogs')) - 1
+    assert totals['consumedUnits'] > 0
+    # Plain JSON types: numbers, sets as sorted lists, maps as objects
+    dog = next(item for item in items if item['id'] == 'dog-05')
+    assert dog['weightInPounds'] == 45 and dog['photoFormats'] == ['jpeg', 'webp']
+    assert dog['renditions'] == {'400': {'jpeg': 'dog-05/400.jpg'}}
+    checkpoint = json.loads((tmp_path / 'pupper-dogs' / export.CHECKPOINT_NAME).read_text())
+    assert all(segment['done'] for segment in checkpoint['segments'])
+    assert sum(segment['items'] for segment in checkpoint['segments']) == 60
+
+def test_failed_export_resumes_without_duplicates(aws, tmp_path):
+    client = aws.dynamodb.meta.client
+    with pytest.raises(IOError):
+        export.export_table(client, 'pupper-dogs', FailingSink(str(tmp_path), fail_at=5), total_segments=3, workers=1, page_size=4, rows_per_file=4)
+    sink = export.LocalSink(str(tmp_path))
+    partial = len(exported(sink))
+    assert 0 < partial < 60
+    aws.dynamodb.Table('pupper-dogs').calls = []
+    totals = export.export_table(client, 'pupper-dogs', sink, total_segments=3, workers=3, page_size=4, rows_per_file=4, log=lambda line: None)
+    ids = [item['id'] for item in exported(sink)]
+    assert sorted(ids) == [f'dog-{i:02d}' for i in range(60)]
+    assert totals['items'] == 60 - partial
+    # Finished segments aren't scanned again
+    assert len(aws.dynamodb.Table('pupper-dogs').calls) < 60 // 4 + 3
+
+def test_resume_needs_the_same_settings(aws, tmp_path):
+    client = aws.dynamodb.meta.client
+    with pytest.raises(IOError):
+        export.export_table(client, 'pupper-dogs', FailingSink(str(tmp_path), fail_at=2), total_segments=2, workers=1, page_size=5, rows_per_file=5)
+    with pytest.raises(ValueError):
+        export.export_table(client, 'pupper-dogs', export.LocalSink(str(tmp_path)), total_segments=4, page_size=5)
+
+def test_exports_to_s3(aws):
+    sink = export.sink_for('s3://exports-bucket/2025-01-01/', s3=aws.s3)
+    export.export_table(aws.dynamodb.meta.client, 'pupper-interactions', sink, total_segments=2)
+    assert sink.read('pupper-interactions/_checkpoint.json') is not None
+    assert ('exports-bucket', '2025-01-01/pupper-interactions/_checkpoint.json') in aws.s3.objects
+
+def test_budget_paces_reads_to_the_rate():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    budget = export.RcuBudget(10, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        budget.wait()
+        budget.spend(8)
+    budget.wait()
+    # 40 units at 10 a second, the first second's worth up front
+    assert now[0] == pytest.approx(3.0)
+    assert len(sleeps) == 4
+
+def test_parquet_export(aws, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    sink = export.LocalSink(str(tmp_path))
+    export.export_table(aws.dynamodb.meta.client, 'pupper-dogs', sink, total_segments=2, fmt='parquet')
+    rows = [row for name in os.listdir(tmp_path / 'pupper-dogs') if name.endswith('.parquet')
+            for row in pyarrow_parquet.read_table(str(tmp_path / 'pupper-dogs' / name)).to_pylist()]
+    assert len(rows) == 60
@@ -0,0 +1,211 @@
+import base64
+import importlib
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import catalog
+import feed
+import images
+import ingest
+import likes
+import neighbors
+import seen
+import seen_recorder
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+BUCKET = 'pupper-photos-957798448417'
+
+def token(user_id):
+    payload = base64.urlsafe_b64encode(json.dumps({'sub': user_id}).encode()).decode().rstrip('=')
+    return f"Bearer header.{payload}.signature"
+
+def dog(n):
+    base_url = f"https://{BUCKET}.s3.us-east-1.amazonaws.com/dog-{n:02d}"
+    photo_formats = {'standard': {'png': f"{base_url}/standard-400.png", 'webp': f"{base_url}/standard-400.webp"}}
+    return {'id': f'dog-{n:02d}', 'name': f'Dog {n}', 'status': 'ACTIVE', 'createdAt': f'2024-01-{n + 1:02d}T00:00:00',
+            'photo': f"{base_url}/standard-400.png", 'photoFormats': photo_formats, 'cardPhotos': images.card_photos({}, photo_formats, base_url)}
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    ingest.s3_client.cache_clear()
+    monkeypatch.setattr(catalog, '_loaded', {'pointer': None, 'etag': None, 'checked': 0.0, 'bodies': {}, 'dogs': {}})
+    monkeypatch.setattr(neighbors, '_loaded', {'neighbors': None, 'etag': None, 'checked': 0.0})
+    entries = catalog.ordered(catalog.entry(dog(n)) for n in range(20))
+    catalog.publish(aws.s3, BUCKET, entries)
+    yield aws
+    ingest.s3_client.cache_clear()
+
+def swipes(user_id, dog_ids):
+    # The stream records of a user swiping dogs for the first time
+    return {'Records': [stream_record('INSERT', new=likes.interaction_item(user_id, dog_id, 'DISLIKE', '2024-06-01T00:00:00'), keys=('userId', 'dogId'))
+                        for dog_id in dog_ids]}
+
+def get_feed(user_id='user-1', accept=None, **params):
+    event = {'httpMethod': 'GET', 'path': '/feed', 'headers': {'Authorization': token(user_id), 'Accept': accept}, 'queryStringParameters': params}
+    response = lam.handler(event, None)
+    return response['statusCode'], json.loads(response['body']), response['headers']
+
+def test_filter_holds_what_was_added():
+    filter = seen.SeenFilter()
+    dog_ids = [f'dog-{n}' for n in range(2000)]
+    # Repeats aren't added, nor are the few new ids it already claims to hold
+    added = sum(filter.add(dog_id) for dog_id in dog_ids + dog_ids[:10])
+    assert 2000 * (1 - seen.ERROR_RATE) <= added <= 2000 and len(filter) == added
+    assert all(dog_id in filter for dog_id in dog_ids)
+    assert [layer.capacity for layer in filter.layers] == [256, 512, 1024, 2048]
+    false_positives = sum(f'other-{n}' in filter for n in range(10000))
+    assert false_positives < 10000 * seen.ERROR_RATE * 1.5
+    # Through the segment items it is stored as, each within a write unit
+    items = [item for item, version in filter.changed_items('user-1')]
+    assert all(len(item['bits']) <= seen.SEGMENT_BYTES for item in items)
+    restored = seen.SeenFilter.from_items(reversed(items))
+    assert all(dog_id in restored for dog_id in dog_ids) and restored.nbytes() == filter.nbytes() and len(restored) == len(filter)
+
+def test_recorder_adds_swipes_to_each_users_filter(aws):
+    assert seen_recorder.handler(swipes('user-1', ['dog-01', 'dog-02']), None) == {'users': 1, 'added': 2}
+    event = swipes('user-1', ['dog-02', 'dog-03'])
+    event['Records'] += swipes('user-2', ['dog-01'])['Records']
+    # The filter's own writes come back through the stream, and are skipped
+    table = aws.dynamodb.Table('pupper-interactions')
+    stored = [item for key, item in table.items.items() if key[0] == 'user-1' and seen.is_seen_key(key[1])]
+    event['Records'] += [stream_record('MODIFY', new=item, old=item, keys=('userId', 'dogId')) for item in stored]
+    assert seen_recorder.handler(event, None) == {'users': 2, 'added': 2}
+    seen_dogs = seen.load(table, 'user-1')
+    assert all(dog_id in seen_dogs for dog_id in ('dog-01', 'dog-02', 'dog-03')) and 'dog-04' not in seen_dogs
+
+def test_recording_a_swipe_rewrites_one_segment(aws):
+    table = aws.dynamodb.Table('pupper-interactions')
+    assert seen.record(table, 'user-1', [f'dog-{n}' for n in range(3000)]) > 2900
+    segments = {key[1]: item for key, item in table.items.items() if seen.is_seen_key(key[1])}
+    assert len(segments) == 9 and all(len(item['bits']) <= seen.SEGMENT_BYTES for item in segments.values())
+    table.calls.clear()
+    assert seen.record(table, 'user-1', ['dog-new']) == 1
+    assert table.calls == ['query', 'put_item']
+    changed = [name for name, item in table.items.items() if seen.is_seen_key(name[1]) and item['version'] != segments[name[1]]['version']]
+    assert len(changed) == 1
+    # Swipes it already holds write nothing
+    table.calls.clear()
+    assert seen.record(table, 'user-1', ['dog-new', 'dog-7']) == 0 and table.calls == ['query']
+
+def test_feed_skips_swiped_dogs(aws):
+    seen_recorder.handler(swipes('user-1', ['dog-19', 'dog-17', 'dog-16']), None)
+    status, body, headers = get_feed(limit='3')
+    assert status == 200
+    assert [dog['id'] for dog in body['dogs']] == ['dog-18', 'dog-15', 'dog-14']
+    assert headers['Cache-Control'] == 'private, no-store'
+    # Another user's swipes are their own
+    assert [dog['id'] for dog in get_feed('user-2', limit='3')[1]['dogs']] == ['dog-19', 'dog-18', 'dog-17']
+
+def test_feed_pages_follow_the_cursor_with_prefetch_hints(aws):
+    _, first, headers = get_feed(accept='image/webp', limit='4')
+    assert first['dogs'][0]['photo'].endswith('.webp')
+    assert first['prefetch'] == [dog(n)['photoFormats']['standard']['webp'] for n in (15, 14, 13, 12)]
+    assert headers['Link'].startswith(f"<{first['prefetch'][0]}>; rel=prefetch; as=image, ")
+    # Dogs shown but not yet in the filter don't come back on the next page
+    seen_recorder.handler(swipes('user-1', ['dog-19']), None)
+    _, second, _ = get_feed(accept='image/webp', limit='4', nextToken=first['nextToken'])
+    assert [dog['id'] for dog in second['dogs']] == ['dog-15', 'dog-14', 'dog-13', 'dog-12']
+    dogs, next_token = [], second['nextToken']
+    while next_token:
+        _, page, headers = get_feed(limit='5', nextToken=next_token)
+        dogs += [dog['id'] for dog in page['dogs']]
+        next_token = page.get('nextToken')
+    assert dogs == [f'dog-{n:02d}' for n in range(11, -1, -1)]
+    # The last page has nothing to prefetch
+    assert page['prefetch'] == [] and 'Link' not in headers
+
+def test_feed_needs_a_user_and_a_catalog(aws):
+    event = {'httpMethod': 'GET', 'path': '/feed', 'headers': {}}
+    assert lam.handler(event, None)['statusCode'] == 401
+    assert get_feed(nextToken='nonsense')[0] == 400
+    aws.s3.objects.pop((BUCKET, catalog.POINTER_KEY))
+    catalog._loaded.update(pointer=None, etag=None, checked=0.0)
+    assert get_feed()[0] == 404
+
+def neighbors_file(lists, k=3):
+    # A neighbors file from {dog id: [(neighbor id, similarity)]}
+    dog_ids = sorted({dog_id for dog_id in lists} | {other for pairs in lists.values() for other, _ in pairs})
+    number = {dog_id: n for n, dog_id in enumerate(dog_ids)}
+    indices, scores = [], []
+    for dog_id in dog_ids:
+        pairs = lists.get(dog_id, [])[:k]
+        indices += [number[other] for other, _ in pairs] + [neighbors.EMPTY] * (k - len(pairs))
+        scores += [similarity for _, similarity in pairs] + [0.0] * (k - len(pairs))
+    return neighbors.encode(dog_ids, k, indices, scores)
+
+def test_similarity_finds_dogs_liked_together():
+    pytest.importorskip('scipy')
+    import similarity
+    # Users 0-3 like dogs a and b; users 2-5 like b and c; d is liked by
+    # everyone, and the repeated like of a by user 0 counts once
+    likes_ = [(f'user-{u}', dog_id, f'2024-01-0{u + 1}') for u in range(4) for dog_id in ('a', 'b')]
+    likes_ += [(f'user-{u}', dog_id, f'2024-02-0{u + 1}') for u in range(2, 6) for dog_id in ('b', 'c')]
+    likes_ += [(f'user-{u}', 'd', '2024-03-01') for u in range(6)] + [('user-0', 'a', '2024-04-01')]
+    matrix, dog_ids = similarity.like_matrix(likes_)
+    assert matrix.shape == (6, 4) and matrix.nnz == 4 + 6 + 4 + 6
+    indices, scores = similarity.top_neighbors(matrix, k=3, min_co_likes=3, block_rows=2)
+    column = dog_ids.index
+    # a and c share two likers, below min_co_likes; b and d share all four of
+    # a's, and tie
+    a = [dog_ids[i] for i in indices[column('a')] if i != neighbors.EMPTY]
+    assert a == ['b', 'd']
+    assert scores[column('a')][0] == pytest.approx(4 / (4 * 6) ** 0.5)
+    # Only each user's latest likes count
+    matrix, _ = similarity.like_matrix(likes_, max_likes_per_user=1)
+    assert matrix.nnz == 6
+
+def test_neighbors_file_round_trip_and_ranking():
+    similar = neighbors.Neighbors(neighbors_file({
+        'dog-01': [('dog-02', 0.9), ('dog-03', 0.5)],
+        'dog-04': [('dog-03', 0.8), ('dog-01', 0.7), ('dog-05', 0.1)],
+    }))
+    assert similar.count == 5 and similar.k == 3
+    assert similar.of('dog-01') == [('dog-02', pytest.approx(0.9)), ('dog-03', pytest.approx(0.5))]
+    assert similar.of('dog-99') == []
+    # dog-04 is the latest like, dog-01 the one before it, which counts DECAY
+    # as much; liked dogs aren't recommended back
+    ranked = similar.rank(['dog-04', 'dog-01', 'dog-99'])
+    assert set(ranked) == {'dog-02', 'dog-03', 'dog-05'}
+    assert ranked['dog-03'] == pytest.approx(0.8 + 0.9 * 0.5, abs=1e-6)
+    assert ranked['dog-02'] == pytest.approx(0.9 * 0.9, abs=1e-6)
+    with pytest.raises(ValueError):
+        neighbors.Neighbors(b'not neighbors')
+
+def test_deal_puts_ranked_dogs_first_and_pages_across_both():
+    dogs = [dog(n) for n in range(9, -1, -1)]
+    scores = {'dog-02': 0.5, 'dog-07': 0.9, 'dog-05': 0.5}
+    filter = seen.SeenFilter()
+    filter.add('dog-05')
+    page, upcoming = feed.deal(dogs, filter, 2, None, scores)
+    assert [d['id'] for d in page] == ['dog-07', 'dog-02'] and [d['id'] for d in upcoming] == ['dog-09', 'dog-08']
+    cursor = feed.parse_token(feed.token(page[-1], scores))
+    page, _ = feed.deal(dogs, filter, 3, cursor, scores)
+    assert [d['id'] for d in page] == ['dog-09', 'dog-08', 'dog-06']
+    cursor = feed.parse_token(feed.token(page[-1], scores))
+    assert cursor[0] == feed.NEWEST
+    page, _ = feed.deal(dogs, filter, 3, cursor, scores)
+    assert [d['id'] for d in page] == ['dog-04', 'dog-03', 'dog-01']
+
+def test_feed_ranks_neighbors_of_recent_likes(aws):
+    aws.s3.put_object(Bucket=BUCKET, Key=neighbors.NEIGHBORS_KEY, Body=neighbors_file({
+        'dog-03': [('dog-10', 0.6), ('dog-05', 0.4)],
+        'dog-04': [('dog-05', 0.5), ('dog-03', 0.3)],
+    }))
+    table = aws.dynamodb.Table('pupper-interactions')
+    table.put_item(Item=likes.interaction_item('user-1', 'dog-03', 'LIKE', '2024-06-01T00:00:00'))
+    table.put_item(Item=likes.interaction_item('user-1', 'dog-04', 'LIKE', '2024-06-02T00:00:00'))
+    status, body, _ = get_feed(limit='3')
+    assert status == 200
+    # dog-05 neighbors both likes; then the newest of the rest
+    assert [d['id'] for d in body['dogs']] == ['dog-05', 'dog-10', 'dog-19']
+    status, body, _ = get_feed(limit='3', nextToken=body['nextToken'])
+    assert [d['id'] for d in body['dogs']] == ['dog-18', 'dog-17', 'dog-16']
+    # Another user without likes gets the catalog newest first
+    status, body, _ = get_feed('user-2', limit='2')
+    assert [d['id'] for d in body['dogs']] == ['dog-19', 'dog-18']
@@ -0,0 +1,50 @@
+import ast
+import subprocess
+import sys
+import os
+import pytest
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend'))
+STACK = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../cdk-workshop/cdk_workshop/cdk_workshop_stack.py'))
+
+# Imports a module the way Lambda would with no Pillow on the path
+IMPORT_WITHOUT_PILLOW = """
+import importlib, importlib.abc, sys
+
+class NoPillow(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name == 'PIL' or name.startswith('PIL.'):
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+
+sys.meta_path.insert(0, NoPillow())
+sys.path.insert(0, sys.argv[1])
+importlib.import_module(sys.argv[2])
+"""
+
+
+def stack_handlers():
+    # (handler module, deployed with layers) of each function in the stack
+    with open(STACK) as f:
+        tree = ast.parse(f.read())
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'Function':
+            keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+            if isinstance(keywords.get('handler'), ast.Constant):
+                found.append((keywords['handler'].value.rsplit('.', 1)[0], 'layers' in keywords))
+    return found
+
+
+def test_the_stack_deploys_the_handlers_it_names():
+    handlers = stack_handlers()
+    assert len(handlers) >= 7
+    assert all(os.path.exists(os.path.join(BACKEND, f'{module}.py')) for module, _ in handlers)
+
+
+@pytest.mark.parametrize('module', sorted(module for module, layers in stack_handlers() if not layers))
+def test_handlers_without_the_pillow_layer_import_without_pillow(module):
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_WITHOUT_PILLOW, BACKEND, module],
+        capture_output=True, text=True, env=dict(os.environ, AWS_DEFAULT_REGION='us-east-1'),
+    )
+    assert result.returncode == 0, result.stderr
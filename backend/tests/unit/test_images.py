@@ -0,0 +1,99 @@
+import base64
+import io
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+from PIL import Image
+import images
+
+def make_jpeg(size=(2000, 1500)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 150, 100)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def test_decode_uses_draft_scale():
+    img = images.decode(make_jpeg(), min_size=(400, 400))
+    assert img.mode == 'RGB'
+    assert img.width >= 400 and img.height >= 400
+    assert img.width < 2000
+
+def test_draft_scale_covers_rotated_photos():
+    # Stored 4000x3000, upright 3000x4000: still wide enough for standard-800
+    img = Image.new('RGB', (4000, 3000), (200, 150, 100))
+    exif = img.getexif()
+    exif[images.EXIF_ORIENTATION] = 6
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', exif=exif)
+    decoded = images.decode(buffer.getvalue(), min_size=images.minimum_source_size())
+    assert decoded.height > decoded.width >= 800
+    outputs = images.render(decoded, formats=['png'])
+    assert ('standard-800.png', 800) in [(o['key'], o['width']) for o in outputs]
+
+def test_render_produces_aspect_preserving_ladder():
+    timer = images.StageTimer()
+    spec = {'version': 2, 'renditions': [
+        {'name': 'standard', 'widths': [200, 800, 400], 'default': 400, 'fit': 'contain', 'formats': ['png']},
+        {'name': 'thumbnail', 'widths': [100, 50], 'default': 50, 'fit': 'cover', 'aspect': (1, 1), 'sharpen': True, 'formats': ['png']},
+    ]}
+    outputs = images.render(images.decode(make_jpeg()), spec=spec, timer=timer)
+    assert [(o['key'], o['width'], o['height']) for o in outputs] == [
+        ('standard-800.png', 800, 600), ('standard-400.png', 400, 300), ('standard-200.png', 200, 150),
+        ('thumbnail-100.png', 100, 100), ('thumbnail-50.png', 50, 50),
+    ]
+    stages = [stage['stage'] for stage in timer.report()['stages']]
+    assert stages[:2] == ['resize:standard-800', 'encode:standard-800.png']
+
+    fields = images.record_fields(outputs, 'https://bucket/dog', spec=spec)
+    assert fields['photo'] == 'https://bucket/dog/standard-400.png'
+    assert fields['thumbnailPhoto'] == 'https://bucket/dog/thumbnail-50.png'
+    assert fields['renditions']['standard'][0] == {'width': 800, 'height': 600, 'formats': {'png': 'https://bucket/dog/standard-800.png'}}
+    assert images.srcset(fields['renditions']['standard'], 'png').endswith('standard-200.png 200w')
+    # cardPhotos negotiates to the same URLs as the renditions they abbreviate
+    assert fields['cardPhotos']['formats']['png']['photo'] == 'standard-400.png'
+    full, card = dict(fields), {'cardPhotos': fields['cardPhotos']}
+    del full['cardPhotos']
+    assert images.negotiate_photos(card, 'png') == {name: images.negotiate_photos(full, 'png')[name] for name in ('photo', 'thumbnailPhoto', 'photoSrcset')}
+
+def test_render_never_upscales_small_sources():
+    outputs = images.render(images.decode(make_jpeg((300, 300))), formats=['png'])
+    assert [o['key'] for o in outputs] == ['standard-200.png', 'thumbnail-100.png', 'thumbnail-50.png']
+
+def test_parallel_render_matches_sequential_render():
+    img = images.decode(make_jpeg())
+    sequential = images.render(img, eager_only=True)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parallel = images.render(img, eager_only=True, executor=pool)
+    assert [o['key'] for o in parallel] == [o['key'] for o in sequential]
+    assert [o['data'] for o in parallel] == [o['data'] for o in sequential]
+
+def test_placeholder_is_a_tiny_data_uri():
+    uri = images.placeholder(images.decode(make_jpeg()))
+    header, data = uri.split(',', 1)
+    assert header.startswith('data:image/') and header.endswith(';base64')
+    assert len(uri) < 1000
+    assert Image.open(io.BytesIO(base64.b64decode(data))).size == (20, 15)
+
+def test_prepare_original_keeps_upload_bytes():
+    image_data = make_jpeg()
+    assert images.prepare_original(image_data) == (image_data, 'jpg', 'image/jpeg')
+
+def test_prepare_original_normalizes_rotated_photos():
+    img = Image.new('RGB', (300, 200))
+    exif = img.getexif()
+    exif[images.EXIF_ORIENTATION] = 6
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', exif=exif)
+    data, extension, content_type = images.prepare_original(buffer.getvalue())
+    normalized = Image.open(io.BytesIO(data))
+    assert (extension, content_type) == ('jpg', 'image/jpeg')
+    assert normalized.size == (200, 300)
+    assert images.EXIF_ORIENTATION not in normalized.getexif()
+
+def test_negotiate_format_prefers_explicit_modern_formats():
+    available = ['avif', 'webp', 'png']
+    assert images.negotiate_format('application/json, image/avif, image/webp;q=0.9', available) == 'avif'
+    assert images.negotiate_format('image/avif;q=0.5, image/webp', available) == 'webp'
+    assert images.negotiate_format('image/avif', ['webp', 'png']) == 'png'
+    assert images.negotiate_format('*/*', available) == 'png'
+    assert images.negotiate_format(None, available) == 'png'
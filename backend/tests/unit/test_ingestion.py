@@ -0,0 +1,133 @@
+import base64
+import importlib
+import io
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+from PIL import Image, ImageDraw
+import ingest
+import worker
+from fakes import FakeAWS
+
+lam = importlib.import_module('lambda')
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('BUCKET_NAME', 'bucket')
+    monkeypatch.setenv('INGEST_QUEUE_URL', 'https://sqs.example/ingest')
+    monkeypatch.setenv('API_URL', 'https://api.example/prod')
+    fake = FakeAWS()
+    fake.install(monkeypatch)
+    ingest.s3_client.cache_clear()
+    yield fake
+    ingest.s3_client.cache_clear()
+
+def make_jpeg(size=(1200, 900), quality=75):
+    # A gradient with some detail, so the perceptual hash is distinctive
+    img = Image.radial_gradient('L').resize(size).convert('RGB')
+    ImageDraw.Draw(img).ellipse((size[0] // 4, size[1] // 4, size[0] // 2, size[1] // 2), fill=(200, 150, 100))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+def create_dog(image_data=None, **extra):
+    image = base64.b64encode(image_data or make_jpeg()).decode()
+    body = {'name': 'Rex', 'species': 'Labrador Retriever', 'shelter': 'Pupper Shelter', 'image': image, 'async': True, **extra}
+    return lam.handler({'httpMethod': 'POST', 'path': '/dogs', 'body': json.dumps(body)}, None)
+
+def get_dog(dog_id):
+    return json.loads(lam.handler({'httpMethod': 'GET', 'path': f'/dogs/{dog_id}'}, None)['body'])
+
+def get_status(dog_id):
+    response = lam.handler({'httpMethod': 'GET', 'path': f'/dogs/{dog_id}/status'}, None)
+    return json.loads(response['body'])['status']
+
+def listed_ids():
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs'}, None)
+    return [dog['id'] for dog in json.loads(response['body'])['dogs']]
+
+def test_async_create_is_pending_until_the_worker_runs(aws):
+    response = create_dog()
+    assert response['statusCode'] == 202
+    dog_id = json.loads(response['body'])['id']
+    assert get_status(dog_id) == 'PENDING'
+    assert dog_id not in listed_ids()
+    assert aws.rekognition.calls == []
+
+    assert worker.handler(aws.sqs.drain(), None) == {'batchItemFailures': []}
+    assert get_status(dog_id) == 'ACTIVE'
+    assert dog_id in listed_ids()
+    assert get_dog(dog_id)['placeholder'].startswith('data:image/')
+    keys = {key for bucket, key in aws.s3.objects}
+    assert f'{dog_id}/standard-400.png' in keys
+    assert not any(key.startswith('staging/') for key in keys)
+
+def test_redelivered_message_is_skipped(aws):
+    create_dog()
+    message = aws.sqs.drain()
+    worker.handler(message, None)
+    calls = len(aws.s3.calls)
+    assert worker.handler(message, None) == {'batchItemFailures': []}
+    assert aws.s3.calls[calls:] == []
+
+def test_non_labrador_is_rejected(aws):
+    aws.rekognition.labels = ['Dog', 'Poodle']
+    dog_id = json.loads(create_dog()['body'])['id']
+    worker.handler(aws.sqs.drain(), None)
+    assert get_status(dog_id) == 'REJECTED'
+    assert dog_id not in listed_ids()
+
+def test_failures_are_retried_then_marked_failed(aws, monkeypatch):
+    def unavailable(**kwargs):
+        raise RuntimeError('Rekognition unavailable')
+    monkeypatch.setattr(aws.rekognition, 'detect_labels', unavailable)
+    dog_id = json.loads(create_dog()['body'])['id']
+    body = aws.sqs.messages[0]['Body']
+
+    event = aws.sqs.drain(receive_count=1)
+    assert worker.handler(event, None) == {'batchItemFailures': [{'itemIdentifier': event['Records'][0]['messageId']}]}
+    assert get_status(dog_id) == 'PENDING'
+
+    aws.sqs.send_message(QueueUrl='https://sqs.example/ingest', MessageBody=body)
+    assert len(worker.handler(aws.sqs.drain(receive_count=worker.MAX_RECEIVE_COUNT), None)['batchItemFailures']) == 1
+    assert get_status(dog_id) == 'FAILED'
+
+def test_duplicate_upload_reuses_renditions_and_classification(aws):
+    first = json.loads(create_dog(**{'async': False})['body'])['id']
+    puts = [call for call in aws.s3.calls if call[0] == 'put_object']
+    second = json.loads(create_dog(**{'async': False})['body'])['id']
+    assert len(aws.rekognition.calls) == 1
+    assert [call for call in aws.s3.calls if call[0] == 'put_object'] == puts
+    assert get_dog(second)['photo'] == get_dog(first)['photo']
+    assert get_dog(second)['photoHash'] == get_dog(first)['photoHash']
+
+def test_reencoded_duplicate_matches_on_perceptual_hash(aws):
+    create_dog(**{'async': False})
+    second = json.loads(create_dog(make_jpeg(size=(1000, 750), quality=60), **{'async': False})['body'])['id']
+    assert len(aws.rekognition.calls) == 1
+    assert get_status(second) == 'ACTIVE'
+
+def test_rejections_are_cached(aws):
+    aws.rekognition.labels = ['Dog', 'Poodle']
+    assert create_dog(**{'async': False})['statusCode'] == 422
+    assert create_dog(**{'async': False})['statusCode'] == 422
+    assert len(aws.rekognition.calls) == 1
+
+def test_uploads_are_capped_at_what_rekognition_reads_from_s3(aws, monkeypatch):
+    assert lam.MAX_UPLOAD_BYTES == ingest.MAX_UPLOAD_BYTES <= ingest.REKOGNITION_S3_OBJECT_BYTES
+    image_data = make_jpeg()
+    dog_id = json.loads(create_dog(image_data)['body'])['id']
+    # A staged object over the limit is refused a chunk past it, not read whole
+    monkeypatch.setattr(ingest, 'READ_CHUNK_BYTES', 1024)
+    monkeypatch.setattr(ingest, 'MAX_UPLOAD_BYTES', 4096)
+    assert worker.handler(aws.sqs.drain(), None) == {'batchItemFailures': []}
+    assert get_status(dog_id) == 'FAILED' and aws.rekognition.calls == []
+
+def test_large_inline_images_reach_rekognition_downscaled(aws, monkeypatch):
+    monkeypatch.setattr(ingest, 'REKOGNITION_INLINE_BYTES', 1024)
+    assert create_dog(make_jpeg(size=(2400, 1800)), **{'async': False})['statusCode'] == 200
+    sent = Image.open(io.BytesIO(aws.rekognition.calls[0]['Bytes']))
+    assert sent.format == 'JPEG' and sent.size == (ingest.REKOGNITION_INLINE_SIDE, 1440)
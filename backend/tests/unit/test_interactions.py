@@ -0,0 +1,132 @@
+import base64
+import importlib
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import batch
+import interactions
+from fakes import FakeAWS
+
+lam = importlib.import_module('lambda')
+
+def token(user_id):
+    payload = base64.urlsafe_b64encode(json.dumps({'sub': user_id}).encode()).decode().rstrip('=')
+    return f"Bearer header.{payload}.signature"
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    for i in range(60):
+        dogs.put_item(Item={'id': f'dog-{i:02d}', 'name': f'Dog {i}', 'status': 'ACTIVE'})
+    dogs.calls = []
+    sleeps = []
+    monkeypatch.setattr(batch.time, 'sleep', sleeps.append)
+    aws.sleeps = sleeps
+    return aws
+
+def post_batch(swipes, user_id='user-1'):
+    event = {'httpMethod': 'POST', 'path': '/interactions/batch', 'headers': {'Authorization': token(user_id)}, 'body': json.dumps({'interactions': swipes})}
+    response = lam.handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+START = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+
+def swipe(i, interaction='LIKE', second=0):
+    return {'dogId': f'dog-{i:02d}', 'interaction': interaction, 'timestamp': (START + timedelta(seconds=second)).isoformat() + '.000Z'}
+
+def test_swipes_are_written_together(aws):
+    status, body = post_batch([swipe(i, 'LIKE' if i % 3 else 'DISLIKE', i) for i in range(60)])
+    assert status == 200
+    assert [result['status'] for result in body['results']] == ['recorded'] * 60
+    table = aws.dynamodb.Table('pupper-interactions')
+    # A conditional put per swipe, and one BatchGetItem for the liked dogs' summaries
+    assert table.calls == ['put_item'] * 60
+    assert aws.dynamodb.Table('pupper-dogs').calls == ['batch_get_item']
+    like = table.items[('user-1', 'dog-01')]
+    assert like['timestamp'] == (START + timedelta(seconds=1)).isoformat(timespec='microseconds')
+    assert like['likedBy'] == 'user-1' and like['dogSummary']['name'] == 'Dog 1'
+    assert 'likedBy' not in table.items[('user-1', 'dog-03')]
+
+def test_latest_swipe_of_a_dog_wins(aws):
+    status, body = post_batch([swipe(1, 'LIKE', 5), swipe(1, 'DISLIKE', 9), swipe(2, 'DISLIKE', 5), swipe(2, 'LIKE', 5), swipe(1, 'LIKE', 7)])
+    assert status == 200
+    assert [result['status'] for result in body['results']] == ['superseded', 'recorded', 'superseded', 'recorded', 'superseded']
+    table = aws.dynamodb.Table('pupper-interactions')
+    assert table.items[('user-1', 'dog-01')]['interaction'] == 'DISLIKE'
+    assert table.items[('user-1', 'dog-02')]['interaction'] == 'LIKE'
+
+def test_a_late_batch_does_not_undo_newer_swipes(aws):
+    table = aws.dynamodb.Table('pupper-interactions')
+    post_batch([swipe(1, 'LIKE', 30), swipe(2, 'LIKE', 30)])
+    status, body = post_batch([swipe(1, 'DISLIKE', 10), swipe(2, 'DISLIKE', 50)])
+    assert status == 200
+    assert [result['status'] for result in body['results']] == ['superseded', 'recorded']
+    assert table.items[('user-1', 'dog-01')]['interaction'] == 'LIKE'
+    assert table.items[('user-1', 'dog-02')]['interaction'] == 'DISLIKE'
+
+    # A swipe through POST /interactions is dated now, after any buffered one
+    event = {'httpMethod': 'POST', 'path': '/interactions', 'headers': {'Authorization': token('user-1')}, 'body': json.dumps({'dogId': 'dog-03', 'interaction': 'LIKE'})}
+    assert lam.handler(event, None)['statusCode'] == 200
+    _, body = post_batch([swipe(3, 'DISLIKE', 59)])
+    assert body['results'][0]['status'] == 'superseded'
+    assert table.items[('user-1', 'dog-03')]['interaction'] == 'LIKE'
+
+def test_single_and_batch_swipes_share_a_timestamp_format(aws, monkeypatch):
+    on_the_second = datetime(2024, 6, 1, 12, 0, 0)
+    monkeypatch.setattr(lam, 'datetime', type('FrozenDatetime', (datetime,), {'utcnow': staticmethod(lambda: on_the_second)}))
+    event = {'httpMethod': 'POST', 'path': '/interactions', 'headers': {'Authorization': token('user-1')}, 'body': json.dumps({'dogId': 'dog-01', 'interaction': 'LIKE'})}
+    assert lam.handler(event, None)['statusCode'] == 200
+    stored = aws.dynamodb.Table('pupper-interactions').items[('user-1', 'dog-01')]['timestamp']
+    assert stored == '2024-06-01T12:00:00.000000' == interactions.parse_timestamp('2024-06-01T12:00:00Z', on_the_second)
+
+def test_invalid_swipes_are_reported_alone(aws):
+    status, body = post_batch([swipe(1), {'dogId': 'dog-02', 'interaction': 'MAYBE'}, {'interaction': 'LIKE'}, dict(swipe(3), timestamp='yesterday'), 'dog-04'])
+    assert status == 200
+    assert [result['status'] for result in body['results']] == ['recorded', 'invalid', 'invalid', 'invalid', 'invalid']
+    assert body['results'][1]['dogId'] == 'dog-02'
+
+def test_seen_filter_keys_are_not_dog_ids(aws):
+    table = aws.dynamodb.Table('pupper-interactions')
+    segment = {'userId': 'user-1', 'dogId': '#seen#00#0000', 'bits': b'\x01', 'version': 1}
+    table.put_item(Item=segment)
+    status, body = post_batch([dict(swipe(1), dogId='#seen#00#0000'), swipe(2)])
+    assert status == 200
+    assert [result['status'] for result in body['results']] == ['invalid', 'recorded']
+    event = {'httpMethod': 'POST', 'path': '/interactions', 'headers': {'Authorization': token('user-1')}, 'body': json.dumps({'dogId': '#seen#00#0000', 'interaction': 'LIKE'})}
+    assert lam.handler(event, None)['statusCode'] == 400
+    assert 'bits' in table.items[('user-1', '#seen#00#0000')] and 'interaction' not in table.items[('user-1', '#seen#00#0000')]
+
+def test_client_timestamps_are_bounded():
+    now = datetime(2024, 6, 1, 12, 0, 0)
+    assert interactions.parse_timestamp('2024-06-01T13:00:00+02:00', now) == '2024-06-01T11:00:00.000000'
+    assert interactions.parse_timestamp('2030-01-01T00:00:00Z', now) == '2024-06-01T12:00:00.000000'
+    assert interactions.parse_timestamp('2020-01-01T00:00:00Z', now) == '2024-05-31T12:00:00.000000'
+
+def test_unprocessed_swipes_are_retried(aws):
+    aws.dynamodb.meta.client.unprocessed_rounds = 2
+    status, body = post_batch([swipe(i) for i in range(10)])
+    assert status == 200
+    assert all(result['status'] == 'recorded' for result in body['results'])
+    assert len(aws.dynamodb.Table('pupper-interactions').items) == 10
+    assert len(aws.sleeps) == 2
+
+def test_swipes_left_unprocessed_are_failed(aws):
+    aws.dynamodb.meta.client.unprocessed_rounds = 1000
+    status, body = post_batch([swipe(i, 'DISLIKE') for i in range(4)])
+    assert status == 200
+    statuses = [result['status'] for result in body['results']]
+    written = aws.dynamodb.Table('pupper-interactions').items
+    assert statuses.count('failed') == 4 - len(written) and 'failed' in statuses
+    assert all((result['status'] == 'recorded') == (('user-1', result['dogId']) in written) for result in body['results'])
+
+def test_batch_rejects_bad_requests(aws):
+    assert post_batch([])[0] == 400
+    assert post_batch([swipe(i % 60) for i in range(101)])[0] == 400
+    event = {'httpMethod': 'POST', 'path': '/interactions/batch', 'headers': {}, 'body': json.dumps({'interactions': [swipe(1)]})}
+    assert lam.handler(event, None)['statusCode'] == 401
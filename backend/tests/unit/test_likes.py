@@ -0,0 +1,143 @@
+import base64
+import importlib
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import batch
+import likes
+import summary_refresher
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+
+def token(user_id):
+    payload = base64.urlsafe_b64encode(json.dumps({'sub': user_id}).encode()).decode().rstrip('=')
+    return f"Bearer header.{payload}.signature"
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    interactions = aws.dynamodb.Table('pupper-interactions')
+    for i in range(250):
+        dogs.put_item(Item={'id': f'dog-{i:03d}', 'name': f'Dog {i}', 'status': 'ACTIVE', 'originalPhoto': 'https://example.com/original.jpg'})
+        interactions.put_item(Item=likes.interaction_item('user-1', f'dog-{i:03d}', 'LIKE' if i % 5 else 'DISLIKE', f'2024-01-01T00:00:{i:03d}'))
+        interactions.put_item(Item=likes.interaction_item('user-2', f'dog-{i:03d}', 'LIKE', f'2024-01-01T00:00:{i:03d}'))
+    # A liked dog that has since been deleted
+    interactions.put_item(Item=likes.interaction_item('user-1', 'dog-gone', 'LIKE', '2023-12-31T00:00:00'))
+    dogs.calls = []
+    interactions.calls, interactions.read_units = [], 0
+    sleeps = []
+    monkeypatch.setattr(batch.time, 'sleep', sleeps.append)
+    aws.sleeps = sleeps
+    return aws
+
+def get_likes(user_id='user-1', **params):
+    event = {'httpMethod': 'GET', 'path': '/likes', 'headers': {'Authorization': token(user_id)}, 'queryStringParameters': params}
+    response = lam.handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def all_likes(**params):
+    dogs, token = [], None
+    while True:
+        status, body = get_likes(**dict(params, **({'nextToken': token} if token else {})))
+        assert status == 200
+        dogs += body['dogs']
+        token = body.get('nextToken')
+        if not token:
+            return dogs
+
+def test_likes_are_joined_in_batches_of_100(aws):
+    status, body = get_likes(limit='100')
+    assert status == 200
+    # Most recent likes first
+    assert [dog['id'] for dog in body['dogs']] == [f'dog-{i:03d}' for i in range(249, -1, -1) if i % 5][:100]
+    assert aws.dynamodb.Table('pupper-dogs').calls == ['batch_get_item']
+    # Only what the list shows is read
+    assert 'originalPhoto' not in body['dogs'][0]
+    assert aws.sleeps == []
+
+def test_likes_page_through_the_sparse_index(aws):
+    dogs = all_likes(limit='30')
+    assert [dog['id'] for dog in dogs] == [f'dog-{i:03d}' for i in range(249, -1, -1) if i % 5]
+    interactions = aws.dynamodb.Table('pupper-interactions')
+    # 200 likes (and one dangling) read, none of the 50 dislikes
+    assert all(call == 'query' for call in interactions.calls)
+    assert interactions.read_units == pytest.approx(201 / 2)
+
+def test_disliking_removes_a_like(aws):
+    event = {'httpMethod': 'POST', 'path': '/interactions', 'headers': {'Authorization': token('user-1')},
+             'body': json.dumps({'dogId': 'dog-249', 'interaction': 'DISLIKE'})}
+    assert lam.handler(event, None)['statusCode'] == 200
+    _, body = get_likes(limit='1')
+    assert body['dogs'][0]['id'] == 'dog-248'
+
+def test_likes_rejects_bad_parameters(aws):
+    _, body = get_likes(limit='1')
+    assert get_likes(limit='many')[0] == 400
+    assert get_likes(nextToken='not json')[0] == 400
+    # Another user's cursor
+    assert get_likes('user-2', nextToken=body['nextToken'])[0] == 400
+
+def like(user_id, dog_id, interaction='LIKE'):
+    event = {'httpMethod': 'POST', 'path': '/interactions', 'headers': {'Authorization': token(user_id)},
+             'body': json.dumps({'dogId': dog_id, 'interaction': interaction})}
+    return lam.handler(event, None)['statusCode']
+
+def test_likes_carry_a_dog_summary(aws):
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    dogs.put_item(Item={
+        'id': 'rex', 'name': 'Rex', 'status': 'ACTIVE', 'city': 'Boise', 'state': 'ID', 'weightInPounds': 70,
+        'description': 'Long description that stays out of the summary', 'thumbnailPhoto': 'https://example.com/rex-50.png',
+        'photoFormats': {'thumbnail': {'png': 'https://example.com/rex-50.png', 'webp': 'https://example.com/rex-50.webp'}},
+    })
+    assert like('user-3', 'rex') == 200
+    dogs.calls = []
+
+    event = {'httpMethod': 'GET', 'path': '/likes', 'headers': {'Authorization': token('user-3'), 'Accept': 'image/webp'}}
+    body = json.loads(lam.handler(event, None)['body'])
+    assert dogs.calls == []
+    dog = body['dogs'][0]
+    assert (dog['id'], dog['name'], dog['city'], dog['weightInPounds']) == ('rex', 'Rex', 'Boise', 70)
+    assert dog['thumbnailPhoto'] == 'https://example.com/rex-50.webp'
+    assert 'description' not in dog
+
+def test_summaries_follow_changes_to_the_dog(aws):
+    dogs = aws.dynamodb.Table('pupper-dogs')
+    rex = {'id': 'rex', 'name': 'Rex', 'status': 'ACTIVE', 'city': 'Boise'}
+    dogs.put_item(Item=rex)
+    assert like('user-3', 'rex') == 200
+    assert like('user-4', 'rex') == 200
+    assert like('user-5', 'rex') == 200
+    assert like('user-5', 'rex', 'DISLIKE') == 200
+
+    renamed = dict(rex, name='Rexy')
+    event = {'Records': [
+        stream_record('MODIFY', new=renamed, old=rex),
+        # Nothing in the summary changed
+        stream_record('MODIFY', new=dict(renamed, description='New text'), old=renamed),
+    ]}
+    assert summary_refresher.handler(event, None) == {'dogs': 1, 'likes': 2}
+    assert [dog['name'] for dog in get_likes('user-3')[1]['dogs']] == ['Rexy']
+    assert 'dogSummary' not in aws.dynamodb.Table('pupper-interactions').get_item(Key={'userId': 'user-5', 'dogId': 'rex'})['Item']
+
+    # Deleted dogs drop out of the list
+    summary_refresher.handler({'Records': [stream_record('REMOVE', old=renamed)]}, None)
+    assert get_likes('user-4')[1]['dogs'] == []
+
+def test_unprocessed_keys_are_retried_with_backoff(aws):
+    aws.dynamodb.meta.client.unprocessed_rounds = 3
+    status, body = get_likes(limit='100')
+    assert status == 200
+    assert len(body['dogs']) == 100
+    assert len(aws.sleeps) == 3
+    assert all(0 <= delay <= batch.BACKOFF_CAP_SECONDS for delay in aws.sleeps)
+
+def test_keys_left_unprocessed_fail_the_request(aws):
+    aws.dynamodb.meta.client.unprocessed_rounds = 100
+    status, _ = get_likes()
+    assert status == 500
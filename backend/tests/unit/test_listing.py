@@ -0,0 +1,156 @@
+import importlib
+import json
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import images
+import listing
+import views
+from fakes import FakeAWS
+
+lam = importlib.import_module('lambda')
+
+@pytest.fixture
+def dogs(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    table = aws.dynamodb.Table('pupper-dogs')
+    places = [('WA', 'Seattle'), ('WA', 'Spokane'), ('OR', 'Portland')]
+    colors = ['Yellow', 'Black', 'Chocolate', 'Yellow', 'Black']
+    for i in range(25):
+        state, city = places[i % 3]
+        dog = {
+            'id': f'dog-{i:02d}', 'name': f'Dog {i}', 'status': 'ACTIVE', 'createdAt': f'2024-01-{i + 1:02d}T00:00:00',
+            'state': state, 'city': city, 'color': colors[i % 5], 'weightInPounds': 50 + i,
+        }
+        table.put_item(Item=dict(dog, **listing.listing_keys(dog)))
+    table.put_item(Item={'id': 'pending', 'name': 'Pending', 'status': 'PENDING', 'createdAt': '2024-02-01T00:00:00'})
+    table.calls = []
+    return table
+
+def list_dogs(**params):
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': params}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def test_listing_is_newest_first_by_default(dogs):
+    status, body = list_dogs(limit='3')
+    assert status == 200
+    assert [dog['id'] for dog in body['dogs']] == ['dog-24', 'dog-23', 'dog-22']
+    # The like counts aren't in the index: they are read through the dog
+    # cache, so only once per container
+    assert dogs.calls == ['query', 'batch_get_item']
+    dogs.calls = []
+    list_dogs(limit='3')
+    assert dogs.calls == ['query']
+
+def test_listing_pages_with_keyset_tokens(dogs):
+    seen, token = [], None
+    while True:
+        params = {'limit': '10', 'order': 'oldest'}
+        if token:
+            params['nextToken'] = token
+        _, body = list_dogs(**params)
+        seen += [dog['id'] for dog in body['dogs']]
+        token = body.get('nextToken')
+        if not token:
+            break
+    assert seen == [f'dog-{i:02d}' for i in range(25)]
+
+def test_listing_rejects_bad_parameters(dogs):
+    assert list_dogs(order='random')[0] == 400
+    assert list_dogs(nextToken='{"id": "dog-01"}')[0] == 400
+    assert list_dogs(nextToken='not json')[0] == 400
+
+def test_filters_are_served_from_their_indexes(dogs):
+    _, body = list_dogs(state='wa', city='Seattle', limit='100')
+    assert [dog['id'] for dog in body['dogs']] == [f'dog-{i:02d}' for i in range(24, -1, -1) if i % 3 == 0]
+    assert 'statusState' not in body['dogs'][0]
+
+    _, body = list_dogs(color='yellow', limit='100')
+    assert {dog['color'] for dog in body['dogs']} == {'Yellow'}
+    assert len(body['dogs']) == 10
+
+    _, body = list_dogs(minWeight='60', maxWeight='64', order='oldest')
+    assert [dog['weightInPounds'] for dog in body['dogs']] == [60, 61, 62, 63, 64]
+
+    _, body = list_dogs(state='OR', color='black', minWeight='55', limit='100')
+    assert [dog['id'] for dog in body['dogs']] == ['dog-14', 'dog-11']
+    assert dogs.calls.count('query') == 4 and set(dogs.calls) == {'query', 'batch_get_item'}
+
+def test_a_state_alone_is_in_listing_order_across_cities(dogs):
+    # Seattle and Spokane dogs interleave by listing date, not city by city
+    washington = [f'dog-{i:02d}' for i in range(24, -1, -1) if i % 3 != 2]
+    _, body = list_dogs(state='WA', limit='100')
+    assert [dog['id'] for dog in body['dogs']] == washington
+    assert {dog['city'] for dog in body['dogs'][:2]} == {'Seattle', 'Spokane'}
+    _, body = list_dogs(state='WA', order='oldest', limit='100')
+    assert [dog['id'] for dog in body['dogs']] == washington[::-1]
+    # Pages follow nextToken in the same order
+    seen, token = [], None
+    while True:
+        _, body = list_dogs(state='WA', limit='4', **({'nextToken': token} if token else {}))
+        seen += [dog['id'] for dog in body['dogs']]
+        token = body.get('nextToken')
+        if not token:
+            break
+    assert seen == washington
+
+def test_summary_view_reads_and_returns_less(dogs):
+    photo_formats = {'standard': {'png': 'https://example.com/standard.png', 'webp': 'https://example.com/standard.webp'}}
+    renditions = {'standard': [{'width': 400, 'height': 300, 'formats': {'png': 'https://example.com/standard-400.png', 'webp': 'https://example.com/standard-400.webp'}}]}
+    for item in dogs.items.values():
+        item.update({
+            'shelter': 'Happy Tails', 'originalPhoto': 'https://example.com/original.jpg', 'photo': 'https://example.com/standard.png',
+            'photoFormats': photo_formats, 'renditions': renditions, 'cardPhotos': images.card_photos(renditions, photo_formats, 'https://example.com'),
+        })
+    _, detail = list_dogs(limit='5')
+    dogs.calls = []
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': {'limit': '5', 'view': 'summary'},
+                            'headers': {'Accept': 'image/webp'}}, None)
+    summary = json.loads(response['body'])
+    # Served from the index alone, whose entries hold no renditions
+    assert dogs.calls == ['query']
+    assert 'renditions' not in dogs.indexed(dogs.items[('dog-24',)], 'StatusCreatedAtIndex')
+    assert [dog['id'] for dog in summary['dogs']] == [dog['id'] for dog in detail['dogs']]
+    assert summary['nextToken'] == detail['nextToken']
+    dog = summary['dogs'][0]
+    assert set(dog) <= set(views.SUMMARY_FIELDS)
+    assert dog['photo'] == 'https://example.com/standard.webp'
+    assert dog['photoSrcset'] == 'https://example.com/standard-400.webp 400w'
+    assert detail['dogs'][0]['photoFormats'] == photo_formats and 'cardPhotos' not in detail['dogs'][0]
+    assert len(response['body']) < len(json.dumps(detail)) / 2
+
+def test_fields_outside_the_summary_are_read_from_the_dogs(dogs):
+    dogs.items[('dog-24',)].update({'likeCount': 7, 'dislikeCount': 2})
+    assert 'dislikeCount' not in dogs.indexed(dogs.items[('dog-24',)], 'StatusCreatedAtIndex')
+    _, body = list_dogs(limit='1', fields='name,likeCount')
+    assert body['dogs'][0] == {'id': 'dog-24', 'name': 'Dog 24', 'likeCount': 7}
+    assert dogs.calls == ['query']
+    dogs.calls = []
+    _, body = list_dogs(limit='1', fields='name,dislikeCount')
+    assert body['dogs'][0] == {'id': 'dog-24', 'name': 'Dog 24', 'dislikeCount': 2}
+    assert dogs.calls == ['query', 'batch_get_item']
+
+def test_fields_pick_what_is_returned(dogs):
+    status, body = list_dogs(fields='name, weightInPounds', state='WA', minWeight='60')
+    assert status == 200
+    assert body['dogs'][0] == {'id': 'dog-24', 'name': 'Dog 24', 'weightInPounds': 74}
+    assert list_dogs(fields='name,statusState')[0] == 400
+    assert list_dogs(view='tiny')[0] == 400
+    assert views.attributes(views.SUMMARY_FIELDS).count('cardPhotos') == 1
+
+def test_filter_plan_picks_the_most_selective_index():
+    assert listing.plan_query({'state': 'WA', 'color': 'black'})['IndexName'] == 'StateIndex'
+    assert listing.plan_query({'state': 'WA', 'city': 'Seattle'})['IndexName'] == 'StateCityIndex'
+    assert listing.plan_query({'color': 'black', 'minWeight': '50'})['IndexName'] == 'ColorIndex'
+    assert listing.plan_query({'maxWeight': '50'})['IndexName'] == 'WeightIndex'
+    assert 'FilterExpression' not in listing.plan_query({'maxWeight': '50'})
+    with pytest.raises(ValueError):
+        listing.plan_query({'city': 'Seattle'})
+    with pytest.raises(ValueError):
+        listing.plan_query({'minWeight': 'heavy'})
+
+def test_pending_dogs_have_no_filter_keys():
+    assert listing.listing_keys({'status': 'PENDING', 'state': 'WA', 'color': 'Black', 'createdAt': '2024'}) == {}
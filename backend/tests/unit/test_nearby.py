@@ -0,0 +1,138 @@
+import importlib
+import json
+import random
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+from decimal import Decimal
+import pytest
+import geo
+import listing
+import nearby
+from fakes import FakeAWS
+
+lam = importlib.import_module('lambda')
+
+@pytest.fixture
+def dogs(monkeypatch):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    return aws.dynamodb.Table('pupper-dogs')
+
+def list_dogs(**params):
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs', 'queryStringParameters': params}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def test_geohash_cells_and_covers():
+    assert geo.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    south, west, north, east = geo.bounds('u4pruydqqvj')
+    assert south <= 57.64911 <= north and west <= 10.40744 <= east
+    assert geo.distance_miles(47.6062, -122.3321, 45.5152, -122.6784) == pytest.approx(145.4, abs=0.5)
+    # Small circles get fine cells, large ones coarse cells, within the
+    # budget of key ranges
+    small, large = geo.cover(47.6062, -122.3321, 1, 3, 16), geo.cover(47.6062, -122.3321, 100, 3, 16)
+    assert {len(cell) for cell in small} == {6} and {len(cell) for cell in large} == {3}
+    assert len(geo.runs(small, 3)) <= 16 and len(geo.runs(large, 3)) <= 16
+    # Across the antimeridian
+    assert {cell[0] for cell in geo.cover(0, 179.99, 20, 3, 16)} == {'2', '8', 'r', 'x'}
+    # Every point within the radius is in a cell of the cover
+    rng = random.Random(3)
+    for _ in range(50):
+        latitude, longitude, radius = rng.uniform(-70, 70), rng.uniform(-180, 180), rng.choice([0.5, 3, 20, 100])
+        cells = geo.cover(latitude, longitude, radius, 3, 16)
+        for _ in range(40):
+            point = (latitude + rng.uniform(-2, 2) * radius / 69, longitude + rng.uniform(-2, 2) * radius / 40)
+            if geo.distance_miles(latitude, longitude, *point) <= radius:
+                assert any(geo.encode(*point).startswith(cell) for cell in cells)
+
+def test_cities_resolve_to_coordinates():
+    assert geo.coordinates(' seattle ', 'wa') == {'latitude': Decimal('47.6062'), 'longitude': Decimal('-122.3321')}
+    assert geo.coordinates('Saint Louis', 'MO') == geo.coordinates('St. Louis', 'MO') != {}
+    assert geo.coordinates('Portland', 'ME')['longitude'] != geo.coordinates('Portland', 'OR')['longitude']
+    assert geo.coordinates('Atlantis', 'WA') == {} and geo.coordinates('', '') == {}
+    # Small towns are in the table too, under either spelling of their accents
+    assert geo.coordinates('Bay Minette', 'AL') != {}
+    assert geo.coordinates('Cañon City', 'CO') == geo.coordinates('canon city', 'co') != {}
+    keys = listing.listing_keys({'status': 'ACTIVE', 'createdAt': '2024', **geo.coordinates('Seattle', 'WA')})
+    assert keys['geoCell'] == 'ACTIVE#c23' and keys['geohash'].startswith('c23nb')
+
+def place_dogs(table, count=60, seed=5):
+    # Dogs scattered up to ~40 miles around downtown Seattle
+    rng = random.Random(seed)
+    for i in range(count):
+        dog = {
+            'id': f'near-{i:02d}', 'name': f'Near {i}', 'status': 'ACTIVE', 'createdAt': f'2024-03-01T00:00:{i:02d}',
+            'color': ['Yellow', 'Black'][i % 2], 'weightInPounds': 50 + i,
+            'latitude': Decimal(f"{47.6062 + rng.uniform(-0.6, 0.6):.4f}"), 'longitude': Decimal(f"{-122.3321 + rng.uniform(-0.8, 0.8):.4f}"),
+        }
+        table.put_item(Item=dict(dog, **listing.listing_keys(dog)))
+
+def test_near_lists_dogs_within_the_radius_nearest_first(dogs):
+    place_dogs(dogs)
+    dogs.calls = []
+    status, body = list_dogs(near='47.6062,-122.3321', radiusMiles='15', limit='100')
+    assert status == 200
+    expected = sorted(
+        (geo.distance_miles(47.6062, -122.3321, float(item['latitude']), float(item['longitude'])), item['id'])
+        for item in dogs.items.values() if 'geohash' in item
+    )
+    expected = [dog_id for distance, dog_id in expected if distance <= 15]
+    assert 0 < len(expected) < 60
+    assert [dog['id'] for dog in body['dogs']] == expected
+    distances = [dog['distanceMiles'] for dog in body['dogs']]
+    assert distances == sorted(distances) and distances[-1] <= 15
+    assert 'geohash' not in body['dogs'][0] and 'geoCell' not in body['dogs'][0]
+    plan = nearby.plan({'near': '47.6062,-122.3321', 'radiusMiles': '15'})
+    assert 0 < dogs.calls.count('query') <= sum(len(nearby.queries(plan, radius)) for radius in nearby.rings(plan))
+
+    # Pages follow nextToken
+    seen, token = [], None
+    while True:
+        params = {'near': '47.6062,-122.3321', 'radiusMiles': '15', 'limit': '7', 'fields': 'name'}
+        if token:
+            params['nextToken'] = token
+        _, body = list_dogs(**params)
+        seen += [dog['id'] for dog in body['dogs']]
+        assert all(set(dog) == {'id', 'name', 'distanceMiles'} for dog in body['dogs'])
+        token = body.get('nextToken')
+        if not token:
+            break
+    assert seen == expected
+
+def test_near_reads_wider_rings_only_until_a_page_is_found(dogs):
+    place_dogs(dogs)
+    # A crowd within half a mile fills the page from the first ring
+    for i in range(5):
+        dog = {'id': f'close-{i}', 'name': f'Close {i}', 'status': 'ACTIVE', 'createdAt': f'2024-03-02T00:00:0{i}',
+               'latitude': Decimal(f'47.60{i}'), 'longitude': Decimal('-122.3321')}
+        dogs.put_item(Item=dict(dog, **listing.listing_keys(dog)))
+    dogs.calls = []
+    _, body = list_dogs(near='47.6062,-122.3321', radiusMiles='40', limit='3')
+    assert [dog['id'] for dog in body['dogs']] == ['close-4', 'close-3', 'close-2'] and body['nextToken']
+    plan = nearby.plan({'near': '47.6062,-122.3321', 'radiusMiles': '40'})
+    assert dogs.calls.count('query') == len(nearby.queries(plan, nearby.FIRST_RING_MILES))
+    _, body = list_dogs(near='47.6062,-122.3321', radiusMiles='40', limit='3', nextToken=body['nextToken'])
+    assert [dog['id'] for dog in body['dogs']][:2] == ['close-1', 'close-0']
+
+def test_near_applies_filters_and_rejects_bad_parameters(dogs):
+    place_dogs(dogs)
+    _, body = list_dogs(near='47.6062,-122.3321', radiusMiles='40', color='black', minWeight='80', limit='100')
+    assert body['dogs'] and all(dog['color'] == 'Black' and dog['weightInPounds'] >= 80 for dog in body['dogs'])
+    # Far from every dog
+    assert list_dogs(near='25.7617,-80.1918')[1] == {'dogs': []}
+    assert list_dogs(near='47.6,north')[0] == 400
+    assert list_dogs(near='95,0')[0] == 400
+    assert list_dogs(near='47.6,-122.3', radiusMiles='500')[0] == 400
+    assert list_dogs(near='47.6,-122.3', state='WA')[0] == 400
+    assert list_dogs(near='47.6,-122.3', nextToken='{"id": "dog-01"}')[0] == 400
+
+def test_new_dogs_are_placed_from_their_city(capsys):
+    fields = lam.dog_fields({'name': 'Rex', 'city': 'Spokane', 'state': 'WA'})
+    assert fields['latitude'] == Decimal('47.6588')
+    assert capsys.readouterr().out == ''
+    # Places the table lacks are counted, by name
+    assert 'latitude' not in lam.dog_fields({'name': 'Rex', 'city': 'Nowhere', 'state': 'WA'})
+    metric = json.loads(capsys.readouterr().out)
+    assert metric['_aws']['CloudWatchMetrics'][0]['Metrics'] == [{'Name': 'UnresolvedCity', 'Unit': 'Count'}]
+    assert (metric['UnresolvedCity'], metric['city'], metric['state']) == (1, 'Nowhere', 'WA')
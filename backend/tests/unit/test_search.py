@@ -0,0 +1,111 @@
+import importlib
+import json
+import random
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+import pytest
+import ingest
+import search
+import search_indexer
+from fakes import FakeAWS, stream_record
+
+lam = importlib.import_module('lambda')
+BUCKET = 'pupper-photos-957798448417'
+
+DOGS = [
+    {'id': 'max', 'name': 'Max', 'city': 'Seattle', 'description': 'Friendly yellow lab who loves fetch and swimming.', 'createdAt': '2024-01-01'},
+    {'id': 'bella', 'name': 'Bella', 'city': 'Portland', 'description': 'Sweet yellow lab, great with kids.', 'createdAt': '2024-01-02'},
+    {'id': 'charlie', 'name': 'Charlie', 'city': 'Denver', 'description': 'Energetic chocolate lab who loved outdoor adventures.', 'createdAt': '2024-01-03'},
+    {'id': 'luna', 'name': 'Luna', 'city': 'Austin', 'description': 'Gentle black lab, perfect family companion.', 'createdAt': '2024-01-04'},
+    {'id': 'rocky', 'name': 'Rocky', 'city': 'Phoenix', 'description': 'Strong yellow lab who loves playing fetch.', 'createdAt': '2024-01-05', 'status': 'PENDING'},
+]
+
+@pytest.fixture
+def aws(monkeypatch, tmp_path):
+    aws = FakeAWS()
+    aws.install(monkeypatch)
+    ingest.s3_client.cache_clear()
+    search_indexer.s3_client.cache_clear()
+    monkeypatch.setattr(search, '_loaded', {'index': None, 'etag': None, 'checked': 0.0})
+    monkeypatch.setattr(search, 'CACHE_DIR', str(tmp_path))
+    yield aws
+    ingest.s3_client.cache_clear()
+    search_indexer.s3_client.cache_clear()
+
+def search_dogs(**params):
+    response = lam.handler({'httpMethod': 'GET', 'path': '/dogs/search', 'queryStringParameters': params}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def test_word_forms_share_a_stem():
+    assert search.tokenize('Loves, loved and LOVING the kids') == ['lov', 'lov', 'lov', 'kid']
+    assert search.stem('swimming') == search.stem('swims') == 'swim'
+    assert search.stem('puppies') == search.stem('puppy')
+
+def test_search_matches_all_terms_newest_first():
+    index = search.SearchIndex(search.build(DOGS))
+    assert index.search('yellow lab') == (['bella', 'max'], 2)
+    assert index.search('love') == (['charlie', 'max'], 2)
+    # The last term matches as a prefix while it is being typed
+    assert index.search('port') == (['bella'], 1)
+    assert index.search('yellow sea') == (['max'], 1)
+    # Pending dogs are not listed
+    assert index.search('rocky') == ([], 0)
+    assert index.search('the') == ([], 0)
+
+def test_bitmap_postings_give_the_same_results():
+    rng = random.Random(3)
+    words = ['calm', 'playful', 'senior', 'puppy', 'yellow', 'black', 'swimmer', 'fetch']
+    dogs = [
+        {'id': f'dog-{i:04d}', 'name': f'Dog {i}', 'city': 'Seattle', 'description': ' '.join(rng.sample(words, 3)), 'createdAt': f'{i:04d}'}
+        for i in range(600)
+    ]
+    index = search.SearchIndex(search.build(dogs))
+    assert set(index.kinds) == {search.POSTINGS_ARRAY, search.POSTINGS_BITMAP}
+
+    def matches(dog, query):
+        *words, last = query.split()
+        terms = search.document_terms(dog)
+        return all(search.stem(word) in terms for word in words) and (search.stem(last) in terms or any(term.startswith(last) for term in terms))
+
+    for query in ('yellow', 'calm puppy', 'seattle black', 'dog 59', 'swim', 'black yellow fetch'):
+        expected = [dog['id'] for dog in reversed(dogs) if matches(dog, query)]
+        assert index.search(query, limit=1000) == (expected, len(expected))
+
+def test_search_endpoint_reads_index_from_s3(aws):
+    table = aws.dynamodb.Table('pupper-dogs')
+    for dog in DOGS:
+        table.put_item(Item=dict(dog, status=dog.get('status', 'ACTIVE')))
+    aws.s3.put_object(Bucket=BUCKET, Key=search.INDEX_KEY, Body=search.build(DOGS))
+
+    status, body = search_dogs(q='yellow lab', limit='1')
+    assert status == 200
+    assert [dog['id'] for dog in body['dogs']] == ['bella']
+    assert body['total'] == 2
+    assert table.calls[-1] == 'batch_get_item'
+    status, body = search_dogs(q='yellow lab', fields='name')
+    assert body['dogs'] == [{'id': 'bella', 'name': 'Bella'}, {'id': 'max', 'name': 'Max'}]
+    assert search_dogs()[0] == 400
+    assert search_dogs(q='lab', limit='x')[0] == 400
+
+def test_indexer_applies_stream_changes(aws):
+    aws.s3.put_object(Bucket=BUCKET, Key=search.INDEX_KEY, Body=search.build(DOGS))
+    rocky = dict(DOGS[4], status='ACTIVE')
+    luna = dict(DOGS[3], status='ACTIVE')
+    event = {'Records': [
+        # Rocky is listed, Luna's description changes, Max is deleted
+        stream_record('MODIFY', new=rocky, old=DOGS[4]),
+        stream_record('MODIFY', new=dict(luna, description='Gentle black lab who loves naps.'), old=luna),
+        stream_record('REMOVE', old=dict(DOGS[0], status='ACTIVE')),
+        # Changes to attributes that are not searched leave the index alone
+        stream_record('MODIFY', new=dict(DOGS[1], status='ACTIVE', likes=3), old=dict(DOGS[1], status='ACTIVE')),
+    ]}
+    assert search_indexer.handler(event, None) == {'upserts': 2, 'deletes': 1}
+
+    index = search.load(aws.s3, BUCKET, max_age=0)
+    assert index.search('fetch') == (['rocky'], 1)
+    assert index.search('nap') == (['luna'], 1)
+    assert index.search('perfect companion') == ([], 0)
+    assert index.search('bella') == (['bella'], 1)
+    assert search_indexer.handler({'Records': event['Records'][3:]}, None) == {'upserts': 0, 'deletes': 0}
@@ -0,0 +1,50 @@
+import io
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../backend')))
+sys.path.insert(0, os.path.dirname(__file__))
+from PIL import Image
+import variant_cache
+from fakes import FakeS3
+
+def make_original():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (10, 120, 200)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def test_variant_is_generated_once_and_then_served_from_cache():
+    s3 = FakeS3()
+    loads = []
+    def load_original():
+        loads.append(1)
+        return make_original()
+
+    deadline = time.monotonic() + 10
+    assert variant_cache.get_or_create(s3, 'bucket', 'dog', 'standard-800.webp', load_original, deadline) == 'generated'
+    assert variant_cache.get_or_create(s3, 'bucket', 'dog', 'standard-800.webp', load_original, deadline) == 'hit'
+    assert len(loads) == 1
+    assert Image.open(io.BytesIO(s3.objects[('bucket', 'dog/standard-800.webp')]['Body'])).size == (800, 600)
+    assert ('bucket', 'dog/.locks/standard-800.webp') not in s3.objects
+
+def test_concurrent_misses_are_coalesced():
+    s3 = FakeS3()
+    loads = []
+    def load_original():
+        loads.append(1)
+        time.sleep(0.3)
+        return make_original()
+
+    deadline = time.monotonic() + 10
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: variant_cache.get_or_create(s3, 'bucket', 'dog', 'thumbnail-100.png', load_original, deadline), range(4)))
+    assert sorted(results) == ['coalesced', 'coalesced', 'coalesced', 'generated']
+    assert len(loads) == 1
+
+def test_misses_are_not_locked_without_conditional_writes(monkeypatch):
+    monkeypatch.setattr(variant_cache, 'CONDITIONAL_WRITES', False)
+    s3 = FakeS3()
+    deadline = time.monotonic() + 10
+    assert variant_cache.get_or_create(s3, 'bucket', 'dog', 'standard-800.webp', make_original, deadline) == 'generated'
+    assert [call for call in s3.calls if call[0] != 'head_object'] == [('put_object', 'dog/standard-800.webp')]
@@ -0,0 +1,56 @@
+import boto3
+import sys
+import os
+from collections import Counter
+from boto3.dynamodb.conditions import Key
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import counters
+
+def scan_all(table, **scan_params):
+    while True:
+        response = table.scan(**scan_params)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def backfill_dog_counters():
+    # Recounts every dog's likes and dislikes from pupper-interactions: sets
+    # the counters (all on shard 0) and likeCount/dislikeCount on the dog, so
+    # that every dog is in PopularityIndex. Also corrects counts a retried
+    # stream batch counted twice. Swipes recorded while this runs may be
+    # counted twice or not at all; run it when swiping is quiet.
+    dynamodb = boto3.resource('dynamodb')
+    interactions_table = dynamodb.Table('pupper-interactions')
+    dogs_table = dynamodb.Table('pupper-dogs')
+    counters_table = dynamodb.Table(counters.COUNTERS_TABLE)
+
+    tallies = Counter()
+    for item in scan_all(interactions_table, ProjectionExpression='dogId, interaction'):
+        if item.get('interaction') in counters.COUNTED:
+            tallies[(item['dogId'], counters.COUNTED[item['interaction']])] += 1
+
+    updated = 0
+    for dog in scan_all(dogs_table, ProjectionExpression='id'):
+        dog_id = dog['id']
+        likes, dislikes = tallies[(dog_id, 'likes')], tallies[(dog_id, 'dislikes')]
+        try:
+            shards = counters_table.query(KeyConditionExpression=Key('dogId').eq(dog_id), ProjectionExpression='shard')['Items']
+            with counters_table.batch_writer() as writer:
+                for shard in shards:
+                    if shard['shard'] != 0:
+                        writer.delete_item(Key={'dogId': dog_id, 'shard': shard['shard']})
+                writer.put_item(Item={'dogId': dog_id, 'shard': 0, 'likes': likes, 'dislikes': dislikes})
+            dogs_table.update_item(
+                Key={'id': dog_id},
+                UpdateExpression='SET likeCount = :likes, dislikeCount = :dislikes',
+                ExpressionAttributeValues={':likes': likes, ':dislikes': dislikes}
+            )
+            updated += 1
+        except Exception as e:
+            print(f"Error counting dog {dog_id}: {e}")
+
+    print(f"Counted {sum(tallies.values())} interactions for {updated} dogs")
+
+if __name__ == "__main__":
+    backfill_dog_counters()
@@ -0,0 +1,48 @@
+import boto3
+import sys
+import os
+from boto3.dynamodb.conditions import Attr
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import likes
+
+def backfill_like_keys():
+    # Sets likedBy and dogSummary on LIKE interactions recorded before the
+    # sparse likes indexes and dog summaries existed, so they show up in
+    # GET /likes again and are answered without a join
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-interactions')
+    dogs_table = dynamodb.Table('pupper-dogs')
+
+    summaries = {}
+    updated = 0
+    scan_params = {
+        'FilterExpression': Attr('interaction').eq('LIKE') & (Attr('likedBy').not_exists() | Attr('dogSummary').not_exists()),
+        'ProjectionExpression': 'userId, dogId'
+    }
+    while True:
+        response = table.scan(**scan_params)
+        for item in response['Items']:
+            dog_id = item['dogId']
+            try:
+                if dog_id not in summaries:
+                    dog = dogs_table.get_item(Key={'id': dog_id}, **likes.source_projection()).get('Item')
+                    summaries[dog_id] = likes.dog_summary(dog)
+                # Skips interactions that were changed to a DISLIKE meanwhile
+                table.update_item(
+                    Key={'userId': item['userId'], 'dogId': dog_id},
+                    UpdateExpression='SET likedBy = :user, dogSummary = :summary',
+                    ConditionExpression='interaction = :like',
+                    ExpressionAttributeValues={':user': item['userId'], ':summary': summaries[dog_id], ':like': 'LIKE'}
+                )
+                updated += 1
+            except Exception as e:
+                print(f"Error backfilling like of {dog_id} by {item['userId']}: {e}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Backfilled {updated} likes")
+
+if __name__ == "__main__":
+    backfill_like_keys()
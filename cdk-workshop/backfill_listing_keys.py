@@ -0,0 +1,69 @@
+import boto3
+import sys
+import os
+from collections import Counter
+from datetime import datetime
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import geo
+import images
+import listing
+
+def backfill_listing_keys():
+    # Sets the attributes the GET /dogs listing indexes are keyed on. Dogs
+    # created before async ingestion have no status or createdAt, dogs
+    # created before the filter indexes have no composite keys, and dogs
+    # created before GeoIndex have no coordinates. Also sets cardPhotos, which
+    # the indexes serve view=summary photos from, on dogs created before it.
+    # Ends with a report of the places geo.py could not resolve, most dogs
+    # first: add them with build_cities.py and run this again.
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-dogs')
+
+    updated = 0
+    unresolved = Counter()
+    scan_params = {
+        'ProjectionExpression': 'id, #status, createdAt, shelterEntryDate, #state, city, color, statusState, cityCreatedAt, statusColor, latitude, longitude, geoCell, geohash, '
+                                'originalPhoto, photoFormats, renditions, cardPhotos',
+        'ExpressionAttributeNames': {'#status': 'status', '#state': 'state'}
+    }
+    while True:
+        response = table.scan(**scan_params)
+        for item in response['Items']:
+            location = geo.coordinates(item.get('city'), item.get('state'))
+            if not location and 'latitude' not in item:
+                unresolved[(item.get('city') or '', item.get('state') or '')] += 1
+            # The shelter entry date is the best guess at when a legacy dog was listed
+            fields = {
+                'status': item.get('status', 'ACTIVE'),
+                'createdAt': item.get('createdAt') or item.get('shelterEntryDate') or datetime.utcnow().isoformat(),
+                **location,
+            }
+            fields.update(listing.listing_keys(dict(item, **fields)))
+            if 'cardPhotos' not in item and 'renditions' in item and 'photoFormats' in item:
+                fields['cardPhotos'] = images.card_photos(item['renditions'], item['photoFormats'], item['originalPhoto'].rsplit('/', 1)[0])
+            if all(item.get(name) == value for name, value in fields.items()):
+                continue
+            try:
+                table.update_item(
+                    Key={'id': item['id']},
+                    UpdateExpression='SET ' + ', '.join(f"#{name} = :{name}" for name in fields),
+                    ConditionExpression='attribute_exists(id)',
+                    ExpressionAttributeNames={f"#{name}": name for name in fields},
+                    ExpressionAttributeValues={f":{name}": value for name, value in fields.items()}
+                )
+                updated += 1
+                print(f"Backfilled listing keys for dog {item['id']}")
+            except Exception as e:
+                print(f"Error backfilling dog {item['id']}: {e}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Backfilled listing keys for {updated} dogs")
+    print(f"{sum(unresolved.values())} dogs in {len(unresolved)} places have no coordinates")
+    for (city, state), count in unresolved.most_common():
+        print(f"{count:>6}  {city or '(no city)'}, {state or '(no state)'}")
+
+if __name__ == "__main__":
+    backfill_listing_keys()
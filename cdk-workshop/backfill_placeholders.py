@@ -0,0 +1,47 @@
+import boto3
+import sys
+import os
+from urllib.parse import urlparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import images
+
+def backfill_placeholders():
+    # Adds the inline placeholder to every dog created before it existed
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-dogs')
+    s3 = boto3.client('s3')
+    bucket_name = "pupper-photos-957798448417"
+
+    updated = 0
+    scan_params = {
+        'FilterExpression': 'attribute_not_exists(placeholder) AND attribute_exists(originalPhoto)',
+        'ProjectionExpression': 'id, originalPhoto'
+    }
+    while True:
+        response = table.scan(**scan_params)
+        for item in response['Items']:
+            dog_id = item['id']
+            try:
+                original_key = urlparse(item['originalPhoto']).path.lstrip('/')
+                image_data = s3.get_object(Bucket=bucket_name, Key=original_key)['Body'].read()
+                # The placeholder is 20px wide, so let JPEGs decode at 1/8 scale
+                img = images.decode(image_data, min_size=(images.PLACEHOLDER_WIDTH * 4, images.PLACEHOLDER_WIDTH * 4))
+                table.update_item(
+                    Key={'id': dog_id},
+                    UpdateExpression='SET placeholder = :placeholder',
+                    ConditionExpression='attribute_exists(id)',
+                    ExpressionAttributeValues={':placeholder': images.placeholder(img)}
+                )
+                updated += 1
+                print(f"Backfilled placeholder for dog {dog_id}")
+            except Exception as e:
+                print(f"Error backfilling dog {dog_id}: {e}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Backfilled placeholders for {updated} dogs")
+
+if __name__ == "__main__":
+    backfill_placeholders()
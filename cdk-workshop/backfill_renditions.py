@@ -0,0 +1,52 @@
+import boto3
+import sys
+import os
+from urllib.parse import urlparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import images
+
+def backfill_renditions():
+    # Regenerates renditions for every dog created with an older RENDITION_SPEC
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-dogs')
+    s3 = boto3.client('s3')
+    bucket_name = "pupper-photos-957798448417"
+    version = images.RENDITION_SPEC['version']
+
+    updated = 0
+    scan_params = {}
+    while True:
+        response = table.scan(**scan_params)
+        for item in response['Items']:
+            if int(item.get('renditionVersion', 1)) >= version or not item.get('originalPhoto'):
+                continue
+            dog_id = item['id']
+
+            try:
+                original_key = urlparse(item['originalPhoto']).path.lstrip('/')
+                image_data = s3.get_object(Bucket=bucket_name, Key=original_key)['Body'].read()
+                img = images.decode(image_data, min_size=images.minimum_source_size())
+                outputs = images.render(img)
+                for output in outputs:
+                    s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/{output['key']}", Body=output['data'], ContentType=output['contentType'])
+
+                fields = dict(images.record_fields(outputs, item['originalPhoto'].rsplit('/', 1)[0]), placeholder=images.placeholder(img))
+                table.update_item(
+                    Key={'id': dog_id},
+                    UpdateExpression='SET ' + ', '.join(f"#{name} = :{name}" for name in fields),
+                    ExpressionAttributeNames={f"#{name}": name for name in fields},
+                    ExpressionAttributeValues={f":{name}": value for name, value in fields.items()}
+                )
+                updated += 1
+                print(f"Backfilled renditions for dog {dog_id}")
+            except Exception as e:
+                print(f"Error backfilling dog {dog_id}: {e}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Backfilled {updated} dogs to rendition spec v{version}")
+
+if __name__ == "__main__":
+    backfill_renditions()
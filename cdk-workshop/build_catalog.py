@@ -0,0 +1,35 @@
+import boto3
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import catalog
+
+def build_catalog():
+    # Rebuilds the GET /dogs?snapshot= catalog snapshot from the whole dogs
+    # table. Run once after deploying the catalog materializer, and whenever
+    # the snapshot's fields change; the materializer applies every later write
+    # on top of it.
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-dogs')
+    s3 = boto3.client('s3')
+    bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+
+    dogs = []
+    attributes = list(dict.fromkeys(catalog.ATTRIBUTES + ['status']))
+    scan_params = {
+        'ProjectionExpression': ', '.join(f"#p{i}" for i in range(len(attributes))),
+        'ExpressionAttributeNames': {f"#p{i}": name for i, name in enumerate(attributes)}
+    }
+    while True:
+        response = table.scan(**scan_params)
+        dogs.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    entries = catalog.ordered(entry for entry in map(catalog.entry, dogs) if entry)
+    pointer = catalog.publish(s3, bucket_name, entries, catalog.read_pointer(s3, bucket_name))
+    print(f"Published {pointer['count']} of {len(dogs)} dogs as catalog version {pointer['version']} to s3://{bucket_name}/{catalog.POINTER_KEY}")
+
+if __name__ == "__main__":
+    build_catalog()
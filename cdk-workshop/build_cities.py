@@ -0,0 +1,66 @@
+import argparse
+import csv
+import io
+import sys
+import os
+import zipfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import geo
+
+# Columns of the GeoNames place dumps (https://download.geonames.org/export/dump/,
+# CC BY 4.0), one tab-separated line per place
+NAME, LATITUDE, LONGITUDE, COUNTRY, ADMIN1, POPULATION = 1, 4, 5, 8, 10, 14
+
+
+def us_places(lines):
+    # (city, state, latitude, longitude, population) of each US place in a dump
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if fields[COUNTRY] == 'US' and len(fields[ADMIN1]) == 2 and fields[ADMIN1].isalpha():
+            yield fields[NAME], fields[ADMIN1], float(fields[LATITUDE]), float(fields[LONGITUDE]), int(fields[POPULATION] or 0)
+
+
+def merge(kept, places):
+    # Table rows: those of kept (the current table) as they are, so dogs keep
+    # the coordinates they were given, and the most populous place of every
+    # other name in a state
+    rows = {geo.place_key(row['city'], row['state']): row for row in kept}
+    best = {}
+    for city, state, latitude, longitude, population in places:
+        key = geo.place_key(city, state)
+        if key not in rows and (key not in best or population > best[key][1]):
+            best[key] = ({'city': city, 'state': state, 'latitude': f"{latitude:.4f}", 'longitude': f"{longitude:.4f}"}, population)
+    rows.update((key, row) for key, (row, _) in best.items())
+    return sorted(rows.values(), key=lambda row: (row['state'], row['city']))
+
+
+def build_cities():
+    # Rebuilds backend/backend/cities.csv, the table geo.py resolves dog
+    # cities from, out of a GeoNames dump: cities500.zip (every place of 500
+    # people or more) by default. Run it to add places dogs are listed in
+    # that the table lacks; backfill_listing_keys.py reports those.
+    #
+    #   python build_cities.py cities500.zip [--output ../backend/backend/cities.csv]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dump', help='GeoNames dump, .zip or .txt')
+    parser.add_argument('--output', default=geo.CITIES_FILE)
+    args = parser.parse_args()
+
+    if args.dump.endswith('.zip'):
+        with zipfile.ZipFile(args.dump) as archive:
+            lines = io.TextIOWrapper(archive.open(archive.namelist()[0]), encoding='utf-8').readlines()
+    else:
+        with open(args.dump, encoding='utf-8') as f:
+            lines = f.readlines()
+    with open(args.output, newline='') as f:
+        kept = list(csv.DictReader(f))
+
+    rows = merge(kept, us_places(lines))
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['city', 'state', 'latitude', 'longitude'], lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Wrote {len(rows)} places to {args.output}, {len(rows) - len(kept)} of them new")
+
+if __name__ == "__main__":
+    build_cities()
@@ -0,0 +1,77 @@
+import argparse
+import glob
+import json
+import time
+import boto3
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import neighbors
+import similarity
+
+BUCKET_NAME = 'pupper-photos-957798448417'
+
+def scan_likes(client, segments):
+    # (userId, dogId, timestamp) of every LIKE in pupper-interactions, read
+    # with a parallel scan of segments segments
+    def scan_segment(segment):
+        likes, params = [], {
+            'TableName': 'pupper-interactions', 'Segment': segment, 'TotalSegments': segments,
+            'FilterExpression': 'interaction = :like', 'ProjectionExpression': 'userId, dogId, #ts',
+            'ExpressionAttributeNames': {'#ts': 'timestamp'}, 'ExpressionAttributeValues': {':like': {'S': 'LIKE'}},
+        }
+        while True:
+            response = client.scan(**params)
+            likes.extend((item['userId']['S'], item['dogId']['S'], item.get('timestamp', {'S': ''})['S']) for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return likes
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for likes in pool.map(scan_segment, range(segments)):
+            yield from likes
+
+def exported_likes(directory):
+    # The same from the NDJSON files export_tables.py wrote to directory
+    for path in sorted(glob.glob(os.path.join(directory, 'pupper-interactions', '*.ndjson'))):
+        with open(path) as f:
+            for line in f:
+                item = json.loads(line)
+                if item.get('interaction') == 'LIKE':
+                    yield item['userId'], item['dogId'], item.get('timestamp', '')
+
+def build_neighbors():
+    # Computes every dog's top --k neighbors by co-likes (backend/similarity.py)
+    # and uploads them for GET /feed to rank with (backend/neighbors.py). Reads
+    # the likes from the table, or from an export_tables.py export with
+    # --export. Needs NumPy and SciPy, the backend's neighbors extra. Run it
+    # again to pick up new likes; containers load the new file within
+    # NEIGHBORS_REFRESH_SECONDS.
+    #
+    #   python build_neighbors.py [--export exports/2025-01-01] [--k 50] [--output neighbors.bin]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', help='local directory written by export_tables.py')
+    parser.add_argument('--segments', type=int, default=8)
+    parser.add_argument('--k', type=int, default=similarity.K)
+    parser.add_argument('--min-co-likes', type=int, default=similarity.MIN_CO_LIKES)
+    parser.add_argument('--output', help='write the file here instead of uploading it')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    likes = exported_likes(args.export) if args.export else scan_likes(boto3.client('dynamodb'), args.segments)
+    matrix, dog_ids = similarity.like_matrix(likes)
+    read = time.monotonic()
+    indices, scores = similarity.top_neighbors(matrix, k=args.k, min_co_likes=args.min_co_likes)
+    data = neighbors.encode(dog_ids, args.k, indices, scores)
+    print(f"{matrix.nnz} likes by {matrix.shape[0]} users of {len(dog_ids)} dogs read in {read - started:.1f} s; "
+          f"neighbors computed in {time.monotonic() - read:.1f} s, {len(data) / 1e6:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    else:
+        boto3.client('s3').put_object(Bucket=BUCKET_NAME, Key=neighbors.NEIGHBORS_KEY, Body=data, ContentType='application/octet-stream')
+        print(f"Uploaded s3://{BUCKET_NAME}/{neighbors.NEIGHBORS_KEY}")
+
+if __name__ == "__main__":
+    build_neighbors()
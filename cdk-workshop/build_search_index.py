@@ -0,0 +1,34 @@
+import boto3
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import search
+
+def build_search_index():
+    # Rebuilds the GET /dogs/search index from the whole dogs table. Run once
+    # after deploying the search indexer, and whenever the index format or
+    # tokenizer changes; the indexer applies every later write on top of it.
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table('pupper-dogs')
+    s3 = boto3.client('s3')
+    bucket_name = os.environ.get('BUCKET_NAME', 'pupper-photos-957798448417')
+
+    dogs = []
+    scan_params = {
+        'ProjectionExpression': 'id, #status, createdAt, ' + ', '.join(f"#{field}" for field in search.SEARCH_FIELDS),
+        'ExpressionAttributeNames': dict({'#status': 'status'}, **{f"#{field}": field for field in search.SEARCH_FIELDS})
+    }
+    while True:
+        response = table.scan(**scan_params)
+        dogs.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    data = search.build(dogs)
+    s3.put_object(Bucket=bucket_name, Key=search.INDEX_KEY, Body=data, ContentType='application/octet-stream')
+    index = search.SearchIndex(data)
+    print(f"Indexed {index.doc_count} of {len(dogs)} dogs ({index.term_count} terms, {len(data)} bytes) to s3://{bucket_name}/{search.INDEX_KEY}")
+
+if __name__ == "__main__":
+    build_search_index()
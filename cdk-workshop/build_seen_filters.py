@@ -0,0 +1,37 @@
+import boto3
+import sys
+import os
+from collections import defaultdict
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import seen
+
+def scan_all(table, **scan_params):
+    while True:
+        response = table.scan(**scan_params)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def build_seen_filters():
+    # Adds every swipe in pupper-interactions to its user's seen filter, for
+    # the swipes recorded before the seen recorder was deployed. Filters only
+    # ever gain dogs, so this is safe to run alongside the recorder, and again.
+    table = boto3.resource('dynamodb').Table('pupper-interactions')
+
+    swiped = defaultdict(list)
+    for item in scan_all(table, ProjectionExpression='userId, dogId'):
+        if not seen.is_seen_key(item['dogId']):
+            swiped[item['userId']].append(item['dogId'])
+
+    added = 0
+    for user_id, dog_ids in swiped.items():
+        try:
+            added += seen.record(table, user_id, dog_ids)
+        except Exception as e:
+            print(f"Error building the seen filter of {user_id}: {e}")
+
+    print(f"Added {added} of {sum(map(len, swiped.values()))} swipes to the seen filters of {len(swiped)} users")
+
+if __name__ == "__main__":
+    build_seen_filters()
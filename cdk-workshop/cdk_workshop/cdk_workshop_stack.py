@@ -8,6 +8,8 @@ from aws_cdk import (
     aws_cloudwatch as cloudwatch,
     aws_xray as xray,
     aws_logs as logs,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
 )
 import sys
 import os
@@ -22,7 +24,7 @@ class pupperStack(Stack):
         super().__init__(scope, construct_id, **kwargs)
 
         # Create DynamoDB tables
-        self.dogs_table, self.interactions_table = create_tables(self)
+        self.dogs_table, self.interactions_table, self.photos_table, self.counters_table = create_tables(self)
 
         # Create S3 bucket
         bucket, bucket_name = create_bucket(self)
@@ -35,6 +37,17 @@ class pupperStack(Stack):
             description="Pillow library for image processing"
         )
 
+        # Async ingestion queue; messages that fail 3 times are dead-lettered
+        ingest_dlq = sqs.Queue(
+            self, "IngestDeadLetterQueue",
+            retention_period=Duration.days(14)
+        )
+        ingest_queue = sqs.Queue(
+            self, "IngestQueue",
+            visibility_timeout=Duration.seconds(360), # 6x the worker timeout
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=3, queue=ingest_dlq)
+        )
+
         # Lambda function - using code from backend/lambda.py
         lambda_fn = _lambda.Function(
             self, "DogsApiFunction",
@@ -47,13 +60,194 @@ class pupperStack(Stack):
                 "BUCKET_NAME": bucket_name,
                 "TABLE_NAME": "pupper-dogs",
                 "INTERACTIONS_TABLE": "pupper-interactions",
-                "REGION": self.region
+                "REGION": self.region,
+                "INGEST_QUEUE_URL": ingest_queue.queue_url
             },
             code=_lambda.Code.from_asset("../backend/backend"),
             log_retention=logs.RetentionDays.ONE_MONTH, # Set logs to expire after one month
             tracing=_lambda.Tracing.ACTIVE # Enable X-Ray tracing
         )
 
+        # Ingestion worker - classifies and renders dogs queued by POST /dogs (backend/worker.py)
+        worker_fn = _lambda.Function(
+            self, "IngestWorkerFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="worker.handler",
+            timeout=Duration.seconds(60),
+            memory_size=1024,
+            layers=[pillow_layer],
+            environment={
+                "BUCKET_NAME": bucket_name,
+                "TABLE_NAME": "pupper-dogs",
+                "REGION": self.region,
+                "MAX_RECEIVE_COUNT": "3"
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        worker_fn.add_event_source(lambda_event_sources.SqsEventSource(
+            ingest_queue,
+            batch_size=5,
+            report_batch_item_failures=True
+        ))
+
+        # Search indexer - keeps the GET /dogs/search index in S3 current from
+        # the dogs table stream (backend/search_indexer.py). One at a time, since
+        # each batch rewrites the whole index file.
+        search_indexer_fn = _lambda.Function(
+            self, "SearchIndexerFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="search_indexer.handler",
+            timeout=Duration.seconds(60),
+            memory_size=1024,
+            reserved_concurrent_executions=1,
+            environment={
+                "BUCKET_NAME": bucket_name,
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        search_indexer_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.dogs_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=500,
+            max_batching_window=Duration.seconds(10),
+            retry_attempts=10
+        ))
+
+        # Catalog materializer - publishes the GET /dogs?snapshot= catalog
+        # snapshot in S3 from the dogs table stream (backend/catalog_materializer.py).
+        # One at a time, since each batch builds on the snapshot before it, and
+        # with the Pillow layer for photo negotiation.
+        catalog_materializer_fn = _lambda.Function(
+            self, "CatalogMaterializerFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="catalog_materializer.handler",
+            timeout=Duration.seconds(60),
+            memory_size=1024,
+            reserved_concurrent_executions=1,
+            layers=[pillow_layer],
+            environment={
+                "BUCKET_NAME": bucket_name,
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        catalog_materializer_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.dogs_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=500,
+            max_batching_window=Duration.seconds(5),
+            retry_attempts=10
+        ))
+
+        # Summary refresher - rewrites the dog summaries copied onto likes when
+        # a dog changes (backend/summary_refresher.py)
+        summary_refresher_fn = _lambda.Function(
+            self, "SummaryRefresherFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="summary_refresher.handler",
+            timeout=Duration.seconds(60),
+            memory_size=256,
+            environment={
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        summary_refresher_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.dogs_table,
+            starting_position=_lambda.StartingPosition.LATEST,
+            batch_size=100,
+            retry_attempts=10
+        ))
+
+        # Counter aggregator - keeps per-dog like/dislike counters from the
+        # interactions stream (backend/counter_aggregator.py). Large batches
+        # fold many swipes into one counter write per dog; a parallelization
+        # factor of 4 keeps up with swipe bursts.
+        counter_aggregator_fn = _lambda.Function(
+            self, "CounterAggregatorFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="counter_aggregator.handler",
+            timeout=Duration.seconds(60),
+            memory_size=512,
+            environment={
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        counter_aggregator_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.interactions_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=1000,
+            max_batching_window=Duration.seconds(5),
+            parallelization_factor=4,
+            retry_attempts=10
+        ))
+
+        # Counter flusher - copies the summed counters onto the dogs from the
+        # counters table stream (backend/counter_flusher.py). Batches gather up
+        # to a minute of counter writes, so a dog is written about once a
+        # minute at most, and only when its counts changed.
+        counter_flusher_fn = _lambda.Function(
+            self, "CounterFlusherFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="counter_flusher.handler",
+            timeout=Duration.seconds(60),
+            memory_size=256,
+            environment={
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        counter_flusher_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.counters_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=10000,
+            max_batching_window=Duration.seconds(60),
+            retry_attempts=10
+        ))
+
+        # Seen recorder - adds swiped dogs to each user's seen filter, which
+        # GET /feed deals past, from the interactions stream (backend/seen_recorder.py)
+        seen_recorder_fn = _lambda.Function(
+            self, "SeenRecorderFunction",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="seen_recorder.handler",
+            timeout=Duration.seconds(60),
+            memory_size=256,
+            environment={
+                "REGION": self.region
+            },
+            code=_lambda.Code.from_asset("../backend/backend"),
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            tracing=_lambda.Tracing.ACTIVE
+        )
+        seen_recorder_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            self.interactions_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=500,
+            max_batching_window=Duration.seconds(1),
+            retry_attempts=10,
+            # Only swipes: not removals, nor the filter's own segment writes,
+            # which have no interaction
+            filters=[_lambda.FilterCriteria.filter({
+                "eventName": _lambda.FilterRule.or_("INSERT", "MODIFY"),
+                "dynamodb": {"NewImage": {"interaction": {"S": _lambda.FilterRule.exists()}}},
+            })]
+        ))
+
         # Add CloudWatch alarms
         lambda_errors_alarm = cloudwatch.Alarm(
             self, "LambdaErrorsAlarm",
@@ -73,10 +267,45 @@ class pupperStack(Stack):
             alarm_name="PupperLambdaDuration"
         )
 
+        ingest_dlq_alarm = cloudwatch.Alarm(
+            self, "IngestDeadLetterAlarm",
+            metric=ingest_dlq.metric_approximate_number_of_messages_visible(),
+            threshold=1,
+            evaluation_periods=1,
+            alarm_description="Alarm if any dog failed async ingestion",
+            alarm_name="PupperIngestDeadLetters"
+        )
+
+        # Share of uploads that reused an earlier upload of the same photo
+        # (emitted by backend/dedup.py in embedded metric format)
+        dedup_hit_rate = cloudwatch.Metric(
+            namespace="Pupper",
+            metric_name="DedupHit",
+            statistic="Average",
+            period=Duration.hours(1)
+        )
+        cloudwatch.Dashboard(
+            self, "IngestDashboard",
+            dashboard_name="PupperIngest",
+            widgets=[[cloudwatch.GraphWidget(title="Upload dedup hit rate", left=[dedup_hit_rate])]]
+        )
+
         # Grant permissions
         self.dogs_table.grant_read_write_data(lambda_fn)
         self.interactions_table.grant_read_write_data(lambda_fn)
         bucket.grant_read_write(lambda_fn)
+        ingest_queue.grant_send_messages(lambda_fn)
+        self.dogs_table.grant_read_write_data(worker_fn)
+        self.photos_table.grant_read_write_data(lambda_fn)
+        self.photos_table.grant_read_write_data(worker_fn)
+        bucket.grant_read_write(worker_fn)
+        bucket.grant_read_write(search_indexer_fn)
+        bucket.grant_read_write(catalog_materializer_fn)
+        self.interactions_table.grant_read_write_data(summary_refresher_fn)
+        self.counters_table.grant_read_write_data(counter_aggregator_fn)
+        self.counters_table.grant_read_data(counter_flusher_fn)
+        self.dogs_table.grant_read_write_data(counter_flusher_fn)
+        self.interactions_table.grant_read_write_data(seen_recorder_fn)
         
         # Add Bedrock permissions
         lambda_fn.add_to_role_policy(iam.PolicyStatement(
@@ -85,10 +314,11 @@ class pupperStack(Stack):
         ))
 
         # Add Rekognition permissions
-        lambda_fn.add_to_role_policy(iam.PolicyStatement(
-            actions=["rekognition:DetectLabels"],
-            resources=["*"]
-        ))
+        for fn in (lambda_fn, worker_fn):
+            fn.add_to_role_policy(iam.PolicyStatement(
+                actions=["rekognition:DetectLabels"],
+                resources=["*"]
+            ))
 
         # Create API Gateway
         api = create_api(self, lambda_fn)
@@ -98,4 +328,6 @@ class pupperStack(Stack):
         CfnOutput(self, "BucketName", value=bucket_name, description="S3 Bucket Name")
         CfnOutput(self, "DynamoDBTableName", value="pupper-dogs", description="DynamoDB Table Name")
         CfnOutput(self, "InteractionsTableName", value="pupper-interactions", description="Interactions Table Name")
-        CfnOutput(self, "Region", value=self.region, description="AWS Region")
\ No newline at end of file
+        CfnOutput(self, "CountersTableName", value="pupper-dog-counters", description="Dog Counters Table Name")
+        CfnOutput(self, "Region", value=self.region, description="AWS Region")
+        CfnOutput(self, "IngestQueueUrl", value=ingest_queue.queue_url, description="Async Ingestion Queue URL")
\ No newline at end of file
@@ -6,9 +6,16 @@ def delete_all_dogs():
     s3 = boto3.client('s3')
     bucket_name = "pupper-photos-957798448417"
     
-    # Scan all items
-    response = table.scan()
-    items = response['Items']
+    # Scan all items, every page of them: a scan page stops at 1 MB, so one
+    # call only ever saw the first few hundred dogs
+    items = []
+    scan_params = {'ProjectionExpression': 'id'}
+    while True:
+        response = table.scan(**scan_params)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
     
     # Delete from DynamoDB and S3
     for item in items:
@@ -18,14 +25,13 @@ def delete_all_dogs():
         table.delete_item(Key={'id': dog_id})
         print(f"Deleted dog {dog_id} from DynamoDB")
         
-        # Delete from S3 (all formats)
+        # Delete from S3 (every object under the dog's prefix, whatever the original's format)
         try:
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/original.jpg")
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/original.png")
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/standard.jpg") 
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/standard.png") 
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/thumbnail.jpg")
-            s3.delete_object(Bucket=bucket_name, Key=f"{dog_id}/thumbnail.png")
+            paginator = s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{dog_id}/"):
+                keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+                if keys:
+                    s3.delete_objects(Bucket=bucket_name, Delete={'Objects': keys, 'Quiet': True})
             print(f"Deleted S3 objects for dog {dog_id}")
         except:
             pass
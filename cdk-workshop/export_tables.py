@@ -0,0 +1,48 @@
+import argparse
+import boto3
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import export
+
+TABLES = ('pupper-dogs', 'pupper-interactions')
+
+def export_tables():
+    # Exports the dogs and interactions tables (or --table) to NDJSON or
+    # Parquet files in a local directory or under s3://bucket/prefix, scanning
+    # --segments segments in parallel on --workers threads. Run the same
+    # command again after a failure to carry on from the last checkpoint.
+    #
+    #   python export_tables.py --output s3://pupper-photos-957798448417/exports/2025-01-01
+    #       [--table pupper-dogs] [--segments 8] [--workers 8] [--format ndjson|parquet]
+    #       [--rcu-budget 50]
+    #
+    # Scans read at most as fast as the table's read capacity allows, and
+    # throttled pages are retried by boto3. Set --rcu-budget below the
+    # provisioned capacity to leave room for the app; each worker beyond
+    # what the budget or capacity can feed only waits.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', required=True, help='local directory or s3://bucket/prefix')
+    parser.add_argument('--table', action='append', choices=TABLES, help='table to export (default: all of them)')
+    parser.add_argument('--segments', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+    parser.add_argument('--rcu-budget', type=float, help='read capacity units per second to use at most')
+    parser.add_argument('--page-size', type=int, default=export.PAGE_SIZE)
+    parser.add_argument('--rows-per-file', type=int, default=export.ROWS_PER_FILE)
+    args = parser.parse_args()
+
+    client = boto3.client('dynamodb')
+    sink = export.sink_for(args.output, s3=boto3.client('s3'))
+    budget = export.RcuBudget(args.rcu_budget) if args.rcu_budget else None
+    for table_name in args.table or TABLES:
+        totals = export.export_table(
+            client, table_name, sink,
+            total_segments=args.segments, workers=args.workers, fmt=args.format, budget=budget,
+            rows_per_file=args.rows_per_file, page_size=args.page_size,
+        )
+        print(f"Exported {totals['items']} items from {table_name} in {totals['parts']} files, "
+              f"{totals['consumedUnits']:.0f} RCU in {totals['seconds']:.1f} s")
+
+if __name__ == "__main__":
+    export_tables()
@@ -1,3 +1,4 @@
+import json
 import aws_cdk as cdk
 import pytest
 from aws_cdk.assertions import Template, Match
@@ -11,8 +12,8 @@ def test_dynamodb_tables_created():
     stack = pupperStack(app, "TestStack")
     template = Template.from_stack(stack)
     
-    # Check that we have at least 2 DynamoDB tables
-    template.resource_count_is("AWS::DynamoDB::Table", 2)
+    # Dogs, interactions, photo hashes and dog counters
+    template.resource_count_is("AWS::DynamoDB::Table", 4)
     
     # Check for tables with specific logical IDs instead of properties
     template.has_resource("AWS::DynamoDB::Table", {
@@ -35,13 +36,130 @@ def test_dynamodb_tables_created():
         })
     })
 
+def test_dogs_listing_indexes_created():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-dogs",
+        "GlobalSecondaryIndexes": [
+            Match.object_like({"IndexName": "StatusCreatedAtIndex", "KeySchema": [
+                {"AttributeName": "status", "KeyType": "HASH"}, {"AttributeName": "createdAt", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "StateIndex", "KeySchema": [
+                {"AttributeName": "statusState", "KeyType": "HASH"}, {"AttributeName": "createdAt", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "StateCityIndex", "KeySchema": [
+                {"AttributeName": "statusState", "KeyType": "HASH"}, {"AttributeName": "cityCreatedAt", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "ColorIndex", "KeySchema": [
+                {"AttributeName": "statusColor", "KeyType": "HASH"}, {"AttributeName": "createdAt", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "WeightIndex", "KeySchema": [
+                {"AttributeName": "status", "KeyType": "HASH"}, {"AttributeName": "weightInPounds", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "PopularityIndex", "KeySchema": [
+                {"AttributeName": "status", "KeyType": "HASH"}, {"AttributeName": "likeCount", "KeyType": "RANGE"}
+            ], "Projection": Match.object_like({"ProjectionType": "INCLUDE"})}),
+            Match.object_like({"IndexName": "GeoIndex", "KeySchema": [
+                {"AttributeName": "geoCell", "KeyType": "HASH"}, {"AttributeName": "geohash", "KeyType": "RANGE"}
+            ], "Projection": {
+                "ProjectionType": "INCLUDE", "NonKeyAttributes": ["latitude", "longitude", "statusColor", "weightInPounds"]
+            }})
+        ]
+    })
+
+def test_listing_indexes_project_only_the_summary():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    table = next(resource for resource in template.find_resources("AWS::DynamoDB::Table").values()
+                 if resource["Properties"].get("TableName") == "pupper-dogs")
+    projections = {index["IndexName"]: index["Projection"] for index in table["Properties"]["GlobalSecondaryIndexes"]}
+    for index_name in ("StatusCreatedAtIndex", "StateIndex", "StateCityIndex", "ColorIndex", "WeightIndex", "PopularityIndex"):
+        assert projections[index_name]["ProjectionType"] == "INCLUDE"
+        assert {"name", "cardPhotos", "placeholder"} <= set(projections[index_name]["NonKeyAttributes"])
+        assert not {"photoFormats", "renditions", "dislikeCount", "recordVersion"} & set(projections[index_name]["NonKeyAttributes"])
+    # DynamoDB allows 100 projected attributes across a table's indexes
+    assert sum(len(projection.get("NonKeyAttributes", [])) for projection in projections.values()) <= 100
+
+def test_sparse_likes_index_created():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-interactions",
+        "GlobalSecondaryIndexes": [
+            Match.object_like({"IndexName": "LikesByTimeIndex", "KeySchema": [
+                {"AttributeName": "likedBy", "KeyType": "HASH"}, {"AttributeName": "timestamp", "KeyType": "RANGE"}
+            ]}),
+            Match.object_like({"IndexName": "LikesByDogIndex", "KeySchema": [
+                {"AttributeName": "dogId", "KeyType": "HASH"}, {"AttributeName": "likedBy", "KeyType": "RANGE"}
+            ]})
+        ]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "summary_refresher.handler"
+    })
+
+def test_counters_follow_interactions_stream():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-dog-counters",
+        "KeySchema": [
+            {"AttributeName": "dogId", "KeyType": "HASH"},
+            {"AttributeName": "shard", "KeyType": "RANGE"}
+        ]
+    })
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-interactions",
+        "StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 1000,
+        "ParallelizationFactor": 4
+    })
+    # The flusher copies the counters onto dogs at most once a minute
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-dog-counters",
+        "StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "counter_flusher.handler"
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 10000,
+        "MaximumBatchingWindowInSeconds": 60
+    })
+
+def test_photo_hash_table_created():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-photo-hashes",
+        "KeySchema": [
+            {"AttributeName": "hashKey", "KeyType": "HASH"},
+            {"AttributeName": "sha256", "KeyType": "RANGE"}
+        ]
+    })
+
 def test_lambda_function_created():
     app = cdk.App()
     stack = pupperStack(app, "TestStack")
     template = Template.from_stack(stack)
     
-    # Updated to expect 2 Lambda functions
-    template.resource_count_is("AWS::Lambda::Function", 2)
+    # API, ingestion worker, search indexer, catalog materializer, summary
+    # refresher, counter aggregator, counter flusher, seen recorder and the
+    # log retention custom resource
+    template.resource_count_is("AWS::Lambda::Function", 9)
     
     # Check for Lambda with handler property
     template.has_resource("AWS::Lambda::Function", {
@@ -56,4 +174,81 @@ def test_api_gateway_created():
     template = Template.from_stack(stack)
     
     # Check that we have an API Gateway
-    template.resource_count_is("AWS::ApiGateway::RestApi", 1)
\ No newline at end of file
+    template.resource_count_is("AWS::ApiGateway::RestApi", 1)
+def test_staged_uploads_expire():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+    
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {
+            "Rules": Match.array_with([
+                Match.object_like({"Prefix": "staging/", "ExpirationInDays": 1, "Status": "Enabled"})
+            ])
+        }
+    })
+
+
+def test_ingestion_queue_created():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+    
+    template.resource_count_is("AWS::SQS::Queue", 2)
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "RedrivePolicy": Match.object_like({"maxReceiveCount": 3})
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "worker.handler"
+    })
+
+
+def test_search_indexer_reads_dogs_stream():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "pupper-dogs",
+        "StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "search_indexer.handler",
+        "ReservedConcurrentExecutions": 1
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "StartingPosition": "TRIM_HORIZON"
+    })
+
+
+def test_catalog_materializer_reads_dogs_stream():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "catalog_materializer.handler",
+        "ReservedConcurrentExecutions": 1
+    })
+
+
+def test_seen_recorder_reads_interactions_stream():
+    app = cdk.App()
+    stack = pupperStack(app, "TestStack")
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "seen_recorder.handler"
+    })
+    # The filter's own writes to the table don't invoke it
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 500,
+        "MaximumBatchingWindowInSeconds": 1,
+        "FilterCriteria": {"Filters": [{"Pattern": json.dumps({
+            "eventName": ["INSERT", "MODIFY"],
+            "dynamodb": {"NewImage": {"interaction": {"S": [{"exists": True}]}}},
+        }, separators=(',', ':'))}]}
+    })
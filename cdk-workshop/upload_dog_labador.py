@@ -1,37 +1,26 @@
 import boto3
 import requests
 import uuid
-from PIL import Image
-import io
+from datetime import datetime
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/backend')))
+import dedup
+import geo
+import images
+import listing
 
 def process_image(image_data):
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    
-    # Original as PNG
-    original_buffer = io.BytesIO()
-    img.save(original_buffer, format='PNG')
-    original_data = original_buffer.getvalue()
-    
-    # 400x400 PNG
-    standard_img = img.resize((400, 400), Image.Resampling.LANCZOS)
-    standard_buffer = io.BytesIO()
-    standard_img.save(standard_buffer, format='PNG')
-    standard_data = standard_buffer.getvalue()
-    
-    # 50x50 PNG
-    thumbnail_img = img.resize((50, 50), Image.Resampling.LANCZOS)
-    thumbnail_buffer = io.BytesIO()
-    thumbnail_img.save(thumbnail_buffer, format='PNG')
-    thumbnail_data = thumbnail_buffer.getvalue()
-    
-    return original_data, standard_data, thumbnail_data
+    # Original is kept as uploaded (normalized only when needed), same as the API
+    original = images.prepare_original(image_data)
+    img = images.decode(image_data, min_size=images.minimum_source_size())
+    return original, images.render(img), images.placeholder(img)
 
 def upload_labrador_retrievers():
     dynamodb = boto3.resource('dynamodb')
     table = dynamodb.Table('pupper-dogs')
     s3 = boto3.client('s3')
+    photos = dynamodb.Table(dedup.PHOTOS_TABLE)
     bucket_name = "pupper-photos-957798448417"
     
     # Verified Labrador Retriever photos
@@ -74,16 +63,28 @@ def upload_labrador_retrievers():
         try:
             response = requests.get(lab_data["photo_url"])
             if response.status_code == 200:
-                # Process images
-                original_data, standard_data, thumbnail_data = process_image(response.content)
-                
-                # Upload to S3 - ALL PNG
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/original.png", Body=original_data, ContentType='image/png')
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/standard.png", Body=standard_data, ContentType='image/png')
-                s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/thumbnail.png", Body=thumbnail_data, ContentType='image/png')
-                
-                photo_url = f"https://{bucket_name}.s3.amazonaws.com/{dog_id}/standard.png"
-                
+                # Re-seeding the same photo reuses the renditions from the last run
+                sha256 = dedup.content_hash(response.content)
+                phash = images.perceptual_hash(response.content)
+                record, match = dedup.find(photos, sha256, phash)
+                image_fields = dedup.reusable_fields(record, s3, bucket_name) if record else None
+                if image_fields:
+                    print(f"Reusing photos of {record['dogId']} ({match} match)")
+                else:
+                    # Process images
+                    (original_data, original_extension, original_content_type), outputs, placeholder = process_image(response.content)
+
+                    # Upload to S3 - original as uploaded, every rendition width and format
+                    s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/original.{original_extension}", Body=original_data, ContentType=original_content_type)
+                    for output in outputs:
+                        s3.put_object(Bucket=bucket_name, Key=f"{dog_id}/{output['key']}", Body=output['data'], ContentType=output['contentType'])
+                    image_fields = {
+                        "originalPhoto": f"https://{bucket_name}.s3.amazonaws.com/{dog_id}/original.{original_extension}",
+                        "placeholder": placeholder,
+                        **images.record_fields(outputs, f"https://{bucket_name}.s3.amazonaws.com/{dog_id}")
+                    }
+                    dedup.remember(photos, sha256, phash, dog_id, True, ["labrador retriever"], image_fields)
+
                 # Create DynamoDB record
                 dog_record = {
                     "id": dog_id,
@@ -97,11 +98,14 @@ def upload_labrador_retrievers():
                     "birthday": lab_data["birthday"],
                     "weightInPounds": lab_data["weightInPounds"],
                     "color": lab_data["color"],
-                    "photo": photo_url,
-                    "originalPhoto": f"https://{bucket_name}.s3.amazonaws.com/{dog_id}/original.png",
-                    "thumbnailPhoto": f"https://{bucket_name}.s3.amazonaws.com/{dog_id}/thumbnail.png"
+                    "status": "ACTIVE",
+                    "createdAt": datetime.utcnow().isoformat(),
+                    "photoHash": sha256,
+                    **image_fields,
+                    **geo.coordinates(lab_data["city"], lab_data["state"])
                 }
                 
+                dog_record.update(listing.listing_keys(dog_record))
                 table.put_item(Item=dog_record)
                 print(f"Added Labrador: {lab_data['name']} ({dog_id})")
                 
@@ -18,6 +18,8 @@ interface Dog {
   shelter?: string;
   photo: string;
   thumbnailPhoto?: string;
+  photoSrcset?: string;
+  placeholder?: string;
   weightInPounds: number;
   color: string;
   description: string;
@@ -38,16 +40,24 @@ export default function BrowseLabrador({ user, signOut }: BrowseLabradorProps) {
   const [colorFilter, setColorFilter] = useState('');
   const [stateFilter, setStateFilter] = useState('');
   const [showFilters, setShowFilters] = useState(false);
+  const [filterOptions, setFilterOptions] = useState<{ colors: string[]; states: string[] }>({ colors: [], states: [] });
   
   const navigate = useNavigate();
 
+  // Color and state are filtered by the API
   useEffect(() => {
     const fetchDogs = async () => {
       setLoading(true);
       try {
-        const fetchedDogs = await dogService.getAllDogs();
-        setDogs(fetchedDogs);
-        setFilteredDogs(fetchedDogs);
+        const page = await dogService.listDogs({ color: colorFilter, state: stateFilter, limit: 100, view: 'summary' });
+        setDogs(page.dogs);
+        setFilteredDogs(page.dogs);
+        if (!colorFilter && !stateFilter) {
+          setFilterOptions({
+            colors: [...new Set(page.dogs.map(dog => dog.color))],
+            states: [...new Set(page.dogs.map(dog => dog.state))]
+          });
+        }
       } catch (error) {
         console.error('Error fetching dogs:', error);
       } finally {
@@ -56,30 +66,36 @@ export default function BrowseLabrador({ user, signOut }: BrowseLabradorProps) {
     };
 
     fetchDogs();
-  }, []);
+  }, [colorFilter, stateFilter]);
 
+  // Free-text search runs on the API's search index; color and state still
+  // apply to the results
   useEffect(() => {
-    const filtered = dogs.filter(dog => {
-      // Text search filter
-      const matchesSearch = 
-        searchTerm === '' || 
-        dog.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        dog.city.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        dog.state.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        dog.color.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        dog.description.toLowerCase().includes(searchTerm.toLowerCase());
-      
-      // Color filter
-      const matchesColor = colorFilter === '' || dog.color.toLowerCase() === colorFilter.toLowerCase();
-      
-      // State filter
-      const matchesState = stateFilter === '' || dog.state === stateFilter;
-      
-      return matchesSearch && matchesColor && matchesState;
-    });
-    
-    setFilteredDogs(filtered);
-  }, [searchTerm, colorFilter, stateFilter, dogs]);
+    const term = searchTerm.trim();
+    if (!term) {
+      setFilteredDogs(dogs);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await dogService.searchDogs(term);
+        if (!cancelled) {
+          setFilteredDogs(results.dogs.filter(dog =>
+            (!colorFilter || dog.color.toLowerCase() === colorFilter.toLowerCase()) &&
+            (!stateFilter || dog.state.toUpperCase() === stateFilter.toUpperCase())
+          ));
+        }
+      } catch (error) {
+        console.error('Error searching dogs:', error);
+      }
+    }, 250);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, dogs, colorFilter, stateFilter]);
 
   const calculateAge = (birthday: string) => {
     const today = new Date();
@@ -87,8 +103,8 @@ export default function BrowseLabrador({ user, signOut }: BrowseLabradorProps) {
     return Math.floor((today.getTime() - birthDate.getTime()) / (365.25 * 24 * 60 * 60 * 1000));
   };
 
-  const uniqueColors = [...new Set(dogs.map(dog => dog.color))];
-  const uniqueStates = [...new Set(dogs.map(dog => dog.state))];
+  const uniqueColors = filterOptions.colors;
+  const uniqueStates = filterOptions.states;
 
   const resetFilters = () => {
     setSearchTerm('');
@@ -148,7 +164,7 @@ export default function BrowseLabrador({ user, signOut }: BrowseLabradorProps) {
             }}>
               <TextField
                 fullWidth
-                placeholder="Search by name, location, or color..."
+                placeholder="Search by name, city, or description..."
                 value={searchTerm}
                 onChange={(e) => setSearchTerm(e.target.value)}
                 InputProps={{
@@ -286,8 +302,11 @@ export default function BrowseLabrador({ user, signOut }: BrowseLabradorProps) {
                       <CardMedia
                         component="img"
                         height="200"
-                        image={dog.thumbnailPhoto || dog.photo}
+                        image={dog.photo || dog.thumbnailPhoto}
+                        srcSet={dog.photoSrcset}
+                        sizes="(max-width: 600px) 100vw, 300px"
                         alt={`Photo of ${dog.name}`}
+                        sx={dog.placeholder ? { background: `center / cover no-repeat url(${dog.placeholder})` } : undefined}
                       />
                       <CardContent sx={{ flex: 1, display: 'flex', flexDirection: 'column' }}>
                         <Typography variant="h6" sx={{ fontWeight: 'bold', mb: 1 }}>
@@ -1,8 +1,9 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Box, Typography, Container } from '@mui/material';
 import SwipeCard from './SwipeCard';
 import Sidebar from './Sidebar';
 import { dogService } from '../services/api';
+import { queueSwipe, flushSwipes } from '../services/swipeBuffer';
 
 interface DogDetails {
   id: string;
@@ -24,16 +25,39 @@ interface DogsProps {
   signOut?: () => void;
 }
 
+// Starts loading photos so they are cached by the time their card shows
+function preload(urls: string[]) {
+  urls.forEach(url => {
+    const image = new Image();
+    image.src = url;
+  });
+}
+
 function Dogs({ user, signOut }: DogsProps) {
   const [dogs, setDogs] = useState<DogDetails[]>([]);
   const [currentIndex, setCurrentIndex] = useState(0);
+  const [nextToken, setNextToken] = useState<string | undefined>();
+  const loadingMore = useRef(false);
+  // Swipes reach the feed's seen filter a moment after they are sent, so the
+  // ones made here are also skipped locally
+  const swiped = useRef(new Set<string>());
+
+  const unswiped = <T extends { id: string }>(page: T[]) => page.filter(dog => !swiped.current.has(dog.id));
 
   useEffect(() => {
+    // The deck is dealt by GET /feed, a page at a time, less the dogs the
+    // user has swiped; the whole catalog only until the API can deal one
     const fetchDogs = async () => {
       try {
-        const fetchedDogs = await dogService.getAllDogs();
-        console.log('Fetched dogs:', fetchedDogs);
-        setDogs(fetchedDogs);
+        const page = await dogService.getFeed();
+        if (page) {
+          setDogs(unswiped(page.dogs));
+          setNextToken(page.nextToken);
+          preload(page.prefetch);
+        } else {
+          setDogs(unswiped(await dogService.getAllDogs()));
+          setNextToken(undefined);
+        }
         setCurrentIndex(0);
       } catch (error) {
         console.error('Error fetching dogs:', error);
@@ -49,29 +73,46 @@ function Dogs({ user, signOut }: DogsProps) {
     };
     
     document.addEventListener('visibilitychange', handleVisibilityChange);
-    return () => document.removeEventListener('visibilitychange', handleVisibilityChange);
+    return () => {
+      document.removeEventListener('visibilitychange', handleVisibilityChange);
+      flushSwipes();
+    };
   }, []);
 
-  const handleLike = async () => {
+  // The next page is fetched a few cards before the deck runs out; its
+  // photos were already preloaded from the previous page's hints
+  useEffect(() => {
+    if (!nextToken || loadingMore.current || dogs.length - currentIndex > 3) {
+      return;
+    }
+    loadingMore.current = true;
+    dogService.getFeed(nextToken)
+      .then(page => {
+        if (page) {
+          setDogs(previous => [...previous, ...unswiped(page.dogs)]);
+          setNextToken(page.nextToken);
+          preload(page.prefetch);
+        }
+      })
+      .catch(error => console.error('Error fetching more dogs:', error))
+      .finally(() => { loadingMore.current = false; });
+  }, [currentIndex, dogs.length, nextToken]);
+
+  // Swipes are buffered and sent in batches (see swipeBuffer.ts)
+  const handleLike = () => {
     const currentDog = dogs[currentIndex];
     if (currentDog) {
-      try {
-        await dogService.recordInteraction(currentDog.id, 'LIKE');
-      } catch (error) {
-        console.error('Error recording like:', error);
-      }
+      swiped.current.add(currentDog.id);
+      queueSwipe(currentDog.id, 'LIKE');
     }
     setCurrentIndex(prev => prev + 1);
   };
 
-  const handleDislike = async () => {
+  const handleDislike = () => {
     const currentDog = dogs[currentIndex];
     if (currentDog) {
-      try {
-        await dogService.recordInteraction(currentDog.id, 'DISLIKE');
-      } catch (error) {
-        console.error('Error recording dislike:', error);
-      }
+      swiped.current.add(currentDog.id);
+      queueSwipe(currentDog.id, 'DISLIKE');
     }
     setCurrentIndex(prev => prev + 1);
   };
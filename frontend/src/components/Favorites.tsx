@@ -4,6 +4,7 @@ import { LocationOn, Favorite, Close, Pets, Home } from '@mui/icons-material';
 import Sidebar from './Sidebar';
 import { useNavigate, Link } from 'react-router-dom';
 import { dogService } from '../services/api';
+import { flushSwipes } from '../services/swipeBuffer';
 
 interface Dog {
     id: string;
@@ -15,7 +16,7 @@ interface Dog {
     thumbnailPhoto?: string;
     weightInPounds: number;
     color: string;
-    description: string;
+    description?: string;
     birthday: string;
 }
 
@@ -26,14 +27,19 @@ interface FavoritesProps {
 
 export default function Favorites({ user, signOut }: FavoritesProps) {
     const [favorites, setFavorites] = useState<Dog[]>([]);
+    const [nextToken, setNextToken] = useState<string | undefined>();
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
     useEffect(() => {
         const fetchFavorites = async () => {
             try {
-                const likedDogs = await dogService.getLikedDogs();
-                setFavorites(likedDogs);
+                // Swipes still buffered would otherwise be missing from the list
+                await flushSwipes();
+                const page = await dogService.getLikedDogs();
+                setFavorites(page.dogs);
+                setNextToken(page.nextToken);
             } catch (error) {
                 console.error('Error fetching favorites:', error);
                 setFavorites([]);
@@ -44,6 +50,19 @@ export default function Favorites({ user, signOut }: FavoritesProps) {
         fetchFavorites();
     }, []);
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const page = await dogService.getLikedDogs(nextToken);
+            setFavorites(prev => [...prev, ...page.dogs]);
+            setNextToken(page.nextToken);
+        } catch (error) {
+            console.error('Error fetching more favorites:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const calculateAge = (birthday: string) => {
         const today = new Date();
         const birthDate = new Date(birthday);
@@ -155,6 +174,7 @@ export default function Favorites({ user, signOut }: FavoritesProps) {
                                 </Button>
                             </Box>
                         ) : (
+                            <>
                             <Grid container spacing={3}>
                                 {favorites.map((dog) => (
                                     <Grid item xs={12} sm={6} md={4} lg={3} key={dog.id}>
@@ -254,24 +274,34 @@ export default function Favorites({ user, signOut }: FavoritesProps) {
                                                     />
                                                 </Box>
 
-                                                <Typography
-                                                    variant="body2"
-                                                    sx={{
-                                                        color: '#475569',
-                                                        overflow: 'hidden',
-                                                        display: '-webkit-box',
-                                                        WebkitLineClamp: 3,
-                                                        WebkitBoxOrient: 'vertical',
-                                                        lineHeight: 1.5
-                                                    }}
-                                                >
-                                                    {dog.description}
-                                                </Typography>
+                                                {dog.description && (
+                                                    <Typography
+                                                        variant="body2"
+                                                        sx={{
+                                                            color: '#475569',
+                                                            overflow: 'hidden',
+                                                            display: '-webkit-box',
+                                                            WebkitLineClamp: 3,
+                                                            WebkitBoxOrient: 'vertical',
+                                                            lineHeight: 1.5
+                                                        }}
+                                                    >
+                                                        {dog.description}
+                                                    </Typography>
+                                                )}
                                             </CardContent>
                                         </Card>
                                     </Grid>
                                 ))}
                             </Grid>
+                            {nextToken && (
+                                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 4 }}>
+                                    <Button variant="outlined" onClick={loadMore} disabled={loadingMore} sx={{ borderRadius: 3, textTransform: 'none' }}>
+                                        {loadingMore ? 'Loading...' : 'Load more'}
+                                    </Button>
+                                </Box>
+                            )}
+                            </>
                         )
                     )}
                 </Container>
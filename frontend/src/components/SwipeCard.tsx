@@ -58,18 +58,28 @@ export default function SwipeCard({ dog, onLike, onDislike }: SwipeCardProps) {
             transform: 'translateY(-8px)'
           }
         }}>
-          {!imageLoaded && (
+          {!imageLoaded && (dog.placeholder ? (
+            <Box
+              component="img"
+              src={dog.placeholder}
+              alt=""
+              aria-hidden="true"
+              sx={{ width: '100%', height: '100%', objectFit: 'cover', filter: 'blur(12px)', transform: 'scale(1.1)' }}
+            />
+          ) : (
             <Skeleton 
               variant="rectangular" 
               width="100%" 
               height="100%" 
               animation="wave"
             />
-          )}
+          ))}
           
           <Box
             component="img"
             src={dog.photo}
+            srcSet={dog.photoSrcset}
+            sizes="(max-width: 600px) 100vw, 400px"
             alt={dog.name}
             onLoad={() => setImageLoaded(true)}
             sx={{
@@ -18,6 +18,34 @@ async function handleApiResponse(response: Response, errorMessage: string) {
 
 const API_BASE_URL = import.meta.env.VITE_API_URL;
 
+// One-pixel images of each format the API can serve; the browser decodes
+// them only if it can display the format
+const FORMAT_PROBES: [string, string][] = [
+  ['image/avif', 'data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADrbWV0YQAAAAAAAAAhaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAAAAAAAOcGl0bQAAAAAAAQAAAB5pbG9jAAAAAEQAAAEAAQAAAAEAAAETAAAAIQAAAChpaW5mAAAAAAABAAAAGmluZmUCAAAAAAEAAGF2MDFDb2xvcgAAAABqaXBycAAAAEtpcGNvAAAAFGlzcGUAAAAAAAAAAQAAAAEAAAAQcGl4aQAAAAADCAgIAAAADGF2MUOBAAwAAAAAE2NvbHJuY2x4AAEADQAGgAAAABdpcG1hAAAAAAAAAAEAAQQBAoMEAAAAKW1kYXQSAAoIGAAGiAhoNCAyExlHh4Yhh5555oAAAJBAyRxgimo='],
+  ['image/webp;q=0.9', 'data:image/webp;base64,UklGRh4AAABXRUJQVlA4TBEAAAAvAAAAAAfQ//73v/+BiOh/AAA='],
+];
+
+function canDisplay(dataUri: string): Promise<boolean> {
+  if (typeof Image === 'undefined') return Promise.resolve(false);
+  return new Promise((resolve) => {
+    const image = new Image();
+    const timer = setTimeout(() => resolve(false), 1000);
+    image.onload = () => { clearTimeout(timer); resolve(image.width > 0); };
+    image.onerror = () => { clearTimeout(timer); resolve(false); };
+    image.src = dataUri;
+  });
+}
+
+let acceptHeader: Promise<string> | undefined;
+
+// Image formats we can display, probed once; the API picks photo URLs from
+// these and falls back to PNG (images.FALLBACK_FORMAT) for anything not listed
+function acceptWithImages(): Promise<string> {
+  if (!acceptHeader) acceptHeader = Promise.all(FORMAT_PROBES.map(([, dataUri]) => canDisplay(dataUri))).then((supported) =>
+    ['application/json', ...FORMAT_PROBES.filter((_, i) => supported[i]).map(([type]) => type)].join(', '));
+  return acceptHeader;
+}
+
 async function getAuthHeaders() {
   try {
     const session = await fetchAuthSession();
@@ -31,12 +59,61 @@ async function getAuthHeaders() {
   }
 }
 
+export interface DogListParams {
+  state?: string;
+  city?: string;
+  color?: string;
+  minWeight?: number;
+  maxWeight?: number;
+  order?: 'newest' | 'oldest' | 'popular';
+  limit?: number;
+  nextToken?: string;
+  view?: 'summary' | 'detail'; // summary: just what cards show
+  fields?: string; // comma-separated, instead of view
+}
+
+export interface DogPage {
+  dogs: Dog[];
+  nextToken?: string;
+}
+
+export interface FeedPage {
+  dogs: Dog[];
+  nextToken?: string;
+  prefetch: string[]; // Photos of the next page, to load ahead
+}
+
+export interface SearchResults {
+  dogs: Dog[];
+  total: number;
+}
+
+export type Interaction = 'LIKE' | 'DISLIKE';
+
+export interface Swipe {
+  dogId: string;
+  interaction: Interaction;
+  timestamp: string; // When it happened, as an ISO string
+}
+
+export interface SwipeResult {
+  dogId: string;
+  status: 'recorded' | 'superseded' | 'invalid' | 'failed';
+}
+
 export const dogService = {
-  async getAllDogs(): Promise<Dog[]> {
+  // One page of GET /dogs; filters are applied by the API
+  async listDogs(params: DogListParams = {}): Promise<DogPage> {
     try {
-      const response = await fetch(`${API_BASE_URL}/dogs`, {
+      const query = new URLSearchParams();
+      Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== '') {
+          query.append(key, String(value));
+        }
+      });
+      const response = await fetch(`${API_BASE_URL}/dogs?${query}`, {
         headers: {
-          'Accept': 'application/json',
+          'Accept': await acceptWithImages(),
           'Content-Type': 'application/json'
         }
       });
@@ -48,11 +125,61 @@ export const dogService = {
     }
   },
 
+  // GET /dogs/search: dogs matching every word of q (the last one as a
+  // prefix), newest first
+  async searchDogs(q: string, limit = 50): Promise<SearchResults> {
+    try {
+      const query = new URLSearchParams({ q, limit: String(limit), view: 'summary' });
+      const response = await fetch(`${API_BASE_URL}/dogs/search?${query}`, {
+        headers: {
+          'Accept': await acceptWithImages(),
+          'Content-Type': 'application/json'
+        }
+      });
+
+      return await handleApiResponse(response, 'Failed to search dogs');
+    } catch (error) {
+      console.error('Error searching dogs:', error);
+      throw error;
+    }
+  },
+
+  // Every listed dog from the catalog snapshot, which the API redirects to in
+  // S3; falls back to the first page of GET /dogs until one has been built
+  async getAllDogs(): Promise<Dog[]> {
+    const response = await fetch(`${API_BASE_URL}/dogs?snapshot=redirect`, {
+      headers: { 'Accept': await acceptWithImages() }
+    });
+    if (response.status === 404) {
+      const page = await this.listDogs({ limit: 100, view: 'summary' });
+      return page.dogs;
+    }
+    const snapshot = await handleApiResponse(response, 'Failed to fetch dogs');
+    return snapshot.dogs;
+  },
+
+  // The next dogs the user hasn't swiped (GET /feed); null until the API has
+  // a catalog snapshot to deal from
+  async getFeed(nextToken?: string, limit = 10): Promise<FeedPage | null> {
+    const authHeaders = await getAuthHeaders();
+    const query = new URLSearchParams({ limit: String(limit) });
+    if (nextToken) {
+      query.append('nextToken', nextToken);
+    }
+    const response = await fetch(`${API_BASE_URL}/feed?${query}`, {
+      headers: { 'Accept': await acceptWithImages(), ...authHeaders }
+    });
+    if (response.status === 404) {
+      return null;
+    }
+    return await handleApiResponse(response, 'Failed to fetch feed');
+  },
+
   async getDogById(id: string): Promise<Dog> {
     try {
       const response = await fetch(`${API_BASE_URL}/dogs/${id}`, {
         headers: {
-          'Accept': 'application/json',
+          'Accept': await acceptWithImages(),
           'Content-Type': 'application/json'
         }
       });
@@ -68,20 +195,53 @@ export const dogService = {
     }
   },
 
+  // Uploads the photo straight to S3 and returns the staging key for createDog
+  async uploadImage(image: File): Promise<string> {
+    const intentResponse = await fetch(`${API_BASE_URL}/uploads`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+      },
+      body: JSON.stringify({ contentType: image.type })
+    });
+    const intent = await handleApiResponse(intentResponse, 'Failed to start upload');
+    if (image.size > intent.maxBytes) {
+      throw new Error(`Image is too large (max ${Math.round(intent.maxBytes / 1024 / 1024)} MB)`);
+    }
+
+    const form = new FormData();
+    Object.entries(intent.fields).forEach(([key, value]) => form.append(key, value as string));
+    form.append('file', image);
+    const uploadResponse = await fetch(intent.url, { method: 'POST', body: form });
+    if (!uploadResponse.ok) {
+      throw new Error(`Failed to upload image: ${uploadResponse.status}`);
+    }
+    return intent.uploadKey;
+  },
+
+  // Polls an asynchronously ingested dog until it is ACTIVE, REJECTED or FAILED
+  async waitForDog(dogId: string, timeoutMs = 60000): Promise<any> {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      const response = await fetch(`${API_BASE_URL}/dogs/${dogId}/status`, {
+        headers: { 'Accept': 'application/json' }
+      });
+      const status = await handleApiResponse(response, 'Failed to check dog status');
+      if (status.status !== 'PENDING') {
+        return status;
+      }
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+    throw new Error('Timed out waiting for the dog to be processed');
+  },
+
   async createDog(dogData: any, image?: File, generatedImage?: string): Promise<void> {
     try {
-      const payload: any = { ...dogData };
+      const payload: any = { ...dogData, async: true };
       
       if (image) {
-        const base64Image = await new Promise<string>((resolve) => {
-          const reader = new FileReader();
-          reader.onload = () => {
-            const base64 = (reader.result as string).split(',')[1];
-            resolve(base64);
-          };
-          reader.readAsDataURL(image);
-        });
-        payload.image = base64Image;
+        payload.uploadKey = await this.uploadImage(image);
       } else if (generatedImage) {
         payload.image = generatedImage;
       }
@@ -104,6 +264,17 @@ export const dogService = {
         const errorText = await response.text();
         throw new Error(`Failed to create dog: ${response.status} - ${errorText}`);
       }
+
+      if (response.status === 202) {
+        const { id } = await response.json();
+        const result = await this.waitForDog(id);
+        if (result.status === 'REJECTED') {
+          throw new Error(`❌ Only Labrador retrievers are accepted for adoption listings.\n\nDetected: ${result.detectedLabels?.join(', ') || 'Unknown breed'}`);
+        }
+        if (result.status === 'FAILED') {
+          throw new Error(`Failed to process dog photo: ${result.error}`);
+        }
+      }
     } catch (error) {
       console.error('Error creating dog:', error);
       throw error;
@@ -129,13 +300,31 @@ export const dogService = {
     }
   },
 
-  async getLikedDogs(): Promise<Dog[]> {
+  // Records buffered swipes in one request; failed ones can be sent again
+  async recordInteractions(interactions: Swipe[]): Promise<SwipeResult[]> {
+    const authHeaders = await getAuthHeaders();
+    const response = await fetch(`${API_BASE_URL}/interactions/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders },
+      body: JSON.stringify({ interactions }),
+      keepalive: true
+    });
+    const data = await handleApiResponse(response, 'Failed to record interactions');
+    return data.results;
+  },
+
+  // One page of the user's liked dogs, most recently liked first
+  async getLikedDogs(nextToken?: string, limit = 50): Promise<DogPage> {
     console.log('Fetching liked dogs...');
     const authHeaders = await getAuthHeaders();
     console.log('Auth headers for likes:', authHeaders);
     
-    const response = await fetch(`${API_BASE_URL}/likes`, {
-      headers: authHeaders
+    const query = new URLSearchParams({ limit: String(limit) });
+    if (nextToken) {
+      query.append('nextToken', nextToken);
+    }
+    const response = await fetch(`${API_BASE_URL}/likes?${query}`, {
+      headers: { 'Accept': await acceptWithImages(), ...authHeaders }
     });
     
     console.log('Likes response status:', response.status);
@@ -0,0 +1,62 @@
+import { dogService, Interaction, Swipe } from './api';
+
+// Swipes are held here and sent together through POST /interactions/batch:
+// every few seconds, as soon as FLUSH_SIZE are waiting, and when the page is
+// hidden. Swipes the API could not write are kept for the next flush.
+const FLUSH_INTERVAL_MS = 5000;
+const FLUSH_SIZE = 20;
+const MAX_BATCH = 100;
+
+let pending: Swipe[] = [];
+let timer: ReturnType<typeof setTimeout> | undefined;
+let inFlight: Promise<void> | undefined;
+
+export function queueSwipe(dogId: string, interaction: Interaction) {
+  pending.push({ dogId, interaction, timestamp: new Date().toISOString() });
+  if (pending.length >= FLUSH_SIZE) {
+    flushSwipes();
+  } else if (!timer) {
+    timer = setTimeout(flushSwipes, FLUSH_INTERVAL_MS);
+  }
+}
+
+export function flushSwipes(): Promise<void> {
+  if (timer) {
+    clearTimeout(timer);
+    timer = undefined;
+  }
+  if (inFlight) {
+    // Whatever was queued meanwhile goes once this batch is done
+    return inFlight.then(() => flushSwipes());
+  }
+  if (pending.length === 0) {
+    return Promise.resolve();
+  }
+  const sending = pending.slice(0, MAX_BATCH);
+  pending = pending.slice(MAX_BATCH);
+  inFlight = dogService.recordInteractions(sending)
+    .then(results => {
+      const failed = sending.filter((_, i) => results[i]?.status === 'failed');
+      pending = [...failed, ...pending];
+    })
+    .catch(error => {
+      console.error('Error recording swipes:', error);
+      pending = [...sending, ...pending];
+    })
+    .finally(() => {
+      inFlight = undefined;
+      if (pending.length > 0 && !timer) {
+        timer = setTimeout(flushSwipes, FLUSH_INTERVAL_MS);
+      }
+    });
+  return inFlight;
+}
+
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+      flushSwipes();
+    }
+  });
+  window.addEventListener('pagehide', () => flushSwipes());
+}
@@ -13,4 +13,9 @@ export interface Dog {
   photo: string;
   originalPhoto?: string;
   thumbnailPhoto?: string;
+  photoFormats?: Record<string, Record<string, string>>;
+  photoSrcset?: string;
+  placeholder?: string;
+  likeCount?: number;
+  dislikeCount?: number;
 }